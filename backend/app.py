@@ -112,6 +112,34 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(jobs_bp)
     app.register_blueprint(help_bp)
+
+    # Background delivery for queued email (no-op unless the outbox is configured)
+    try:
+        from utils.email_outbox import start_outbox_workers
+        start_outbox_workers()
+    except Exception as e:
+        print(f"Failed to start email outbox workers: {e}")
+
+    # Bulk-load subject approvals for eligibility checks (needs the service key)
+    try:
+        from utils.eligibility import start_eligibility_preload
+        start_eligibility_preload()
+    except Exception as e:
+        print(f"Failed to start eligibility preload: {e}")
+
+    # Windowed session reminders (opt-in via REMINDER_SCHEDULER_ENABLED)
+    try:
+        from utils.reminder_service import start_reminder_scheduler
+        start_reminder_scheduler()
+    except Exception as e:
+        print(f"Failed to start reminder scheduler: {e}")
+
+    # Cross-worker dashboard events via Postgres LISTEN (opt-in via EVENTS_DATABASE_URL)
+    try:
+        from utils.events import start_event_listener
+        start_event_listener()
+    except Exception as e:
+        print(f"Failed to start event listener: {e}")
     
     @app.route('/')
     def hello():
@@ -1,12 +1,17 @@
-from flask import Blueprint, jsonify, request, current_app
+from flask import Blueprint, jsonify, request, current_app, send_file, abort
 import os
+import re
+import uuid
 import logging
+import mimetypes
+from werkzeug.utils import secure_filename
 from utils.db import get_db_manager
 from utils.db import get_supabase_client
 from utils.cache import TTLCache
 from utils.auth import require_auth
 from utils.email_service import get_email_service
-from utils.storage import get_storage_service
+from utils.storage import get_storage_service, get_content_hash_verifier
+from utils.local_storage import ObjectTooLarge, ContentMismatch
 from utils.db import get_db_manager
 
 # Configure logging
@@ -25,18 +30,276 @@ def status():
         "version": "1.0.0"
     })
 
+_SHA256_RE = re.compile(r'^[0-9a-f]{64}$')
+
+def _content_hash_from_path(object_path: str):
+    """SHA-256 encoded in a content-addressed object name, if it is one"""
+    stem = object_path.rsplit('/', 1)[-1].split('.', 1)[0]
+    return stem if _SHA256_RE.match(stem) else None
+
+def _recording_job_for_tutor(supabase, job_id: str):
+    """Return (job, error_response) ensuring the caller is the job's tutor."""
+    if not job_id:
+        return None, (jsonify({'error': 'job_id is required'}), 400)
+    try:
+        job_res = supabase.table('tutoring_jobs').select('id, tutor_id').eq('id', job_id).limit(1).execute()
+    except Exception:
+        job_res = None
+    job = (job_res.data or [None])[0] if job_res else None
+    if not job:
+        return None, (jsonify({'error': 'Job not found or already completed'}), 404)
+    if not request.principal.tutor_id or request.principal.tutor_id != job.get('tutor_id'):
+        return None, (jsonify({'error': 'Forbidden'}), 403)
+    return job, None
+
 @api_bp.route('/storage/upload-url', methods=['POST'])
 @require_auth
 def get_upload_url():
-    """Get a pre-signed URL for file upload"""
-    # This endpoint would typically require authentication
-    # For now, we'll just return a mock response
+    """Get a signed URL to upload a session recording straight to storage
+
+    Body: { job_id, filename, file_size?, sha256? }
+    The object lands under <job_id>/ in the recordings bucket; the client PUTs
+    the file (multipart, fields + file) to upload_url, then calls
+    /api/storage/upload-complete with the returned path.
+
+    With sha256 (hex digest of the file) the object is named after its content.
+    If this job already holds those bytes (e.g. a retry after a failed
+    completion) the response has deduplicated=true and no upload_url, and the
+    client goes straight to upload-complete.
+    """
+    data = request.get_json(silent=True) or {}
+    supabase = get_supabase_client()
+    job, err = _recording_job_for_tutor(supabase, data.get('job_id'))
+    if err:
+        return err
+
+    storage_service = get_storage_service()
+    filename = secure_filename(data.get('filename') or '')
+    try:
+        file_size = int(data.get('file_size') or 0)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'file_size must be an integer'}), 400
+    # Checked before a URL is issued; the bucket's file_size_limit enforces it during the PUT
+    if file_size <= 0:
+        return jsonify({'error': 'file_size is required'}), 400
+    validation = storage_service.validate_file(filename, file_size)
+    if not validation['valid']:
+        return jsonify({'error': validation['message']}), 400
+
+    ext = filename.rsplit('.', 1)[1].lower()
+    digest = (data.get('sha256') or '').strip().lower()
+    if digest:
+        if not _SHA256_RE.match(digest):
+            return jsonify({'error': 'sha256 must be a hex SHA-256 digest'}), 400
+        object_path = storage_service.content_object_name(digest, ext, job['id'])
+        try:
+            existing = storage_service.object_info(object_path)
+        except Exception as e:
+            logger.warning(f"Could not check for existing upload {object_path}: {str(e)}")
+            existing = None
+        if existing is not None:
+            return jsonify({
+                "upload_url": None,
+                "method": None,
+                "fields": {},
+                "path": object_path,
+                "deduplicated": True
+            })
+    else:
+        object_path = f"{job['id']}/{uuid.uuid4()}.{ext}"
+    try:
+        signed = storage_service.create_signed_upload_url(object_path)
+    except Exception as e:
+        logger.error(f"Failed to sign upload for job {job['id']}: {str(e)}")
+        return jsonify({'error': 'Failed to create upload URL'}), 502
+
     return jsonify({
-        "upload_url": "/api/storage/upload",
-        "fields": {},
-        "expires_in": 3600
+        "upload_url": signed['upload_url'],
+        "method": "PUT",
+        "fields": {"cacheControl": "3600"},
+        "path": object_path,
+        "deduplicated": False,
+        # Supabase signed upload tokens are valid for two hours
+        "expires_in": 7200
     })
 
+@api_bp.route('/storage/upload-complete', methods=['POST'])
+@require_auth
+def complete_upload():
+    """Record a directly uploaded recording in session_recordings
+
+    Body: { job_id, path }
+    A content-addressed path is checked against its hash in the background
+    (see ContentHashVerifier); a mismatch removes the recording afterwards.
+    """
+    data = request.get_json(silent=True) or {}
+    supabase = get_supabase_client()
+    job, err = _recording_job_for_tutor(supabase, data.get('job_id'))
+    if err:
+        return err
+
+    object_path = (data.get('path') or '').strip()
+    # Paths are only ever issued under the job's own folder
+    if not object_path.startswith(f"{job['id']}/") or '..' in object_path:
+        return jsonify({'error': 'Invalid upload path for this job'}), 400
+
+    storage_service = get_storage_service()
+    try:
+        info = storage_service.object_info(object_path)
+    except Exception as e:
+        logger.error(f"Failed to verify upload {object_path}: {str(e)}")
+        return jsonify({'error': 'Failed to verify upload'}), 502
+    if info is None:
+        return jsonify({'error': 'Upload not found'}), 404
+    size = info.get('size') or info.get('contentLength')
+    if size and int(size) > storage_service.max_size_bytes:
+        storage_service.delete_file(object_path)
+        return jsonify({'error': f"File too large. Maximum size: {storage_service.max_size_mb}MB"}), 400
+    content_hash = _content_hash_from_path(object_path)
+    verify_later = False
+    # The name is client-claimed and later uploads dedup on it, so the stored bytes
+    # are checked once per path; a retry of an already verified path is metadata-only
+    if content_hash and not _content_hash_verified(supabase, object_path, content_hash):
+        if storage_service.provider == "local" or not os.environ.get('SUPABASE_SERVICE_ROLE_KEY'):
+            # Local objects are hashed as they are written; without a service key there is no background verifier
+            try:
+                matches = storage_service.verify_content_hash(object_path, content_hash)
+            except Exception as e:
+                logger.error(f"Failed to verify content hash of {object_path}: {str(e)}")
+                return jsonify({'error': 'Failed to verify upload'}), 502
+            if not matches:
+                storage_service.delete_file(object_path)
+                return jsonify({'error': 'Uploaded bytes do not match the content hash'}), 400
+        else:
+            # Reading the object back streams up to MAX_UPLOAD_SIZE_MB, so it happens off the request
+            verify_later = True
+
+    response = _save_recording(supabase, job['id'], {
+        'recording_url': storage_service.public_url(object_path),
+        'storage_path': object_path,
+        'content_type': info.get('mimetype'),
+        'size_bytes': int(size) if size else None,
+        'content_hash': content_hash,
+    })
+    if verify_later and response[1] == 200:
+        get_content_hash_verifier().submit(object_path, content_hash)
+    return response
+
+def _content_hash_verified(supabase, object_path: str, content_hash: str) -> bool:
+    """True when a recording row already vouches for these bytes at this path"""
+    try:
+        res = (
+            supabase.table('session_recordings')
+            .select('content_verified_at')
+            .eq('storage_path', object_path)
+            .eq('content_hash', content_hash)
+            .execute()
+        )
+    except Exception as e:
+        logger.warning(f"Could not look up verified recordings for {object_path}: {str(e)}")
+        return False
+    return any(r.get('content_verified_at') for r in (res.data or []))
+
+def _save_recording(supabase, job_id: str, record: dict):
+    """Create or replace the job's session_recordings row"""
+    try:
+        existing = supabase.table('session_recordings').select('id').eq('job_id', job_id).limit(1).execute()
+        if existing.data:
+            res = supabase.table('session_recordings').update(record).eq('job_id', job_id).execute()
+        else:
+            res = supabase.table('session_recordings').insert({'job_id': job_id, **record}).execute()
+    except Exception as e:
+        return jsonify({'error': 'recording_upsert_failed', 'details': str(e)}), 500
+    if not res.data:
+        return jsonify({'error': 'Failed to save recording'}), 500
+    return jsonify({'message': 'Recording saved', 'recording': res.data[0]}), 200
+
+@api_bp.route('/storage/upload', methods=['POST'])
+@require_auth
+def upload_recording():
+    """Upload a session recording through the API (for clients that cannot PUT to storage)
+
+    Multipart form: job_id, file, and optionally resume_url/file_id from a
+    previous failed attempt. Large files are streamed to storage in resumable
+    chunks; a failure returns resume_url/file_id to continue with.
+    """
+    supabase = get_supabase_client()
+    job, err = _recording_job_for_tutor(supabase, request.form.get('job_id'))
+    if err:
+        return err
+    upload = request.files.get('file')
+    if upload is None or not upload.filename:
+        return jsonify({'error': 'file is required'}), 400
+
+    storage_service = get_storage_service()
+    validation = storage_service.validate_file(upload.filename, request.content_length or 0)
+    if not validation['valid']:
+        return jsonify({'error': validation['message']}), 400
+
+    result = storage_service.upload_file(
+        upload.stream, upload.filename,
+        resume_url=request.form.get('resume_url') or None,
+        file_id=request.form.get('file_id') or None,
+        folder=job['id'],
+    )
+    if not result.get('success'):
+        body = {'error': result.get('message')}
+        if result.get('resume_url'):
+            body.update({'resume_url': result['resume_url'], 'file_id': result.get('file_id')})
+        too_large = 'too large' in (result.get('message') or '').lower()
+        return jsonify(body), 400 if too_large else 502
+
+    return _save_recording(supabase, job['id'], {
+        'recording_url': result['url'],
+        'storage_path': storage_service.object_key(result['storage_path']),
+        'content_type': result.get('content_type'),
+        'size_bytes': result.get('size'),
+        'content_hash': result.get('content_hash'),
+    })
+
+@api_bp.route('/storage/local/<bucket>/<path:object_key>', methods=['GET'])
+def serve_local_object(bucket: str, object_key: str):
+    """Stream a locally stored object with HTTP Range support (signed URLs only)"""
+    storage_service = get_storage_service()
+    store = storage_service.local
+    if store is None:
+        abort(404)
+    if not store.verify('GET', bucket, object_key, request.args.get('expires'), request.args.get('sig')):
+        return jsonify({'error': 'Invalid or expired link'}), 403
+    try:
+        path = store.path_for(bucket, object_key)
+    except ValueError:
+        abort(404)
+    if not os.path.isfile(path):
+        abort(404)
+    mimetype = mimetypes.guess_type(object_key)[0] or 'application/octet-stream'
+    # conditional=True answers Range requests with 206 partial content; the file is
+    # streamed through the WSGI file wrapper (sendfile where the server supports it)
+    return send_file(path, mimetype=mimetype, conditional=True, etag=True, max_age=0)
+
+@api_bp.route('/storage/local/<bucket>/<path:object_key>', methods=['PUT'])
+def upload_local_object(bucket: str, object_key: str):
+    """Receive a direct upload issued by /api/storage/upload-url (signed URLs only)"""
+    storage_service = get_storage_service()
+    store = storage_service.local
+    if store is None:
+        abort(404)
+    if not store.verify('PUT', bucket, object_key, request.args.get('expires'), request.args.get('sig')):
+        return jsonify({'error': 'Invalid or expired link'}), 403
+    upload = request.files.get('file')
+    stream = upload.stream if upload is not None else request.stream
+    try:
+        # Content-addressed keys are only published if the bytes really hash to the name
+        size = store.write_stream(bucket, object_key, stream, storage_service.max_size_bytes,
+                                  expected_sha256=_content_hash_from_path(object_key))
+    except ObjectTooLarge:
+        return jsonify({'error': f"File too large. Maximum size: {storage_service.max_size_mb}MB"}), 413
+    except ContentMismatch:
+        return jsonify({'error': 'Uploaded bytes do not match the content hash'}), 400
+    except ValueError:
+        return jsonify({'error': 'Invalid object key'}), 400
+    return jsonify({'Key': f"{bucket}/{object_key}", 'size': size}), 200
+
 @api_bp.route('/services/status', methods=['GET'])
 @require_auth
 def services_status():
@@ -58,14 +321,14 @@ def services_status():
     
     # Check email service configuration
     email_service = get_email_service()
-    if all([email_service.host, email_service.username, email_service.password, email_service.from_email]):
+    if email_service.is_configured():
         services["email"]["status"] = "configured"
     else:
         services["email"]["status"] = "not_configured"
     
     # Check storage service configuration
     storage_service = get_storage_service()
-    if storage_service.provider == "supabase":
+    if storage_service.provider in ("supabase", "local"):
         services["storage"]["status"] = "configured"
     else:
         services["storage"]["status"] = "not_configured"
@@ -1,5 +1,5 @@
 from flask import Blueprint, jsonify, request
-from utils.auth import require_auth
+from utils.auth import require_auth, invalidate_account
 from utils.db import get_supabase_client
 
 auth_bp = Blueprint('auth', __name__)
@@ -12,34 +12,9 @@ def get_role():
     Never raise uncaught errors; fallback to role None to avoid frontend hard failure.
     """
     try:
-        supabase = get_supabase_client()
-        user_id = request.user_id
-
-        # Check admin first
-        try:
-            admin_res = supabase.table('admins').select('role').eq('auth_id', user_id).limit(1).execute()
-            if admin_res.data:
-                row = admin_res.data[0]
-                if row:
-                    return jsonify({ 'role': row.get('role') }), 200
-        except Exception:
-            pass
-
-        # Tutor
-        try:
-            tutor_res = supabase.table('tutors').select('id').eq('auth_id', user_id).limit(1).execute()
-            if tutor_res.data:
-                return jsonify({ 'role': 'tutor' }), 200
-        except Exception:
-            pass
-
-        # Tutee
-        try:
-            tutee_res = supabase.table('tutees').select('id').eq('auth_id', user_id).limit(1).execute()
-            if tutee_res.data:
-                return jsonify({ 'role': 'tutee' }), 200
-        except Exception:
-            pass
+        role = request.principal.role
+        if role:
+            return jsonify({ 'role': role }), 200
 
         return jsonify({ 'role': None }), 200
     except Exception as e:
@@ -76,28 +51,9 @@ def ensure_account():
     if requested_type not in ['tutor', 'tutee']:
         return jsonify({ 'error': 'account_type is required' }), 400
 
-    # Detect existing role bindings
-    existing_role = None  # 'admin' | 'tutor' | 'tutee' | None
-    try:
-        a = supabase.table('admins').select('id').eq('auth_id', auth_id).single().execute()
-        if a.data:
-            existing_role = 'admin'
-    except Exception:
-        pass
-    if existing_role != 'admin':
-        try:
-            t = supabase.table('tutors').select('id').eq('auth_id', auth_id).single().execute()
-            if t.data:
-                existing_role = 'tutor'
-        except Exception:
-            pass
-        if existing_role != 'tutor':
-            try:
-                te = supabase.table('tutees').select('id').eq('auth_id', auth_id).single().execute()
-                if te.data:
-                    existing_role = 'tutee'
-            except Exception:
-                pass
+    # Detect existing role bindings: 'admin' | 'tutor' | 'tutee' | None
+    account = request.principal.account
+    existing_role = account.get('role')
 
     # Admins: do not create a tutor/tutee implicitly
     if existing_role == 'admin':
@@ -107,7 +63,10 @@ def ensure_account():
     effective_type = existing_role if existing_role in ['tutor', 'tutee'] else requested_type
     table = 'tutors' if effective_type == 'tutor' else 'tutees'
 
-    # Check exists first
+    # Check exists first (resolved account already carries the row id)
+    existing_id = account.get('tutor_id') if effective_type == 'tutor' else account.get('tutee_id')
+    if existing_id:
+        return jsonify({ 'status': 'exists', 'id': existing_id }), 200
     try:
         exists = supabase.table(table).select('id').eq('auth_id', auth_id).single().execute()
         if exists.data:
@@ -146,18 +105,21 @@ def ensure_account():
     try:
         res = supabase.table(table).insert(data).execute()
         if res.data:
+            invalidate_account(auth_id)
             return jsonify({ 'status': 'created', 'id': res.data[0]['id'] }), 201
     except Exception:
         # Likely unique violation (auth_id/email). Try update by auth_id
         try:
             upd = supabase.table(table).update(data).eq('auth_id', auth_id).execute()
             if upd.data:
+                invalidate_account(auth_id)
                 return jsonify({ 'status': 'updated', 'id': upd.data[0]['id'] }), 200
         except Exception as e2:
             return jsonify({ 'error': 'failed to ensure account', 'details': str(e2) }), 500
 
     # If we reached here, select again to confirm
     final = supabase.table(table).select('id').eq('auth_id', auth_id).single().execute()
+    invalidate_account(auth_id)
     if final.data:
         return jsonify({ 'status': 'exists', 'id': final.data['id'] }), 200
     return jsonify({ 'error': 'failed to create account' }), 500
@@ -1,8 +1,10 @@
 from flask import Blueprint, request, jsonify
 import logging
 from utils.email_service import get_email_service
-from utils.auth import require_auth
-from utils.db import get_db_manager, get_supabase_client
+from utils.email_outbox import get_outbox_email_service
+from utils.email_digest import invalidate_digest_window
+from utils.auth import require_auth, require_admin
+from utils.db import get_supabase_client
 
 # Configure logging
 logger = logging.getLogger(__name__)
@@ -11,7 +13,7 @@ logger = logging.getLogger(__name__)
 email_notifications_bp = Blueprint('email_notifications', __name__)
 
 @email_notifications_bp.route('/api/email/test', methods=['POST'])
-@require_auth
+@require_admin
 def test_email():
     """
     Test endpoint for sending emails
@@ -50,7 +52,7 @@ def test_email():
         return jsonify({'error': 'Failed to send test email'}), 500
 
 @email_notifications_bp.route('/api/email/session-confirmation', methods=['POST'])
-@require_auth
+@require_admin
 def send_session_confirmation():
     """
     Send session confirmation emails to tutor and tutee
@@ -95,8 +97,6 @@ def send_session_confirmation():
     if not is_valid_email(tutee_email):
         return jsonify({'error': 'Invalid tutee_email'}), 400
 
-    # Send confirmation emails
-    email_service = get_email_service()
     # Build HTML/text bodies for single session
     subj_text = session_details['subject']
     location = session_details['location']
@@ -115,52 +115,22 @@ def send_session_confirmation():
     """
     text = f"Session Confirmation for {subj_text} on {date} at {time} ({location})"
 
-    # Send emails to both parties
-    email_service = get_email_service()
-    # Send in sequence to reduce parallel SMTP overhead under constrained providers
-    tutor_ok = email_service.send_email(tutor_email, f"Session Confirmation: {subj_text}", html, text)
-    tutee_ok = tutor_ok and email_service.send_email(tutee_email, f"Session Confirmation: {subj_text}", html, text)
+    # Queue emails to both parties; delivery and communications logging happen in the outbox worker
+    email_service = get_outbox_email_service(job_id=data.get('job_id'), kind='session_confirmation')
+    tutor_ok, tutee_ok = email_service.send_many([
+        {'to_email': tutor_email, 'subject': f"Session Confirmation: {subj_text}", 'body_html': html, 'body_text': text},
+        {'to_email': tutee_email, 'subject': f"Session Confirmation: {subj_text}", 'body_html': html, 'body_text': text},
+    ])
     success = tutor_ok and tutee_ok
     
     if success:
-        # Log the communication in the database
-        try:
-            db = get_db_manager()
-            job_id = data.get('job_id')
-            if job_id:
-                # Build content for single session
-                date = session_details.get('date', '')
-                time = session_details.get('time', '')
-                content_text = f"Session confirmation for {subj_text} on {date} at {time} ({location})"
-
-                # Log communication for tutor
-                db.insert_record("communications", {
-                    "job_id": job_id,
-                    "type": "email",
-                    "recipient": tutor_email,
-                    "subject": f"Session confirmation for {subj_text}",
-                    "content": content_text,
-                    "status": "sent"
-                })
-                # Log communication for tutee
-                db.insert_record("communications", {
-                    "job_id": job_id,
-                    "type": "email",
-                    "recipient": tutee_email,
-                    "subject": f"Session confirmation for {subj_text}",
-                    "content": content_text,
-                    "status": "sent"
-                })
-        except Exception as e:
-            logger.error(f"Failed to log communication: {str(e)}")
-        
-        logger.info(f"Session confirmation emails sent to {tutor_email} and {tutee_email}")
-        return jsonify({'message': 'Session confirmation emails sent successfully'}), 200
+        logger.info(f"Session confirmation emails queued for {tutor_email} and {tutee_email}")
+        return jsonify({'message': 'Session confirmation emails queued successfully'}), 200
     else:
         return jsonify({'error': 'Failed to send session confirmation emails', 'tutor_sent': tutor_ok, 'tutee_sent': tutee_ok}), 500
 
 @email_notifications_bp.route('/api/email/job-assignment', methods=['POST'])
-@require_auth
+@require_admin
 def send_job_assignment_notification():
     """
     Send job assignment notification to tutor
@@ -230,34 +200,18 @@ def send_job_assignment_notification():
     Thank you for volunteering!
     """
     
-    # Send email
-    email_service = get_email_service()
+    # Queue email
+    email_service = get_outbox_email_service(job_id=data.get('job_id'), kind='job_assignment')
     success = email_service.send_email(tutor_email, subject, html_body, text_body)
     
     if success:
-        # Log the communication
-        try:
-            db = get_db_manager()
-            job_id = data.get('job_id')
-            if job_id:
-                db.insert_record("communications", {
-                    "job_id": job_id,
-                    "type": "email",
-                    "recipient": tutor_email,
-                    "subject": subject,
-                    "content": f"Job assignment notification for {job_details['subject']}",
-                    "status": "sent"
-                })
-        except Exception as e:
-            logger.error(f"Failed to log communication: {str(e)}")
-        
-        logger.info(f"Job assignment notification sent to {tutor_email}")
-        return jsonify({'message': 'Job assignment notification sent successfully'}), 200
+        logger.info(f"Job assignment notification queued for {tutor_email}")
+        return jsonify({'message': 'Job assignment notification queued successfully'}), 200
     else:
         return jsonify({'error': 'Failed to send job assignment notification'}), 500
 
 @email_notifications_bp.route('/api/email/cancellation', methods=['POST'])
-@require_auth
+@require_admin
 def send_cancellation_notification():
     """
     Send cancellation notification emails to tutor and tutee
@@ -281,86 +235,18 @@ def send_cancellation_notification():
         if field not in cancellation_details:
             return jsonify({'error': f'Missing required cancellation detail: {field}'}), 400
     
-    subject = f"Tutoring Session Cancelled: {cancellation_details['subject']}"
-    
-    # Create email content for tutor
-    tutor_html = f"""
-    <html>
-    <body>
-        <h2>Tutoring Session Cancelled</h2>
-        <p>Hello {cancellation_details['tutor_name']},</p>
-        <p>Your tutoring session has been cancelled:</p>
-        <ul>
-            <li><strong>Subject:</strong> {cancellation_details['subject']}</li>
-            <li><strong>Student:</strong> {cancellation_details['tutee_name']}</li>
-            <li><strong>Reason:</strong> {cancellation_details['reason']}</li>
-        </ul>
-        <p>The opportunity has been returned to the tutoring board for other tutors to apply.</p>
-        <p>Thank you for your understanding.</p>
-    </body>
-    </html>
-    """
-    
-    # Create email content for tutee
-    tutee_html = f"""
-    <html>
-    <body>
-        <h2>Tutoring Session Cancelled</h2>
-        <p>Hello {cancellation_details['tutee_name']},</p>
-        <p>Unfortunately, your tutoring session has been cancelled:</p>
-        <ul>
-            <li><strong>Subject:</strong> {cancellation_details['subject']}</li>
-            <li><strong>Tutor:</strong> {cancellation_details['tutor_name']}</li>
-            <li><strong>Reason:</strong> {cancellation_details['reason']}</li>
-        </ul>
-        <p>Don't worry - your request has been returned to our system and another qualified tutor will be able to help you soon.</p>
-        <p>You will receive a new confirmation email once a tutor is assigned.</p>
-        <p>We apologize for any inconvenience.</p>
-    </body>
-    </html>
-    """
-    
-    # Send emails
-    email_service = get_email_service()
-    tutor_success = email_service.send_email(tutor_email, subject, tutor_html)
-    tutee_success = email_service.send_email(tutee_email, subject, tutee_html)
-    
-    success = tutor_success and tutee_success
+    # Queue emails
+    email_service = get_outbox_email_service(job_id=data.get('job_id'), kind='cancellation')
+    success = email_service.send_cancellation_notification(tutor_email, tutee_email, cancellation_details)
     
     if success:
-        # Log the communication
-        try:
-            db = get_db_manager()
-            job_id = data.get('job_id')
-            if job_id:
-                # Log communication for tutor
-                db.insert_record("communications", {
-                    "job_id": job_id,
-                    "type": "email",
-                    "recipient": tutor_email,
-                    "subject": subject,
-                    "content": f"Cancellation notification for {cancellation_details['subject']} - {cancellation_details['reason']}",
-                    "status": "sent"
-                })
-                # Log communication for tutee
-                db.insert_record("communications", {
-                    "job_id": job_id,
-                    "type": "email",
-                    "recipient": tutee_email,
-                    "subject": subject,
-                    "content": f"Cancellation notification for {cancellation_details['subject']} - {cancellation_details['reason']}",
-                    "status": "sent"
-                })
-        except Exception as e:
-            logger.error(f"Failed to log communication: {str(e)}")
-        
-        logger.info(f"Cancellation notifications sent to {tutor_email} and {tutee_email}")
-        return jsonify({'message': 'Cancellation notifications sent successfully'}), 200
+        logger.info(f"Cancellation notifications queued for {tutor_email} and {tutee_email}")
+        return jsonify({'message': 'Cancellation notifications queued successfully'}), 200
     else:
         return jsonify({'error': 'Failed to send cancellation notifications'}), 500
 
 @email_notifications_bp.route('/api/email/reminder', methods=['POST'])
-@require_auth
+@require_admin
 def send_session_reminder():
     """
     Send session reminder emails to tutor and tutee
@@ -436,47 +322,23 @@ def send_session_reminder():
     </html>
     """
     
-    # Send emails
-    email_service = get_email_service()
-    tutor_success = email_service.send_email(tutor_email, subject, tutor_html)
-    tutee_success = email_service.send_email(tutee_email, subject, tutee_html)
+    # Queue emails
+    email_service = get_outbox_email_service(job_id=data.get('job_id'), kind='session_reminder')
+    tutor_success, tutee_success = email_service.send_many([
+        {'to_email': tutor_email, 'subject': subject, 'body_html': tutor_html},
+        {'to_email': tutee_email, 'subject': subject, 'body_html': tutee_html},
+    ])
     
     success = tutor_success and tutee_success
     
     if success:
-        # Log the communication
-        try:
-            db = get_db_manager()
-            job_id = data.get('job_id')
-            if job_id:
-                # Log communication for tutor
-                db.insert_record("communications", {
-                    "job_id": job_id,
-                    "type": "email",
-                    "recipient": tutor_email,
-                    "subject": subject,
-                    "content": f"Session reminder for {session_details['subject']} on {session_details['date']}",
-                    "status": "sent"
-                })
-                # Log communication for tutee
-                db.insert_record("communications", {
-                    "job_id": job_id,
-                    "type": "email",
-                    "recipient": tutee_email,
-                    "subject": subject,
-                    "content": f"Session reminder for {session_details['subject']} on {session_details['date']}",
-                    "status": "sent"
-                })
-        except Exception as e:
-            logger.error(f"Failed to log communication: {str(e)}")
-        
-        logger.info(f"Session reminders sent to {tutor_email} and {tutee_email}")
-        return jsonify({'message': 'Session reminders sent successfully'}), 200
+        logger.info(f"Session reminders queued for {tutor_email} and {tutee_email}")
+        return jsonify({'message': 'Session reminders queued successfully'}), 200
     else:
         return jsonify({'error': 'Failed to send session reminders'}), 500
 
 @email_notifications_bp.route('/api/email/approval-status', methods=['POST'])
-@require_auth
+@require_admin
 def send_approval_status_notification():
     """
     Send subject approval status notification to tutor
@@ -535,38 +397,28 @@ def send_approval_status_notification():
         </html>
         """
     
-    # Send email
-    email_service = get_email_service()
+    # Queue email
+    email_service = get_outbox_email_service(kind='approval_status')
     success = email_service.send_email(tutor_email, subject, html_body)
     
     if success:
-        logger.info(f"Approval status notification sent to {tutor_email} for {subject_name}: {status}")
-        return jsonify({'message': 'Approval status notification sent successfully'}), 200
+        logger.info(f"Approval status notification queued for {tutor_email} for {subject_name}: {status}")
+        return jsonify({'message': 'Approval status notification queued successfully'}), 200
     else:
         return jsonify({'error': 'Failed to send approval status notification'}), 500
 
 @email_notifications_bp.route('/api/email/send-reminders', methods=['POST'])
-@require_auth
+@require_admin
 def trigger_session_reminders():
     """
     Manually trigger session reminders for tomorrow's sessions
-    This endpoint can be called by a cron job or for testing
+    The run happens in the background with the service role; the reminder
+    ledger keeps it from duplicating the scheduler's work
     """
-    try:
-        from utils.reminder_service import send_session_reminders
-        # Forward the user's JWT so RLS applies to the reminder query context
-        auth_header = request.headers.get('Authorization', '')
-        token = auth_header.split(' ')[1] if ' ' in auth_header else None
-        reminder_count = send_session_reminders(user_jwt=token)
-        
-        return jsonify({
-            'message': f'Successfully sent {reminder_count} session reminders',
-            'count': reminder_count
-        }), 200
-        
-    except Exception as e:
-        logger.error(f"Error triggering session reminders: {str(e)}")
-        return jsonify({'error': 'Failed to send session reminders'}), 500
+    from utils.reminder_service import request_reminder_run
+    if not request_reminder_run():
+        return jsonify({'error': 'Session reminders need SUPABASE_SERVICE_ROLE_KEY'}), 503
+    return jsonify({'message': 'Session reminder run started'}), 202
 
 @email_notifications_bp.route('/api/email/debug', methods=['GET'])
 def debug_email_config():
@@ -598,12 +450,71 @@ def debug_email_config():
     
     try:
         email_service = get_email_service()
-        service_type = type(email_service).__name__
-        config_status['active_service'] = service_type
+        primary = getattr(email_service, 'primary', None) or email_service
+        config_status['active_service'] = type(primary).__name__
+        config_status['providers'] = [p.name for p in getattr(email_service, 'providers', [])]
     except Exception as e:
         config_status['active_service'] = f'error: {str(e)}'
     
     return jsonify({
         'status': 'Email configuration debug info',
         'config': config_status
-    }), 200
\ No newline at end of file
+    }), 200
+
+@email_notifications_bp.route('/api/email/digest-preferences', methods=['GET'])
+@require_auth
+def get_digest_preferences():
+    """
+    Current user's notification digest opt-in
+    """
+    supabase = get_supabase_client()
+    try:
+        res = supabase.table('email_digest_preferences').select('enabled, window_minutes, email').eq('auth_id', request.user_id).limit(1).execute()
+    except Exception as e:
+        logger.error(f"Failed to load digest preferences: {str(e)}")
+        return jsonify({'error': 'Failed to load digest preferences'}), 500
+    row = (res.data or [None])[0] or {'enabled': False, 'window_minutes': None, 'email': request.user_email}
+    return jsonify({'preferences': row}), 200
+
+@email_notifications_bp.route('/api/email/digest-preferences', methods=['PUT'])
+@require_auth
+def update_digest_preferences():
+    """
+    Opt in/out of grouped notification emails
+    Body: { enabled: bool, window_minutes?: int (1-1440, default 15) }
+    """
+    data = request.get_json(silent=True) or {}
+    enabled = bool(data.get('enabled', True))
+    try:
+        window_minutes = int(data.get('window_minutes', 15))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'window_minutes must be an integer'}), 400
+    if window_minutes < 1 or window_minutes > 1440:
+        return jsonify({'error': 'window_minutes must be between 1 and 1440'}), 400
+    email = getattr(request, 'user_email', None)
+    if not email:
+        return jsonify({'error': 'No email on account'}), 400
+
+    supabase = get_supabase_client()
+    try:
+        res = supabase.table('email_digest_preferences').upsert({
+            'auth_id': request.user_id,
+            'email': email,
+            'enabled': enabled,
+            'window_minutes': window_minutes,
+        }).execute()
+    except Exception as e:
+        logger.error(f"Failed to save digest preferences: {str(e)}")
+        return jsonify({'error': 'Failed to save digest preferences'}), 500
+    invalidate_digest_window(email)
+    return jsonify({'message': 'Digest preferences saved', 'preferences': (res.data or [{}])[0]}), 200
+
+@email_notifications_bp.route('/api/email/metrics', methods=['GET'])
+@require_admin
+def email_provider_metrics():
+    """
+    Per-provider throughput, error rate, health score and rate-limit state
+    """
+    email_service = get_email_service()
+    metrics = email_service.metrics() if hasattr(email_service, 'metrics') else {}
+    return jsonify({'providers': metrics}), 200
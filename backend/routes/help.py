@@ -2,6 +2,7 @@ from flask import Blueprint, request, jsonify
 from utils.auth import require_auth, require_admin
 from utils.db import get_supabase_client
 from utils.cache import TTLCache
+from utils.events import publish_change
 import os
 
 help_bp = Blueprint('help', __name__)
@@ -26,43 +27,30 @@ def submit_help_request():
 
     urgency = 'high' if urgency_raw == 'urgent' else 'normal'
 
-    # Determine role and profile (prefer tutor, then tutee)
-    role = None
-    tutor_row = None
-    tutee_row = None
-    try:
-        tutor_row = supabase.table('tutors').select('id, first_name, last_name, email, school_id').eq('auth_id', request.user_id).single().execute()
-        if tutor_row.data:
-            role = 'tutor'
-    except Exception:
-        tutor_row = None
-    if role is None:
-        try:
-            tutee_row = supabase.table('tutees').select('id, first_name, last_name, email, school_id, grade').eq('auth_id', request.user_id).single().execute()
-            if tutee_row.data:
-                role = 'tutee'
-        except Exception:
-            tutee_row = None
-
-    if role is None:
+    # Determine role and profile (prefer tutor, then tutee) from the request principal
+    tutor_row = request.principal.tutor
+    tutee_row = None if tutor_row else request.principal.tutee
+    if not tutor_row and not tutee_row:
         return jsonify({'error': 'profile_not_found'}), 404
 
-    if role == 'tutor':
-        first_name = tutor_row.data.get('first_name')
-        last_name = tutor_row.data.get('last_name')
-        email = tutor_row.data.get('email')
-        school_id = tutor_row.data.get('school_id')
+    if tutor_row:
+        role = 'tutor'
+        first_name = tutor_row.get('first_name')
+        last_name = tutor_row.get('last_name')
+        email = tutor_row.get('email')
+        school_id = tutor_row.get('school_id')
         user_grade = None
-        tutor_id = tutor_row.data.get('id')
+        tutor_id = tutor_row.get('id')
         tutee_id = None
     else:
-        first_name = tutee_row.data.get('first_name')
-        last_name = tutee_row.data.get('last_name')
-        email = tutee_row.data.get('email')
-        school_id = tutee_row.data.get('school_id')
-        user_grade = (tutee_row.data or {}).get('grade')
+        role = 'tutee'
+        first_name = tutee_row.get('first_name')
+        last_name = tutee_row.get('last_name')
+        email = tutee_row.get('email')
+        school_id = tutee_row.get('school_id')
+        user_grade = tutee_row.get('grade')
         tutor_id = None
-        tutee_id = tutee_row.data.get('id')
+        tutee_id = tutee_row.get('id')
 
     payload = {
         'auth_id': request.user_id,
@@ -81,6 +69,7 @@ def submit_help_request():
     ins = supabase.table('help_questions').insert(payload).execute()
     if not ins.data:
         return jsonify({'error': 'failed_to_submit'}), 500
+    publish_change('help_questions', 'insert', ins.data[0])
     return jsonify({'message': 'submitted', 'help': ins.data[0]}), 201
 
 
@@ -93,8 +82,7 @@ def list_help_requests_admin():
     """
     supabase = get_supabase_client()
     try:
-        admin_res = supabase.table('admins').select('school_id').eq('auth_id', request.user_id).single().execute()
-        school_id = (admin_res.data or {}).get('school_id') if admin_res.data else None
+        school_id = getattr(request, 'admin_school_id', None)
 
         ck = f"help:{request.user_id}:{school_id or 'all'}"
         cached = _help_admin_cache.get(ck)
@@ -124,9 +112,8 @@ def delete_help_request_admin(request_id: str):
     """Mark a help request as resolved by deleting it (scoped by admin's school)."""
     supabase = get_supabase_client()
     try:
-        # Scope check
-        admin_res = supabase.table('admins').select('school_id').eq('auth_id', request.user_id).single().execute()
-        admin_school_id = (admin_res.data or {}).get('school_id') if admin_res.data else None
+        # Scope check (admin school resolved by require_admin)
+        admin_school_id = getattr(request, 'admin_school_id', None)
 
         row = supabase.table('help_questions').select('school_id').eq('id', request_id).single().execute()
         if not row.data:
@@ -135,6 +122,7 @@ def delete_help_request_admin(request_id: str):
             return jsonify({'error': 'not_in_admin_school_scope'}), 403
 
         supabase.table('help_questions').delete().eq('id', request_id).execute()
+        publish_change('help_questions', 'delete', {'id': request_id})
         return jsonify({'message': 'resolved'}), 200
     except Exception as e:
         print(f"Error deleting help request: {e}")
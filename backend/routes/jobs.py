@@ -1,6 +1,9 @@
 from flask import Blueprint, request, jsonify
 from utils.auth import require_auth
 from utils.db import get_supabase_client
+from utils.booking_index import release_booking
+from utils.events import publish_change
+from utils.email_outbox import get_outbox_email_service
 
 jobs_bp = Blueprint('jobs', __name__)
 
@@ -24,8 +27,7 @@ def upsert_recording_link(job_id: str):
     job_res = supabase.table('tutoring_jobs').select('id, tutor_id').eq('id', job_id).single().execute()
     if not job_res.data:
         return jsonify({'error': 'Job not found or already completed'}), 404
-    tutor_res = supabase.table('tutors').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data or tutor_res.data['id'] != job_res.data['tutor_id']:
+    if not request.principal.tutor_id or request.principal.tutor_id != job_res.data['tutor_id']:
         return jsonify({'error': 'Forbidden'}), 403
 
     # Upsert recording link by job_id (unique job_id)
@@ -53,11 +55,15 @@ def get_recording_link(job_id: str):
     job_res = supabase.table('tutoring_jobs').select('id, tutor_id').eq('id', job_id).single().execute()
     if not job_res.data:
         return jsonify({'error': 'Job not found'}), 404
-    tutor_res = supabase.table('tutors').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data or tutor_res.data['id'] != job_res.data['tutor_id']:
+    if not request.principal.tutor_id or request.principal.tutor_id != job_res.data['tutor_id']:
         return jsonify({'error': 'Forbidden'}), 403
-    rec = supabase.table('session_recordings').select('recording_url').eq('job_id', job_id).single().execute()
-    return jsonify({'recording_url': (rec.data or {}).get('recording_url')}), 200
+    rec = supabase.table('session_recordings').select('recording_url, storage_path').eq('job_id', job_id).single().execute()
+    row = rec.data or {}
+    url = row.get('recording_url')
+    if row.get('storage_path'):
+        from utils.storage import get_storage_service
+        url = get_storage_service().playback_url(row['storage_path'])
+    return jsonify({'recording_url': url}), 200
 
 
 @jobs_bp.route('/api/tutor/jobs/<job_id>/cancel', methods=['POST'])
@@ -67,6 +73,7 @@ def cancel_job(job_id: str):
 
     - Recreates an opportunity row (using snapshot when available or fields on the job)
     - Deletes the job row
+    - Queues the cancellation notice to both parties
     """
     supabase = get_supabase_client()
 
@@ -75,8 +82,7 @@ def cancel_job(job_id: str):
     if not job_res.data:
         return jsonify({'error': 'Job not found'}), 404
 
-    tutor_res = supabase.table('tutors').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data or tutor_res.data['id'] != job_res.data['tutor_id']:
+    if not request.principal.tutor_id or request.principal.tutor_id != job_res.data['tutor_id']:
         return jsonify({'error': 'Forbidden'}), 403
 
     job = job_res.data
@@ -104,6 +110,12 @@ def cancel_job(job_id: str):
     if not new_opp.data:
         return jsonify({'error': 'failed_to_recreate_opportunity'}), 500
 
+    # Resolve the tutee while the job still exists; recipients never come from the caller
+    try:
+        tutee_info = supabase.table('tutees').select('email, first_name, last_name').eq('id', job.get('tutee_id')).single().execute()
+    except Exception:
+        tutee_info = None
+
     # Remove communications associated with this job (since the pairing is cancelled)
     # Under RLS, tutor may not be allowed to delete communications (admin-owned). Skip silently.
     try:
@@ -113,6 +125,25 @@ def cancel_job(job_id: str):
     
     # Remove the job row entirely
     supabase.table('tutoring_jobs').delete().eq('id', job_id).execute()
+    release_booking(job.get('tutor_id'), job_id)
+    publish_change('tutoring_jobs', 'delete', job)
+    publish_change('tutoring_opportunities', 'insert', new_opp.data[0])
+
+    tutor = request.principal.tutor or {}
+    if tutee_info and tutee_info.data and tutor.get('email'):
+        subject = opp_insert['subject_name']
+        if opp_insert['subject_type'] and opp_insert['subject_grade']:
+            subject = f"{subject} • {opp_insert['subject_type']} • Grade {opp_insert['subject_grade']}"
+        get_outbox_email_service(kind='cancellation').send_cancellation_notification(
+            tutor['email'],
+            tutee_info.data.get('email'),
+            {
+                'subject': subject,
+                'tutor_name': f"{tutor.get('first_name', '')} {tutor.get('last_name', '')}".strip(),
+                'tutee_name': f"{tutee_info.data.get('first_name', '')} {tutee_info.data.get('last_name', '')}".strip(),
+                'reason': 'Tutor cancelled before scheduling',
+            },
+        )
 
     return jsonify({'message': 'Job cancelled', 'opportunity': new_opp.data[0]}), 200
 
@@ -128,17 +159,18 @@ def cancel_job_as_tutee(job_id: str):
     supabase = get_supabase_client()
 
     # Ensure requester is the assigned tutee
-    job_res = supabase.table('tutoring_jobs').select('id, tutee_id').eq('id', job_id).single().execute()
+    job_res = supabase.table('tutoring_jobs').select('id, tutee_id, tutor_id').eq('id', job_id).single().execute()
     if not job_res.data:
         return jsonify({'error': 'Job not found'}), 404
 
-    tutee_res = supabase.table('tutees').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutee_res.data or tutee_res.data['id'] != job_res.data['tutee_id']:
+    if not request.principal.tutee_id or request.principal.tutee_id != job_res.data['tutee_id']:
         return jsonify({'error': 'Forbidden'}), 403
 
     # Perform delete using the user's RLS-bound client only
     try:
         _ = supabase.table('tutoring_jobs').delete().eq('id', job_id).execute()
+        release_booking(job_res.data.get('tutor_id'), job_id)
+        publish_change('tutoring_jobs', 'delete', job_res.data)
         return jsonify({'message': 'Job deleted'}), 200
     except Exception as e:
         return jsonify({'error': 'failed_to_delete_job', 'details': str(e)}), 500
@@ -160,8 +192,7 @@ def complete_job(job_id: str):
     if not job_res.data:
         return jsonify({'error': 'Job not found'}), 404
 
-    tutor_res = supabase.table('tutors').select('id, volunteer_hours').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data or tutor_res.data['id'] != job_res.data['tutor_id']:
+    if not request.principal.tutor_id or request.principal.tutor_id != job_res.data['tutor_id']:
         return jsonify({'error': 'Forbidden'}), 403
 
     # Require existing recording link
@@ -175,12 +206,9 @@ def complete_job(job_id: str):
         # Fetch tutor/tutee names for denormalized storage in awaiting table
         tutor_name = None
         tutee_name = None
-        try:
-            t_row = supabase.table('tutors').select('first_name, last_name').eq('id', job.get('tutor_id')).single().execute()
-            if t_row and t_row.data:
-                tutor_name = f"{t_row.data.get('first_name','')} {t_row.data.get('last_name','')}".strip()
-        except Exception:
-            pass
+        tutor_row = request.principal.tutor
+        if tutor_row:
+            tutor_name = f"{tutor_row.get('first_name','')} {tutor_row.get('last_name','')}".strip()
         try:
             te_row = supabase.table('tutees').select('first_name, last_name').eq('id', job.get('tutee_id')).single().execute()
             if te_row and te_row.data:
@@ -219,6 +247,9 @@ def complete_job(job_id: str):
         # Remove communications and delete active job
         supabase.table('communications').delete().eq('job_id', job_id).execute()
         supabase.table('tutoring_jobs').delete().eq('id', job_id).execute()
+        release_booking(job.get('tutor_id'), job_id)
+        publish_change('tutoring_jobs', 'delete', job)
+        publish_change('awaiting_verification_jobs', 'insert', ins.data[0])
 
         return jsonify({'message': 'Job marked as completed and moved to awaiting verification'}), 200
     except Exception as e:
@@ -3,18 +3,56 @@ import os
 from utils.cache import TTLCache
 from utils.auth import require_auth
 from utils.db import get_supabase_client
-from utils.email_service import get_email_service
+from utils.email_outbox import get_outbox_email_service
+from utils.availability import Availability, AvailabilityError
+from utils.events import publish_change, sse_response
+from utils.delta_sync import new_cursor, parse_since, is_servable, changed_since, fetch_changes, removed_ids, DeltaTooLarge
 
 tutee_bp = Blueprint('tutee', __name__)
 _tutee_dashboard_cache = TTLCache(max_size=256, ttl_seconds=int(os.environ.get('TUTEE_DASHBOARD_CACHE_TTL', '3')))
 
 
+def _tutee_dashboard_delta(supabase, tutee_id: str, since) -> dict:
+    """Own opportunities and jobs written since the cursor, plus removed ids"""
+    cursor = new_cursor()
+    opps = fetch_changes(changed_since(supabase.table('tutoring_opportunities').select('*').eq('tutee_id', tutee_id), since).order('updated_at'))
+    jobs = fetch_changes(changed_since(supabase.table('tutoring_jobs').select('*').eq('tutee_id', tutee_id), since).order('updated_at'))
+    return {
+        'delta': True,
+        'cursor': cursor,
+        'opportunities': opps,
+        'jobs': jobs,
+        'removed': {
+            'opportunities': removed_ids(supabase, since, ['tutoring_opportunities'], tutee_id=tutee_id),
+            # Completed jobs leave the tutee's view when they move to awaiting verification
+            'jobs': removed_ids(supabase, since, ['tutoring_jobs'], tutee_id=tutee_id),
+        },
+    }
+
+
 @tutee_bp.route('/api/tutee/dashboard', methods=['GET'])
 @require_auth
 def get_tutee_dashboard():
-    """Return the authenticated tutee's profile, opportunities, and jobs"""
+    """Return the authenticated tutee's profile, opportunities, and jobs
+
+    With ?since=<cursor> only changes after the cursor are returned (see utils/delta_sync.py).
+    """
     supabase = get_supabase_client()
 
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({'error': 'invalid_since'}), 400
+    if since is not None and is_servable(since):
+        if not request.principal.tutee_id:
+            return jsonify({'error': 'Tutee profile not found'}), 404
+        try:
+            return jsonify(_tutee_dashboard_delta(supabase, request.principal.tutee_id, since)), 200
+        except DeltaTooLarge:
+            pass  # too much changed: fall through to a full payload (delta: false)
+        except Exception as e:
+            return jsonify({'error': 'failed_to_load_changes', 'details': str(e)}), 500
+
     # Microcache per tutee to smooth repeated reads during rapid navigation
     try:
         ck = f"dash:{request.user_id}"
@@ -26,13 +64,12 @@ def get_tutee_dashboard():
     except Exception:
         pass
 
-    # Find tutee by auth_id
-    tutee_result = supabase.table('tutees').select('*').eq('auth_id', request.user_id).single().execute()
-    if not tutee_result.data:
+    # Caller's tutee profile (loaded once per request)
+    tutee = request.principal.tutee
+    if not tutee:
         return jsonify({'error': 'Tutee profile not found'}), 404
 
-    tutee = tutee_result.data
-
+    cursor = new_cursor()
     # Load own opportunities (embedded subject fields)
     opps = (
         supabase
@@ -61,7 +98,9 @@ def get_tutee_dashboard():
         'tutee': tutee,
         'opportunities': opps.data or [],
         'jobs': jobs.data or [],
-        'grade_suggestion': grade_suggestion
+        'grade_suggestion': grade_suggestion,
+        'delta': False,
+        'cursor': cursor,
     }
     try:
         _tutee_dashboard_cache.set(ck, payload)
@@ -88,13 +127,11 @@ def create_tutoring_opportunity():
 
     supabase = get_supabase_client()
 
-    # Find tutee by auth_id
-    tutee_result = supabase.table('tutees').select('id, school_id').eq('auth_id', request.user_id).single().execute()
-    if not tutee_result.data:
+    # Caller's tutee id (resolved once per request)
+    tutee_id = request.principal.tutee_id
+    if not tutee_id:
         return jsonify({'error': 'Tutee profile not found'}), 404
 
-    tutee_id = tutee_result.data['id']
-
     opp_insert = {
         'tutee_id': tutee_id,
         'subject_name': data['subject_name'],
@@ -112,17 +149,30 @@ def create_tutoring_opportunity():
     result = supabase.table('tutoring_opportunities').insert(opp_insert).execute()
     if not result.data:
         return jsonify({'error': 'Failed to create opportunity'}), 500
+    publish_change('tutoring_opportunities', 'insert', result.data[0])
 
     return jsonify({'message': 'Opportunity created', 'opportunity': result.data[0]}), 201
 
 
+@tutee_bp.route('/api/tutee/events', methods=['GET'])
+@require_auth
+def tutee_events():
+    """Server-sent change events for the tutee dashboard (own opportunities and jobs)"""
+    tutee_id = request.principal.tutee_id
+    if not tutee_id:
+        return jsonify({'error': 'Tutee profile not found'}), 404
+    return sse_response(
+        request.user_id,
+        {f"tutee:{tutee_id}"},
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id'),
+    )
+
+
 @tutee_bp.route('/api/tutee/subjects', methods=['GET'])
 @require_auth
 def get_tutee_subjects():
     """Return tutee profile subjects and the master subjects list from subjects.txt"""
-    supabase = get_supabase_client()
-    tutee_res = supabase.table('tutees').select('id, subjects').eq('auth_id', request.user_id).single().execute()
-    subjects = (tutee_res.data or {}).get('subjects') if (tutee_res and tutee_res.data) else []
+    subjects = (request.principal.tutee or {}).get('subjects') or []
     # load master list from subjects.txt (repo root)
     try:
         subjects_file_path = os.path.abspath(os.path.join(current_app.root_path, '..', 'subjects.txt'))
@@ -151,12 +201,13 @@ def update_tutee_subjects():
     subs = body.get('subjects')
     if not isinstance(subs, list):
         return jsonify({'error': 'subjects must be an array'}), 400
-    tutee_res = supabase.table('tutees').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutee_res.data:
+    tutee_id = request.principal.tutee_id
+    if not tutee_id:
         return jsonify({'error': 'Tutee not found'}), 404
-    upd = supabase.table('tutees').update({'subjects': subs}).eq('id', tutee_res.data['id']).execute()
+    upd = supabase.table('tutees').update({'subjects': subs}).eq('id', tutee_id).execute()
     if not upd.data:
         return jsonify({'error': 'Failed to update subjects'}), 500
+    request.principal.invalidate()
     return jsonify({'message': 'Subjects updated', 'tutee': upd.data[0]}), 200
 
 
@@ -193,10 +244,9 @@ def set_tutee_availability(job_id: str):
     supabase = get_supabase_client()
 
     # Identify tutee
-    tutee_res = supabase.table('tutees').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutee_res.data:
+    tutee_id = request.principal.tutee_id
+    if not tutee_id:
         return jsonify({'error': 'Tutee profile not found'}), 404
-    tutee_id = tutee_res.data['id']
 
     # Ensure job belongs to tutee and is awaiting tutee scheduling
     job_res = (
@@ -214,25 +264,12 @@ def set_tutee_availability(job_id: str):
     if status not in ['pending_tutee_scheduling', 'pending_tutor_scheduling']:
         return jsonify({'error': f'Job status must be pending scheduling. Current: {status}'}), 400
 
-    # Validate structure and HH:MM format; relax horizon checks to avoid timezone/horizon errors
-    for date_str, ranges in availability.items():
-        try:
-            y, m, d = map(int, date_str.split('-'))
-        except Exception:
-            return jsonify({'error': f'Invalid date key: {date_str}'}), 400
-        if not isinstance(ranges, list):
-            return jsonify({'error': f'Ranges for {date_str} must be a list'}), 400
-        for r in ranges:
-            if not isinstance(r, str) or '-' not in r:
-                return jsonify({'error': f'Invalid time range format for {date_str}: {r}'}), 400
-            start_s, end_s = r.split('-')
-            try:
-                sh, sm = map(int, start_s.split(':'))
-                eh, em = map(int, end_s.split(':'))
-            except Exception:
-                return jsonify({'error': f'Invalid HH:MM in range for {date_str}: {r}'}), 400
-            if (eh, em) <= (sh, sm):
-                return jsonify({'error': f'End must be after start for {date_str}: {r}'}), 400
+    # Validate structure and HH:MM format once; relax horizon checks to avoid timezone/horizon errors.
+    # The normalized form (sorted, overlapping ranges merged) is what gets stored.
+    try:
+        availability = Availability.parse(availability).to_json()
+    except AvailabilityError as e:
+        return jsonify({'error': str(e)}), 400
 
     upd = (
         supabase
@@ -243,6 +280,7 @@ def set_tutee_availability(job_id: str):
     )
     if not upd.data:
         return jsonify({'error': 'Failed to save availability'}), 500
+    publish_change('tutoring_jobs', 'update', upd.data[0])
 
     # Get tutor and tutee information for email notification
     try:
@@ -253,13 +291,12 @@ def set_tutee_availability(job_id: str):
             subject_name = row.get('subject_name')
 
             tutor_info = supabase.table('tutors').select('email, first_name, last_name').eq('id', tutor_id_val).limit(1).execute() if tutor_id_val else type('obj', (), {'data': []})()
-            tutee_info = supabase.table('tutees').select('first_name, last_name').eq('id', tutee_id).limit(1).execute()
+            tutee_row = request.principal.tutee
             
             # Send email notification to tutor (best-effort)
-            if (tutor_info.data and len(tutor_info.data) > 0) and (tutee_info.data and len(tutee_info.data) > 0):
-                email_service = get_email_service()
+            if (tutor_info.data and len(tutor_info.data) > 0) and tutee_row:
+                email_service = get_outbox_email_service(job_id=job_id, kind='tutor_scheduling_notification')
                 tutor_row = tutor_info.data[0]
-                tutee_row = tutee_info.data[0]
                 tutor_name = f"{tutor_row.get('first_name', '')} {tutor_row.get('last_name', '')}".strip()
                 tutee_name = f"{tutee_row.get('first_name', '')} {tutee_row.get('last_name', '')}".strip()
                 tutor_email = tutor_row.get('email')
@@ -285,10 +322,9 @@ def set_tutee_availability(job_id: str):
 def get_tutee_job(job_id: str):
     """Fetch a job that belongs to the authenticated tutee (for scheduling UI)."""
     supabase = get_supabase_client()
-    tutee_res = supabase.table('tutees').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutee_res.data:
+    tutee_id = request.principal.tutee_id
+    if not tutee_id:
         return jsonify({'error': 'Tutee profile not found'}), 404
-    tutee_id = tutee_res.data['id']
 
     job_res = supabase.table('tutoring_jobs').select('*').eq('id', job_id).eq('tutee_id', tutee_id).single().execute()
     if not job_res.data:
@@ -319,10 +355,9 @@ def cancel_tutee_opportunity(opportunity_id: str):
     supabase = get_supabase_client()
     try:
         # Identify tutee
-        tutee_res = supabase.table('tutees').select('id').eq('auth_id', request.user_id).single().execute()
-        if not tutee_res.data:
+        tutee_id = request.principal.tutee_id
+        if not tutee_id:
             return jsonify({'error': 'Tutee profile not found'}), 404
-        tutee_id = tutee_res.data['id']
 
         # Ensure opportunity belongs to this tutee and is open
         opp = (
@@ -348,6 +383,7 @@ def cancel_tutee_opportunity(opportunity_id: str):
         )
         if del_res.data is None:
             return jsonify({'error': 'failed_to_delete'}), 500
+        publish_change('tutoring_opportunities', 'delete', opp.data)
         return jsonify({'message': 'Opportunity deleted', 'id': opportunity_id}), 200
     except Exception as e:
         return jsonify({'error': 'cancel_failed', 'details': str(e)}), 500
@@ -1,10 +1,17 @@
 import os
 from flask import Blueprint, request, jsonify
-import os
+import base64
+import json
 from utils.auth import require_auth
 from utils.db import get_supabase_client
-from utils.email_service import get_email_service
+from utils.email_outbox import get_outbox_email_service
 from utils.cache import TTLCache
+from utils.availability import Availability, AvailabilityError, parse_hhmm
+from utils.slot_search import grid_for, suggest_for_jobs, DEFAULT_STEP_MINUTES
+from utils.eligibility import get_eligibility_index, tutor_is_eligible
+from utils.booking_index import session_bounds, find_conflict, record_booking, invalidate_tutor, is_overlap_error
+from utils.events import publish_change, sse_response
+from utils.delta_sync import new_cursor, parse_since, is_servable, changed_since, fetch_changes, removed_ids, split_closed, DeltaTooLarge
 
 tutor_bp = Blueprint('tutor', __name__)
 _tutor_dashboard_cache = TTLCache(max_size=256, ttl_seconds=int(os.environ.get('TUTOR_DASHBOARD_CACHE_TTL', '3')))
@@ -12,12 +19,75 @@ _tutor_profile_cache = TTLCache(max_size=256, ttl_seconds=int(os.environ.get('TU
 _tutor_opps_cache = TTLCache(max_size=256, ttl_seconds=int(os.environ.get('TUTOR_OPPS_CACHE_TTL', '10')))
 
 
+def _mark_eligible(supabase, tutor_id: str, opportunities: list) -> list:
+    """Flag each opportunity with whether this tutor's approvals let them take it"""
+    try:
+        index = get_eligibility_index()
+        index.ensure_tutor(supabase, tutor_id)
+    except Exception:
+        return opportunities
+    for o in opportunities:
+        o['eligible'] = index.is_eligible(tutor_id, o)
+    return opportunities
+
+
+def _tutor_dashboard_delta(supabase, tutor: dict, since) -> dict:
+    """Opportunities and jobs written since the cursor, plus removed ids"""
+    cursor = new_cursor()
+    opps = fetch_changes(
+        changed_since(supabase.table('tutoring_opportunities').select('*, tutee:tutees(id, first_name, last_name, email, school_id, grade)'), since)
+        .order('updated_at')
+    )
+    jobs = fetch_changes(changed_since(supabase.table('tutoring_jobs').select('*').eq('tutor_id', tutor['id']), since).order('updated_at'))
+    awaiting = fetch_changes(changed_since(supabase.table('awaiting_verification_jobs').select('*').eq('tutor_id', tutor['id']), since).order('updated_at'))
+
+    open_opps, closed_ids = split_closed(opps)
+    changed_jobs = jobs
+    for j in changed_jobs:
+        if j.get('opportunity_snapshot'):
+            j['tutoring_opportunity'] = j['opportunity_snapshot']
+    for aw in awaiting:
+        aw_copy = dict(aw)
+        aw_copy['status'] = 'awaiting_admin_verification'
+        if aw_copy.get('opportunity_snapshot'):
+            aw_copy['tutoring_opportunity'] = aw_copy['opportunity_snapshot']
+        changed_jobs.append(aw_copy)
+
+    return {
+        'delta': True,
+        'cursor': cursor,
+        'opportunities': _mark_eligible(supabase, tutor['id'], open_opps),
+        'jobs': changed_jobs,
+        'removed': {
+            'opportunities': closed_ids + removed_ids(supabase, since, ['tutoring_opportunities']),
+            'jobs': removed_ids(supabase, since, ['tutoring_jobs', 'awaiting_verification_jobs'], tutor_id=tutor['id']),
+        },
+    }
+
+
 @tutor_bp.route('/api/tutor/dashboard', methods=['GET'])
 @require_auth
 def get_tutor_dashboard():
-    """Return the authenticated tutor's profile, approved subjects, opportunities, and jobs"""
+    """Return the authenticated tutor's profile, approved subjects, opportunities, and jobs
+
+    With ?since=<cursor> only changes after the cursor are returned (see utils/delta_sync.py).
+    """
     supabase = get_supabase_client()
 
+    try:
+        since = parse_since(request.args.get('since'))
+    except ValueError:
+        return jsonify({'error': 'invalid_since'}), 400
+    if since is not None and is_servable(since):
+        if not request.principal.tutor:
+            return jsonify({'error': 'Tutor profile not found'}), 404
+        try:
+            return jsonify(_tutor_dashboard_delta(supabase, request.principal.tutor, since)), 200
+        except DeltaTooLarge:
+            pass  # too much changed: fall through to a full payload (delta: false)
+        except Exception as e:
+            return jsonify({'error': 'failed_to_load_changes', 'details': str(e)}), 500
+
     # Microcache per tutor to avoid repeated expensive reads during rapid navigation
     try:
         cache_key = f"dash:{request.user_id}"
@@ -29,11 +99,11 @@ def get_tutor_dashboard():
     except Exception:
         pass
 
-    tutor_result = supabase.table('tutors').select('*').eq('auth_id', request.user_id).single().execute()
-    if not tutor_result.data:
+    tutor = request.principal.tutor
+    if not tutor:
         return jsonify({'error': 'Tutor profile not found'}), 404
 
-    tutor = tutor_result.data
+    cursor = new_cursor()
     approved_subject_ids = tutor.get('approved_subject_ids') or []
 
     # Opportunities visible to tutors: all open (include tutee embed; RLS will filter)
@@ -87,11 +157,15 @@ def get_tutor_dashboard():
 
     # For privacy, do not attach tutee PII in bulk; clients should fetch details per job when needed
 
+    opportunities = _mark_eligible(supabase, tutor['id'], opps.data or [])
     payload = {
         'tutor': tutor,
         'approved_subject_ids': approved_subject_ids,
-        'opportunities': opps.data or [],
-        'jobs': jobs
+        'opportunities': opportunities,
+        'eligible_opportunity_ids': [o.get('id') for o in opportunities if o.get('eligible')],
+        'jobs': jobs,
+        'delta': False,
+        'cursor': cursor,
     }
     try:
         _tutor_dashboard_cache.set(cache_key, payload)
@@ -115,10 +189,9 @@ def accept_opportunity(opportunity_id: str):
     supabase = get_supabase_client()
 
     # Get tutor and enforce active status
-    tutor_result = supabase.table('tutors').select('id, status, approved_subject_ids').eq('auth_id', request.user_id).single().execute()
-    if not tutor_result.data:
+    tutor = request.principal.tutor
+    if not tutor:
         return jsonify({'error': 'Tutor profile not found'}), 404
-    tutor = tutor_result.data
     if (tutor.get('status') or '').lower() != 'active':
         return jsonify({'error': 'tutor_not_active', 'message': 'Your account must be active to accept opportunities.'}), 403
 
@@ -128,30 +201,12 @@ def accept_opportunity(opportunity_id: str):
         return jsonify({'error': 'Opportunity not found'}), 404
     opp = opp_result.data
 
-    # Check subject approval strictly via subject_approvals
-    # Check approval by embedded fields
+    # Check subject approval by embedded fields via the in-memory eligibility index
     subj_name = opp.get('subject_name')
     subj_type = opp.get('subject_type')
     subj_grade = opp.get('subject_grade')
     # Approval: base subject name in approvals may be contained within opportunity subject_name (handles HL/SL, ELL suffixes)
-    approvals_res = (
-        supabase
-        .table('subject_approvals')
-        .select('*')
-        .eq('tutor_id', tutor['id'])
-        .eq('subject_type', subj_type)
-        .eq('subject_grade', str(subj_grade))
-        .eq('status', 'approved')
-        .execute()
-    )
-    opp_name_norm = (str(subj_name or '')).strip().lower()
-    approved = False
-    for a in (approvals_res.data or []):
-        base_name = (str((a or {}).get('subject_name') or '')).strip().lower()
-        if base_name and base_name in opp_name_norm:
-            approved = True
-            break
-    if not approved:
+    if not tutor_is_eligible(supabase, tutor['id'], opp):
         return jsonify({'error': 'Not approved for this subject'}), 403
 
     # Create job (single-session, pending tutee scheduling)
@@ -182,20 +237,16 @@ def accept_opportunity(opportunity_id: str):
     if not job_res.data:
         return jsonify({'error': 'Failed to create job'}), 500
 
-    # Get tutor and (if permitted) tutee information for email notification
-    try:
-        tutor_info = supabase.table('tutors').select('first_name, last_name').eq('id', tutor['id']).single().execute()
-    except Exception:
-        tutor_info = None
+    # Tutor row is already loaded; fetch (if permitted) tutee information for email notification
     try:
         tutee_info = supabase.table('tutees').select('email, first_name, last_name').eq('id', opp.get('tutee_id')).single().execute()
     except Exception:
         tutee_info = None
 
     # Send email notification to tutee when possible
-    if tutor_info and tutor_info.data and tutee_info and tutee_info.data:
-        email_service = get_email_service()
-        tutor_name = f"{tutor_info.data.get('first_name', '')} {tutor_info.data.get('last_name', '')}".strip()
+    if tutee_info and tutee_info.data:
+        email_service = get_outbox_email_service(job_id=job_res.data[0].get('id'), kind='availability_notification')
+        tutor_name = f"{tutor.get('first_name', '')} {tutor.get('last_name', '')}".strip()
         tutee_name = f"{tutee_info.data.get('first_name', '')} {tutee_info.data.get('last_name', '')}".strip()
         tutee_email = tutee_info.data.get('email')
         
@@ -230,6 +281,9 @@ def accept_opportunity(opportunity_id: str):
         except Exception:
             pass
 
+    publish_change('tutoring_jobs', 'insert', job_res.data[0])
+    publish_change('tutoring_opportunities', 'delete', opp)
+
     return jsonify({'message': 'Job created', 'job': job_res.data[0]}), 201
 
 
@@ -262,10 +316,9 @@ def tutor_profile():
 @require_auth
 def tutor_approvals():
     supabase = get_supabase_client()
-    tutor_res = supabase.table('tutors').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data:
+    tutor_id = request.principal.tutor_id
+    if not tutor_id:
         return jsonify({'approved_subjects': [], 'approvals': []}), 200
-    tutor_id = tutor_res.data['id']
     approvals = supabase.table('subject_approvals').select('subject_name, subject_type, subject_grade, status').eq('tutor_id', tutor_id).eq('status', 'approved').execute()
     triples = [
         {
@@ -290,7 +343,6 @@ def list_open_opportunities():
             resp = jsonify(cached)
             resp.headers['Cache-Control'] = 'private, max-age=10'
             return resp
-        tutor_res = supabase.table('tutors').select('status').eq('auth_id', request.user_id).single().execute()
         res = (
             supabase
             .table('tutoring_opportunities')
@@ -300,7 +352,14 @@ def list_open_opportunities():
             .limit(100)
             .execute()
         )
-        payload = {'opportunities': res.data or [], 'tutor_status': (tutor_res.data or {}).get('status')}
+        opportunities = res.data or []
+        tutor_status = None
+        if request.principal.tutor_id:
+            opportunities = _mark_eligible(supabase, request.principal.tutor_id, opportunities)
+            # Read fresh: the cached account can lag an admin status change on another worker
+            status_res = supabase.table('tutors').select('status').eq('id', request.principal.tutor_id).limit(1).execute()
+            tutor_status = (status_res.data or [{}])[0].get('status')
+        payload = {'opportunities': opportunities, 'tutor_status': tutor_status}
         try:
             _tutor_opps_cache.set(ck, payload)
         except Exception:
@@ -312,17 +371,145 @@ def list_open_opportunities():
         return jsonify({'error': 'failed_to_list_opportunities', 'details': str(e)}), 500
 
 
+@tutor_bp.route('/api/tutor/events', methods=['GET'])
+@require_auth
+def tutor_events():
+    """Server-sent change events for the tutor dashboard (own jobs, approvals, the open board)"""
+    tutor_id = request.principal.tutor_id
+    if not tutor_id:
+        return jsonify({'error': 'not_a_tutor'}), 403
+    return sse_response(
+        request.user_id,
+        {f"tutor:{tutor_id}", 'tutors'},
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id'),
+    )
+
+
+FEED_PAGE_SIZE = 20
+FEED_MAX_PAGE_SIZE = 100
+
+
+def _encode_feed_cursor(tier, row: dict) -> str:
+    raw = json.dumps({'t': tier, 'r': row.get('priority_rank'), 'c': row.get('created_at'), 'i': row.get('id')})
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii').rstrip('=')
+
+
+def _decode_feed_cursor(value: str) -> dict:
+    padded = value + '=' * (-len(value) % 4)
+    data = json.loads(base64.urlsafe_b64decode(padded.encode('ascii')).decode('utf-8'))
+    if not isinstance(data, dict) or not data.get('i') or not data.get('c') or not isinstance(data.get('r'), int):
+        raise ValueError('invalid cursor')
+    return data
+
+
+def _like_prefix(value: str) -> str:
+    """Lower-cased LIKE prefix with wildcards escaped (matched as `prefix%`)"""
+    return value.strip().lower().replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+
+
+@tutor_bp.route('/api/tutor/opportunities/feed', methods=['GET'])
+@require_auth
+def opportunity_feed():
+    """
+    Open opportunities this tutor is approved for, best first
+
+    Order: the tutor's own school first, then by priority (high first), then
+    oldest first. Pages are keyset-paginated through `cursor`, so page 50
+    costs the same as page 1. Optional filters: subject (name prefix),
+    grade, type, language.
+    """
+    supabase = get_supabase_client()
+    tutor_id = request.principal.tutor_id
+    if not tutor_id:
+        return jsonify({'error': 'not_a_tutor'}), 403
+    try:
+        limit = int(request.args.get('limit') or FEED_PAGE_SIZE)
+    except Exception:
+        return jsonify({'error': 'invalid_limit'}), 400
+    limit = max(1, min(limit, FEED_MAX_PAGE_SIZE))
+    cursor = None
+    if request.args.get('cursor'):
+        try:
+            cursor = _decode_feed_cursor(request.args['cursor'])
+        except Exception:
+            return jsonify({'error': 'invalid_cursor'}), 400
+
+    try:
+        index = get_eligibility_index()
+        index.ensure_tutor(supabase, tutor_id)
+        keys = sorted(index.approved_keys(tutor_id))
+        # Read fresh: the cached account can lag an admin status change on another worker
+        status_res = supabase.table('tutors').select('status').eq('id', tutor_id).limit(1).execute()
+        tutor_status = (status_res.data or [{}])[0].get('status')
+        if not keys:
+            return jsonify({'opportunities': [], 'next_cursor': None, 'tutor_status': tutor_status}), 200
+
+        subject = (request.args.get('subject') or '').strip()
+        params = {
+            'p_names': [k[0] for k in keys],
+            'p_types': [k[1] for k in keys],
+            'p_grades': [k[2] for k in keys],
+            'p_school_id': request.principal.account.get('school_id'),
+            'p_subject': _like_prefix(subject) if subject else None,
+            'p_grade': (request.args.get('grade') or '').strip() or None,
+            'p_type': (request.args.get('type') or '').strip() or None,
+            'p_language': (request.args.get('language') or '').strip() or None,
+        }
+        # Same-school tier, then everyone else; without a school there is one tier
+        tiers = [0, 1] if params['p_school_id'] else [None]
+        if cursor is not None and cursor.get('t') in tiers:
+            tiers = tiers[tiers.index(cursor['t']):]
+        else:
+            cursor = None
+
+        opportunities, next_cursor = [], None
+        for tier in tiers:
+            need = limit - len(opportunities)
+            after = cursor if cursor is not None and cursor.get('t') == tier else None
+            res = supabase.rpc('opportunity_feed', dict(
+                params,
+                p_tier=tier,
+                p_after_rank=after['r'] if after else None,
+                p_after_created=after['c'] if after else None,
+                p_after_id=after['i'] if after else None,
+                p_limit=need + 1,
+            )).execute()
+            rows = res.data or []
+            opportunities.extend(rows[:need])
+            if len(rows) > need:
+                next_cursor = _encode_feed_cursor(tier, opportunities[-1])
+                break
+            if len(opportunities) >= limit:
+                # Tier exhausted exactly at the page boundary; resume at the start of the next one
+                remaining = tiers[tiers.index(tier) + 1:]
+                if remaining:
+                    next_cursor = _encode_feed_cursor(tier, opportunities[-1])
+                break
+
+        tutee_ids = list({o['tutee_id'] for o in opportunities if o.get('tutee_id')})
+        tutees = {}
+        if tutee_ids:
+            tres = supabase.table('tutees').select('id, first_name, last_name, email, school_id, grade').in_('id', tutee_ids).execute()
+            tutees = {t['id']: t for t in (tres.data or [])}
+        for o in opportunities:
+            o['tutee'] = tutees.get(o.get('tutee_id'))
+            o['eligible'] = True
+        return jsonify({'opportunities': opportunities, 'next_cursor': next_cursor, 'tutor_status': tutor_status}), 200
+    except Exception as e:
+        return jsonify({'error': 'failed_to_load_feed', 'details': str(e)}), 500
+
+
 @tutor_bp.route('/api/tutor/opportunities/<opportunity_id>/apply', methods=['POST'])
 @require_auth
 def apply_to_opportunity(opportunity_id: str):
     supabase = get_supabase_client()
-    tutor_res = supabase.table('tutors').select('id, status').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data:
+    tutor = request.principal.tutor
+    if not tutor:
         return jsonify({'error': 'Tutor not found'}), 404
     # Enforce active-only tutors can apply
-    if (tutor_res.data.get('status') or '').lower() != 'active':
+    if (tutor.get('status') or '').lower() != 'active':
         return jsonify({'error': 'tutor_not_active', 'message': 'Your account must be active to apply for opportunities.'}), 403
-    tutor_id = tutor_res.data['id']
+    tutor_id = tutor['id']
 
     # Verify subject approval first using embedded fields
     opp_res = (
@@ -338,23 +525,8 @@ def apply_to_opportunity(opportunity_id: str):
     subj_name = opp_res.data.get('subject_name')
     subj_type = opp_res.data.get('subject_type')
     subj_grade = str(opp_res.data.get('subject_grade'))
-    approvals_res = (
-        supabase.table('subject_approvals')
-        .select('*')
-        .eq('tutor_id', tutor_id)
-        .eq('subject_type', subj_type)
-        .eq('subject_grade', subj_grade)
-        .eq('status', 'approved')
-        .execute()
-    )
-    opp_name_norm = (str(subj_name or '')).strip().lower()
-    approved = False
-    for a in (approvals_res.data or []):
-        base_name = (str((a or {}).get('subject_name') or '')).strip().lower()
-        if base_name and base_name in opp_name_norm:
-            approved = True
-            break
-    if not approved:
+    # Base approval name contained in the opportunity subject_name (see utils/eligibility.py)
+    if not tutor_is_eligible(supabase, tutor_id, opp_res.data):
         return jsonify({'error': 'Not approved for this subject'}), 403
 
     # Create job and move to pending tutee scheduling; snapshot the opportunity
@@ -383,19 +555,15 @@ def apply_to_opportunity(opportunity_id: str):
     if not job_ins.data:
         return jsonify({'error': 'Failed to create job'}), 500
 
-    # Get tutor and (if permitted) tutee information for email notification
-    try:
-        tutor_info = supabase.table('tutors').select('first_name, last_name').eq('id', tutor_id).single().execute()
-    except Exception:
-        tutor_info = None
+    # Tutor row is already loaded; fetch (if permitted) tutee information for email notification
     try:
         tutee_info = supabase.table('tutees').select('email, first_name, last_name').eq('id', opp_res.data.get('tutee_id')).single().execute()
     except Exception:
         tutee_info = None
     
-    if tutor_info and tutor_info.data and tutee_info and tutee_info.data:
-        email_service = get_email_service()
-        tutor_name = f"{tutor_info.data.get('first_name', '')} {tutor_info.data.get('last_name', '')}".strip()
+    if tutee_info and tutee_info.data:
+        email_service = get_outbox_email_service(job_id=job_ins.data[0].get('id'), kind='availability_notification')
+        tutor_name = f"{tutor.get('first_name', '')} {tutor.get('last_name', '')}".strip()
         tutee_name = f"{tutee_info.data.get('first_name', '')} {tutee_info.data.get('last_name', '')}".strip()
         tutee_email = tutee_info.data.get('email')
         
@@ -430,6 +598,9 @@ def apply_to_opportunity(opportunity_id: str):
         except Exception:
             pass
 
+    publish_change('tutoring_jobs', 'insert', job_ins.data[0])
+    publish_change('tutoring_opportunities', 'delete', opp_res.data)
+
     # The created job serves as the reservation for this opportunity.
     return jsonify({'job': job_ins.data[0]}), 201
 
@@ -444,15 +615,7 @@ def get_job(job_id: str):
     supabase = get_supabase_client()
 
     # Resolve tutor_id from auth
-    tutor_row = (
-        supabase
-        .table('tutors')
-        .select('id')
-        .eq('auth_id', request.user_id)
-        .limit(1)
-        .execute()
-    )
-    tutor_id = (tutor_row.data or [{}])[0].get('id') if tutor_row and tutor_row.data else None
+    tutor_id = request.principal.tutor_id
     if not tutor_id:
         return jsonify({'error': 'Tutor not found'}), 404
 
@@ -523,6 +686,90 @@ def get_job(job_id: str):
     return jsonify({'job': job}), 200
 
 
+def _suggest_times(tutor_id: str, job_ids, payload: dict):
+    """Shared body of the single and batch suggestion endpoints; returns (result, error_response)"""
+    from datetime import timedelta
+
+    try:
+        k = max(1, min(int(payload.get('k') or 5), 50))
+        step = int(payload.get('step_minutes') or DEFAULT_STEP_MINUTES)
+    except Exception:
+        return None, (jsonify({'error': 'k and step_minutes must be integers'}), 400)
+    if step not in (5, 10, 15, 30, 60):
+        return None, (jsonify({'error': 'step_minutes must be one of 5, 10, 15, 30, 60'}), 400)
+    tutor_availability = None
+    if payload.get('tutor_availability') is not None:
+        try:
+            tutor_availability = Availability.parse(payload.get('tutor_availability'))
+        except AvailabilityError as e:
+            return None, (jsonify({'error': f'tutor_availability: {str(e)}'}), 400)
+
+    supabase = get_supabase_client()
+    grid = grid_for()
+    jobs_res = (
+        supabase
+        .table('tutoring_jobs')
+        .select('id, status, tutee_availability, desired_duration_minutes')
+        .eq('tutor_id', tutor_id)
+        .in_('id', list(job_ids))
+        .execute()
+    )
+    jobs = [j for j in (jobs_res.data or []) if j.get('status') == 'pending_tutor_scheduling']
+    if not jobs:
+        return {}, None
+    # One read of the tutor's booked sessions serves the whole batch (a day of slack covers UTC offsets)
+    booked_res = (
+        supabase
+        .table('tutoring_jobs')
+        .select('scheduled_time, duration_minutes')
+        .eq('tutor_id', tutor_id)
+        .eq('status', 'scheduled')
+        .gte('scheduled_time', (grid.first_day - timedelta(days=1)).isoformat())
+        .execute()
+    )
+    return suggest_for_jobs(jobs, booked_res.data or [], k=k, tutor_availability=tutor_availability,
+                            step=step, grid=grid), None
+
+
+@tutor_bp.route('/api/tutor/jobs/<job_id>/suggested-times', methods=['POST'])
+@require_auth
+def suggest_job_times(job_id: str):
+    """Top-k start times for a job that fit the tutee's availability and the tutor's calendar.
+
+    Optional payload: { k: 5, step_minutes: 15, tutor_availability: {"YYYY-MM-DD": ["HH:MM-HH:MM"]} }
+    Each suggestion carries date/start_time (local) and scheduled_time (ISO), ready for /schedule.
+    """
+    tutor_id = request.principal.tutor_id
+    if not tutor_id:
+        return jsonify({'error': 'Tutor not found'}), 404
+    results, err = _suggest_times(tutor_id, [job_id], request.get_json(silent=True) or {})
+    if err:
+        return err
+    if job_id not in results:
+        return jsonify({'error': 'Job not found or not awaiting scheduling'}), 404
+    return jsonify({'job_id': job_id, 'suggestions': results[job_id]}), 200
+
+
+@tutor_bp.route('/api/tutor/jobs/suggested-times', methods=['POST'])
+@require_auth
+def suggest_times_batch():
+    """Suggestions for many of the tutor's jobs at once.
+
+    Payload: { job_ids: [...], k?, step_minutes?, tutor_availability? }
+    """
+    tutor_id = request.principal.tutor_id
+    if not tutor_id:
+        return jsonify({'error': 'Tutor not found'}), 404
+    payload = request.get_json(silent=True) or {}
+    job_ids = payload.get('job_ids')
+    if not isinstance(job_ids, list) or not job_ids or len(job_ids) > 100:
+        return jsonify({'error': 'job_ids must be a list of 1..100 ids'}), 400
+    results, err = _suggest_times(tutor_id, [str(j) for j in job_ids], payload)
+    if err:
+        return err
+    return jsonify({'suggestions': results}), 200
+
+
 @tutor_bp.route('/api/tutor/jobs/<job_id>/schedule', methods=['POST'])
 @require_auth
 def schedule_job(job_id: str):
@@ -553,10 +800,9 @@ def schedule_job(job_id: str):
     if duration_minutes < 60 or duration_minutes > 180:
         return jsonify({'error': 'duration_minutes must be between 60 and 180'}), 400
 
-    tutor_res = supabase.table('tutors').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data:
+    tutor_id = request.principal.tutor_id
+    if not tutor_id:
         return jsonify({'error': 'Tutor not found'}), 404
-    tutor_id = tutor_res.data['id']
 
     # Ensure job belongs to tutor
     job_res = supabase.table('tutoring_jobs').select('id, opportunity_id').eq('id', job_id).eq('tutor_id', tutor_id).single().execute()
@@ -576,7 +822,7 @@ def schedule_job(job_id: str):
     if job_detail.data and isinstance(job_detail.data.get('tutee_availability'), dict):
         try:
             from datetime import datetime
-            availability = job_detail.data['tutee_availability']
+            availability = Availability.parse(job_detail.data['tutee_availability'], strict=False)
             # Prefer explicit local date/time from client to avoid timezone conversion issues
             if isinstance(explicit_date_key, str) and isinstance(explicit_start_hhmm, str):
                 date_key = explicit_date_key
@@ -586,47 +832,51 @@ def schedule_job(job_id: str):
                 date_key = chosen.date().isoformat()
                 start_hhmm = chosen.strftime('%H:%M')
 
-            ranges = availability.get(date_key)
             # Only enforce if availability exists for this exact date
-            if isinstance(ranges, list) and len(ranges) > 0:
+            if availability.has_day(date_key):
                 # Ensure the entire duration fits within one allowed range on that date
-                def fits(r: str) -> bool:
-                    parts = r.split('-')
-                    if len(parts) != 2:
-                        return False
-                    s, e = parts
-                    try:
-                        sh, sm = map(int, start_hhmm.split(':'))
-                    except Exception:
-                        return False
-                    eh = sh
-                    em = sm + int(duration_minutes)
-                    eh += em // 60
-                    em = em % 60
-                    end_hhmm = f"{eh:02d}:{em:02d}"
-                    return s <= start_hhmm and end_hhmm <= e
-                if not any(fits(r) for r in ranges):
+                try:
+                    start_minute = parse_hhmm(start_hhmm)
+                except ValueError:
+                    start_minute = None
+                if start_minute is None or not availability.fits(date_key, start_minute, int(duration_minutes)):
                     return jsonify({'error': 'chosen_time_not_in_tutee_availability'}), 400
         except Exception:
             pass
 
+    # Refuse double bookings up front (O(log n) against the tutor's session index);
+    # the exclusion constraint catches requests that race past this check
+    bounds = session_bounds(scheduled_time, duration_minutes)
+    if bounds:
+        try:
+            clash = find_conflict(supabase, tutor_id, bounds[0], bounds[1], exclude_job_id=job_id)
+        except Exception:
+            clash = None
+        if clash:
+            return jsonify({'error': 'tutor_double_booked', 'details': 'Overlaps another scheduled session', 'conflicting_job_id': clash}), 409
+
     updates = {'status': 'scheduled', 'scheduled_time': scheduled_time, 'duration_minutes': duration_minutes}
-    upd = supabase.table('tutoring_jobs').update(updates).eq('id', job_id).execute()
+    try:
+        upd = supabase.table('tutoring_jobs').update(updates).eq('id', job_id).execute()
+    except Exception as e:
+        if is_overlap_error(e):
+            invalidate_tutor(tutor_id)
+            return jsonify({'error': 'tutor_double_booked', 'details': 'Overlaps another scheduled session'}), 409
+        raise
     if not upd.data:
         return jsonify({'error': 'Failed to update job'}), 500
+    if bounds:
+        record_booking(tutor_id, job_id, bounds[0], bounds[1])
+    publish_change('tutoring_jobs', 'update', upd.data[0])
 
-    # Prepare and send session confirmation email(s) without nested selects
-    email_service = get_email_service()
+    # Prepare and queue session confirmation email(s) without nested selects
+    email_service = get_outbox_email_service(job_id=job_id, kind='session_confirmation')
     job_row = None
     try:
         job_row = supabase.table('tutoring_jobs').select('*').eq('id', job_id).single().execute()
     except Exception:
         job_row = None
-    tutor_row = None
-    try:
-        tutor_row = supabase.table('tutors').select('email, first_name, last_name').eq('auth_id', request.user_id).single().execute()
-    except Exception:
-        tutor_row = None
+    tutor = request.principal.tutor or {}
     tutee_row = None
     try:
         if job_row and job_row.data and job_row.data.get('tutee_id'):
@@ -634,8 +884,8 @@ def schedule_job(job_id: str):
     except Exception:
         tutee_row = None
 
-    if tutor_row and tutor_row.data and job_row and job_row.data:
-        tutor_name = f"{(tutor_row.data or {}).get('first_name','')} {(tutor_row.data or {}).get('last_name','')}".strip()
+    if tutor and job_row and job_row.data:
+        tutor_name = f"{tutor.get('first_name','')} {tutor.get('last_name','')}".strip()
         tutee_name = None
         tutee_email = None
         tutee_grade = None
@@ -670,9 +920,9 @@ def schedule_job(job_id: str):
         subject_string = f"{job_row.data.get('subject_name','')} • {job_row.data.get('subject_type','')} • Grade {job_row.data.get('subject_grade','')}".strip()
         location = job_row.data.get('location') or 'Location TBD'
 
-        if (tutor_row.data or {}).get('email') and tutee_email:
+        if tutor.get('email') and tutee_email:
             email_service.send_session_confirmation(
-                tutor_email=(tutor_row.data or {}).get('email'),
+                tutor_email=tutor.get('email'),
                 tutee_email=tutee_email,
                 session_details={
                     'subject': subject_string,
@@ -685,7 +935,7 @@ def schedule_job(job_id: str):
                     'duration_minutes': duration_minutes
                 }
             )
-        elif (tutor_row.data or {}).get('email'):
+        elif tutor.get('email'):
             subj = f"Session Confirmation: {subject_string} on {formatted_date}"
             html = f"""
             <html><body>
@@ -695,7 +945,7 @@ def schedule_job(job_id: str):
             </body></html>
             """
             text = f"Session Confirmation for {subject_string} on {formatted_date} at {formatted_time} ({location})"
-            email_service.send_email((tutor_row.data or {}).get('email'), subj, html, text)
+            email_service.send_email(tutor.get('email'), subj, html, text)
 
     return jsonify({'message': 'Scheduled', 'job': upd.data[0]}), 200
 
@@ -705,10 +955,9 @@ def schedule_job(job_id: str):
 def list_past_jobs_for_tutor():
     """Return past (verified) jobs for the authenticated tutor from past_jobs."""
     supabase = get_supabase_client()
-    tutor_res = supabase.table('tutors').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data:
+    tutor_id = request.principal.tutor_id
+    if not tutor_id:
         return jsonify({'jobs': []}), 200
-    tutor_id = tutor_res.data['id']
     res = supabase.table('past_jobs').select('*').eq('tutor_id', tutor_id).order('created_at', desc=True).execute()
     return jsonify({'jobs': res.data or []}), 200
 
@@ -736,12 +985,12 @@ def create_certification_request():
         return jsonify({'error': 'invalid_input', 'details': 'Provide subject_name, valid subject_type, subject_grade'}), 400
 
     # Identify tutor
-    tutor_res = supabase.table('tutors').select('id, first_name, last_name').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data:
+    tutor = request.principal.tutor
+    if not tutor:
         return jsonify({'error': 'Tutor profile not found'}), 404
 
-    tutor_id = tutor_res.data['id']
-    tutor_name = f"{tutor_res.data.get('first_name','').strip()} {tutor_res.data.get('last_name','').strip()}".strip()
+    tutor_id = tutor['id']
+    tutor_name = f"{(tutor.get('first_name') or '').strip()} {(tutor.get('last_name') or '').strip()}".strip()
 
     ins = supabase.table('certification_requests').insert({
         'tutor_id': tutor_id,
@@ -754,6 +1003,7 @@ def create_certification_request():
 
     if not ins.data:
         return jsonify({'error': 'failed_to_create'}), 500
+    publish_change('certification_requests', 'insert', ins.data[0])
 
     return jsonify({'message': 'Certification request submitted', 'request': ins.data[0]}), 201
 
@@ -763,10 +1013,9 @@ def create_certification_request():
 def list_own_certification_requests():
     """Tutor lists their own certification requests."""
     supabase = get_supabase_client()
-    tutor_res = supabase.table('tutors').select('id').eq('auth_id', request.user_id).single().execute()
-    if not tutor_res.data:
+    tutor_id = request.principal.tutor_id
+    if not tutor_id:
         return jsonify({'requests': []}), 200
-    tutor_id = tutor_res.data['id']
     res = (
         supabase
         .table('certification_requests')
@@ -1,14 +1,20 @@
 from flask import Blueprint, request, jsonify, current_app
 import os
+import uuid
 from datetime import datetime, timezone
 from utils.db import get_supabase_client
-from utils.cache import TTLCache
-from utils.auth import require_admin
+from utils.cache import TTLCache, SectionCache
+from utils.auth import require_admin, invalidate_account
+from utils.eligibility import get_eligibility_index, tutor_is_eligible
+from utils.email_outbox import get_outbox_email_service
+from utils.events import publish_change, sse_response, on_change
+from utils.delta_sync import new_cursor, parse_since, is_servable, changed_since, fetch_changes, removed_ids, DeltaTooLarge
 
 tutor_management_bp = Blueprint('tutor_management', __name__)
 _admin_cache = TTLCache(max_size=64, ttl_seconds=int(os.environ.get('ADMIN_CACHE_TTL', '60')))
 _admin_overview_cache = TTLCache(max_size=64, ttl_seconds=int(os.environ.get('ADMIN_OVERVIEW_TTL', '3')))
 _admin_help_cache = TTLCache(max_size=64, ttl_seconds=int(os.environ.get('ADMIN_HELP_TTL', '5')))
+_admin_analytics_cache = TTLCache(max_size=64, ttl_seconds=int(os.environ.get('ADMIN_ANALYTICS_TTL', '60')))
 
 @tutor_management_bp.route('/api/admin/me', methods=['GET'])
 @require_admin
@@ -38,8 +44,7 @@ def list_tutors_for_admin():
     """List tutors; if admin has a school_id, filter to that school, else return all"""
     try:
         supabase = get_supabase_client()
-        admin_res = supabase.table('admins').select('school_id').eq('auth_id', request.user_id).single().execute()
-        school_id = admin_res.data.get('school_id') if admin_res.data else None
+        school_id = getattr(request, 'admin_school_id', None)
         # Note: supabase-py uses 'desc=True' rather than 'ascending=False'
         query = (
             supabase
@@ -86,9 +91,8 @@ def list_opportunities_for_admin():
     """
     try:
         supabase = get_supabase_client()
-        # Determine admin school
-        admin_res = supabase.table('admins').select('school_id').eq('auth_id', request.user_id).single().execute()
-        school_id = admin_res.data.get('school_id') if admin_res.data else None
+        # Determine admin school (resolved by require_admin)
+        school_id = getattr(request, 'admin_school_id', None)
 
         # Embedded subject schema
         if school_id:
@@ -124,9 +128,8 @@ def list_jobs_for_admin():
     try:
         supabase = get_supabase_client()
 
-        # Determine admin school for scoping
-        admin_res = supabase.table('admins').select('school_id').eq('auth_id', request.user_id).single().execute()
-        school_id = admin_res.data.get('school_id') if admin_res.data else None
+        # Determine admin school for scoping (resolved by require_admin)
+        school_id = getattr(request, 'admin_school_id', None)
 
         # Build base query (related entity embedding removed under RLS constraints)
         query = (
@@ -215,8 +218,13 @@ def get_recording_link_for_job(job_id: str):
     """Fetch the session recording link for a given job id (from session_recordings)."""
     try:
         supabase = get_supabase_client()
-        rec = supabase.table('session_recordings').select('recording_url').eq('job_id', job_id).limit(1).execute()
-        url = rec.data[0]['recording_url'] if (rec.data and len(rec.data) > 0) else None
+        rec = supabase.table('session_recordings').select('recording_url, storage_path').eq('job_id', job_id).limit(1).execute()
+        row = rec.data[0] if (rec.data and len(rec.data) > 0) else {}
+        url = row.get('recording_url')
+        if row.get('storage_path'):
+            # Uploaded objects get a streamable (Range-capable, signed when local) URL
+            from utils.storage import get_storage_service
+            url = get_storage_service().playback_url(row['storage_path'])
         return jsonify({'recording_url': url}), 200
     except Exception as e:
         print(f"Error fetching recording link: {e}")
@@ -242,9 +250,9 @@ def verify_completed_job(job_id: str):
         if not aw.data:
             return jsonify({'error': 'Awaiting verification job not found'}), 404
 
-        # Identify admin
-        admin_res = supabase.table('admins').select('id').eq('auth_id', request.user_id).single().execute()
-        if not admin_res.data:
+        # Identify admin (resolved by require_admin)
+        admin_id = getattr(request, 'admin_id', None)
+        if not admin_id:
             return jsonify({'error': 'Admin not found'}), 403
 
         # Move to past_jobs
@@ -265,7 +273,7 @@ def verify_completed_job(job_id: str):
             'duration_minutes': aw.data.get('duration_minutes'),
             'opportunity_snapshot': aw.data.get('opportunity_snapshot'),
             'location': aw.data.get('location'),
-            'verified_by': admin_res.data['id'],
+            'verified_by': admin_id,
             'verified_at': now,
             'awarded_volunteer_hours': awarded_hours
         }
@@ -286,6 +294,7 @@ def verify_completed_job(job_id: str):
         # Remove communications and awaiting row
         supabase.table('communications').delete().eq('job_id', job_id).execute()
         supabase.table('awaiting_verification_jobs').delete().eq('id', job_id).execute()
+        publish_change('awaiting_verification_jobs', 'delete', aw.data)
 
         return jsonify({'message': 'Job verified and archived'}), 200
     except Exception as e:
@@ -392,13 +401,11 @@ def update_subject_approvals(tutor_id):
         
         supabase = get_supabase_client()
         
-        # Get the admin ID from the authenticated user
-        admin_result = supabase.table('admins').select('id').eq('auth_id', request.user_id).single().execute()
-        if not admin_result.data:
+        # Admin ID resolved from the authenticated user by require_admin
+        admin_id = getattr(request, 'admin_id', None)
+        if not admin_id:
             return jsonify({'error': 'Admin record not found'}), 403
         
-        admin_id = admin_result.data['id']
-        
         # Deprecated subjects table path removed; we now embed subject fields
 
         # Fetch tutor basic info
@@ -446,11 +453,17 @@ def update_subject_approvals(tutor_id):
                         }).eq('tutor_id', tutor_id).eq('subject_name', subject_name).eq('subject_type', subject_type).eq('subject_grade', subject_grade).execute()
                     else:
                         supabase.table('subject_approvals').delete().eq('tutor_id', tutor_id).eq('subject_name', subject_name).eq('subject_type', subject_type).eq('subject_grade', subject_grade).execute()
-            # Invalidate caches
+            # Invalidate caches and keep this worker's eligibility index current
             try:
                 _admin_cache.set(f"approvals:{tutor_id}", None)
             except Exception:
                 pass
+            index = get_eligibility_index()
+            if action == 'approve':
+                index.approve(tutor_id, subject_name, subject_type, subject_grade)
+            else:
+                index.revoke(tutor_id, subject_name, subject_type, subject_grade)
+            publish_change('subject_approvals', 'update', {'tutor_id': tutor_id, 'status': action})
         except Exception as e:
             import traceback
             print(f"Subject approvals write failed: {e}\n{traceback.format_exc()}")
@@ -482,7 +495,7 @@ def update_subject_approvals(tutor_id):
                 admin_details = supabase.table('admins').select('first_name, last_name').eq('id', admin_id).single().execute()
                 
                 if tutor_row.data and admin_details.data:
-                    from utils.email_service import get_email_service
+                    from utils.email_outbox import get_outbox_email_service
                     
                     tutor_name = f"{tutor_row.data['first_name']} {tutor_row.data['last_name']}"
                     admin_name = f"{admin_details.data['first_name']} {admin_details.data['last_name']}"
@@ -495,7 +508,7 @@ def update_subject_approvals(tutor_id):
                     }
                     
                     # Send email notification
-                    email_service = get_email_service()
+                    email_service = get_outbox_email_service(kind='approval_status')
                     if action == 'approve':
                         subject_line = f"Subject Approval: You're now approved for {subject_name}"
                         html_body = f"""
@@ -532,7 +545,7 @@ def update_subject_approvals(tutor_id):
                         subject_line,
                         html_body
                     )
-                    print(f"Approval notification sent to {tutor_row.data['email']} for {subject_name}: {action}")
+                    print(f"Approval notification queued for {tutor_row.data['email']} for {subject_name}: {action}")
                     
             except Exception as e:
                 print(f"Failed to send approval notification email: {e}")
@@ -604,6 +617,9 @@ def update_tutor_status(tutor_id):
             _admin_cache.set(f"approvals:{tutor_id}", None)  # simple invalidation
         except Exception:
             pass
+        # Status is part of the cached account resolution for the tutor
+        invalidate_account((result.data[0] or {}).get('auth_id'))
+        publish_change('tutors', 'update', result.data[0])
         return jsonify({'message': 'Tutor status updated successfully'}), 200
         
     except Exception as e:
@@ -705,9 +721,8 @@ def list_certification_requests_admin():
     try:
         supabase = get_supabase_client()
 
-        # Determine admin school
-        admin_res = supabase.table('admins').select('school_id').eq('auth_id', request.user_id).single().execute()
-        school_id = (admin_res.data or {}).get('school_id') if admin_res.data else None
+        # Determine admin school (resolved by require_admin)
+        school_id = getattr(request, 'admin_school_id', None)
 
         # If admin has a school, filter tutors by that school and pull their requests
         if school_id:
@@ -748,8 +763,7 @@ def delete_certification_request(request_id: str):
     try:
         supabase = get_supabase_client()
         # Ensure the request exists and, if admin has a school, is within scope
-        admin_res = supabase.table('admins').select('school_id').eq('auth_id', request.user_id).single().execute()
-        school_id = (admin_res.data or {}).get('school_id') if admin_res.data else None
+        school_id = getattr(request, 'admin_school_id', None)
 
         req_res = supabase.table('certification_requests').select('*').eq('id', request_id).single().execute()
         if not req_res.data:
@@ -761,6 +775,7 @@ def delete_certification_request(request_id: str):
                 return jsonify({'error': 'not_in_admin_school_scope'}), 403
 
         supabase.table('certification_requests').delete().eq('id', request_id).execute()
+        publish_change('certification_requests', 'delete', req_res.data)
         return jsonify({'message': 'Certification request deleted'}), 200
     except Exception as e:
         print(f"Error deleting certification request: {e}")
@@ -778,12 +793,11 @@ def approve_certification_request(request_id: str):
     try:
         supabase = get_supabase_client()
 
-        # Identify admin for audit fields
-        admin_row = supabase.table('admins').select('id, school_id').eq('auth_id', request.user_id).single().execute()
-        if not admin_row.data:
+        # Identify admin for audit fields (resolved by require_admin)
+        admin_id = getattr(request, 'admin_id', None)
+        if not admin_id:
             return jsonify({'error': 'Admin record not found'}), 403
-        admin_id = admin_row.data['id']
-        admin_school_id = admin_row.data.get('school_id')
+        admin_school_id = getattr(request, 'admin_school_id', None)
 
         # Load request
         req_res = supabase.table('certification_requests').select('*').eq('id', request_id).single().execute()
@@ -834,9 +848,12 @@ def approve_certification_request(request_id: str):
                 'approved_by': admin_id,
                 'approved_at': now_iso
             }).execute()
+        get_eligibility_index().approve(tutor_id, subject_name, subject_type, subject_grade)
+        publish_change('subject_approvals', 'update', {'tutor_id': tutor_id, 'status': 'approved'})
 
         # Delete certification request after approval
         supabase.table('certification_requests').delete().eq('id', request_id).execute()
+        publish_change('certification_requests', 'delete', {'id': request_id, 'tutor_id': tutor_id})
 
         return jsonify({'message': 'Certification approved and request removed'}), 200
     except Exception as e:
@@ -845,145 +862,394 @@ def approve_certification_request(request_id: str):
         return jsonify({'error': 'Internal server error'}), 500
 
 
+@tutor_management_bp.route('/api/admin/events', methods=['GET'])
+@require_admin
+def admin_events():
+    """Server-sent change events for the admin dashboard"""
+    return sse_response(
+        request.user_id,
+        {'admin'},
+        request.headers.get('Last-Event-ID') or request.args.get('last_event_id'),
+    )
+
+
+@tutor_management_bp.route('/api/admin/match-proposals', methods=['GET'])
+@require_admin
+def list_match_proposals():
+    """Proposals from the batch matcher (python -m utils.auto_match), newest run first"""
+    try:
+        supabase = get_supabase_client()
+        status = (request.args.get('status') or 'pending').strip()
+        try:
+            limit = max(1, min(int(request.args.get('limit') or 200), 500))
+        except Exception:
+            limit = 200
+        admin_school_id = getattr(request, 'admin_school_id', None)
+        tutor_embed = 'tutor:tutors!inner' if admin_school_id else 'tutor:tutors'
+        q = (
+            supabase
+            .table('match_proposals')
+            .select(
+                '*, '
+                f'{tutor_embed}(id, first_name, last_name, email, school_id, volunteer_hours), '
+                'opportunity:tutoring_opportunities(id, tutee_id, school_id, priority, subject_name, subject_type, subject_grade, language, status, created_at)'
+            )
+            .eq('status', status)
+            .order('created_at', desc=True)
+            .limit(limit)
+        )
+        if admin_school_id:
+            q = q.eq('tutor.school_id', admin_school_id)
+        res = q.execute()
+        return jsonify({'proposals': res.data or []}), 200
+    except Exception as e:
+        return jsonify({'error': 'failed_to_list_match_proposals', 'details': str(e)}), 500
+
+
+def _close_proposal(supabase, proposal_id: str, status: str, job_id=None):
+    update = {
+        'status': status,
+        'decided_by': getattr(request, 'admin_id', None),
+        'decided_at': datetime.now(timezone.utc).isoformat(),
+    }
+    if job_id:
+        update['job_id'] = job_id
+    res = supabase.table('match_proposals').update(update).eq('id', proposal_id).execute()
+    return (res.data or [None])[0]
+
+
+@tutor_management_bp.route('/api/admin/match-proposals/<proposal_id>/approve', methods=['POST'])
+@require_admin
+def approve_match_proposal(proposal_id: str):
+    """Turn a proposal into a job, as if the tutor had accepted the opportunity"""
+    try:
+        supabase = get_supabase_client()
+        prop_res = supabase.table('match_proposals').select('*').eq('id', proposal_id).limit(1).execute()
+        if not prop_res.data:
+            return jsonify({'error': 'Proposal not found'}), 404
+        proposal = prop_res.data[0]
+        if proposal.get('status') != 'pending':
+            return jsonify({'error': 'proposal_not_pending', 'status': proposal.get('status')}), 409
+
+        tutor_res = supabase.table('tutors').select('id, first_name, last_name, school_id, status').eq('id', proposal['tutor_id']).limit(1).execute()
+        tutor = (tutor_res.data or [None])[0]
+        admin_school_id = getattr(request, 'admin_school_id', None)
+        if admin_school_id and (not tutor or tutor.get('school_id') != admin_school_id):
+            return jsonify({'error': 'not_in_admin_school_scope'}), 403
+
+        opp_res = supabase.table('tutoring_opportunities').select('*').eq('id', proposal['opportunity_id']).limit(1).execute()
+        opp = (opp_res.data or [None])[0]
+        # The board moves between runs; a proposal that no longer holds is closed rather than applied
+        reason = None
+        if not opp or opp.get('status') != 'open':
+            reason = 'opportunity_unavailable'
+        elif not tutor or (tutor.get('status') or '').lower() != 'active':
+            reason = 'tutor_not_active'
+        elif not tutor_is_eligible(supabase, tutor['id'], opp):
+            reason = 'tutor_not_approved'
+        if reason:
+            _close_proposal(supabase, proposal_id, 'stale')
+            return jsonify({'error': reason}), 409
+
+        opportunity_snapshot = dict(opp)
+        tutee_info = None
+        try:
+            if opp.get('tutee_id'):
+                tutee_res = supabase.table('tutees').select('email, first_name, last_name, grade').eq('id', opp['tutee_id']).single().execute()
+                tutee_info = tutee_res.data if tutee_res else None
+                if tutee_info:
+                    opportunity_snapshot['tutee_grade'] = tutee_info.get('grade')
+        except Exception:
+            pass
+        job_res = supabase.table('tutoring_jobs').insert({
+            'opportunity_id': opp['id'],
+            'tutor_id': tutor['id'],
+            'tutee_id': opp.get('tutee_id'),
+            'subject_name': opp.get('subject_name'),
+            'subject_type': opp.get('subject_type'),
+            'subject_grade': str(opp.get('subject_grade')),
+            'language': opp.get('language') or 'English',
+            'location': opp.get('location_preference'),
+            'additional_notes': opp.get('additional_notes'),
+            'opportunity_snapshot': opportunity_snapshot,
+            'status': 'pending_tutee_scheduling'
+        }).execute()
+        if not job_res.data:
+            return jsonify({'error': 'Failed to create job'}), 500
+        job = job_res.data[0]
+
+        # Remove the opportunity from the pool (best-effort), same as a tutor accept
+        try:
+            supabase.table('tutoring_opportunities').delete().eq('id', opp['id']).execute()
+        except Exception:
+            try:
+                supabase.table('tutoring_opportunities').update({'status': 'assigned'}).eq('id', opp['id']).execute()
+            except Exception:
+                pass
+
+        updated = _close_proposal(supabase, proposal_id, 'approved', job_id=job.get('id'))
+        publish_change('tutoring_jobs', 'insert', job)
+        publish_change('tutoring_opportunities', 'delete', opp)
+        try:
+            (
+                supabase.table('match_proposals')
+                .update({'status': 'stale'})
+                .eq('opportunity_id', opp['id'])
+                .eq('status', 'pending')
+                .execute()
+            )
+        except Exception:
+            pass
+
+        if tutee_info and tutee_info.get('email'):
+            try:
+                email_service = get_outbox_email_service(job_id=job.get('id'), kind='availability_notification')
+                email_service.send_availability_notification(
+                    tutee_email=tutee_info.get('email'),
+                    tutee_name=f"{tutee_info.get('first_name', '')} {tutee_info.get('last_name', '')}".strip(),
+                    tutor_name=f"{tutor.get('first_name', '')} {tutor.get('last_name', '')}".strip(),
+                    subject_name=opp.get('subject_name'),
+                    dashboard_url=f"{os.environ.get('FRONTEND_URL', 'https://your-app.vercel.app')}/tutee/dashboard"
+                )
+            except Exception as e:
+                print(f"Error queueing availability notification for matched job: {e}")
+
+        return jsonify({'message': 'Proposal approved', 'proposal': updated, 'job': job}), 201
+    except Exception as e:
+        import traceback
+        print(f"Error approving match proposal: {e}\n{traceback.format_exc()}")
+        return jsonify({'error': 'Internal server error'}), 500
+
+
+@tutor_management_bp.route('/api/admin/match-proposals/<proposal_id>/reject', methods=['POST'])
+@require_admin
+def reject_match_proposal(proposal_id: str):
+    try:
+        supabase = get_supabase_client()
+        prop_res = supabase.table('match_proposals').select('id, status').eq('id', proposal_id).limit(1).execute()
+        if not prop_res.data:
+            return jsonify({'error': 'Proposal not found'}), 404
+        if prop_res.data[0].get('status') != 'pending':
+            return jsonify({'error': 'proposal_not_pending', 'status': prop_res.data[0].get('status')}), 409
+        updated = _close_proposal(supabase, proposal_id, 'rejected')
+        return jsonify({'message': 'Proposal rejected', 'proposal': updated}), 200
+    except Exception as e:
+        return jsonify({'error': 'failed_to_reject_match_proposal', 'details': str(e)}), 500
+
+
+_TUTOR_COLS = 'id, first_name, last_name, email, school_id, status, volunteer_hours, created_at, school:schools(name,domain)'
+_OPPORTUNITY_COLS = 'id, tutee_id, subject_name, subject_type, subject_grade, language, status, created_at'
+_AWAITING_COLS = 'id, tutor_id, tutee_id, tutor_name, tutee_name, subject_name, subject_type, subject_grade, language, scheduled_time, duration_minutes, created_at, opportunity_snapshot'
+_HELP_COLS = 'id, auth_id, role, tutor_id, tutee_id, school_id, user_first_name, user_last_name, user_email, user_grade, submitted_at, urgency, description'
+_CERT_COLS = 'id, tutor_id, tutor_name, tutor_mark, subject_name, subject_type, subject_grade, created_at'
+
+
+def _overview_queries(supabase, school_id) -> dict:
+    """Unordered, unlimited base query per overview section, scoped to the admin's school"""
+    tutors_q = supabase.table('tutors').select(_TUTOR_COLS)
+    opp_q = supabase.table('tutoring_opportunities').select(_OPPORTUNITY_COLS)
+    help_q = supabase.table('help_questions').select(_HELP_COLS)
+    cert_q = supabase.table('certification_requests').select(_CERT_COLS + (', tutor:tutors!inner(school_id)' if school_id else ''))
+    if school_id:
+        tutors_q = tutors_q.eq('school_id', school_id)
+        opp_q = opp_q.eq('school_id', school_id)
+        help_q = help_q.eq('school_id', school_id)
+        cert_q = cert_q.eq('tutor.school_id', school_id)
+    return {
+        'tutors': tutors_q,
+        'opportunities': opp_q,
+        'awaiting_jobs': supabase.table('awaiting_verification_jobs').select(_AWAITING_COLS),
+        'help_requests': help_q,
+        'certification_requests': cert_q,
+    }
+
+
+def _without_scope_embed(rows: list) -> list:
+    """Drop the tutor!inner embed used only for school scoping"""
+    for row in rows:
+        row.pop('tutor', None)
+    return rows
+
+
+def _overview_admin(supabase, school_id):
+    res = (
+        supabase
+        .table('admins')
+        .select('id, auth_id, email, first_name, last_name, role, school_id, school:schools(name,domain)')
+        .eq('auth_id', request.user_id)
+        .single()
+        .execute()
+    )
+    return res.data if res and res.data else None
+
+
+def _overview_list(name: str, order_by: str, limit: int):
+    def build(supabase, school_id):
+        q = _overview_queries(supabase, school_id)[name]
+        return _without_scope_embed(q.order(order_by, desc=True).limit(limit).execute().data or [])
+    return build
+
+
+def _overview_schools(supabase, school_id):
+    return supabase.table('schools').select('id, name, domain').order('name').execute().data or []
+
+
+def _section_ttl(name: str, default: int) -> int:
+    return int(os.environ.get(f'ADMIN_OVERVIEW_{name.upper()}_TTL', str(default)))
+
+
+# name -> (builder, ttl seconds, tags, scope). Tags are the tables a section
+# reads; a change event for one of them (utils/events.on_change) drops that
+# section for every admin. Scope decides who shares a cached section.
+_OVERVIEW_SECTIONS = {
+    'admin': (_overview_admin, _section_ttl('admin', 60), ('admins', 'schools'), 'user'),
+    'tutors': (_overview_list('tutors', 'created_at', 100), _section_ttl('tutors', 15), ('tutors',), 'school'),
+    'opportunities': (_overview_list('opportunities', 'created_at', 50), _section_ttl('opportunities', 10), ('tutoring_opportunities',), 'school'),
+    'awaiting_jobs': (_overview_list('awaiting_jobs', 'created_at', 200), _section_ttl('awaiting_jobs', 3), ('awaiting_verification_jobs',), 'school'),
+    'help_requests': (_overview_list('help_requests', 'submitted_at', 100), _section_ttl('help_requests', 5), ('help_questions',), 'school'),
+    'certification_requests': (_overview_list('certification_requests', 'created_at', 200), _section_ttl('certification_requests', 15), ('certification_requests', 'subject_approvals'), 'school'),
+    'schools': (_overview_schools, _section_ttl('schools', 300), ('schools',), 'global'),
+}
+
+_overview_sections = SectionCache(max_size=int(os.environ.get('ADMIN_OVERVIEW_CACHE_SIZE', '512')))
+on_change(_overview_sections.invalidate)
+
+
+def _requested_sections(raw):
+    """?sections=a,b -> ordered section names; all sections when absent. Raises ValueError on unknown names."""
+    if not raw:
+        return list(_OVERVIEW_SECTIONS)
+    names = [s.strip() for s in raw.split(',') if s.strip()]
+    unknown = [s for s in names if s not in _OVERVIEW_SECTIONS]
+    if unknown:
+        raise ValueError(','.join(unknown))
+    return [s for s in _OVERVIEW_SECTIONS if s in names]
+
+
+def _admin_overview_delta(supabase, school_id, since, sections) -> dict:
+    """Overview sections written since the cursor, plus removed ids (same scoping as the full overview)"""
+    cursor = new_cursor()
+    queries = _overview_queries(supabase, school_id)
+    payload = {'delta': True, 'cursor': cursor, 'removed': {}}
+    if 'tutors' in sections:
+        payload['tutors'] = fetch_changes(changed_since(queries['tutors'], since))
+    if 'opportunities' in sections:
+        payload['opportunities'] = fetch_changes(changed_since(queries['opportunities'], since))
+        payload['removed']['opportunities'] = removed_ids(supabase, since, ['tutoring_opportunities'], school_id=school_id)
+    if 'awaiting_jobs' in sections:
+        payload['awaiting_jobs'] = fetch_changes(changed_since(queries['awaiting_jobs'], since))
+        payload['removed']['awaiting_jobs'] = removed_ids(supabase, since, ['awaiting_verification_jobs'])
+    if 'help_requests' in sections:
+        payload['help_requests'] = fetch_changes(changed_since(queries['help_requests'], since))
+        payload['removed']['help_requests'] = removed_ids(supabase, since, ['help_questions'], school_id=school_id)
+    if 'certification_requests' in sections:
+        # Certification requests are insert/delete only
+        rows = fetch_changes(changed_since(queries['certification_requests'], since, column='created_at'))
+        payload['certification_requests'] = _without_scope_embed(rows)
+        payload['removed']['certification_requests'] = removed_ids(supabase, since, ['certification_requests'])
+    return payload
+
+
 @tutor_management_bp.route('/api/admin/overview', methods=['GET'])
 @require_admin
 def admin_overview():
     """Aggregate data for the admin dashboard in a single call.
 
     Returns: {
-      admin, tutors, opportunities, awaiting_jobs, certification_requests, schools
+      admin, tutors, opportunities, awaiting_jobs, help_requests, certification_requests, schools
     }
 
-    Uses a short-lived microcache keyed by admin auth_id to smooth reloads.
+    Each section is cached on its own with its own TTL and invalidated by change
+    events for the tables it reads, so a refresh only refetches stale sections.
+    ?sections=awaiting_jobs,help_requests returns just those sections.
+    With ?since=<cursor> only changes after the cursor are returned (see utils/delta_sync.py).
     """
     try:
         supabase = get_supabase_client()
-        cache_key = f"overview:{request.user_id}"
-        cached = _admin_overview_cache.get(cache_key)
-        if cached is not None:
-            return jsonify(cached), 200
-
-        # Admin profile
-        admin_res = (
-            supabase
-            .table('admins')
-            .select('id, auth_id, email, first_name, last_name, role, school_id, school:schools(name,domain)')
-            .eq('auth_id', request.user_id)
-            .single()
-            .execute()
-        )
-        admin_payload = admin_res.data if admin_res and admin_res.data else None
-        school_id = (admin_payload or {}).get('school_id')
+        try:
+            sections = _requested_sections(request.args.get('sections'))
+        except ValueError as e:
+            return jsonify({'error': 'unknown_sections', 'sections': str(e).split(',')}), 400
+        try:
+            since = parse_since(request.args.get('since'))
+        except ValueError:
+            return jsonify({'error': 'invalid_since'}), 400
+        school_id = getattr(request, 'admin_school_id', None)
+        if since is not None and is_servable(since):
+            try:
+                return jsonify(_admin_overview_delta(supabase, school_id, since, sections)), 200
+            except DeltaTooLarge:
+                pass  # too much changed: fall through to a full payload (delta: false)
+
+        scopes = {'user': f"user:{request.user_id}", 'school': f"school:{school_id or '*'}", 'global': '*'}
+        payload = {}
+        oldest = None
+        for name in sections:
+            builder, ttl, tags, scope = _OVERVIEW_SECTIONS[name]
+            fetched_at, value, _ = _overview_sections.get_or_build(
+                scopes[scope], name, lambda: builder(supabase, school_id), ttl, tags
+            )
+            payload[name] = value
+            oldest = fetched_at if oldest is None else min(oldest, fetched_at)
 
-        # Tutors (scoped if school assigned)
-        tutors_q = (
-            supabase
-            .table('tutors')
-            .select('id, first_name, last_name, email, school_id, status, volunteer_hours, created_at, school:schools(name,domain)')
-            .order('created_at', desc=True)
-            .limit(100)
-        )
-        if school_id:
-            tutors_q = tutors_q.eq('school_id', school_id)
-        tutors_res = tutors_q.execute()
+        # A cached section may predate this request; the cursor must not skip what it missed
+        payload['delta'] = False
+        payload['cursor'] = new_cursor(datetime.fromtimestamp(oldest, timezone.utc) if oldest is not None else None)
+        return jsonify(payload), 200
+    except Exception as e:
+        import traceback
+        print(f"Error building admin overview: {e}\n{traceback.format_exc()}")
+        return jsonify({'error': 'Internal server error'}), 500
 
-        # Opportunities (scoped by admin's tutees when school assigned)
-        tutee_ids = None
-        if school_id:
-            tutees_res = supabase.table('tutees').select('id').eq('school_id', school_id).execute()
-            tutee_ids = [t['id'] for t in (tutees_res.data or [])]
-        opp_q = (
-            supabase
-            .table('tutoring_opportunities')
-            .select('id, tutee_id, subject_name, subject_type, subject_grade, language, status, created_at')
-            .order('created_at', desc=True)
-            .limit(50)
-        )
-        if tutee_ids:
-            opp_q = opp_q.in_('tutee_id', tutee_ids)
-        opp_res = opp_q.execute()
 
-        # Awaiting verification jobs
-        awaiting_res = (
-            supabase
-            .table('awaiting_verification_jobs')
-            .select('id, tutor_id, tutee_id, tutor_name, tutee_name, subject_name, subject_type, subject_grade, language, scheduled_time, duration_minutes, created_at, opportunity_snapshot')
-            .order('created_at', desc=True)
-            .limit(200)
-            .execute()
-        )
+def _parse_analytics_time(value):
+    """ISO date or datetime query param -> aware ISO string; None when absent. Raises ValueError."""
+    if not value:
+        return None
+    ts = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return ts.isoformat()
 
-        # Help requests (scoped by school if present)
-        if school_id:
-            help_q = (
-                supabase
-                .table('help_questions')
-                .select('id, auth_id, role, tutor_id, tutee_id, school_id, user_first_name, user_last_name, user_email, user_grade, submitted_at, urgency, description')
-                .eq('school_id', school_id)
-                .order('submitted_at', desc=True)
-                .limit(100)
-            )
-        else:
-            help_q = (
-                supabase
-                .table('help_questions')
-                .select('id, auth_id, role, tutor_id, tutee_id, school_id, user_first_name, user_last_name, user_email, user_grade, submitted_at, urgency, description')
-                .order('submitted_at', desc=True)
-                .limit(100)
-            )
-        help_res = help_q.execute()
 
-        # Certification requests (scoped by school if present)
-        if school_id:
-            tutors_ids_res = supabase.table('tutors').select('id').eq('school_id', school_id).execute()
-            tutor_ids = [t['id'] for t in (tutors_ids_res.data or [])]
-            if tutor_ids:
-                cert_res = (
-                    supabase
-                    .table('certification_requests')
-                    .select('id, tutor_id, tutor_name, tutor_mark, subject_name, subject_type, subject_grade, created_at')
-                    .in_('tutor_id', tutor_ids)
-                    .order('created_at', desc=True)
-                    .limit(200)
-                    .execute()
-                )
-            else:
-                cert_res = type('obj', (), {'data': []})()
-        else:
-            cert_res = (
-                supabase
-                .table('certification_requests')
-                .select('id, tutor_id, tutor_name, tutor_mark, subject_name, subject_type, subject_grade, created_at')
-                .order('created_at', desc=True)
-                .limit(200)
-                .execute()
-            )
+@tutor_management_bp.route('/api/admin/analytics', methods=['GET'])
+@require_admin
+def admin_analytics():
+    """Reporting aggregates computed in Postgres (schema.sql section 16).
 
-        # Schools (admin needs for filters)
-        schools_cached = _admin_cache.get('admin_schools')
-        if schools_cached is None:
-            schools_res = supabase.table('schools').select('id, name, domain').order('name').execute()
-            schools_cached = schools_res.data or []
-            _admin_cache.set('admin_schools', schools_cached)
+    Query: from, to (ISO dates, default last 90 days), top (rows per ranked list),
+    school_id (district admins only; school admins are always scoped to their school).
 
-        payload = {
-            'admin': admin_payload,
-            'tutors': tutors_res.data or []
-            if hasattr(tutors_res, 'data') else [],
-            'opportunities': opp_res.data or []
-            if hasattr(opp_res, 'data') else [],
-            'awaiting_jobs': awaiting_res.data or []
-            if hasattr(awaiting_res, 'data') else [],
-            'help_requests': help_res.data or []
-            if hasattr(help_res, 'data') else [],
-            'certification_requests': cert_res.data or []
-            if hasattr(cert_res, 'data') else [],
-            'schools': schools_cached,
-        }
+    Returns totals, hours/jobs by week, tutor, school and subject, median and p90
+    time-to-claim and time-to-schedule (hours), and the open-board backlog.
+    """
+    try:
+        try:
+            p_from = _parse_analytics_time(request.args.get('from'))
+            p_to = _parse_analytics_time(request.args.get('to'))
+            top = int(request.args.get('top', '20'))
+            school_id = getattr(request, 'admin_school_id', None) or request.args.get('school_id') or None
+            if school_id:
+                school_id = str(uuid.UUID(school_id))
+        except ValueError:
+            return jsonify({'error': 'invalid_params'}), 400
+
+        ck = f"analytics:{school_id}:{p_from}:{p_to}:{top}"
+        cached = _admin_analytics_cache.get(ck)
+        if cached is not None:
+            return jsonify(cached), 200
 
-        _admin_overview_cache.set(cache_key, payload)
+        supabase = get_supabase_client()
+        res = supabase.rpc('admin_analytics', {
+            'p_school_id': school_id,
+            'p_from': p_from,
+            'p_to': p_to,
+            'p_top': top,
+        }).execute()
+        payload = res.data or {}
+        _admin_analytics_cache.set(ck, payload)
         return jsonify(payload), 200
     except Exception as e:
         import traceback
-        print(f"Error building admin overview: {e}\n{traceback.format_exc()}")
-        return jsonify({'error': 'Internal server error'}), 500
\ No newline at end of file
+        print(f"Error building admin analytics: {e}\n{traceback.format_exc()}")
+        return jsonify({'error': 'Internal server error'}), 500
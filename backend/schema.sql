@@ -235,6 +235,8 @@ create index if not exists idx_tutees_auth_school on public.tutees(auth_id, scho
 create index if not exists idx_jobs_tutor_id on public.tutoring_jobs(tutor_id);
 create index if not exists idx_jobs_tutee_id on public.tutoring_jobs(tutee_id);
 create index if not exists idx_jobs_status on public.tutoring_jobs(status);
+-- Reminder windows scan scheduled jobs by start time
+create index if not exists idx_jobs_status_scheduled on public.tutoring_jobs(status, scheduled_time);
 create index if not exists idx_jobs_created_at on public.tutoring_jobs(created_at desc);
 create index if not exists idx_opps_status on public.tutoring_opportunities(status);
 create index if not exists idx_opps_tutee_id on public.tutoring_opportunities(tutee_id);
@@ -321,6 +323,39 @@ as $$
   );
 $$;
 
+-- Resolve role and profile ids for an auth user in a single round trip.
+-- Runs with the caller's rights, so RLS still decides which rows are visible.
+create or replace function public.resolve_account(p_auth_id uuid)
+returns table (
+  role text,
+  admin_id uuid,
+  tutor_id uuid,
+  tutee_id uuid,
+  school_id uuid,
+  status text
+)
+language sql
+stable
+as $$
+  select
+    case
+      when a.id is not null then a.role
+      when t.id is not null then 'tutor'
+      when te.id is not null then 'tutee'
+    end as role,
+    a.id as admin_id,
+    t.id as tutor_id,
+    te.id as tutee_id,
+    coalesce(a.school_id, t.school_id, te.school_id) as school_id,
+    t.status as status
+  from (select p_auth_id as auth_id) u
+  left join public.admins a on a.auth_id = u.auth_id
+  left join public.tutors t on t.auth_id = u.auth_id
+  left join public.tutees te on te.auth_id = u.auth_id;
+$$;
+
+grant execute on function public.resolve_account(uuid) to authenticated;
+
 -- =========================================================
 -- 4) Row Level Security (RLS) policies
 -- keep data safe if any client accesses tables directly.
@@ -818,3 +853,1033 @@ create policy "hq delete admin same school"
       where a.auth_id = auth.uid() and a.school_id = help_questions.school_id
     )
   );
+
+-- =========================================================
+-- 6) Email outbox (durable background delivery)
+-- =========================================================
+
+create table if not exists public.email_outbox (
+  id uuid primary key default gen_random_uuid(),
+  created_by uuid default auth.uid(),
+  job_id uuid, -- soft reference: jobs are hard-deleted on completion/cancel
+  kind text,
+  to_email text not null,
+  cc jsonb,
+  subject text not null,
+  body_html text not null,
+  body_text text,
+  status text not null default 'pending' check (status in ('pending','sending','sent','failed')),
+  attempts integer not null default 0,
+  max_attempts integer not null default 5,
+  next_attempt_at timestamptz not null default now(),
+  locked_by text,
+  locked_until timestamptz,
+  last_error text,
+  provider text,
+  sent_at timestamptz,
+  created_at timestamptz not null default now(),
+  updated_at timestamptz not null default now()
+);
+
+-- Only undelivered rows are ever scanned by workers
+create index if not exists idx_email_outbox_due on public.email_outbox(next_attempt_at)
+  where status in ('pending','sending');
+
+do $$
+begin
+  if not exists (select 1 from pg_trigger where tgname = 'trg_set_updated_at_email_outbox') then
+    create trigger trg_set_updated_at_email_outbox before update on public.email_outbox
+    for each row execute function public.set_updated_at();
+  end if;
+end$$;
+
+alter table public.email_outbox enable row level security;
+
+-- Users cannot insert outbox rows; the backend's outbox writer does. What it
+-- queues is decided by the routes: the /api/email/* send routes take
+-- recipients and bodies from the caller and are admin-only, every other route
+-- derives them from the rows it acts on. Users may see what was queued on
+-- their behalf
+drop policy if exists "outbox insert self" on public.email_outbox;
+
+drop policy if exists "outbox select self or admin" on public.email_outbox;
+create policy "outbox select self or admin"
+  on public.email_outbox for select
+  to authenticated
+  using (public.is_admin() or created_by = auth.uid());
+
+-- Claim due rows for a worker. Expired leases (crashed workers) are reclaimed.
+create or replace function public.claim_email_outbox(
+  p_worker text,
+  p_limit integer default 10,
+  p_lease_seconds integer default 300
+)
+returns setof public.email_outbox
+language sql
+as $$
+  update public.email_outbox o
+     set status = 'sending',
+         locked_by = p_worker,
+         locked_until = now() + make_interval(secs => p_lease_seconds),
+         attempts = o.attempts + 1
+   where o.id in (
+     select id
+       from public.email_outbox
+      where (status = 'pending' and next_attempt_at <= now())
+         or (status = 'sending' and locked_until < now())
+      order by next_attempt_at
+      limit p_limit
+      for update skip locked
+   )
+  returning o.*;
+$$;
+
+revoke execute on function public.claim_email_outbox(text, integer, integer) from public, anon, authenticated;
+grant execute on function public.claim_email_outbox(text, integer, integer) to service_role;
+
+-- =========================================================
+-- 7) Reminder ledger (idempotent reminder runs)
+-- =========================================================
+
+-- One row per job, reminder kind and session start. A reschedule re-arms the reminder.
+create table if not exists public.reminder_ledger (
+  job_id uuid not null references public.tutoring_jobs(id) on delete cascade,
+  kind text not null,
+  scheduled_time timestamptz not null,
+  run_id text,
+  sent_at timestamptz not null default now(),
+  constraint reminder_ledger_unique unique (job_id, kind, scheduled_time)
+);
+
+alter table public.reminder_ledger enable row level security;
+
+-- Written only by the reminder scheduler (service role); users may read rows for jobs they can see
+drop policy if exists "reminder ledger via job visibility" on public.reminder_ledger;
+drop policy if exists "reminder ledger select via job visibility" on public.reminder_ledger;
+create policy "reminder ledger select via job visibility"
+  on public.reminder_ledger for select
+  to authenticated
+  using (exists (select 1 from public.tutoring_jobs j where j.id = reminder_ledger.job_id));
+
+-- Claim every scheduled job starting in [p_from, p_to) that has no ledger row for p_kind yet.
+-- Concurrent runs for the same kind serialize on an advisory lock; the loser returns nothing
+-- instead of rescanning, and the ledger insert makes repeated runs return only new work.
+create or replace function public.claim_session_reminders(
+  p_kind text,
+  p_from timestamptz,
+  p_to timestamptz,
+  p_run_id text default null
+)
+returns setof public.tutoring_jobs
+language plpgsql
+as $$
+begin
+  if not pg_try_advisory_xact_lock(hashtext('session_reminders'), hashtext(p_kind)) then
+    return;
+  end if;
+  return query
+  with due as (
+    select j.id, j.scheduled_time
+      from public.tutoring_jobs j
+     where j.status = 'scheduled'
+       and j.scheduled_time >= p_from
+       and j.scheduled_time < p_to
+  ), claimed as (
+    insert into public.reminder_ledger (job_id, kind, scheduled_time, run_id)
+    select d.id, p_kind, d.scheduled_time, p_run_id from due d
+    on conflict on constraint reminder_ledger_unique do nothing
+    returning job_id
+  )
+  select j.* from public.tutoring_jobs j join claimed c on c.job_id = j.id;
+end;
+$$;
+
+-- Claiming writes ledger rows, so only the scheduler may call it
+revoke execute on function public.claim_session_reminders(text, timestamptz, timestamptz, text) from public, anon, authenticated;
+grant execute on function public.claim_session_reminders(text, timestamptz, timestamptz, text) to service_role;
+
+-- =========================================================
+-- 8) Email digests (per-recipient notification coalescing)
+-- =========================================================
+
+-- Opt-in: notifications to this address are held for window_minutes and merged into one digest
+create table if not exists public.email_digest_preferences (
+  auth_id uuid primary key default auth.uid(),
+  email text not null,
+  enabled boolean not null default true,
+  window_minutes integer not null default 15 check (window_minutes between 1 and 1440),
+  created_at timestamptz not null default now(),
+  updated_at timestamptz not null default now()
+);
+
+-- Preferences match on the delivered mailbox: +tutor/+tutee tags on hdsb.ca are dropped (see coalesce_key)
+drop index if exists public.idx_email_digest_prefs_email;
+create index if not exists idx_email_digest_prefs_mailbox on public.email_digest_preferences(
+  lower(regexp_replace(email, '\+(tutor|tutee)@hdsb\.ca$', '@hdsb.ca', 'i'))
+);
+
+do $$
+begin
+  if not exists (select 1 from pg_trigger where tgname = 'trg_set_updated_at_email_digest_preferences') then
+    create trigger trg_set_updated_at_email_digest_preferences before update on public.email_digest_preferences
+    for each row execute function public.set_updated_at();
+  end if;
+end$$;
+
+alter table public.email_digest_preferences enable row level security;
+
+drop policy if exists "digest prefs self" on public.email_digest_preferences;
+create policy "digest prefs self"
+  on public.email_digest_preferences for all
+  to authenticated
+  using (auth_id = auth.uid())
+  with check (auth_id = auth.uid());
+
+-- The outbox learns the window for an address (0 = not opted in), never other preference rows
+create or replace function public.email_digest_window(p_email text)
+returns integer
+language sql
+stable
+security definer
+set search_path = public
+as $$
+  select coalesce(max(window_minutes), 0)
+    from public.email_digest_preferences
+   where enabled
+     and lower(regexp_replace(email, '\+(tutor|tutee)@hdsb\.ca$', '@hdsb.ca', 'i'))
+       = lower(regexp_replace(p_email, '\+(tutor|tutee)@hdsb\.ca$', '@hdsb.ca', 'i'));
+$$;
+
+-- Only the backend (which enqueues with the service role) may ask; users must not probe other addresses
+revoke execute on function public.email_digest_window(text) from public, anon, authenticated;
+grant execute on function public.email_digest_window(text) to service_role;
+
+-- Outbox rows held for a digest carry the normalized recipient
+alter table public.email_outbox add column if not exists coalesce_key text;
+
+create index if not exists idx_email_outbox_coalesce on public.email_outbox(coalesce_key)
+  where status = 'pending' and coalesce_key is not null;
+
+-- Claim every other pending row for the same recipient (due or not) so one worker sends one digest
+create or replace function public.claim_email_digest(
+  p_worker text,
+  p_coalesce_key text,
+  p_lease_seconds integer default 300
+)
+returns setof public.email_outbox
+language sql
+as $$
+  update public.email_outbox o
+     set status = 'sending',
+         locked_by = p_worker,
+         locked_until = now() + make_interval(secs => p_lease_seconds),
+         attempts = o.attempts + 1
+   where o.id in (
+     select id
+       from public.email_outbox
+      where status = 'pending'
+        and coalesce_key = p_coalesce_key
+      for update skip locked
+   )
+  returning o.*;
+$$;
+
+revoke execute on function public.claim_email_digest(text, text, integer) from public, anon, authenticated;
+grant execute on function public.claim_email_digest(text, text, integer) to service_role;
+
+-- =========================================================
+-- 9) Direct-to-storage recording uploads
+-- =========================================================
+
+alter table public.session_recordings add column if not exists storage_path text;
+alter table public.session_recordings add column if not exists content_type text;
+alter table public.session_recordings add column if not exists size_bytes bigint;
+
+-- Recordings are private and capped at MAX_UPLOAD_SIZE_MB (default 100MB; keep in sync),
+-- so storage rejects an oversized direct upload instead of the API finding it afterwards
+insert into storage.buckets (id, name, public, file_size_limit)
+values ('session-recordings', 'session-recordings', false, 104857600)
+on conflict (id) do update set public = false, file_size_limit = excluded.file_size_limit;
+
+-- Signed upload and playback URLs are issued under the caller's JWT; objects live at
+-- <job_id>/<file>, so only the job's tutor (or an admin) may create or read them
+drop policy if exists "recording objects insert by job tutor" on storage.objects;
+create policy "recording objects insert by job tutor"
+  on storage.objects for insert
+  to authenticated
+  with check (
+    bucket_id = 'session-recordings'
+    and (
+      public.is_admin()
+      or exists (
+        select 1 from public.tutoring_jobs j
+        join public.tutors tu on tu.id = j.tutor_id
+        where j.id::text = (storage.foldername(name))[1] and tu.auth_id = auth.uid()
+      )
+    )
+  );
+
+drop policy if exists "recording objects select by job tutor" on storage.objects;
+create policy "recording objects select by job tutor"
+  on storage.objects for select
+  to authenticated
+  using (
+    bucket_id = 'session-recordings'
+    and (
+      public.is_admin()
+      or exists (
+        select 1 from public.tutoring_jobs j
+        join public.tutors tu on tu.id = j.tutor_id
+        where j.id::text = (storage.foldername(name))[1] and tu.auth_id = auth.uid()
+      )
+    )
+  );
+
+-- =========================================================
+-- 10) Content-addressed recordings and storage cleanup
+-- =========================================================
+
+-- Objects named <job_id>/<sha256>.<ext> carry their content hash; re-uploading the
+-- same bytes resolves to the existing object instead of a new one
+alter table public.session_recordings add column if not exists content_hash text;
+
+-- Stamped by the backend's hash verifier (service role) once the stored bytes match content_hash;
+-- completing an already verified path again skips re-reading the object
+alter table public.session_recordings add column if not exists content_verified_at timestamptz;
+
+-- Users write their own recording rows, so they may not vouch for a hash: their writes keep the
+-- stamp only while storage_path and content_hash are unchanged
+create or replace function public.guard_recording_verification()
+returns trigger
+language plpgsql
+as $$
+begin
+  if current_user in ('authenticated', 'anon') then
+    if tg_op = 'UPDATE'
+       and new.storage_path is not distinct from old.storage_path
+       and new.content_hash is not distinct from old.content_hash then
+      new.content_verified_at := old.content_verified_at;
+    else
+      new.content_verified_at := null;
+    end if;
+  end if;
+  return new;
+end;
+$$;
+
+do $$
+begin
+  if not exists (select 1 from pg_trigger where tgname = 'trg_guard_recording_verification') then
+    create trigger trg_guard_recording_verification before insert or update on public.session_recordings
+    for each row execute function public.guard_recording_verification();
+  end if;
+end$$;
+
+-- Reference counts are computed by storage_path (and recording_url for legacy rows)
+create index if not exists idx_session_recordings_storage_path on public.session_recordings(storage_path);
+
+-- Objects in the recordings bucket that no session_recordings row references.
+-- Used by the cleanup pass (python -m utils.storage --gc); the grace period
+-- protects uploads whose completion call has not arrived yet.
+create or replace function public.unreferenced_recording_objects(p_grace_seconds integer default 86400)
+returns table (name text, size_bytes bigint, created_at timestamptz)
+language sql
+stable
+security definer
+set search_path = public, storage
+as $$
+  -- References are normalized to the object key: storage_path may carry the bucket
+  -- prefix, and legacy or link rows only have recording_url (see StorageService.key_from_url)
+  with refs as (
+    select regexp_replace(r.storage_path, '^session-recordings/', '') as key
+    from public.session_recordings r
+    where r.storage_path is not null
+    union
+    select substring(r.recording_url from '/session-recordings/([^?#]+)')
+    from public.session_recordings r
+    where r.recording_url is not null
+  )
+  select o.name, (o.metadata->>'size')::bigint, o.created_at
+  from storage.objects o
+  where o.bucket_id = 'session-recordings'
+    and o.created_at < now() - make_interval(secs => p_grace_seconds)
+    and not exists (select 1 from refs where refs.key = o.name)
+  order by o.created_at
+$$;
+
+revoke execute on function public.unreferenced_recording_objects(integer) from public, anon, authenticated;
+grant execute on function public.unreferenced_recording_objects(integer) to service_role;
+
+-- =========================================================
+-- 11) Tutor double-booking guard
+-- =========================================================
+
+create extension if not exists btree_gist; -- tutor_id (=) alongside a range (&&) in one GiST index
+
+-- Time a scheduled session occupies; null for anything not scheduled
+alter table public.tutoring_jobs add column if not exists session_period tstzrange;
+
+create or replace function public.set_session_period()
+returns trigger
+language plpgsql
+as $$
+begin
+  if new.status = 'scheduled' and new.scheduled_time is not null and coalesce(new.duration_minutes, 0) > 0 then
+    new.session_period := tstzrange(new.scheduled_time, new.scheduled_time + make_interval(mins => new.duration_minutes), '[)');
+  else
+    new.session_period := null;
+  end if;
+  return new;
+end;
+$$;
+
+do $$
+begin
+  if not exists (select 1 from pg_trigger where tgname = 'trg_set_session_period') then
+    create trigger trg_set_session_period before insert or update of status, scheduled_time, duration_minutes
+    on public.tutoring_jobs
+    for each row execute function public.set_session_period();
+  end if;
+end$$;
+
+-- Backfill rows scheduled before the trigger existed
+update public.tutoring_jobs
+set session_period = tstzrange(scheduled_time, scheduled_time + make_interval(mins => duration_minutes), '[)')
+where status = 'scheduled' and scheduled_time is not null and coalesce(duration_minutes, 0) > 0
+  and session_period is null;
+
+-- Two sessions of the same tutor may not overlap, even when requests race past the app-level check
+do $$
+begin
+  if not exists (select 1 from pg_constraint where conname = 'tutoring_jobs_no_tutor_overlap') then
+    alter table public.tutoring_jobs add constraint tutoring_jobs_no_tutor_overlap
+      exclude using gist (tutor_id with =, session_period with &&);
+  end if;
+exception when exclusion_violation then
+  raise warning 'tutoring_jobs has overlapping sessions for a tutor; resolve them and re-run this section';
+end$$;
+
+-- =========================================================
+-- 12) Tutor opportunity feed (ranked, keyset-paginated)
+-- =========================================================
+
+-- Sortable priority and the tutee's school, so ranking and filters are plain indexed columns
+alter table public.tutoring_opportunities add column if not exists priority_rank smallint
+  generated always as (case priority when 'high' then 2 when 'normal' then 1 else 0 end) stored;
+alter table public.tutoring_opportunities add column if not exists school_id uuid;
+
+create or replace function public.set_opportunity_school()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  new.school_id := (select te.school_id from public.tutees te where te.id = new.tutee_id);
+  return new;
+end;
+$$;
+
+do $$
+begin
+  if not exists (select 1 from pg_trigger where tgname = 'trg_set_opportunity_school') then
+    create trigger trg_set_opportunity_school before insert or update of tutee_id
+    on public.tutoring_opportunities
+    for each row execute function public.set_opportunity_school();
+  end if;
+end$$;
+
+update public.tutoring_opportunities o
+set school_id = te.school_id
+from public.tutees te
+where te.id = o.tutee_id and o.school_id is distinct from te.school_id;
+
+-- Feed order is (priority_rank desc, created_at, id) within a school tier
+create index if not exists idx_opps_feed on public.tutoring_opportunities(priority_rank desc, created_at, id)
+  where status = 'open';
+create index if not exists idx_opps_feed_school on public.tutoring_opportunities(school_id, priority_rank desc, created_at, id)
+  where status = 'open';
+create index if not exists idx_opps_open_subject on public.tutoring_opportunities(subject_type, subject_grade, language)
+  where status = 'open';
+create index if not exists idx_opps_open_subject_name on public.tutoring_opportunities(lower(subject_name) text_pattern_ops)
+  where status = 'open';
+
+-- One page of open opportunities a tutor is approved for.
+-- p_types/p_grades/p_names are the tutor's approved (type, grade, lower(base name))
+-- triples; a base name contained in subject_name grants eligibility.
+-- p_tier: 0 = the tutor's school, 1 = other schools, null = everything.
+-- Keyset: rows strictly after (p_after_rank, p_after_created, p_after_id) in feed order.
+create or replace function public.opportunity_feed(
+  p_types text[],
+  p_grades text[],
+  p_names text[],
+  p_school_id uuid default null,
+  p_tier integer default null,
+  p_subject text default null,
+  p_grade text default null,
+  p_type text default null,
+  p_language text default null,
+  p_after_rank smallint default null,
+  p_after_created timestamptz default null,
+  p_after_id uuid default null,
+  p_limit integer default 20
+)
+returns table (
+  id uuid,
+  tutee_id uuid,
+  school_id uuid,
+  status text,
+  priority text,
+  priority_rank smallint,
+  subject_name text,
+  subject_type text,
+  subject_grade text,
+  language text,
+  location_preference text,
+  additional_notes text,
+  created_at timestamptz
+)
+language sql
+stable
+as $$
+  select o.id, o.tutee_id, o.school_id, o.status, o.priority, o.priority_rank, o.subject_name,
+         o.subject_type, o.subject_grade, o.language, o.location_preference, o.additional_notes, o.created_at
+  from public.tutoring_opportunities o
+  where o.status = 'open'
+    and (p_tier is null
+         or (p_tier = 0 and o.school_id = p_school_id)
+         or (p_tier = 1 and o.school_id is distinct from p_school_id))
+    and (p_type is null or o.subject_type = p_type)
+    and (p_grade is null or o.subject_grade = p_grade)
+    and (p_language is null or o.language = p_language)
+    and (p_subject is null or lower(o.subject_name) like p_subject || '%')
+    and exists (
+      select 1 from unnest(p_types, p_grades, p_names) k(t, g, n)
+      where k.t = o.subject_type and k.g = o.subject_grade and strpos(lower(o.subject_name), k.n) > 0
+    )
+    and (p_after_id is null
+         or o.priority_rank < p_after_rank
+         or (o.priority_rank = p_after_rank and (o.created_at, o.id) > (p_after_created, p_after_id)))
+  order by o.priority_rank desc, o.created_at, o.id
+  limit least(greatest(coalesce(p_limit, 20), 1), 101)
+$$;
+
+grant execute on function public.opportunity_feed(text[], text[], text[], uuid, integer, text, text, text, text, smallint, timestamptz, uuid, integer) to authenticated;
+
+-- =========================================================
+-- 13) Auto-match proposals (utils/auto_match.py writes, admins review)
+-- =========================================================
+create table if not exists public.match_proposals (
+  id uuid primary key default gen_random_uuid(),
+  run_id uuid not null,
+  opportunity_id uuid not null references public.tutoring_opportunities(id) on delete cascade,
+  tutor_id uuid not null references public.tutors(id) on delete cascade,
+  same_school boolean not null default false,
+  tutor_active_jobs integer not null default 0,
+  status text not null default 'pending' check (status in ('pending','approved','rejected','superseded','stale')),
+  job_id uuid, -- soft reference: jobs are hard-deleted on completion/cancel
+  decided_by uuid,
+  decided_at timestamptz,
+  created_at timestamptz not null default now()
+);
+
+create index if not exists idx_match_proposals_pending on public.match_proposals(created_at)
+  where status = 'pending';
+create index if not exists idx_match_proposals_opportunity on public.match_proposals(opportunity_id);
+create index if not exists idx_match_proposals_run on public.match_proposals(run_id);
+
+alter table public.match_proposals enable row level security;
+
+drop policy if exists "match proposals admin select" on public.match_proposals;
+create policy "match proposals admin select"
+  on public.match_proposals for select
+  to authenticated
+  using (public.is_admin());
+
+drop policy if exists "match proposals admin update" on public.match_proposals;
+create policy "match proposals admin update"
+  on public.match_proposals for update
+  to authenticated
+  using (public.is_admin())
+  with check (public.is_admin());
+
+-- A run replaces the pending proposals in one transaction: admins never see an empty list or a
+-- mix of two runs. Overlapping runs queue on the lock and the later one wins; repeating a run_id
+-- is a no-op. Rows whose opportunity or tutor vanished since the run loaded them are skipped.
+create or replace function public.replace_match_proposals(p_run_id uuid, p_rows jsonb)
+returns integer
+language plpgsql
+set search_path = public
+as $$
+declare
+  inserted integer;
+begin
+  perform pg_advisory_xact_lock(hashtext('public.match_proposals'));
+  if exists (select 1 from public.match_proposals where run_id = p_run_id) then
+    return 0;
+  end if;
+  update public.match_proposals set status = 'superseded' where status = 'pending';
+  insert into public.match_proposals (run_id, opportunity_id, tutor_id, same_school, tutor_active_jobs)
+  select p_run_id, r.opportunity_id, r.tutor_id, coalesce(r.same_school, false), coalesce(r.tutor_active_jobs, 0)
+    from jsonb_to_recordset(coalesce(p_rows, '[]'::jsonb))
+         as r(opportunity_id uuid, tutor_id uuid, same_school boolean, tutor_active_jobs integer)
+    join public.tutoring_opportunities o on o.id = r.opportunity_id
+    join public.tutors t on t.id = r.tutor_id;
+  get diagnostics inserted = row_count;
+  return inserted;
+end;
+$$;
+
+revoke execute on function public.replace_match_proposals(uuid, jsonb) from public, anon, authenticated;
+grant execute on function public.replace_match_proposals(uuid, jsonb) to service_role;
+
+-- =========================================================
+-- 14) Change notifications for dashboard event streams (utils/events.py)
+-- =========================================================
+-- Payload carries ids and status only; listeners route by tutor/tutee and
+-- clients refetch rows through RLS-checked endpoints.
+create or replace function public.notify_app_event()
+returns trigger
+language plpgsql
+as $$
+declare
+  r jsonb := to_jsonb(coalesce(new, old));
+begin
+  perform pg_notify('app_events', json_build_object(
+    'table', tg_table_name,
+    'op', lower(tg_op),
+    'id', r->>'id',
+    'status', r->>'status',
+    'tutor_id', r->>'tutor_id',
+    'tutee_id', r->>'tutee_id'
+  )::text);
+  return null;
+end;
+$$;
+
+do $$
+declare
+  t text;
+begin
+  -- Keep in sync with NOTIFY_TABLES in utils/events.py
+  foreach t in array array['tutoring_jobs','awaiting_verification_jobs','tutoring_opportunities','subject_approvals','help_questions','match_proposals','tutors','certification_requests']
+  loop
+    if not exists (select 1 from pg_trigger where tgname = 'trg_notify_app_event_' || t) then
+      execute format(
+        'create trigger %I after insert or update or delete on public.%I for each row execute function public.notify_app_event()',
+        'trg_notify_app_event_' || t, t
+      );
+    end if;
+  end loop;
+end$$;
+
+-- =========================================================
+-- 15) Delta sync: tombstones for hard-deleted rows (utils/delta_sync.py)
+-- =========================================================
+create table if not exists public.change_tombstones (
+  id bigserial primary key,
+  table_name text not null,
+  row_id uuid not null,
+  tutor_id uuid,
+  tutee_id uuid,
+  school_id uuid,
+  deleted_at timestamptz not null default now()
+);
+
+create index if not exists idx_change_tombstones_deleted_at on public.change_tombstones(table_name, deleted_at);
+create index if not exists idx_change_tombstones_tutor on public.change_tombstones(tutor_id, deleted_at) where tutor_id is not null;
+create index if not exists idx_change_tombstones_tutee on public.change_tombstones(tutee_id, deleted_at) where tutee_id is not null;
+
+create or replace function public.record_tombstone()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  r jsonb := to_jsonb(old);
+begin
+  insert into public.change_tombstones(table_name, row_id, tutor_id, tutee_id, school_id)
+  values (
+    tg_table_name,
+    (r->>'id')::uuid,
+    nullif(r->>'tutor_id', '')::uuid,
+    nullif(r->>'tutee_id', '')::uuid,
+    nullif(r->>'school_id', '')::uuid
+  );
+  -- Self-pruning; API cursors are only honoured for TOMBSTONE_RETENTION_HOURS (< 7 days)
+  if random() < 0.01 then
+    delete from public.change_tombstones where deleted_at < now() - interval '7 days';
+  end if;
+  return null;
+end;
+$$;
+
+do $$
+declare
+  t text;
+begin
+  foreach t in array array['tutoring_jobs','awaiting_verification_jobs','tutoring_opportunities','help_questions','certification_requests']
+  loop
+    if not exists (select 1 from pg_trigger where tgname = 'trg_tombstone_' || t) then
+      execute format(
+        'create trigger %I after delete on public.%I for each row execute function public.record_tombstone()',
+        'trg_tombstone_' || t, t
+      );
+    end if;
+  end loop;
+end$$;
+
+alter table public.change_tombstones enable row level security;
+
+-- Tombstones hold ids only; each caller sees those of rows they could see
+drop policy if exists "tombstones select scoped" on public.change_tombstones;
+create policy "tombstones select scoped"
+  on public.change_tombstones for select
+  to authenticated
+  using (
+    public.is_admin()
+    or exists (select 1 from public.tutors tu where tu.auth_id = auth.uid()
+               and (tu.id = change_tombstones.tutor_id or change_tombstones.table_name = 'tutoring_opportunities'))
+    or exists (select 1 from public.tutees te where te.auth_id = auth.uid() and te.id = change_tombstones.tutee_id)
+  );
+
+-- Row-version scans for ?since=
+create index if not exists idx_jobs_tutor_updated on public.tutoring_jobs(tutor_id, updated_at);
+create index if not exists idx_jobs_tutee_updated on public.tutoring_jobs(tutee_id, updated_at);
+create index if not exists idx_opps_updated_at on public.tutoring_opportunities(updated_at);
+create index if not exists idx_opps_tutee_updated on public.tutoring_opportunities(tutee_id, updated_at);
+create index if not exists idx_awaiting_tutor_updated on public.awaiting_verification_jobs(tutor_id, updated_at);
+create index if not exists idx_awaiting_updated_at on public.awaiting_verification_jobs(updated_at);
+create index if not exists idx_tutors_updated_at on public.tutors(updated_at);
+create index if not exists idx_help_questions_updated_at on public.help_questions(updated_at);
+create index if not exists idx_cert_requests_created_at on public.certification_requests(created_at);
+
+-- =========================================================
+-- 16) Admin analytics: job lifecycle ledger and weekly hours rollup
+-- =========================================================
+-- Jobs are hard-deleted as they move tutoring_jobs -> awaiting_verification_jobs
+-- -> past_jobs, so claim and scheduling times would otherwise be lost.
+-- Triggers keep one lifecycle row per job and a (week, tutor, subject) rollup
+-- of verified hours; admin_analytics() aggregates over these instead of
+-- shipping past_jobs rows to the client.
+create table if not exists public.job_lifecycle (
+  job_id uuid primary key,
+  tutor_id uuid,
+  tutee_id uuid,
+  school_id uuid, -- the tutor's school when claimed
+  subject_name text,
+  subject_type text,
+  subject_grade text,
+  posted_at timestamptz,   -- opportunity created
+  claimed_at timestamptz,  -- job created (null for jobs claimed before this ledger existed)
+  scheduled_at timestamptz,
+  completed_at timestamptz,
+  verified_at timestamptz,
+  cancelled_at timestamptz,
+  hours numeric not null default 0
+);
+
+create index if not exists idx_job_lifecycle_claimed on public.job_lifecycle(claimed_at) where claimed_at is not null;
+create index if not exists idx_job_lifecycle_school_claimed on public.job_lifecycle(school_id, claimed_at) where claimed_at is not null;
+create index if not exists idx_job_lifecycle_scheduled on public.job_lifecycle(scheduled_at) where scheduled_at is not null;
+create index if not exists idx_job_lifecycle_school_scheduled on public.job_lifecycle(school_id, scheduled_at) where scheduled_at is not null;
+
+create table if not exists public.tutoring_hours_weekly (
+  week date not null, -- Monday of the session week
+  tutor_id uuid not null,
+  subject_name text not null,
+  subject_type text not null,
+  school_id uuid,
+  jobs_completed integer not null default 0,
+  hours numeric not null default 0,
+  primary key (week, tutor_id, subject_name, subject_type)
+);
+
+create index if not exists idx_hours_weekly_school on public.tutoring_hours_weekly(school_id, week);
+create index if not exists idx_hours_weekly_tutor on public.tutoring_hours_weekly(tutor_id, week);
+
+create or replace function public.try_timestamptz(p text)
+returns timestamptz
+language plpgsql
+stable
+as $$
+begin
+  return p::timestamptz;
+exception when others then
+  return null;
+end;
+$$;
+
+create or replace function public.track_job_lifecycle()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+begin
+  if tg_table_name = 'tutoring_jobs' then
+    if tg_op = 'INSERT' then
+      insert into public.job_lifecycle(job_id, tutor_id, tutee_id, school_id, subject_name, subject_type, subject_grade,
+                                       posted_at, claimed_at, scheduled_at)
+      values (
+        new.id, new.tutor_id, new.tutee_id,
+        (select tu.school_id from public.tutors tu where tu.id = new.tutor_id),
+        new.subject_name, new.subject_type, new.subject_grade,
+        public.try_timestamptz(new.opportunity_snapshot->>'created_at'),
+        new.created_at,
+        case when new.status = 'scheduled' then now() end
+      )
+      on conflict (job_id) do nothing;
+    elsif tg_op = 'UPDATE' then
+      if new.status = 'scheduled' and old.status is distinct from 'scheduled' then
+        update public.job_lifecycle set scheduled_at = coalesce(scheduled_at, now()) where job_id = new.id;
+      elsif new.status = 'cancelled' and old.status is distinct from 'cancelled' then
+        update public.job_lifecycle set cancelled_at = coalesce(cancelled_at, now()) where job_id = new.id;
+      end if;
+    else
+      -- Completion inserts the awaiting row before deleting the job, so any other delete is a cancellation
+      update public.job_lifecycle set cancelled_at = coalesce(cancelled_at, now())
+      where job_id = old.id and completed_at is null;
+    end if;
+  elsif tg_table_name = 'awaiting_verification_jobs' then
+    update public.job_lifecycle set completed_at = coalesce(completed_at, new.created_at) where job_id = new.id;
+  end if;
+  return null;
+end;
+$$;
+
+create or replace function public.roll_up_past_job()
+returns trigger
+language plpgsql
+security definer
+set search_path = public
+as $$
+declare
+  r public.past_jobs := coalesce(new, old);
+  dir integer := case when tg_op = 'DELETE' then -1 else 1 end;
+  wk date := date_trunc('week', coalesce(r.scheduled_time, r.verified_at, r.created_at, now()))::date;
+begin
+  insert into public.tutoring_hours_weekly as w (week, tutor_id, subject_name, subject_type, school_id, jobs_completed, hours)
+  values (wk, r.tutor_id, r.subject_name, r.subject_type,
+          (select tu.school_id from public.tutors tu where tu.id = r.tutor_id),
+          dir, dir * coalesce(r.awarded_volunteer_hours, 0))
+  on conflict (week, tutor_id, subject_name, subject_type) do update
+    set jobs_completed = w.jobs_completed + excluded.jobs_completed,
+        hours = w.hours + excluded.hours;
+
+  if tg_op = 'INSERT' then
+    insert into public.job_lifecycle(job_id, tutor_id, tutee_id, school_id, subject_name, subject_type, subject_grade,
+                                     posted_at, verified_at, hours)
+    values (
+      r.id, r.tutor_id, r.tutee_id,
+      (select tu.school_id from public.tutors tu where tu.id = r.tutor_id),
+      r.subject_name, r.subject_type, r.subject_grade,
+      public.try_timestamptz(r.opportunity_snapshot->>'created_at'),
+      coalesce(r.verified_at, now()),
+      coalesce(r.awarded_volunteer_hours, 0)
+    )
+    on conflict (job_id) do update
+      set verified_at = excluded.verified_at, hours = excluded.hours;
+  else
+    update public.job_lifecycle set verified_at = null, hours = 0 where job_id = r.id;
+  end if;
+  return null;
+end;
+$$;
+
+do $$
+begin
+  if not exists (select 1 from pg_trigger where tgname = 'trg_job_lifecycle_jobs') then
+    create trigger trg_job_lifecycle_jobs after insert or update of status or delete on public.tutoring_jobs
+    for each row execute function public.track_job_lifecycle();
+  end if;
+  if not exists (select 1 from pg_trigger where tgname = 'trg_job_lifecycle_awaiting') then
+    create trigger trg_job_lifecycle_awaiting after insert on public.awaiting_verification_jobs
+    for each row execute function public.track_job_lifecycle();
+  end if;
+  if not exists (select 1 from pg_trigger where tgname = 'trg_roll_up_past_job') then
+    create trigger trg_roll_up_past_job after insert or delete on public.past_jobs
+    for each row execute function public.roll_up_past_job();
+  end if;
+end$$;
+
+-- One-time backfill from existing rows (scheduling times of existing jobs are unknown)
+insert into public.job_lifecycle(job_id, tutor_id, tutee_id, school_id, subject_name, subject_type, subject_grade, posted_at, claimed_at)
+select j.id, j.tutor_id, j.tutee_id, tu.school_id, j.subject_name, j.subject_type, j.subject_grade,
+       public.try_timestamptz(j.opportunity_snapshot->>'created_at'), j.created_at
+from public.tutoring_jobs j
+left join public.tutors tu on tu.id = j.tutor_id
+on conflict (job_id) do nothing;
+
+insert into public.job_lifecycle(job_id, tutor_id, tutee_id, school_id, subject_name, subject_type, subject_grade, posted_at, completed_at)
+select a.id, a.tutor_id, a.tutee_id, tu.school_id, a.subject_name, a.subject_type, a.subject_grade,
+       public.try_timestamptz(a.opportunity_snapshot->>'created_at'), a.created_at
+from public.awaiting_verification_jobs a
+left join public.tutors tu on tu.id = a.tutor_id
+on conflict (job_id) do nothing;
+
+insert into public.job_lifecycle(job_id, tutor_id, tutee_id, school_id, subject_name, subject_type, subject_grade, posted_at, verified_at, hours)
+select p.id, p.tutor_id, p.tutee_id, tu.school_id, p.subject_name, p.subject_type, p.subject_grade,
+       public.try_timestamptz(p.opportunity_snapshot->>'created_at'), p.verified_at, coalesce(p.awarded_volunteer_hours, 0)
+from public.past_jobs p
+left join public.tutors tu on tu.id = p.tutor_id
+on conflict (job_id) do nothing;
+
+insert into public.tutoring_hours_weekly(week, tutor_id, subject_name, subject_type, school_id, jobs_completed, hours)
+select date_trunc('week', coalesce(p.scheduled_time, p.verified_at, p.created_at))::date,
+       p.tutor_id, p.subject_name, p.subject_type, tu.school_id, count(*), coalesce(sum(p.awarded_volunteer_hours), 0)
+from public.past_jobs p
+left join public.tutors tu on tu.id = p.tutor_id
+where not exists (select 1 from public.tutoring_hours_weekly)
+group by 1, 2, 3, 4, 5;
+
+alter table public.job_lifecycle enable row level security;
+alter table public.tutoring_hours_weekly enable row level security;
+
+drop policy if exists "job lifecycle admin select" on public.job_lifecycle;
+create policy "job lifecycle admin select"
+  on public.job_lifecycle for select
+  to authenticated
+  using (public.is_admin());
+
+drop policy if exists "hours weekly admin select" on public.tutoring_hours_weekly;
+create policy "hours weekly admin select"
+  on public.tutoring_hours_weekly for select
+  to authenticated
+  using (public.is_admin());
+
+-- All dashboard aggregates in one round trip. Hours and completions come from
+-- the weekly rollup (rows per tutor-week, not per job); latency medians from
+-- the lifecycle ledger over the window; backlog from the open-board indexes.
+-- p_school_id null = district-wide. Durations are in hours.
+create or replace function public.admin_analytics(
+  p_school_id uuid default null,
+  p_from timestamptz default null,
+  p_to timestamptz default null,
+  p_top integer default 20
+)
+returns jsonb
+language sql
+stable
+as $$
+  with win as (
+    select coalesce(p_from, now() - interval '90 days') as t0,
+           coalesce(p_to, now()) as t1,
+           least(greatest(coalesce(p_top, 20), 1), 200) as top
+  ),
+  hw as (
+    select w.*
+    from public.tutoring_hours_weekly w, win
+    where w.week >= date_trunc('week', win.t0)::date
+      and w.week <= win.t1::date
+      and (p_school_id is null or w.school_id = p_school_id)
+  ),
+  lc as (
+    select l.*
+    from public.job_lifecycle l, win
+    where (p_school_id is null or l.school_id = p_school_id)
+      and ((l.claimed_at >= win.t0 and l.claimed_at < win.t1)
+           or (l.scheduled_at >= win.t0 and l.scheduled_at < win.t1))
+  ),
+  open_opps as (
+    select o.priority, o.subject_name, o.subject_type, o.subject_grade, o.created_at
+    from public.tutoring_opportunities o
+    where o.status = 'open'
+      and (p_school_id is null or o.school_id = p_school_id)
+  )
+  select jsonb_build_object(
+    'from', (select t0 from win),
+    'to', (select t1 from win),
+    'totals', (
+      select jsonb_build_object(
+        'jobs_completed', coalesce(sum(jobs_completed), 0),
+        'hours', coalesce(sum(hours), 0),
+        'active_tutors', count(distinct tutor_id)
+      ) from hw
+    ),
+    'by_week', coalesce((
+      select jsonb_agg(jsonb_build_object('week', week, 'jobs_completed', jobs, 'hours', hrs) order by week)
+      from (select week, sum(jobs_completed) as jobs, sum(hours) as hrs from hw group by week) s
+    ), '[]'::jsonb),
+    'by_tutor', coalesce((
+      select jsonb_agg(jsonb_build_object(
+               'tutor_id', s.tutor_id, 'first_name', tu.first_name, 'last_name', tu.last_name,
+               'jobs_completed', s.jobs, 'hours', s.hrs) order by s.hrs desc, s.tutor_id)
+      from (
+        select tutor_id, sum(jobs_completed) as jobs, sum(hours) as hrs
+        from hw group by tutor_id
+        order by sum(hours) desc, tutor_id
+        limit (select top from win)
+      ) s
+      left join public.tutors tu on tu.id = s.tutor_id
+    ), '[]'::jsonb),
+    'by_school', coalesce((
+      select jsonb_agg(jsonb_build_object(
+               'school_id', s.school_id, 'name', sc.name,
+               'jobs_completed', s.jobs, 'hours', s.hrs, 'tutors', s.tutors) order by s.hrs desc)
+      from (
+        select school_id, sum(jobs_completed) as jobs, sum(hours) as hrs, count(distinct tutor_id) as tutors
+        from hw group by school_id
+      ) s
+      left join public.schools sc on sc.id = s.school_id
+    ), '[]'::jsonb),
+    'by_subject', coalesce((
+      select jsonb_agg(jsonb_build_object(
+               'subject_name', subject_name, 'subject_type', subject_type,
+               'jobs_completed', jobs, 'hours', hrs) order by hrs desc)
+      from (
+        select subject_name, subject_type, sum(jobs_completed) as jobs, sum(hours) as hrs
+        from hw group by subject_name, subject_type
+      ) s
+    ), '[]'::jsonb),
+    'time_to_claim', (
+      select jsonb_build_object(
+        'samples', count(*),
+        'median_hours', round((percentile_cont(0.5) within group (order by d))::numeric, 2),
+        'p90_hours', round((percentile_cont(0.9) within group (order by d))::numeric, 2)
+      )
+      from (
+        select extract(epoch from (claimed_at - posted_at)) / 3600.0 as d
+        from lc, win
+        where claimed_at >= win.t0 and claimed_at < win.t1
+          and posted_at is not null and claimed_at >= posted_at
+      ) x
+    ),
+    'time_to_schedule', (
+      select jsonb_build_object(
+        'samples', count(*),
+        'median_hours', round((percentile_cont(0.5) within group (order by d))::numeric, 2),
+        'p90_hours', round((percentile_cont(0.9) within group (order by d))::numeric, 2)
+      )
+      from (
+        select extract(epoch from (scheduled_at - claimed_at)) / 3600.0 as d
+        from lc, win
+        where scheduled_at >= win.t0 and scheduled_at < win.t1
+          and claimed_at is not null and scheduled_at >= claimed_at
+      ) x
+    ),
+    'backlog', (
+      select jsonb_build_object(
+        'open', count(*),
+        'high_priority', count(*) filter (where priority = 'high'),
+        'older_than_7_days', count(*) filter (where created_at < now() - interval '7 days'),
+        'oldest_created_at', min(created_at),
+        'median_age_hours', round((percentile_cont(0.5) within group (order by extract(epoch from (now() - created_at)) / 3600.0))::numeric, 2),
+        'by_subject', coalesce((
+          select jsonb_agg(jsonb_build_object(
+                   'subject_name', subject_name, 'subject_type', subject_type, 'subject_grade', subject_grade,
+                   'open', n, 'oldest_created_at', oldest) order by n desc, oldest)
+          from (
+            select subject_name, subject_type, subject_grade, count(*) as n, min(created_at) as oldest
+            from open_opps group by subject_name, subject_type, subject_grade
+            order by count(*) desc, min(created_at)
+            limit (select top from win)
+          ) s
+        ), '[]'::jsonb)
+      ) from open_opps
+    )
+  )
+$$;
+
+grant execute on function public.admin_analytics(uuid, timestamptz, timestamptz, integer) to authenticated;
@@ -0,0 +1,150 @@
+import itertools
+import random
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils.auto_match import (
+    AGE_BUCKETS,
+    AGE_STEP_COST,
+    OTHER_SCHOOL_COST,
+    PRIORITY_COST,
+    MinCostFlow,
+    _age_bucket,
+    _priority_rank,
+    marginal_cost,
+    propose_matches,
+    tutor_capacity,
+)
+from utils.eligibility import EligibilityIndex
+
+NOW = datetime(2030, 9, 1, tzinfo=timezone.utc)
+
+
+def _assignment_cost(opp, tutor, k, active):
+    """Cost the matcher charges for giving `opp` to `tutor` as their (k+1)-th new job"""
+    school_id = opp.get('school_id')
+    cost = PRIORITY_COST[_priority_rank(opp.get('priority'))]
+    cost += AGE_STEP_COST * (AGE_BUCKETS - _age_bucket(opp.get('created_at'), NOW))
+    if school_id is None or tutor.get('school_id') != school_id:
+        cost += OTHER_SCHOOL_COST
+    return cost + marginal_cost(active, k)
+
+
+def _brute_force(opportunities, tutors, approvals, active_jobs, max_new=2, max_active=4):
+    """(assigned, cost) of the best assignment: most matches first, then cheapest"""
+    tutor_by_id = {t['id']: t for t in tutors}
+    capacity = {tid: tutor_capacity(active_jobs.get(tid, 0), max_new, max_active) for tid in tutor_by_id}
+    index = EligibilityIndex()
+    index.replace_all(approvals)
+    choices = [[None] + sorted(t for t in index.eligible_tutors(o) if capacity.get(t, 0) > 0) for o in opportunities]
+    best = (0, 0)
+    for picks in itertools.product(*choices):
+        load = {}
+        cost = 0
+        for opp, tid in zip(opportunities, picks):
+            if tid is None:
+                continue
+            k = load.get(tid, 0)
+            if k >= capacity[tid]:
+                break
+            load[tid] = k + 1
+            cost += _assignment_cost(opp, tutor_by_id[tid], k, active_jobs.get(tid, 0))
+        else:
+            assigned = sum(load.values())
+            if assigned > best[0] or (assigned == best[0] and cost < best[1]):
+                best = (assigned, cost)
+    return best
+
+
+def _random_instance(rng):
+    schools = ['s1', 's2', None][:rng.randint(1, 3)]
+    subjects = [('Math', 'Academic', '9'), ('Math', 'Academic', '10'), ('English', 'IB', '11')]
+    tutors = [{'id': f't{i}', 'school_id': rng.choice(schools), 'volunteer_hours': rng.randint(0, 5)}
+              for i in range(rng.randint(1, 3))]
+    approvals = []
+    for t in tutors:
+        for name, kind, grade in rng.sample(subjects, rng.randint(1, len(subjects))):
+            approvals.append({'tutor_id': t['id'], 'subject_name': name, 'subject_type': kind, 'subject_grade': grade})
+    opportunities = []
+    for i in range(rng.randint(1, 6)):
+        name, kind, grade = rng.choice(subjects)
+        opportunities.append({
+            'id': f'o{i}',
+            'school_id': rng.choice(schools),
+            'priority': rng.choice(['low', 'normal', 'high']),
+            'subject_name': name,
+            'subject_type': kind,
+            'subject_grade': grade,
+            'created_at': (NOW - timedelta(days=rng.randint(0, 40))).isoformat(),
+        })
+    active_jobs = {t['id']: rng.choice([0, 1, 2, 3, 4]) for t in tutors}
+    return opportunities, tutors, approvals, active_jobs
+
+
+def _check_proposals(result, opportunities, tutors, approvals, active_jobs):
+    """Proposals are valid and add up to the reported cost"""
+    tutor_by_id = {t['id']: t for t in tutors}
+    opp_by_id = {o['id']: o for o in opportunities}
+    index = EligibilityIndex()
+    index.replace_all(approvals)
+    load = {}
+    cost = 0
+    seen = set()
+    for p in result['proposals']:
+        opp, tid = opp_by_id[p['opportunity_id']], p['tutor_id']
+        assert p['opportunity_id'] not in seen
+        seen.add(p['opportunity_id'])
+        assert tid in index.eligible_tutors(opp)
+        k = load.get(tid, 0)
+        load[tid] = k + 1
+        cost += _assignment_cost(opp, tutor_by_id[tid], k, active_jobs.get(tid, 0))
+    for tid, n in load.items():
+        assert n <= tutor_capacity(active_jobs.get(tid, 0))
+    assert cost == result['cost']
+
+
+def test_min_cost_flow_prefers_cheaper_paths():
+    graph = MinCostFlow(4)
+    graph.add_edge(0, 1, 2, 1)
+    graph.add_edge(0, 2, 2, 5)
+    graph.add_edge(1, 3, 1, 1)
+    graph.add_edge(2, 3, 2, 1)
+    graph.add_edge(1, 2, 1, 1)
+    assert graph.solve(0, 3) == (3, 11)
+
+
+def test_single_tutor_takes_every_cross_school_opportunity_it_can():
+    tutors = [{'id': 't0', 'school_id': 's1', 'volunteer_hours': 0}]
+    approvals = [{'tutor_id': 't0', 'subject_name': 'Math', 'subject_type': 'Academic', 'subject_grade': '9'}]
+    opportunities = [
+        {'id': f'o{i}', 'school_id': 's2', 'priority': 'normal', 'subject_name': 'Math',
+         'subject_type': 'Academic', 'subject_grade': '9', 'created_at': NOW.isoformat()}
+        for i in range(2)
+    ]
+    result = propose_matches(opportunities, tutors, approvals, {}, now=NOW)
+    assert result['assigned'] == 2
+    assert not any(p['same_school'] for p in result['proposals'])
+
+
+def test_prefers_same_school_and_spreads_load():
+    tutors = [{'id': 'near', 'school_id': 's1'}, {'id': 'far', 'school_id': 's2'}]
+    approvals = [{'tutor_id': t['id'], 'subject_name': 'Math', 'subject_type': 'Academic', 'subject_grade': '9'}
+                 for t in tutors]
+    opportunities = [{'id': 'o1', 'school_id': 's1', 'subject_name': 'Math', 'subject_type': 'Academic',
+                      'subject_grade': '9', 'created_at': NOW.isoformat()}]
+    result = propose_matches(opportunities, tutors, approvals, {}, now=NOW)
+    assert [(p['tutor_id'], p['same_school']) for p in result['proposals']] == [('near', True)]
+
+    # A busy local tutor loses to an idle one elsewhere once load outweighs the school preference
+    result = propose_matches(opportunities, tutors, approvals, {'near': 3}, now=NOW)
+    assert [p['tutor_id'] for p in result['proposals']] == ['far']
+
+
+@pytest.mark.parametrize('seed', range(300))
+def test_matches_brute_force_on_small_instances(seed):
+    rng = random.Random(seed)
+    opportunities, tutors, approvals, active_jobs = _random_instance(rng)
+    result = propose_matches(opportunities, tutors, approvals, active_jobs, now=NOW)
+    assert (result['assigned'], result['cost']) == _brute_force(opportunities, tutors, approvals, active_jobs)
+    _check_proposals(result, opportunities, tutors, approvals, active_jobs)
@@ -0,0 +1,138 @@
+from datetime import date, timedelta
+
+import pytest
+
+from utils.availability import (
+    MINUTES_PER_DAY,
+    Availability,
+    AvailabilityError,
+    _legacy_fits,
+    fits,
+    format_hhmm,
+    intersection,
+    normalize,
+    parse_hhmm,
+)
+
+
+@pytest.mark.parametrize('text, minute', [
+    ('00:00', 0),
+    ('09:30', 570),
+    ('9:30', 570),
+    ('9:5', 545),
+    (' 14:00 ', 840),
+    ('24:00', MINUTES_PER_DAY),
+])
+def test_parse_hhmm(text, minute):
+    assert parse_hhmm(text) == minute
+
+
+@pytest.mark.parametrize('text', ['', '9', '9:60', '24:01', '25:00', '9:005', 'ab:cd', '-1:00'])
+def test_parse_hhmm_rejects(text):
+    with pytest.raises(ValueError):
+        parse_hhmm(text)
+
+
+def test_format_hhmm_round_trips():
+    for minute in range(0, MINUTES_PER_DAY + 1, 7):
+        assert parse_hhmm(format_hhmm(minute)) == minute
+
+
+def test_normalize_merges_overlapping_and_touching():
+    assert normalize([(600, 660), (540, 600), (650, 700), (800, 800), (900, 850)]) == ((540, 700),)
+    assert normalize([(60, 120), (121, 180)]) == ((60, 120), (121, 180))
+    assert normalize([]) == ()
+
+
+def test_intersection():
+    a = ((480, 600), (660, 720))
+    b = ((540, 690),)
+    assert intersection(a, b) == ((540, 600), (660, 690))
+    assert intersection(a, ()) == ()
+
+
+@pytest.mark.parametrize('start, duration, expected', [
+    (480, 60, True),     # exactly the first interval
+    (479, 60, False),    # starts before it
+    (481, 60, False),    # runs past its end
+    (540, 0, True),      # zero-length at the end boundary
+    (600, 30, True),     # second interval
+    (570, 60, False),    # spans the gap between intervals
+    (0, 30, False),      # before every interval
+    (1410, 30, True),    # ends at 24:00
+])
+def test_fits_boundaries(start, duration, expected):
+    intervals = ((480, 540), (600, 660), (1380, MINUTES_PER_DAY))
+    assert fits(intervals, start, duration) is expected
+
+
+def test_parse_normalizes_day():
+    parsed = Availability.parse({'2030-01-07': ['10:00-11:00', '09:00-10:00', '10:30-12:00', '9:5-9:10']})
+    assert parsed.intervals('2030-01-07') == ((540, 720),)
+    assert parsed.to_json() == {'2030-01-07': ['09:00-12:00']}
+
+
+def test_parse_accepts_unpadded_dates_and_merges_duplicate_keys():
+    parsed = Availability.parse({'2030-1-7': ['09:00-10:00'], '2030-01-07': ['10:00-11:00']})
+    assert parsed.to_json() == {'2030-01-07': ['09:00-11:00']}
+
+
+@pytest.mark.parametrize('raw', [
+    [],
+    {'2030-02-30': ['09:00-10:00']},
+    {'2030-01-07': '09:00-10:00'},
+    {'2030-01-07': ['0900-1000']},
+    {'2030-01-07': ['09:00-10:00-11:00']},
+    {'2030-01-07': ['09:00-09:00']},
+    {'2030-01-07': ['10:00-09:00']},
+    {'2030-01-07': ['09:00-24:30']},
+])
+def test_parse_strict_rejects(raw):
+    with pytest.raises(AvailabilityError):
+        Availability.parse(raw)
+
+
+def test_parse_lenient_skips_bad_entries():
+    parsed = Availability.parse({
+        'not-a-date': ['09:00-10:00'],
+        '2030-01-07': ['10:00-09:00', 'garbage', '13:00-14:00'],
+        '2030-01-08': 'oops',
+    }, strict=False)
+    assert parsed.to_json() == {'2030-01-07': ['13:00-14:00']}
+    assert not Availability.parse(None, strict=False)
+
+
+def test_fits_agrees_with_legacy_string_check():
+    # The benchmark's worst case: every other 15-minute slot free between 08:00 and 22:00
+    step = 15
+    first = date(2030, 1, 7)
+    raw = {
+        (first + timedelta(days=i)).isoformat(): [
+            f"{format_hhmm(m)}-{format_hhmm(m + step)}" for m in range(8 * 60, 22 * 60, 2 * step)
+        ]
+        for i in range(2)
+    }
+    parsed = Availability.parse(raw)
+    for key in raw:
+        for minute in range(0, MINUTES_PER_DAY - 60, step):
+            for duration in (15, 30, 60):
+                assert parsed.fits(key, minute, duration) == _legacy_fits(raw[key], format_hhmm(minute), duration)
+
+
+def test_union_and_intersection_by_day():
+    a = Availability.parse({'2030-01-07': ['09:00-10:00'], '2030-01-08': ['09:00-10:00']})
+    b = Availability.parse({'2030-01-07': ['10:00-11:00'], '2030-01-09': ['09:00-10:00']})
+    assert a.union(b).to_json() == {
+        '2030-01-07': ['09:00-11:00'],
+        '2030-01-08': ['09:00-10:00'],
+        '2030-01-09': ['09:00-10:00'],
+    }
+    assert not a.intersection(b)
+    assert a.intersection(a).to_json() == a.to_json()
+
+
+def test_grid_mask_sets_free_minutes():
+    parsed = Availability.parse({'2030-01-08': ['00:00-00:02', '23:59-24:00']})
+    mask = parsed.grid_mask(date(2030, 1, 7), 2)
+    base = MINUTES_PER_DAY
+    assert mask == (0b11 << base) | (1 << (base + MINUTES_PER_DAY - 1))
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from utils import booking_index
+from utils.cache import TTLCache
+from utils.booking_index import TutorBookings, find_conflict, record_booking, release_booking
+
+T0 = datetime(2030, 1, 7, 14, 0, tzinfo=timezone.utc)
+
+
+class FakeClient:
+    """Answers load_tutor_bookings' query from a mutable list of rows"""
+
+    def __init__(self, rows):
+        self.rows = rows
+        self.loads = 0
+
+    def table(self, name):
+        return self
+
+    def select(self, *args):
+        return self
+
+    def eq(self, *args):
+        return self
+
+    def execute(self):
+        self.loads += 1
+        return type('Res', (), {'data': list(self.rows)})()
+
+
+def _row(job_id, start, minutes=60):
+    return {'id': job_id, 'scheduled_time': start.isoformat(), 'duration_minutes': minutes}
+
+
+@pytest.fixture(autouse=True)
+def empty_index(monkeypatch):
+    monkeypatch.setattr(booking_index, '_indexes', TTLCache(max_size=16, ttl_seconds=300))
+
+
+def test_conflict_bounds_are_half_open():
+    index = TutorBookings([(T0, T0 + timedelta(hours=1), 'a')])
+    assert index.conflict(T0 + timedelta(hours=1), T0 + timedelta(hours=2)) is None
+    assert index.conflict(T0 - timedelta(hours=1), T0) is None
+    assert index.conflict(T0 + timedelta(minutes=59), T0 + timedelta(hours=2)) == 'a'
+    assert index.conflict(T0, T0 + timedelta(hours=1), exclude_job_id='a') is None
+
+
+def test_conflict_sees_long_session_behind_short_ones():
+    index = TutorBookings([
+        (T0, T0 + timedelta(hours=5), 'long'),
+        (T0 + timedelta(hours=1), T0 + timedelta(hours=2), 'short'),
+    ])
+    assert index.conflict(T0 + timedelta(hours=3), T0 + timedelta(hours=4)) == 'long'
+
+
+def test_cached_clash_is_rechecked_against_the_database():
+    client = FakeClient([_row('a', T0)])
+    assert find_conflict(client, 'tutor', T0, T0 + timedelta(hours=1)) == 'a'
+    assert client.loads == 1
+
+    # Cancelled on another worker: this process's index still has it
+    client.rows = []
+    assert find_conflict(client, 'tutor', T0, T0 + timedelta(hours=1)) is None
+    assert client.loads == 2
+
+
+def test_cached_free_slot_does_not_query():
+    client = FakeClient([_row('a', T0)])
+    find_conflict(client, 'tutor', T0, T0 + timedelta(hours=1))
+    assert find_conflict(client, 'tutor', T0 + timedelta(hours=2), T0 + timedelta(hours=3)) is None
+    assert client.loads == 1
+
+
+def test_record_and_release_update_cached_index():
+    client = FakeClient([])
+    assert find_conflict(client, 'tutor', T0, T0 + timedelta(hours=1)) is None
+    record_booking('tutor', 'b', T0, T0 + timedelta(hours=1))
+    client.rows = [_row('b', T0)]
+    assert find_conflict(client, 'tutor', T0, T0 + timedelta(hours=1)) == 'b'
+    release_booking('tutor', 'b')
+    assert find_conflict(client, 'tutor', T0, T0 + timedelta(hours=1), exclude_job_id='b') is None
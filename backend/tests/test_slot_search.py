@@ -0,0 +1,150 @@
+from datetime import date, datetime, timedelta, timezone
+from zoneinfo import ZoneInfo
+
+import pytest
+from flask import Flask
+
+from utils.availability import Availability
+from utils.slot_search import SlotGrid, lowest_bits, run_starts, step_mask, suggest_for_jobs
+
+TORONTO = ZoneInfo('America/Toronto')
+NOW = datetime(2030, 1, 6, 12, 0, tzinfo=timezone.utc)
+
+
+def _starts(suggestions):
+    return [(s['date'], s['start_time']) for s in suggestions]
+
+
+def test_bit_helpers():
+    assert run_starts(0b0111_1110, 3) == 0b0001_1110
+    assert run_starts(0b1011, 2) == 0b0001
+    assert step_mask(10, 3) == 0b10_0100_1001
+    assert lowest_bits(0b1010_0100, 2) == [2, 5]
+
+
+def test_suggest_matches_tutee_availability_on_step_grid():
+    grid = SlotGrid(date(2030, 1, 6), days=3, now=NOW, tz=timezone.utc)
+    availability = Availability.parse({'2030-01-07': ['09:10-11:00'], '2030-01-08': ['13:00-14:00']})
+    suggestions = grid.suggest(availability, 60, k=5)
+    assert _starts(suggestions) == [
+        ('2030-01-07', '09:15'), ('2030-01-07', '09:30'), ('2030-01-07', '09:45'), ('2030-01-07', '10:00'),
+        ('2030-01-08', '13:00'),
+    ]
+    assert suggestions[0]['scheduled_time'] == '2030-01-07T09:15:00+00:00'
+    assert suggestions[0]['duration_minutes'] == 60
+
+
+def test_lead_time_excludes_near_starts():
+    grid = SlotGrid(date(2030, 1, 6), days=2, now=NOW, tz=timezone.utc, lead_minutes=60)
+    availability = Availability.parse({'2030-01-06': ['12:00-15:00']})
+    assert _starts(grid.suggest(availability, 60, k=1)) == [('2030-01-06', '13:00')]
+
+
+def test_booked_sessions_are_excluded():
+    grid = SlotGrid(date(2030, 1, 6), days=3, now=NOW, tz=timezone.utc)
+    availability = Availability.parse({'2030-01-07': ['09:00-12:00']})
+    sessions = [
+        {'scheduled_time': '2030-01-07T10:00:00Z', 'duration_minutes': 60},
+        {'scheduled_time': None},
+        {'scheduled_time': 'not a time'},
+    ]
+    tutor_mask = grid.tutor_mask(grid.busy_mask(sessions))
+    starts = _starts(grid.suggest(availability, 60, k=10, tutor_mask=tutor_mask, step=30))
+    assert starts == [('2030-01-07', '09:00'), ('2030-01-07', '11:00')]
+
+
+def test_busy_session_without_duration_blocks_an_hour():
+    grid = SlotGrid(date(2030, 1, 6), days=2, now=NOW, tz=timezone.utc)
+    busy = grid.busy_mask([{'scheduled_time': '2030-01-07T09:00:00+00:00'}])
+    start = grid.offset(datetime(2030, 1, 7, 9, 0, tzinfo=timezone.utc))
+    assert busy == ((1 << 60) - 1) << start
+
+
+def test_utc_offset_day_uses_local_wall_clock():
+    # 09:00 in Toronto in January is 14:00 UTC
+    grid = SlotGrid(date(2030, 1, 6), days=3, now=NOW, tz=TORONTO)
+    availability = Availability.parse({'2030-01-07': ['09:00-10:00']})
+    busy_utc = {'scheduled_time': '2030-01-07T14:00:00+00:00', 'duration_minutes': 30}
+
+    [slot] = grid.suggest(availability, 60, k=5)
+    assert (slot['date'], slot['start_time']) == ('2030-01-07', '09:00')
+    assert datetime.fromisoformat(slot['scheduled_time']) == datetime(2030, 1, 7, 14, 0, tzinfo=timezone.utc)
+    assert grid.suggest(availability, 60, k=5, tutor_mask=grid.tutor_mask(grid.busy_mask([busy_utc]))) == []
+
+
+def test_session_late_in_utc_lands_on_previous_local_day():
+    grid = SlotGrid(date(2030, 1, 6), days=3, now=NOW, tz=TORONTO)
+    availability = Availability.parse({'2030-01-07': ['20:00-22:00']})
+    # 2030-01-08T02:00Z is 21:00 on the 7th in Toronto
+    busy = grid.busy_mask([{'scheduled_time': '2030-01-08T02:00:00Z', 'duration_minutes': 60}])
+    starts = _starts(grid.suggest(availability, 60, k=5, tutor_mask=grid.tutor_mask(busy), step=60))
+    assert starts == [('2030-01-07', '20:00')]
+
+
+@pytest.mark.parametrize('day, offset', [
+    ('2030-03-09', timedelta(hours=-5)),   # the day before clocks go forward
+    ('2030-03-10', timedelta(hours=-4)),   # spring forward at 02:00
+    ('2030-11-03', timedelta(hours=-5)),   # fall back at 02:00
+])
+def test_dst_days_keep_wall_clock_and_offset(day, offset):
+    first = date.fromisoformat(day) - timedelta(days=1)
+    now = datetime.combine(first, datetime.min.time(), tzinfo=timezone.utc)
+    grid = SlotGrid(first, days=3, now=now, tz=TORONTO)
+    availability = Availability.parse({day: ['09:00-10:00']})
+    [slot] = grid.suggest(availability, 60, k=5)
+    assert (slot['date'], slot['start_time']) == (day, '09:00')
+    assert datetime.fromisoformat(slot['scheduled_time']).utcoffset() == offset
+
+
+def test_dst_busy_session_maps_to_local_minutes():
+    # 2030-03-10 10:00 EDT == 14:00 UTC (it would be 15:00 UTC the day before)
+    grid = SlotGrid(date(2030, 3, 9), days=3, now=datetime(2030, 3, 9, tzinfo=timezone.utc), tz=TORONTO)
+    availability = Availability.parse({'2030-03-10': ['09:00-12:00']})
+    busy = grid.busy_mask([{'scheduled_time': '2030-03-10T14:00:00Z', 'duration_minutes': 60}])
+    starts = _starts(grid.suggest(availability, 60, k=5, tutor_mask=grid.tutor_mask(busy), step=60))
+    assert starts == [('2030-03-10', '09:00'), ('2030-03-10', '11:00')]
+
+
+def test_suggest_for_jobs_shares_tutor_constraints():
+    grid = SlotGrid(date(2030, 1, 6), days=3, now=NOW, tz=timezone.utc)
+    jobs = [
+        {'id': 'a', 'tutee_availability': {'2030-01-07': ['09:00-11:00']}, 'desired_duration_minutes': 60},
+        {'id': 'b', 'tutee_availability': {'2030-01-07': ['09:00-10:30']}, 'desired_duration_minutes': 90},
+        {'id': 'c', 'tutee_availability': 'garbage'},
+    ]
+    sessions = [{'scheduled_time': '2030-01-07T10:00:00Z', 'duration_minutes': 60}]
+    tutor_availability = Availability.parse({'2030-01-07': ['09:00-12:00']})
+    results = suggest_for_jobs(jobs, sessions, k=3, tutor_availability=tutor_availability, step=30, grid=grid)
+    assert _starts(results['a']) == [('2030-01-07', '09:00')]
+    assert results['b'] == []
+    assert results['c'] == []
+
+
+@pytest.fixture
+def tutor_client(monkeypatch):
+    import routes.tutor as tutor_routes
+    import utils.auth as auth
+
+    calls = []
+
+    def fake_suggest(tutor_id, job_ids, payload):
+        calls.append(job_ids)
+        return {job_id: [] for job_id in job_ids}, None
+
+    monkeypatch.setattr(auth, 'verify_token', lambda token: {'sub': 'user-1'})
+    monkeypatch.setattr(auth.RequestPrincipal, 'tutor_id', property(lambda self: 'tutor-1'))
+    monkeypatch.setattr(tutor_routes, '_suggest_times', fake_suggest)
+    app = Flask(__name__)
+    app.register_blueprint(tutor_routes.tutor_bp)
+    return app.test_client(), calls
+
+
+@pytest.mark.parametrize('count, status', [(0, 400), (1, 200), (100, 200), (101, 400)])
+def test_batch_is_capped_at_100_jobs(tutor_client, count, status):
+    client, calls = tutor_client
+    resp = client.post('/api/tutor/jobs/suggested-times', json={'job_ids': [f'j{i}' for i in range(count)]},
+                       headers={'Authorization': 'Bearer token'})
+    assert resp.status_code == status
+    assert len(calls) == (1 if status == 200 else 0)
+    if status == 200:
+        assert len(resp.get_json()['suggestions']) == count
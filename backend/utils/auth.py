@@ -2,10 +2,371 @@
 Authentication utilities for Flask backend
 """
 from functools import wraps
+from typing import Any, Dict, Optional
 from flask import request, jsonify
 from utils.db import get_supabase_client
+from utils.cache import TTLCache
+import hashlib
 import jwt
+import logging
 import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def _token_digest(token: Optional[str]) -> str:
+    return hashlib.sha256((token or '').encode('utf-8')).hexdigest()
+
+
+# ---------------------------------------------------------------------------
+# Local JWT verification
+# ---------------------------------------------------------------------------
+# Tokens are verified in-process before any database traffic:
+#   - HS256 with SUPABASE_JWT_SECRET when configured (legacy Supabase projects);
+#     without the secret, HS256 tokens are checked once by Supabase Auth
+#   - otherwise asymmetric keys from the project's JWKS endpoint, cached and
+#     refreshed every JWKS_CACHE_TTL seconds; an unknown kid forces a refetch
+#     at most once per JWKS_MIN_REFRESH_SECONDS and is rejected locally otherwise
+# Verified claims are cached by token digest until the token expires.
+_JWT_SECRET = os.environ.get('SUPABASE_JWT_SECRET')
+_JWT_AUDIENCE = os.environ.get('SUPABASE_JWT_AUDIENCE', 'authenticated') or None
+_JWT_LEEWAY = int(os.environ.get('JWT_LEEWAY_SECONDS', '30'))
+_JWT_VERIFY = os.environ.get('JWT_VERIFY_SIGNATURE', 'true').lower() not in ('0', 'false', 'no')
+_JWKS_URL = os.environ.get('SUPABASE_JWKS_URL') or (
+    f"{os.environ.get('SUPABASE_URL').rstrip('/')}/auth/v1/.well-known/jwks.json"
+    if os.environ.get('SUPABASE_URL') else None
+)
+_ASYMMETRIC_ALGS = ['RS256', 'ES256', 'EdDSA']
+_JWKS_MIN_REFRESH = int(os.environ.get('JWKS_MIN_REFRESH_SECONDS', '60'))
+
+_claims_cache = TTLCache(
+    max_size=int(os.environ.get('JWT_CLAIMS_CACHE_SIZE', '4096')),
+    ttl_seconds=int(os.environ.get('JWT_CLAIMS_CACHE_TTL', '3600')),
+)
+_jwks_client = None
+_jwks_refreshed_at = 0.0
+_jwks_lock = threading.Lock()
+_auth_fallback_warned = False
+
+if not _JWT_VERIFY:
+    logger.warning("JWT_VERIFY_SIGNATURE is disabled; bearer tokens are not verified")
+
+
+def _get_jwks_client():
+    global _jwks_client
+    if _jwks_client is None and _JWKS_URL:
+        _jwks_client = jwt.PyJWKClient(
+            _JWKS_URL,
+            cache_jwk_set=True,
+            lifespan=int(os.environ.get('JWKS_CACHE_TTL', '600')),
+            timeout=int(os.environ.get('JWKS_FETCH_TIMEOUT', '5')),
+        )
+    return _jwks_client
+
+
+def _signing_key(client, kid: Optional[str]):
+    """Key for kid from the cached JWKS; unknown kids refetch at most once per JWKS_MIN_REFRESH_SECONDS"""
+    global _jwks_refreshed_at
+    try:
+        key = client.match_kid(client.get_signing_keys(), kid)
+        if key is None:
+            with _jwks_lock:
+                if time.time() - _jwks_refreshed_at < _JWKS_MIN_REFRESH:
+                    raise jwt.InvalidTokenError(f'Unknown signing key: {kid}')
+                _jwks_refreshed_at = time.time()
+            key = client.match_kid(client.get_signing_keys(refresh=True), kid)
+    except jwt.PyJWKClientError as e:
+        raise jwt.InvalidTokenError(f'Signing key lookup failed: {e}')
+    if key is None:
+        raise jwt.InvalidTokenError(f'Unknown signing key: {kid}')
+    return key.key
+
+
+def _verify_with_auth_server(token: str) -> Dict[str, Any]:
+    """HS256 token without SUPABASE_JWT_SECRET: let Supabase Auth check the signature"""
+    global _auth_fallback_warned
+    if not _auth_fallback_warned:
+        _auth_fallback_warned = True
+        logger.warning("SUPABASE_JWT_SECRET is not set; HS256 tokens are verified through Supabase Auth "
+                       "(one request per new token). Set it to verify them locally.")
+    claims = jwt.decode(
+        token,
+        options={'verify_signature': False, 'verify_exp': True, 'require': ['exp', 'sub']},
+        leeway=_JWT_LEEWAY,
+    )
+    try:
+        res = get_supabase_client().auth.get_user(token)
+        user_id = getattr(getattr(res, 'user', None), 'id', None)
+    except Exception as e:
+        raise jwt.InvalidTokenError(f'Supabase Auth rejected the token: {e}')
+    if not user_id or str(user_id) != str(claims.get('sub')):
+        raise jwt.InvalidTokenError('Supabase Auth rejected the token')
+    return claims
+
+
+def verify_token(token: str) -> Dict[str, Any]:
+    """Verify a bearer token locally and return its claims.
+
+    Raises jwt.InvalidTokenError (or a subclass) when the token is malformed,
+    forged or expired. Successful results are cached until the token's exp.
+    """
+    digest = _token_digest(token)
+    now = time.time()
+    try:
+        cached = _claims_cache.get(digest)
+        if cached is not None and float(cached.get('exp') or 0) + _JWT_LEEWAY > now:
+            return dict(cached)
+    except Exception:
+        pass
+
+    if not _JWT_VERIFY:
+        # Explicit opt-out for local development only
+        return jwt.decode(token, options={'verify_signature': False})
+
+    header = jwt.get_unverified_header(token)
+    alg = header.get('alg')
+    if alg == 'HS256' and not _JWT_SECRET:
+        claims = _verify_with_auth_server(token)
+    else:
+        if alg == 'HS256':
+            key = _JWT_SECRET
+            algorithms = ['HS256']
+        elif alg in _ASYMMETRIC_ALGS:
+            client = _get_jwks_client()
+            if client is None:
+                raise jwt.InvalidTokenError('No JWKS endpoint configured')
+            key = _signing_key(client, header.get('kid'))
+            algorithms = [alg]
+        else:
+            raise jwt.InvalidAlgorithmError(f'Unsupported token algorithm: {alg}')
+
+        claims = jwt.decode(
+            token,
+            key,
+            algorithms=algorithms,
+            audience=_JWT_AUDIENCE,
+            leeway=_JWT_LEEWAY,
+            options={'require': ['exp', 'sub']},
+        )
+    try:
+        _claims_cache.set(digest, dict(claims))
+    except Exception:
+        pass
+    return claims
+
+
+# Cross-request cache of resolved accounts keyed by auth_id. Each entry remembers
+# the digest of the token it was resolved with, so a different (possibly forged)
+# token for the same subject never reuses another session's resolution.
+_account_cache = TTLCache(
+    max_size=int(os.environ.get('ACCOUNT_CACHE_SIZE', '1024')),
+    ttl_seconds=int(os.environ.get('ACCOUNT_CACHE_TTL', '30')),
+)
+
+
+def _empty_account() -> Dict[str, Any]:
+    return {
+        'role': None,
+        'admin_id': None,
+        'tutor_id': None,
+        'tutee_id': None,
+        'school_id': None,
+        'status': None,
+    }
+
+
+def _lookup_account(supabase, auth_id: str) -> Dict[str, Any]:
+    """Resolve role/profile ids for auth_id in one round trip.
+
+    Uses the resolve_account RPC (see schema.sql). Falls back to sequential
+    lookups when the function has not been deployed yet.
+    """
+    account = _empty_account()
+    try:
+        res = supabase.rpc('resolve_account', {'p_auth_id': auth_id}).execute()
+        rows = res.data if isinstance(res.data, list) else ([res.data] if res.data else [])
+        if rows:
+            row = rows[0] or {}
+            for k in account:
+                account[k] = row.get(k)
+        return account
+    except Exception:
+        pass
+
+    # Fallback: admin first, then tutor, then tutee
+    try:
+        a = supabase.table('admins').select('id, school_id').eq('auth_id', auth_id).limit(1).execute()
+        if a.data:
+            account.update({'role': 'admin', 'admin_id': a.data[0].get('id'), 'school_id': a.data[0].get('school_id')})
+            return account
+    except Exception:
+        pass
+    try:
+        t = supabase.table('tutors').select('id, school_id, status').eq('auth_id', auth_id).limit(1).execute()
+        if t.data:
+            account.update({'role': 'tutor', 'tutor_id': t.data[0].get('id'), 'school_id': t.data[0].get('school_id'), 'status': t.data[0].get('status')})
+            return account
+    except Exception:
+        pass
+    try:
+        te = supabase.table('tutees').select('id, school_id').eq('auth_id', auth_id).limit(1).execute()
+        if te.data:
+            account.update({'role': 'tutee', 'tutee_id': te.data[0].get('id'), 'school_id': te.data[0].get('school_id')})
+    except Exception:
+        pass
+    return account
+
+
+def resolve_account(auth_id: Optional[str] = None, token: Optional[str] = None) -> Dict[str, Any]:
+    """Return {role, admin_id, tutor_id, tutee_id, school_id, status} for auth_id.
+
+    Defaults to the current request's user and bearer token. Results are cached
+    across requests for ACCOUNT_CACHE_TTL seconds; call invalidate_account()
+    after mutating a user's role or status.
+    """
+    auth_id = auth_id or getattr(request, 'user_id', None)
+    if not auth_id:
+        return _empty_account()
+    if token is None:
+        auth_header = request.headers.get('Authorization') or ''
+        parts = auth_header.split()
+        token = parts[1] if len(parts) == 2 else None
+    digest = _token_digest(token)
+
+    try:
+        cached = _account_cache.get(auth_id)
+        if cached is not None and cached.get('token_digest') == digest:
+            return dict(cached['account'])
+    except Exception:
+        pass
+
+    account = _lookup_account(get_supabase_client(), auth_id)
+    # Do not cache "no role yet" so a freshly created account is picked up immediately
+    if account.get('role'):
+        try:
+            _account_cache.set(auth_id, {'token_digest': digest, 'account': dict(account)})
+        except Exception:
+            pass
+    return account
+
+
+def invalidate_account(auth_id: Optional[str]) -> None:
+    """Drop any cached account resolution and profile rows for auth_id."""
+    if not auth_id:
+        return
+    try:
+        _account_cache.set(auth_id, None)
+    except Exception:
+        pass
+    try:
+        _principal_cache.set(auth_id, None)
+    except Exception:
+        pass
+
+
+# Optional cross-request cache of full profile rows (tutors/tutees/admins).
+# Disabled by default (PRINCIPAL_CACHE_TTL=0) since rows carry mutable fields
+# such as volunteer_hours; per-request memoization always applies.
+_principal_cache_ttl = int(os.environ.get('PRINCIPAL_CACHE_TTL', '0'))
+_principal_cache = TTLCache(
+    max_size=int(os.environ.get('PRINCIPAL_CACHE_SIZE', '1024')),
+    ttl_seconds=_principal_cache_ttl,
+)
+
+_PROFILE_TABLES = {'tutor': 'tutors', 'tutee': 'tutees', 'admin': 'admins'}
+
+
+class RequestPrincipal:
+    """Lazily loaded caller identity attached to the request by require_auth.
+
+    Profile rows are fetched on first access and memoized for the rest of the
+    request, so handlers can read request.principal.tutor repeatedly without
+    issuing extra lookups.
+    """
+
+    def __init__(self, auth_id: str, token: Optional[str]):
+        self.auth_id = auth_id
+        self._token = token
+        self._account: Optional[Dict[str, Any]] = None
+        self._rows: Dict[str, Optional[Dict[str, Any]]] = {}
+
+    @property
+    def account(self) -> Dict[str, Any]:
+        if self._account is None:
+            self._account = resolve_account(self.auth_id, self._token)
+        return self._account
+
+    @property
+    def role(self) -> Optional[str]:
+        return self.account.get('role')
+
+    @property
+    def tutor_id(self) -> Optional[str]:
+        return self.account.get('tutor_id')
+
+    @property
+    def tutee_id(self) -> Optional[str]:
+        return self.account.get('tutee_id')
+
+    @property
+    def admin_id(self) -> Optional[str]:
+        return self.account.get('admin_id')
+
+    @property
+    def school_id(self) -> Optional[str]:
+        return self.account.get('school_id')
+
+    @property
+    def tutor(self) -> Optional[Dict[str, Any]]:
+        return self._load('tutor')
+
+    @property
+    def tutee(self) -> Optional[Dict[str, Any]]:
+        return self._load('tutee')
+
+    @property
+    def admin(self) -> Optional[Dict[str, Any]]:
+        return self._load('admin')
+
+    def invalidate(self) -> None:
+        """Forget memoized rows after the caller's own profile was modified."""
+        self._account = None
+        self._rows = {}
+        invalidate_account(self.auth_id)
+
+    def _load(self, kind: str) -> Optional[Dict[str, Any]]:
+        if kind in self._rows:
+            return self._rows[kind]
+        digest = _token_digest(self._token)
+        if _principal_cache_ttl > 0:
+            try:
+                cached = _principal_cache.get(self.auth_id)
+                if cached is not None and cached.get('token_digest') == digest and kind in cached['rows']:
+                    self._rows[kind] = cached['rows'][kind]
+                    return self._rows[kind]
+            except Exception:
+                pass
+        row = None
+        try:
+            supabase = get_supabase_client()
+            res = supabase.table(_PROFILE_TABLES[kind]).select('*').eq('auth_id', self.auth_id).limit(1).execute()
+            row = res.data[0] if res.data else None
+        except Exception:
+            row = None
+        self._rows[kind] = row
+        if _principal_cache_ttl > 0:
+            try:
+                cached = _principal_cache.get(self.auth_id)
+                if cached is None or cached.get('token_digest') != digest:
+                    cached = {'token_digest': digest, 'rows': {}}
+                cached['rows'][kind] = row
+                _principal_cache.set(self.auth_id, cached)
+            except Exception:
+                pass
+        return row
+
 
 def require_auth(f):
     """Decorator to require authentication for API endpoints"""
@@ -37,16 +398,21 @@ def require_auth(f):
         except IndexError:
             return jsonify({'error': 'Invalid authorization header format'}), 401
         
-        # Lightweight decode without trusting signature; RLS validation happens on DB calls
+        # Verify signature and expiry locally so bad tokens never reach the database
         try:
-            decoded_token = jwt.decode(token, options={"verify_signature": False})
+            decoded_token = verify_token(token)
             request.user_id = decoded_token.get('sub')
             request.user_email = decoded_token.get('email')
             if not request.user_id:
                 return jsonify({'error': 'Invalid token'}), 401
+        except jwt.ExpiredSignatureError:
+            return jsonify({'error': 'Token expired'}), 401
         except Exception as e:
             print(f"Auth decode error: {e}")
             return jsonify({'error': 'Invalid token'}), 401
+
+        # Lazily resolved caller profile; nothing is queried until accessed
+        request.principal = RequestPrincipal(request.user_id, token)
         
         return f(*args, **kwargs)
     return decorated_function
@@ -56,17 +422,18 @@ def require_admin(f):
     @wraps(f)
     @require_auth
     def decorated_function(*args, **kwargs):
-        # Check if user is an admin
+        # Check if user is an admin (resolved once, cached across requests)
         try:
-            supabase = get_supabase_client()
-            
-            result = supabase.table('admins').select('role').eq('auth_id', request.user_id).single().execute()
+            account = request.principal.account
             
-            if not result.data:
+            if account.get('role') != 'admin' or not account.get('admin_id'):
                 return jsonify({'error': 'Access denied: Admin role required'}), 403
             
-            # Store admin role in request context
-            request.user_role = result.data['role']
+            # Store admin role and identifiers in request context so handlers
+            # do not need to query admins again
+            request.user_role = account['role']
+            request.admin_id = account['admin_id']
+            request.admin_school_id = account.get('school_id')
             
         except Exception as e:
             print(f"Admin check error: {e}")
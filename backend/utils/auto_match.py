@@ -0,0 +1,507 @@
+"""
+Batch auto-matching of open opportunities to tutors
+
+Builds a min-cost max-flow problem and writes the result as proposals for
+admins to approve (match_proposals, schema.sql section 13):
+
+    source -> class -> [school hub ->] tutor -> sink
+
+- a class is a group of interchangeable opportunities: the same set of
+  eligible tutors (EligibilityIndex.eligible_tutors) and the same school.
+  Opportunities repeat heavily, so a 10k board collapses to a few thousand
+  classes. Cross-school arcs go through one hub node per eligible set
+  instead of class x tutor, which keeps the graph small
+- source -> class arcs, one per (priority, age bucket) tier, rank who gets
+  served when tutors are scarce: high priority first, then the longest-waiting
+- class -> tutor costs prefer a tutor from the tutee's school
+- each tutor has one unit arc to the sink per new assignment, with a
+  marginal cost that grows with their current load (active jobs). Convex
+  costs are what spread work out instead of piling it on the first eligible
+  tutor. Among otherwise equal tutors, fewer volunteer hours wins
+
+The flow is solved with the primal-dual method: Dijkstra over reduced costs,
+then a Dinic blocking flow along every zero-reduced-cost path at once, so the
+number of shortest-path rounds is bounded by the number of distinct path
+costs rather than by the number of assignments.
+
+CLI:
+    python -m utils.auto_match              # compute and store proposals
+    python -m utils.auto_match --dry-run    # print a summary only
+    python -m utils.auto_match --benchmark  # synthetic 10k x 2k instance (~3 s)
+"""
+
+import os
+import heapq
+import logging
+import uuid
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Tuple
+
+from utils.eligibility import EligibilityIndex
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# New assignments one tutor can receive per run, and their ceiling of active jobs
+MATCH_MAX_NEW_PER_TUTOR = int(os.environ.get('MATCH_MAX_NEW_PER_TUTOR', '2'))
+MATCH_MAX_ACTIVE_JOBS = int(os.environ.get('MATCH_MAX_ACTIVE_JOBS', '4'))
+
+# Cost weights (integers). Priority dominates age, age dominates school and load.
+# A common step keeps the number of distinct path costs, and so of solver rounds, small.
+PRIORITY_COST = {2: 0, 1: 400, 0: 800}
+AGE_STEP_COST = 60
+AGE_BUCKET_DAYS = 7
+AGE_BUCKETS = 4
+OTHER_SCHOOL_COST = 40
+LOAD_STEP_COST = 20
+
+ACTIVE_JOB_STATUSES = ('pending_tutee_scheduling', 'pending_tutor_scheduling', 'scheduled')
+
+_INF = float('inf')
+
+
+class MinCostFlow:
+    """Integer-cost min-cost max-flow on an edge-list graph (edge e pairs with e ^ 1)"""
+
+    def __init__(self, nodes: int):
+        self.n = nodes
+        self.adj: List[List[int]] = [[] for _ in range(nodes)]
+        self.to: List[int] = []
+        self.cap: List[int] = []
+        self.cost: List[int] = []
+
+    def add_edge(self, u: int, v: int, cap: int, cost: int) -> int:
+        e = len(self.to)
+        self.to += [v, u]
+        self.cap += [cap, 0]
+        self.cost += [cost, -cost]
+        self.adj[u].append(e)
+        self.adj[v].append(e + 1)
+        return e
+
+    def flow_on(self, e: int) -> int:
+        return self.cap[e ^ 1]
+
+    def _dijkstra(self, s: int, t: int, h: List[float]) -> List[float]:
+        to, cap, cost, adj = self.to, self.cap, self.cost, self.adj
+        dist = [_INF] * self.n
+        dist[s] = 0
+        heap = [(0, s)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            if u == t:
+                # Nodes beyond t cannot lie on a shortest path this round
+                break
+            hu = h[u]
+            for e in adj[u]:
+                if cap[e] > 0:
+                    v = to[e]
+                    nd = d + cost[e] + hu - h[v]
+                    if nd < dist[v]:
+                        dist[v] = nd
+                        heapq.heappush(heap, (nd, v))
+        return dist
+
+    def _levels(self, s: int, t: int, h: List[float]) -> Optional[List[int]]:
+        """BFS levels over the admissible (zero reduced cost) residual graph"""
+        to, cap, cost, adj = self.to, self.cap, self.cost, self.adj
+        level = [-1] * self.n
+        level[s] = 0
+        queue = deque([s])
+        while queue:
+            u = queue.popleft()
+            if level[t] >= 0 and level[u] >= level[t]:
+                # Only paths of the shortest length are augmented this round
+                break
+            hu = h[u]
+            for e in adj[u]:
+                v = to[e]
+                if cap[e] > 0 and level[v] < 0 and cost[e] + hu - h[v] == 0:
+                    level[v] = level[u] + 1
+                    queue.append(v)
+        return level if level[t] >= 0 else None
+
+    def _blocking_flow(self, s: int, t: int, h: List[float], level: List[int]) -> int:
+        to, cap, cost, adj = self.to, self.cap, self.cost, self.adj
+        it = [0] * self.n
+        total = 0
+        while True:
+            path: List[int] = []
+            u = s
+            while u != t:
+                edges = adj[u]
+                i, hu, lu = it[u], h[u], level[u] + 1
+                while i < len(edges):
+                    e = edges[i]
+                    v = to[e]
+                    if cap[e] > 0 and level[v] == lu and cost[e] + hu - h[v] == 0:
+                        break
+                    i += 1
+                it[u] = i
+                if i < len(edges):
+                    path.append(edges[i])
+                    u = to[edges[i]]
+                elif u == s:
+                    return total
+                else:
+                    # Dead end: drop the node and retreat one edge
+                    level[u] = -1
+                    u = to[path.pop() ^ 1]
+            pushed = min(cap[e] for e in path)
+            for e in path:
+                cap[e] -= pushed
+                cap[e ^ 1] += pushed
+            total += pushed
+
+    def solve(self, s: int, t: int) -> Tuple[int, int]:
+        """Maximum flow of minimum cost from s to t; returns (flow, cost). Costs must be >= 0."""
+        h: List[float] = [0] * self.n
+        flow = 0
+        while True:
+            dist = self._dijkstra(s, t, h)
+            reach = dist[t]
+            if reach == _INF:
+                break
+            # min(dist, dist[t]) keeps every residual reduced cost non-negative
+            for v in range(self.n):
+                h[v] += dist[v] if dist[v] < reach else reach
+            while True:
+                level = self._levels(s, t, h)
+                if level is None:
+                    break
+                flow += self._blocking_flow(s, t, h, level)
+        total_cost = sum(self.cost[e] * self.cap[e ^ 1] for e in range(0, len(self.to), 2))
+        return flow, total_cost
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    try:
+        ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+    except Exception:
+        return None
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def _priority_rank(value: Any) -> int:
+    return {'high': 2, 'normal': 1, 'low': 0}.get(str(value or 'normal').lower(), 1)
+
+
+def _age_bucket(created_at: Any, now: datetime) -> int:
+    ts = _parse_ts(created_at)
+    if ts is None:
+        return 0
+    return max(0, min(AGE_BUCKETS, int((now - ts).days // AGE_BUCKET_DAYS)))
+
+
+def tutor_capacity(active_jobs: int, max_new: int = MATCH_MAX_NEW_PER_TUTOR,
+                   max_active: int = MATCH_MAX_ACTIVE_JOBS) -> int:
+    return max(0, min(max_new, max_active - active_jobs))
+
+
+def marginal_cost(active_jobs: int, k: int) -> int:
+    """Cost of a tutor's (k+1)-th new assignment this run; increasing in k, so total cost is convex"""
+    return LOAD_STEP_COST * (active_jobs + k)
+
+
+def _hours(value: Any) -> float:
+    try:
+        return float(value or 0)
+    except Exception:
+        return 0.0
+
+
+def propose_matches(opportunities: List[Dict[str, Any]], tutors: List[Dict[str, Any]],
+                    approvals: Iterable[Dict[str, Any]], active_jobs: Dict[str, int],
+                    max_new: int = MATCH_MAX_NEW_PER_TUTOR, max_active: int = MATCH_MAX_ACTIVE_JOBS,
+                    now: Optional[datetime] = None) -> Dict[str, Any]:
+    """
+    Pure matching step
+
+    opportunities: open rows (id, subject_*, priority, created_at, school_id or tutee.school_id)
+    tutors: active rows (id, school_id, volunteer_hours)
+    approvals: approved subject_approvals rows
+    active_jobs: tutor_id -> count of active jobs
+    Returns {'proposals': [...], 'assigned': n, 'unassigned': n, 'cost': c, 'classes': n}
+    """
+    now = now or datetime.now(timezone.utc)
+    tutor_by_id = {t['id']: t for t in tutors if t.get('id')}
+    capacity = {tid: tutor_capacity(int(active_jobs.get(tid, 0)), max_new, max_active) for tid in tutor_by_id}
+
+    index = EligibilityIndex()
+    index.replace_all(a for a in approvals if capacity.get(a.get('tutor_id'), 0) > 0)
+
+    # Group interchangeable opportunities: same eligible tutors and same school.
+    # Within a class, priority and age only decide which members are served,
+    # so each (priority, age) tier is a parallel source arc instead of a node.
+    classes: Dict[Tuple[FrozenSet[str], Any], Dict[Tuple[int, int], List[Dict[str, Any]]]] = {}
+    eligible_memo: Dict[Tuple[str, str, str], FrozenSet[str]] = {}
+    for o in opportunities:
+        subject = (
+            str(o.get('subject_name') or '').strip().lower(),
+            str(o.get('subject_type') or ''),
+            str(o.get('subject_grade') or ''),
+        )
+        eligible = eligible_memo.get(subject)
+        if eligible is None:
+            eligible = eligible_memo[subject] = frozenset(index.eligible_tutors(o))
+        if not eligible:
+            continue
+        school_id = o.get('school_id') or (o.get('tutee') or {}).get('school_id')
+        tier = (_priority_rank(o.get('priority')), _age_bucket(o.get('created_at'), now))
+        classes.setdefault((eligible, school_id), {}).setdefault(tier, []).append(o)
+
+    tutor_ids = sorted((tid for tid, cap in capacity.items() if cap > 0),
+                       key=lambda tid: (_hours(tutor_by_id[tid].get('volunteer_hours')), tid))
+    tutor_node = {tid: i for i, tid in enumerate(tutor_ids)}
+    tutors_by_school: Dict[Any, List[str]] = {}
+    for tid in tutor_ids:
+        tutors_by_school.setdefault(tutor_by_id[tid].get('school_id'), []).append(tid)
+    class_keys = list(classes)
+    # Every school shares one hub per eligible set for its cross-school arcs, so
+    # a class has direct arcs only to its own school's tutors
+    hub_keys = list({eligible for eligible, _ in class_keys})
+    hub_index = {eligible: i for i, eligible in enumerate(hub_keys)}
+    source, sink = 0, 1
+    class_base = 2
+    hub_base = class_base + len(class_keys)
+    tutor_base = hub_base + len(hub_keys)
+    graph = MinCostFlow(tutor_base + len(tutor_ids))
+
+    # Tutors are numbered by volunteer hours and arcs added in that order, so among
+    # equal-cost tutors the blocking flow reaches the one with fewer hours first
+    tier_edges: List[List[Tuple[int, List[Dict[str, Any]]]]] = []
+    direct_edges: List[List[Tuple[int, str]]] = []
+    hub_in_edges: List[List[Tuple[int, int]]] = [[] for _ in hub_keys]
+    for ci, key in enumerate(class_keys):
+        eligible, school_id = key
+        node = class_base + ci
+        size = 0
+        tiers = []
+        for (rank, age), members in classes[key].items():
+            e = graph.add_edge(source, node, len(members), PRIORITY_COST[rank] + AGE_STEP_COST * (AGE_BUCKETS - age))
+            tiers.append((e, members))
+            size += len(members)
+        tier_edges.append(tiers)
+        edges = []
+        if school_id is not None:
+            for tid in tutors_by_school.get(school_id, ()):
+                if tid in eligible:
+                    edges.append((graph.add_edge(node, tutor_base + tutor_node[tid], size, 0), tid))
+        direct_edges.append(edges)
+        hi = hub_index[eligible]
+        hub_in_edges[hi].append((graph.add_edge(node, hub_base + hi, size, OTHER_SCHOOL_COST), ci))
+
+    # Hub arcs carry up to the tutor's whole capacity; only the tutor -> sink arcs bound it
+    hub_out_edges: List[List[Tuple[int, str]]] = []
+    for hi, eligible in enumerate(hub_keys):
+        hub_out_edges.append([
+            (graph.add_edge(hub_base + hi, tutor_base + tutor_node[tid], capacity[tid], 0), tid)
+            for tid in sorted(eligible, key=tutor_node.__getitem__)
+        ])
+
+    for tid in tutor_ids:
+        active = int(active_jobs.get(tid, 0))
+        for k in range(capacity[tid]):
+            graph.add_edge(tutor_base + tutor_node[tid], sink, 1, marginal_cost(active, k))
+
+    flow, total_cost = graph.solve(source, sink)
+
+    # Served members of each class: the oldest ones of every tier that received flow
+    served: List[List[Dict[str, Any]]] = []
+    for tiers in tier_edges:
+        picked: List[Dict[str, Any]] = []
+        for e, members in tiers:
+            count = graph.flow_on(e)
+            if count:
+                picked.extend(sorted(members, key=lambda o: str(o.get('created_at') or ''))[:count])
+        served.append(picked)
+
+    pairs: List[Tuple[int, str]] = []
+    for ci, edges in enumerate(direct_edges):
+        for e, tid in edges:
+            pairs.extend([(ci, tid)] * graph.flow_on(e))
+    # Any split of a hub's inflow across its outflow is optimal: every route through it costs the same
+    for hi in range(len(hub_keys)):
+        outflow = [tid for e, tid in hub_out_edges[hi] for _ in range(graph.flow_on(e))]
+        inflow = [ci for e, ci in hub_in_edges[hi] for _ in range(graph.flow_on(e))]
+        pairs.extend(zip(inflow, outflow))
+
+    proposals = []
+    cursor = [0] * len(class_keys)
+    for ci, tid in pairs:
+        o = served[ci][cursor[ci]]
+        cursor[ci] += 1
+        school_id = class_keys[ci][1]
+        proposals.append({
+            'opportunity_id': o.get('id'),
+            'tutor_id': tid,
+            'same_school': school_id is not None and tutor_by_id[tid].get('school_id') == school_id,
+            'tutor_active_jobs': int(active_jobs.get(tid, 0)),
+        })
+    return {
+        'proposals': proposals,
+        'assigned': flow,
+        'unassigned': len(opportunities) - flow,
+        'cost': total_cost,
+        'classes': len(class_keys),
+    }
+
+
+def _fetch_all(query_fn, page: int = 1000) -> List[Dict[str, Any]]:
+    rows: List[Dict[str, Any]] = []
+    start = 0
+    while True:
+        batch = query_fn().range(start, start + page - 1).execute().data or []
+        rows.extend(batch)
+        if len(batch) < page:
+            return rows
+        start += page
+
+
+def load_inputs(client) -> Dict[str, Any]:
+    """Everything the matcher reads, in a handful of paged queries (service role)"""
+    opportunities = _fetch_all(lambda: (
+        client.table('tutoring_opportunities')
+        .select('id, tutee_id, school_id, priority, subject_name, subject_type, subject_grade, created_at')
+        .eq('status', 'open')
+        .order('created_at')
+    ))
+    tutors = _fetch_all(lambda: (
+        client.table('tutors')
+        .select('id, school_id, volunteer_hours')
+        .eq('status', 'active')
+        .order('id')
+    ))
+    approvals = _fetch_all(lambda: (
+        client.table('subject_approvals')
+        .select('tutor_id, subject_name, subject_type, subject_grade')
+        .eq('status', 'approved')
+        .order('id')
+    ))
+    jobs = _fetch_all(lambda: (
+        client.table('tutoring_jobs')
+        .select('tutor_id')
+        .in_('status', list(ACTIVE_JOB_STATUSES))
+        .order('id')
+    ))
+    active_jobs: Dict[str, int] = {}
+    for j in jobs:
+        if j.get('tutor_id'):
+            active_jobs[j['tutor_id']] = active_jobs.get(j['tutor_id'], 0) + 1
+    return {'opportunities': opportunities, 'tutors': tutors, 'approvals': approvals, 'active_jobs': active_jobs}
+
+
+def save_proposals(client, proposals: List[Dict[str, Any]], run_id: Optional[str] = None) -> str:
+    """Replace pending proposals with this run's in one transaction; returns the run id
+
+    replace_match_proposals (schema.sql section 13) supersedes the old pending
+    rows and inserts these together, so a failed or overlapping run never
+    leaves admins with no proposals or a mix of two runs.
+    """
+    run_id = run_id or str(uuid.uuid4())
+    rows = [
+        {
+            'opportunity_id': p['opportunity_id'],
+            'tutor_id': p['tutor_id'],
+            'same_school': p['same_school'],
+            'tutor_active_jobs': p['tutor_active_jobs'],
+        }
+        for p in proposals
+    ]
+    client.rpc('replace_match_proposals', {'p_run_id': run_id, 'p_rows': rows}).execute()
+    return run_id
+
+
+def run_auto_match(client=None, dry_run: bool = False) -> Dict[str, Any]:
+    if client is None:
+        from utils.db import get_service_client
+        client = get_service_client()
+    if client is None:
+        raise RuntimeError('auto-matching needs SUPABASE_SERVICE_ROLE_KEY')
+    inputs = load_inputs(client)
+    result = propose_matches(inputs['opportunities'], inputs['tutors'], inputs['approvals'], inputs['active_jobs'])
+    if not dry_run and result['proposals']:
+        result['run_id'] = save_proposals(client, result['proposals'])
+    logger.info(
+        f"Auto-match: {result['assigned']} proposed, {result['unassigned']} unassigned "
+        f"({len(inputs['opportunities'])} open, {len(inputs['tutors'])} active tutors)"
+    )
+    return result
+
+
+# ---- benchmark -------------------------------------------------------------
+
+def _benchmark(opportunities: int = 10000, tutors: int = 2000) -> None:
+    import random
+    import time
+    from datetime import timedelta
+
+    rng = random.Random(11)
+    now = datetime(2030, 9, 1, tzinfo=timezone.utc)
+    names = [f"Subject {i}" for i in range(40)]
+    types = ['Academic', 'ALP', 'IB']
+    grades = ['9', '10', '11', '12']
+    schools = [str(uuid.uuid4()) for _ in range(12)]
+    tutor_rows = [
+        {'id': f"t{i}", 'school_id': rng.choice(schools), 'volunteer_hours': rng.randint(0, 80)}
+        for i in range(tutors)
+    ]
+    approvals = []
+    for t in tutor_rows:
+        for _ in range(rng.randint(2, 8)):
+            approvals.append({'tutor_id': t['id'], 'subject_name': rng.choice(names),
+                              'subject_type': rng.choice(types), 'subject_grade': rng.choice(grades)})
+    opp_rows = [
+        {
+            'id': f"o{i}",
+            'school_id': rng.choice(schools),
+            'priority': rng.choice(['low', 'normal', 'normal', 'high']),
+            'subject_name': rng.choice(names) + rng.choice(['', ' HL', ' SL']),
+            'subject_type': rng.choice(types),
+            'subject_grade': rng.choice(grades),
+            'created_at': (now - timedelta(hours=rng.randint(0, 24 * 40))).isoformat(),
+        }
+        for i in range(opportunities)
+    ]
+    active = {t['id']: rng.choice([0, 0, 1, 1, 2, 3]) for t in tutor_rows}
+
+    start = time.perf_counter()
+    result = propose_matches(opp_rows, tutor_rows, approvals, active, now=now)
+    elapsed = time.perf_counter() - start
+
+    per_tutor: Dict[str, int] = {}
+    for p in result['proposals']:
+        per_tutor[p['tutor_id']] = per_tutor.get(p['tutor_id'], 0) + 1
+    print(f"{opportunities} opportunities x {tutors} tutors, {result['classes']} classes")
+    print(f"proposed {result['assigned']}, unassigned {result['unassigned']}, cost {result['cost']}")
+    print(f"tutors used {len(per_tutor)}, max new per tutor {max(per_tutor.values() or [0])}")
+    print(f"solve time {elapsed:.2f} s")
+
+
+if __name__ == "__main__":
+    import argparse
+    import json
+
+    parser = argparse.ArgumentParser(description="Batch opportunity -> tutor matcher")
+    parser.add_argument('--dry-run', action='store_true', help="compute proposals without storing them")
+    parser.add_argument('--json', action='store_true', help="print the proposals as JSON")
+    parser.add_argument('--benchmark', action='store_true', help="solve a synthetic 10k x 2k instance")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+
+    if args.benchmark:
+        _benchmark()
+    else:
+        outcome = run_auto_match(dry_run=args.dry_run)
+        if args.json:
+            print(json.dumps(outcome['proposals'], indent=2))
+        print(f"Proposed {outcome['assigned']} matches, {outcome['unassigned']} left open"
+              + (f" (run {outcome['run_id']})" if outcome.get('run_id') else ''))
@@ -0,0 +1,265 @@
+"""
+Tutee availability as sorted integer intervals
+
+tutoring_jobs.tutee_availability is stored as
+``{"YYYY-MM-DD": ["HH:MM-HH:MM", ...]}``. Availability.parse validates that
+shape once and turns every day into a sorted, non-overlapping tuple of
+(start_minute, end_minute) pairs, minutes counted from midnight. After that:
+
+- fits() is a bisect over the day's intervals (O(log n))
+- union() / intersection() are linear merges of two sorted lists
+- to_json() writes the normalized form back (overlapping and touching ranges
+  merged, canonical HH:MM)
+- grid_mask() flattens a date range into one minute bitmask for slot search
+  (see utils/slot_search.py)
+
+Micro-benchmarks over a 14-day, 15-minute grid: python -m utils.availability
+"""
+
+import re
+from bisect import bisect_right
+from datetime import date
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+MINUTES_PER_DAY = 24 * 60
+
+Interval = Tuple[int, int]
+Intervals = Tuple[Interval, ...]
+
+# Single-digit minutes ('9:5') were accepted by the old int() parsing and may be stored
+_HHMM_RE = re.compile(r'^\s*(\d{1,2}):(\d{1,2})\s*$')
+# Canonical 'HH:MM' <-> minute tables; stored data is almost always canonical
+_HHMM_TEXT = [f"{m // 60:02d}:{m % 60:02d}" for m in range(MINUTES_PER_DAY + 1)]
+_HHMM_MINUTE = {text: m for m, text in enumerate(_HHMM_TEXT)}
+
+
+class AvailabilityError(ValueError):
+    pass
+
+
+def parse_hhmm(value: str) -> int:
+    """'HH:MM' -> minutes since midnight (24:00 allowed as an end of day)"""
+    minute = _HHMM_MINUTE.get(value)
+    if minute is not None:
+        return minute
+    match = _HHMM_RE.match(value or '')
+    if not match:
+        raise ValueError(value)
+    hours, minutes = int(match.group(1)), int(match.group(2))
+    if minutes > 59 or hours * 60 + minutes > MINUTES_PER_DAY:
+        raise ValueError(value)
+    return hours * 60 + minutes
+
+
+def format_hhmm(minute: int) -> str:
+    return _HHMM_TEXT[minute]
+
+
+def normalize(intervals: Iterable[Interval]) -> Intervals:
+    """Sort and merge overlapping or touching intervals; drop empty ones"""
+    merged: List[List[int]] = []
+    for start, end in sorted(intervals):
+        if end <= start:
+            continue
+        if merged and start <= merged[-1][1]:
+            if end > merged[-1][1]:
+                merged[-1][1] = end
+        else:
+            merged.append([start, end])
+    return tuple((s, e) for s, e in merged)
+
+
+def union(a: Sequence[Interval], b: Sequence[Interval]) -> Intervals:
+    return normalize(list(a) + list(b))
+
+
+def intersection(a: Sequence[Interval], b: Sequence[Interval]) -> Intervals:
+    """Two-pointer sweep over two normalized interval lists"""
+    out: List[Interval] = []
+    i = j = 0
+    while i < len(a) and j < len(b):
+        start = max(a[i][0], b[j][0])
+        end = min(a[i][1], b[j][1])
+        if start < end:
+            out.append((start, end))
+        if a[i][1] < b[j][1]:
+            i += 1
+        else:
+            j += 1
+    return tuple(out)
+
+
+def fits(intervals: Sequence[Interval], start: int, duration: int) -> bool:
+    """True if [start, start + duration) lies inside one normalized interval"""
+    # Last interval starting at or before `start` is the only candidate
+    idx = bisect_right(intervals, (start, MINUTES_PER_DAY + 1)) - 1
+    return idx >= 0 and start + duration <= intervals[idx][1]
+
+
+class Availability:
+    """Per-day normalized intervals keyed by ISO date string"""
+
+    __slots__ = ('days',)
+
+    def __init__(self, days: Optional[Dict[str, Intervals]] = None):
+        self.days: Dict[str, Intervals] = days or {}
+
+    @classmethod
+    def parse(cls, raw: Any, strict: bool = True) -> 'Availability':
+        """
+        Build from the stored/posted JSON shape
+
+        With strict=True malformed input raises AvailabilityError (message is
+        suitable for a 400 response). With strict=False malformed dates and
+        ranges are skipped, which is how previously stored data is read.
+        """
+        if not isinstance(raw, dict):
+            if strict:
+                raise AvailabilityError('availability must be an object of date->time ranges')
+            return cls()
+        days: Dict[str, Intervals] = {}
+        for date_str, ranges in raw.items():
+            try:
+                y, m, d = map(int, str(date_str).split('-'))
+                key = date(y, m, d).isoformat()
+            except Exception:
+                if strict:
+                    raise AvailabilityError(f'Invalid date key: {date_str}')
+                continue
+            if not isinstance(ranges, list):
+                if strict:
+                    raise AvailabilityError(f'Ranges for {date_str} must be a list')
+                continue
+            parsed: List[Interval] = []
+            for r in ranges:
+                if not isinstance(r, str) or r.count('-') != 1:
+                    if strict:
+                        raise AvailabilityError(f'Invalid time range format for {date_str}: {r}')
+                    continue
+                start_s, end_s = r.split('-')
+                try:
+                    start, end = parse_hhmm(start_s), parse_hhmm(end_s)
+                except ValueError:
+                    if strict:
+                        raise AvailabilityError(f'Invalid HH:MM in range for {date_str}: {r}')
+                    continue
+                if end <= start:
+                    if strict:
+                        raise AvailabilityError(f'End must be after start for {date_str}: {r}')
+                    continue
+                parsed.append((start, end))
+            intervals = normalize(parsed)
+            if intervals:
+                days[key] = union(days.get(key, ()), intervals) if key in days else intervals
+        return cls(days)
+
+    def __bool__(self) -> bool:
+        return bool(self.days)
+
+    def has_day(self, date_key: str) -> bool:
+        return bool(self.days.get(date_key))
+
+    def intervals(self, date_key: str) -> Intervals:
+        return self.days.get(date_key, ())
+
+    def fits(self, date_key: str, start_minute: int, duration_minutes: int) -> bool:
+        return fits(self.days.get(date_key, ()), start_minute, duration_minutes)
+
+    def union(self, other: 'Availability') -> 'Availability':
+        days = dict(self.days)
+        for key, intervals in other.days.items():
+            days[key] = union(days[key], intervals) if key in days else intervals
+        return Availability(days)
+
+    def intersection(self, other: 'Availability') -> 'Availability':
+        days = {}
+        for key in self.days.keys() & other.days.keys():
+            common = intersection(self.days[key], other.days[key])
+            if common:
+                days[key] = common
+        return Availability(days)
+
+    def grid_mask(self, first_day: date, days: int) -> int:
+        """Bitmask over a minute grid starting at first_day's midnight: bit i set = minute i free"""
+        mask = 0
+        for offset in range(days):
+            key = date.fromordinal(first_day.toordinal() + offset).isoformat()
+            base = offset * MINUTES_PER_DAY
+            for start, end in self.days.get(key, ()):
+                mask |= ((1 << (end - start)) - 1) << (base + start)
+        return mask
+
+    def to_json(self) -> Dict[str, List[str]]:
+        """Normalized stored form, dates in order"""
+        return {
+            key: [f"{_HHMM_TEXT[s]}-{_HHMM_TEXT[e]}" for s, e in self.days[key]]
+            for key in sorted(self.days)
+        }
+
+
+# ---- benchmark -------------------------------------------------------------
+
+def _legacy_validate(availability: Dict[str, List[str]]) -> bool:
+    """The per-request string validation set_tutee_availability used to do"""
+    for date_str, ranges in availability.items():
+        y, m, d = map(int, date_str.split('-'))
+        for r in ranges:
+            start_s, end_s = r.split('-')
+            sh, sm = map(int, start_s.split(':'))
+            eh, em = map(int, end_s.split(':'))
+            if (eh, em) <= (sh, sm):
+                return False
+    return True
+
+
+def _legacy_fits(ranges: List[str], start_hhmm: str, duration_minutes: int) -> bool:
+    """The string comparison schedule_job used to do"""
+    def one(r: str) -> bool:
+        s, e = r.split('-')
+        sh, sm = map(int, start_hhmm.split(':'))
+        em = sm + duration_minutes
+        end_hhmm = f"{sh + em // 60:02d}:{em % 60:02d}"
+        return s <= start_hhmm and end_hhmm <= e
+    return any(one(r) for r in ranges)
+
+
+def _benchmark(days: int = 14, step: int = 15, rounds: int = 20) -> None:
+    import time
+    from datetime import timedelta
+
+    first = date(2030, 1, 7)
+    # Worst case for a 15-minute grid: every other slot free between 08:00 and 22:00
+    raw = {
+        (first + timedelta(days=i)).isoformat(): [
+            f"{format_hhmm(m)}-{format_hhmm(m + step)}" for m in range(8 * 60, 22 * 60, 2 * step)
+        ]
+        for i in range(days)
+    }
+    other = {
+        key: [f"{format_hhmm(m)}-{format_hhmm(m + 3 * step)}" for m in range(9 * 60, 21 * 60, 4 * step)]
+        for key in raw
+    }
+    starts = [(key, m) for key in raw for m in range(0, MINUTES_PER_DAY, step)]
+    parsed = Availability.parse(raw)
+    parsed_other = Availability.parse(other)
+
+    def timed(label: str, fn, ops: int) -> None:
+        start = time.perf_counter()
+        for _ in range(rounds):
+            fn()
+        per_op = (time.perf_counter() - start) / (rounds * ops) * 1e6
+        print(f"{label:>36}: {per_op:8.3f} us/op")
+
+    print(f"{days} days x {MINUTES_PER_DAY // step} slots, "
+          f"{sum(len(v) for v in raw.values())} ranges, {len(starts)} fit checks per round")
+    timed('legacy validate (per payload)', lambda: _legacy_validate(raw), 1)
+    timed('parse + normalize (per payload)', lambda: Availability.parse(raw), 1)
+    timed('legacy fits (strings)', lambda: [_legacy_fits(raw[k], format_hhmm(m), 60) for k, m in starts], len(starts))
+    timed('fits (bisect)', lambda: [parsed.fits(k, m, 60) for k, m in starts], len(starts))
+    timed('union (per payload)', lambda: parsed.union(parsed_other), 1)
+    timed('intersection (per payload)', lambda: parsed.intersection(parsed_other), 1)
+    timed('to_json (per payload)', parsed.to_json, 1)
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,184 @@
+"""
+Per-tutor index of booked session intervals
+
+schedule_job used to check only the tutee's availability, so nothing stopped
+a tutor from booking two overlapping sessions. Each tutor's scheduled
+sessions are loaded with one query into a TutorBookings: starts kept sorted,
+plus a running maximum of ends, so an overlap check is a single bisect
+(O(log n)). The index is cached per tutor and updated in place when a
+session is scheduled or cancelled.
+
+The index is a fast pre-check local to one process. A cached index may still
+hold sessions that another worker has since cancelled or completed, so a
+clash found there is confirmed against a fresh load before it is reported.
+The authority is the tutoring_jobs_no_tutor_overlap exclusion constraint on
+session_period (schema.sql section 11); a write that loses a race to another
+worker fails there with SQLSTATE 23P01 (see is_overlap_error).
+"""
+
+import os
+import logging
+import threading
+from bisect import bisect_left, insort
+from datetime import datetime, timedelta, timezone
+from typing import Any, List, Optional, Tuple
+
+from utils.cache import TTLCache
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+OVERLAP_CONSTRAINT = 'tutoring_jobs_no_tutor_overlap'
+
+# Other workers can book too; a short TTL bounds how stale a cached index gets
+_indexes = TTLCache(max_size=1024, ttl_seconds=int(os.environ.get('BOOKING_INDEX_TTL', '300')))
+_lock = threading.Lock()
+
+
+def _parse_ts(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        ts = value
+    else:
+        try:
+            ts = datetime.fromisoformat(str(value).replace('Z', '+00:00'))
+        except Exception:
+            return None
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+class TutorBookings:
+    """Sorted [start, end) intervals of one tutor's scheduled sessions"""
+
+    def __init__(self, sessions: Optional[List[Tuple[datetime, datetime, str]]] = None):
+        self._items: List[Tuple[datetime, datetime, str]] = sorted(sessions or [])
+        self._reach: List[datetime] = []
+        self._rebuild()
+
+    def _rebuild(self) -> None:
+        # _reach[i] = latest end among the first i+1 sessions, so one bisect answers overlap
+        # queries even if legacy rows overlap each other
+        self._reach = []
+        for _, end, _ in self._items:
+            self._reach.append(end if not self._reach or end > self._reach[-1] else self._reach[-1])
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def conflict(self, start: datetime, end: datetime, exclude_job_id: Optional[str] = None) -> Optional[str]:
+        """Job id of a booked session overlapping [start, end), or None"""
+        # Sessions starting before `end` are the only candidates
+        idx = bisect_left(self._items, (end,)) - 1
+        if idx < 0 or self._reach[idx] <= start:
+            return None
+        # Rare path: walk back through the candidates that reach past `start`
+        while idx >= 0 and self._reach[idx] > start:
+            s, e, job_id = self._items[idx]
+            if e > start and s < end and job_id != exclude_job_id:
+                return job_id
+            idx -= 1
+        return None
+
+    def add(self, job_id: str, start: datetime, end: datetime) -> None:
+        self.remove(job_id)
+        insort(self._items, (start, end, job_id))
+        self._rebuild()
+
+    def remove(self, job_id: str) -> bool:
+        before = len(self._items)
+        self._items = [item for item in self._items if item[2] != job_id]
+        if len(self._items) != before:
+            self._rebuild()
+            return True
+        return False
+
+
+def session_bounds(scheduled_time: Any, duration_minutes: Any) -> Optional[Tuple[datetime, datetime]]:
+    start = _parse_ts(scheduled_time)
+    try:
+        minutes = int(duration_minutes or 0)
+    except Exception:
+        return None
+    if start is None or minutes <= 0:
+        return None
+    return start, start + timedelta(minutes=minutes)
+
+
+def load_tutor_bookings(client, tutor_id: str) -> TutorBookings:
+    """Build a tutor's index with one query over their scheduled sessions"""
+    res = (
+        client
+        .table('tutoring_jobs')
+        .select('id, scheduled_time, duration_minutes')
+        .eq('tutor_id', tutor_id)
+        .eq('status', 'scheduled')
+        .execute()
+    )
+    sessions = []
+    for row in res.data or []:
+        bounds = session_bounds(row.get('scheduled_time'), row.get('duration_minutes'))
+        if bounds:
+            sessions.append((bounds[0], bounds[1], row.get('id')))
+    return TutorBookings(sessions)
+
+
+def _reload(client, tutor_id: str) -> TutorBookings:
+    # Query outside the lock; a concurrent load for the same tutor just wins or loses the set
+    index = load_tutor_bookings(client, tutor_id)
+    with _lock:
+        _indexes.set(tutor_id, index)
+    return index
+
+
+def get_tutor_bookings(client, tutor_id: str) -> TutorBookings:
+    with _lock:
+        index = _indexes.get(tutor_id)
+    return index if index is not None else _reload(client, tutor_id)
+
+
+def find_conflict(client, tutor_id: str, start: datetime, end: datetime,
+                  exclude_job_id: Optional[str] = None) -> Optional[str]:
+    """Job id of a scheduled session overlapping [start, end), or None
+
+    A free slot in the cached index is trusted (the exclusion constraint backs
+    it up). A clash there is re-checked against the database, since the cached
+    session may have been cancelled, completed or deleted elsewhere.
+    """
+    with _lock:
+        index = _indexes.get(tutor_id)
+        clash = index.conflict(start, end, exclude_job_id) if index is not None else None
+    if index is not None and clash is None:
+        return None
+    index = _reload(client, tutor_id)
+    with _lock:
+        return index.conflict(start, end, exclude_job_id)
+
+
+def record_booking(tutor_id: str, job_id: str, start: datetime, end: datetime) -> None:
+    """Keep a cached index current after a session is scheduled"""
+    with _lock:
+        index = _indexes.get(tutor_id)
+        if index is not None:
+            index.add(job_id, start, end)
+
+
+def release_booking(tutor_id: Optional[str], job_id: str) -> None:
+    """Keep a cached index current after a session is cancelled or completed"""
+    if not tutor_id:
+        return
+    with _lock:
+        index = _indexes.get(tutor_id)
+        if index is not None:
+            index.remove(job_id)
+
+
+def invalidate_tutor(tutor_id: Optional[str]) -> None:
+    if tutor_id:
+        with _lock:
+            _indexes.set(tutor_id, None)
+
+
+def is_overlap_error(error: Exception) -> bool:
+    """True for the exclusion-constraint violation raised by a racing double booking"""
+    code = getattr(error, 'code', None)
+    text = str(error)
+    return code == '23P01' or '23P01' in text or OVERLAP_CONSTRAINT in text
@@ -1,5 +1,6 @@
 import time
-from typing import Any, Callable, Optional, Tuple, Dict
+import threading
+from typing import Any, Callable, Optional, Tuple, Dict, Iterable
 from collections import OrderedDict
 
 
@@ -46,3 +47,72 @@ class TTLCache:
                 break
 
 
+
+class SectionCache:
+    """Per-section TTLs with tag invalidation for pages assembled from several queries.
+
+    Each entry is (scope, section) -> value. A section declares its TTL and the
+    tags (table names) it depends on; invalidate(tag) drops every entry built
+    from that tag in all scopes, so a change to one table only forces the
+    sections that read it to be rebuilt.
+
+    Thread-safe: request threads and the change-event listener share it.
+    Builders run outside the lock.
+    """
+
+    def __init__(self, max_size: int = 512):
+        self.max_size = max_size
+        self._store: OrderedDict[Tuple[str, str], Tuple[float, float, Dict[str, int], Any]] = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._lock = threading.Lock()
+
+    def get(self, scope: str, section: str) -> Optional[Tuple[float, Any]]:
+        """(fetched_at, value) while fresh, else None"""
+        key = (scope, section)
+        with self._lock:
+            entry = self._store.get(key)
+            if not entry:
+                return None
+            fetched_at, expires_at, generations, value = entry
+            if time.time() > expires_at or any(self._generations.get(t, 0) != g for t, g in generations.items()):
+                self._store.pop(key, None)
+                return None
+            try:
+                self._store.move_to_end(key)
+            except KeyError:
+                pass
+            return fetched_at, value
+
+    def set(self, scope: str, section: str, value: Any, ttl_seconds: float, tags: Iterable[str] = ()) -> None:
+        self._put(scope, section, value, ttl_seconds, self._snapshot(tags), time.time())
+
+    def invalidate(self, tag: str) -> None:
+        with self._lock:
+            self._generations[tag] = self._generations.get(tag, 0) + 1
+
+    def get_or_build(self, scope: str, section: str, builder: Callable[[], Any], ttl_seconds: float, tags: Iterable[str] = ()) -> Tuple[float, Any, bool]:
+        """(fetched_at, value, rebuilt) - runs builder only when the cached section is stale"""
+        hit = self.get(scope, section)
+        if hit is not None:
+            return hit[0], hit[1], False
+        # Snapshot before building so a change that lands mid-build still invalidates the result
+        generations = self._snapshot(tags)
+        fetched_at = time.time()
+        value = builder()
+        self._put(scope, section, value, ttl_seconds, generations, fetched_at)
+        return fetched_at, value, True
+
+    def _snapshot(self, tags: Iterable[str]) -> Dict[str, int]:
+        with self._lock:
+            return {t: self._generations.get(t, 0) for t in tags}
+
+    def _put(self, scope: str, section: str, value: Any, ttl_seconds: float, generations: Dict[str, int], fetched_at: float) -> None:
+        key = (scope, section)
+        with self._lock:
+            self._store[key] = (fetched_at, fetched_at + ttl_seconds, generations, value)
+            self._store.move_to_end(key)
+            while len(self._store) > self.max_size:
+                try:
+                    self._store.popitem(last=False)
+                except KeyError:
+                    break
@@ -2,6 +2,7 @@ import os
 import logging
 import time
 from collections import OrderedDict
+from flask import has_request_context
 from supabase import create_client, Client
 from typing import Dict, List, Any, Optional, Tuple
 
@@ -175,4 +176,29 @@ def get_db_manager() -> DatabaseManager:
     return mgr
 
 
-# Removed service-role admin client to avoid bypassing RLS.
\ No newline at end of file
+_service_client: Optional[Client] = None
+
+
+def get_service_client() -> Optional[Client]:
+    """Return a service-role client for background workers, or None if not configured.
+
+    Only for threads and CLI entry points that run outside a user request
+    (email outbox writer/workers, reminder scheduler, eligibility preload,
+    storage GC, auto-match). Request handlers must use get_supabase_client()
+    so RLS stays enforced; calling this inside a request raises.
+    """
+    global _service_client
+    if has_request_context():
+        raise RuntimeError("get_service_client() must not be used while handling a request")
+    if _service_client is not None:
+        return _service_client
+    url = os.environ.get("SUPABASE_URL")
+    service_key = os.environ.get("SUPABASE_SERVICE_ROLE_KEY")
+    if not url or not service_key:
+        return None
+    try:
+        _service_client = create_client(url, service_key)
+    except Exception as e:
+        logger.error(f"Failed to initialize Supabase service client: {str(e)}")
+        return None
+    return _service_client
@@ -0,0 +1,103 @@
+"""
+Delta sync helpers for dashboard endpoints (?since=<cursor>)
+
+Every dashboard response carries a `cursor`. Passing it back as `since`
+returns only rows inserted or updated after it, plus `removed` ids for rows
+that were deleted. Jobs and opportunities are hard-deleted on accept,
+complete and cancel, so deletions come from change_tombstones, which is
+filled by an AFTER DELETE trigger (schema.sql section 15).
+
+Cursor semantics:
+- a cursor is the server time the response started being built, minus
+  SYNC_OVERLAP_SECONDS, so a write that committed while the response was
+  being built is returned again next time rather than lost. Clients apply
+  rows idempotently by id: removals first, then upserts
+- a cursor older than TOMBSTONE_RETENTION_HOURS cannot be served (its
+  tombstones may be pruned); the endpoint answers with a full payload and
+  `delta: false`, which clients treat as a reset
+- the same happens when more than SYNC_DELTA_LIMIT rows (or
+  SYNC_REMOVED_LIMIT removed ids) changed in a section: a truncated delta
+  would skip rows for good once the client advanced its cursor
+"""
+
+import os
+import base64
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional
+
+SYNC_OVERLAP_SECONDS = int(os.environ.get('SYNC_OVERLAP_SECONDS', '5'))
+# Must stay below the tombstone retention in schema.sql (7 days)
+TOMBSTONE_RETENTION_HOURS = int(os.environ.get('TOMBSTONE_RETENTION_HOURS', '72'))
+SYNC_DELTA_LIMIT = int(os.environ.get('SYNC_DELTA_LIMIT', '500'))
+SYNC_REMOVED_LIMIT = int(os.environ.get('SYNC_REMOVED_LIMIT', '5000'))
+
+
+class DeltaTooLarge(Exception):
+    """More changes than one delta carries; the endpoint sends a full payload instead"""
+
+
+def new_cursor(started_at: Optional[datetime] = None) -> str:
+    started_at = started_at or datetime.now(timezone.utc)
+    value = (started_at - timedelta(seconds=SYNC_OVERLAP_SECONDS)).isoformat()
+    return base64.urlsafe_b64encode(value.encode('ascii')).decode('ascii').rstrip('=')
+
+
+def parse_since(value: Optional[str]) -> Optional[datetime]:
+    """Cursor -> aware datetime; None when absent. Raises ValueError on garbage."""
+    if not value:
+        return None
+    padded = value + '=' * (-len(value) % 4)
+    try:
+        text = base64.urlsafe_b64decode(padded.encode('ascii')).decode('ascii')
+        ts = datetime.fromisoformat(text)
+    except Exception:
+        raise ValueError('invalid since cursor')
+    return ts if ts.tzinfo is not None else ts.replace(tzinfo=timezone.utc)
+
+
+def is_servable(since: datetime) -> bool:
+    now = datetime.now(timezone.utc)
+    return now - timedelta(hours=TOMBSTONE_RETENTION_HOURS) < since <= now + timedelta(minutes=5)
+
+
+def changed_since(query, since: datetime, column: str = 'updated_at'):
+    """Restrict a PostgREST query to rows written after the cursor"""
+    return query.gt(column, since.isoformat())
+
+
+def fetch_changes(query) -> List[Dict[str, Any]]:
+    """Run a changed_since() query; raises DeltaTooLarge past SYNC_DELTA_LIMIT rows"""
+    rows = query.limit(SYNC_DELTA_LIMIT + 1).execute().data or []
+    if len(rows) > SYNC_DELTA_LIMIT:
+        raise DeltaTooLarge()
+    return rows
+
+
+def removed_ids(client, since: datetime, tables: Iterable[str], **scope: Any) -> List[str]:
+    """Ids deleted from any of `tables` after the cursor, optionally scoped (tutor_id=..., tutee_id=...)"""
+    q = (
+        client
+        .table('change_tombstones')
+        .select('row_id')
+        .in_('table_name', list(tables))
+        .gt('deleted_at', since.isoformat())
+    )
+    for column, value in scope.items():
+        if value is not None:
+            q = q.eq(column, value)
+    res = q.order('deleted_at').limit(SYNC_REMOVED_LIMIT + 1).execute()
+    if len(res.data or []) > SYNC_REMOVED_LIMIT:
+        raise DeltaTooLarge()
+    seen: Dict[str, None] = {}
+    for row in res.data or []:
+        if row.get('row_id'):
+            seen[row['row_id']] = None
+    return list(seen)
+
+
+def split_closed(rows: List[Dict[str, Any]], open_status: str = 'open'):
+    """Board rows that changed but left `open_status` are removals for a board view"""
+    still_open, closed = [], []
+    for row in rows:
+        (still_open if row.get('status') == open_status else closed).append(row)
+    return still_open, [row.get('id') for row in closed]
@@ -0,0 +1,231 @@
+"""
+In-memory subject-approval eligibility index
+
+A tutor may take an opportunity when they hold an approved subject_approvals
+row with the same subject_type and subject_grade whose subject_name is
+contained in the opportunity's subject_name (case-insensitive). Containment
+lets a base approval like "Chemistry" cover "Chemistry HL" or "Chemistry (ELL)".
+
+The index keeps, per (subject_type, subject_grade), every approved base name
+and the tutors holding it. Opportunity names repeat heavily, so the
+substring scan for a given (name, type, grade) is memoized; after that an
+eligibility check is a set lookup.
+
+Loading:
+- load_all(client) reads every approved row in one query (service role;
+  approvals RLS only shows tutors their own rows), run at startup by
+  start_eligibility_preload() rather than inside a request
+- without it, a tutor's rows are loaded on first use with the request client
+- admin approval writes call approve()/revoke() so this process is current
+  at once; other workers pick changes up within ELIGIBILITY_INDEX_TTL
+"""
+
+import os
+import logging
+import threading
+import time
+from typing import Any, Dict, FrozenSet, Iterable, List, Optional, Set, Tuple
+
+from utils.db import get_service_client
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+ELIGIBILITY_INDEX_TTL = int(os.environ.get('ELIGIBILITY_INDEX_TTL', '300'))
+
+Bucket = Tuple[str, str]  # (subject_type, subject_grade)
+
+
+def _norm_name(value: Any) -> str:
+    return str(value or '').strip().lower()
+
+
+def _bucket(subject_type: Any, subject_grade: Any) -> Bucket:
+    return (str(subject_type or '').strip(), str(subject_grade or '').strip())
+
+
+class EligibilityIndex:
+    """Approved (type, grade, base name) -> tutor ids, plus the reverse map"""
+
+    def __init__(self):
+        self._tutors_by_key: Dict[Bucket, Dict[str, Set[str]]] = {}
+        self._keys_by_tutor: Dict[str, Set[Tuple[str, str, str]]] = {}
+        self._loaded_at: Dict[str, float] = {}
+        self._all_loaded_at = 0.0
+        # (opportunity name, type, grade) -> base names it contains
+        self._match_memo: Dict[Tuple[str, str, str], FrozenSet[str]] = {}
+        self._lock = threading.RLock()
+
+    # ---- maintenance -------------------------------------------------------
+
+    def _add(self, tutor_id: str, name: str, bucket: Bucket) -> None:
+        names = self._tutors_by_key.setdefault(bucket, {})
+        if name not in names:
+            names[name] = set()
+            # A new base name can change which names an opportunity contains
+            self._match_memo.clear()
+        names[name].add(tutor_id)
+        self._keys_by_tutor.setdefault(tutor_id, set()).add((name,) + bucket)
+
+    def _discard(self, tutor_id: str, name: str, bucket: Bucket) -> None:
+        holders = self._tutors_by_key.get(bucket, {}).get(name)
+        if holders is not None:
+            holders.discard(tutor_id)
+        keys = self._keys_by_tutor.get(tutor_id)
+        if keys is not None:
+            keys.discard((name,) + bucket)
+
+    def _replace_tutor(self, tutor_id: str, rows: Iterable[Dict[str, Any]]) -> None:
+        for name, subject_type, grade in list(self._keys_by_tutor.get(tutor_id, ())):
+            self._discard(tutor_id, name, (subject_type, grade))
+        self._keys_by_tutor[tutor_id] = set()
+        for row in rows:
+            name = _norm_name(row.get('subject_name'))
+            if name:
+                self._add(tutor_id, name, _bucket(row.get('subject_type'), row.get('subject_grade')))
+        self._loaded_at[tutor_id] = time.time()
+
+    def load_all(self, client=None) -> int:
+        """Bulk (re)load every approved row; returns the number of rows"""
+        client = client or get_service_client()
+        if client is None:
+            return 0
+        rows: List[Dict[str, Any]] = []
+        page, start = 1000, 0
+        while True:
+            res = (
+                client
+                .table('subject_approvals')
+                .select('tutor_id, subject_name, subject_type, subject_grade')
+                .eq('status', 'approved')
+                .range(start, start + page - 1)
+                .execute()
+            )
+            batch = res.data or []
+            rows.extend(batch)
+            if len(batch) < page:
+                break
+            start += page
+        self.replace_all(rows)
+        return len(rows)
+
+    def replace_all(self, rows: Iterable[Dict[str, Any]]) -> None:
+        """Rebuild from approved rows ({tutor_id, subject_name, subject_type, subject_grade})"""
+        by_tutor: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            if row.get('tutor_id'):
+                by_tutor.setdefault(row['tutor_id'], []).append(row)
+        with self._lock:
+            self._tutors_by_key = {}
+            self._keys_by_tutor = {}
+            self._match_memo.clear()
+            for tutor_id, tutor_rows in by_tutor.items():
+                self._replace_tutor(tutor_id, tutor_rows)
+            self._all_loaded_at = time.time()
+
+    def _fresh(self, tutor_id: str) -> bool:
+        now = time.time()
+        if now - self._all_loaded_at < ELIGIBILITY_INDEX_TTL:
+            return True
+        return now - self._loaded_at.get(tutor_id, 0.0) < ELIGIBILITY_INDEX_TTL
+
+    def ensure_tutor(self, client, tutor_id: str) -> None:
+        """Make sure a tutor's approvals are loaded and not older than the TTL"""
+        with self._lock:
+            if self._fresh(tutor_id):
+                return
+        res = (
+            client
+            .table('subject_approvals')
+            .select('subject_name, subject_type, subject_grade')
+            .eq('tutor_id', tutor_id)
+            .eq('status', 'approved')
+            .execute()
+        )
+        with self._lock:
+            self._replace_tutor(tutor_id, res.data or [])
+
+    def approve(self, tutor_id: str, subject_name: Any, subject_type: Any, subject_grade: Any) -> None:
+        name = _norm_name(subject_name)
+        if tutor_id and name:
+            with self._lock:
+                self._add(tutor_id, name, _bucket(subject_type, subject_grade))
+
+    def revoke(self, tutor_id: str, subject_name: Any, subject_type: Any, subject_grade: Any) -> None:
+        name = _norm_name(subject_name)
+        if tutor_id and name:
+            with self._lock:
+                self._discard(tutor_id, name, _bucket(subject_type, subject_grade))
+
+    # ---- queries -----------------------------------------------------------
+
+    def _matching_names(self, opportunity: Dict[str, Any]) -> Tuple[Bucket, FrozenSet[str]]:
+        bucket = _bucket(opportunity.get('subject_type'), opportunity.get('subject_grade'))
+        opp_name = _norm_name(opportunity.get('subject_name'))
+        memo_key = (opp_name,) + bucket
+        names = self._match_memo.get(memo_key)
+        if names is None:
+            names = frozenset(n for n in self._tutors_by_key.get(bucket, {}) if n in opp_name)
+            self._match_memo[memo_key] = names
+        return bucket, names
+
+    def is_eligible(self, tutor_id: str, opportunity: Dict[str, Any]) -> bool:
+        with self._lock:
+            bucket, names = self._matching_names(opportunity)
+            held = self._keys_by_tutor.get(tutor_id)
+            return bool(held) and any((n,) + bucket in held for n in names)
+
+    def eligible_tutors(self, opportunity: Dict[str, Any]) -> Set[str]:
+        with self._lock:
+            bucket, names = self._matching_names(opportunity)
+            holders = self._tutors_by_key.get(bucket, {})
+            out: Set[str] = set()
+            for n in names:
+                out |= holders.get(n, set())
+            return out
+
+    def eligible_opportunities(self, tutor_id: str, opportunities: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        return [o for o in opportunities if self.is_eligible(tutor_id, o)]
+
+    def approved_keys(self, tutor_id: str) -> Set[Tuple[str, str, str]]:
+        """(base name, type, grade) triples a tutor holds"""
+        with self._lock:
+            return set(self._keys_by_tutor.get(tutor_id, ()))
+
+
+_index: Optional[EligibilityIndex] = None
+_index_lock = threading.Lock()
+
+
+def get_eligibility_index() -> EligibilityIndex:
+    """Process-wide index; tutors load on demand until the background preload lands"""
+    global _index
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                _index = EligibilityIndex()
+    return _index
+
+
+def _preload() -> None:
+    try:
+        count = get_eligibility_index().load_all()
+        if count:
+            logger.info(f"Eligibility index loaded {count} approvals")
+    except Exception as e:
+        logger.warning(f"Eligibility index bulk load failed; loading per tutor: {str(e)}")
+
+
+def start_eligibility_preload() -> Optional[threading.Thread]:
+    """Bulk-load approvals off the request path when a service client is configured"""
+    if not os.environ.get('SUPABASE_SERVICE_ROLE_KEY'):
+        return None
+    thread = threading.Thread(target=_preload, name='eligibility-preload', daemon=True)
+    thread.start()
+    return thread
+
+
+def tutor_is_eligible(client, tutor_id: str, opportunity: Dict[str, Any]) -> bool:
+    index = get_eligibility_index()
+    index.ensure_tutor(client, tutor_id)
+    return index.is_eligible(tutor_id, opportunity)
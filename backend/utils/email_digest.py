@@ -0,0 +1,121 @@
+"""
+Per-recipient notification coalescing
+
+Recipients who opt in (email_digest_preferences, see schema.sql) have
+low-urgency notifications held in the outbox for their window instead of being
+sent one by one. When the first held message falls due, the outbox worker
+claims every other pending message for that recipient (claim_email_digest)
+and sends them as a single digest.
+
+Only kinds in EMAIL_DIGEST_KINDS are held; reminders, session confirmations and
+anything with CC recipients always go out individually.
+"""
+
+import os
+import re
+import logging
+from datetime import datetime, timedelta, timezone
+from html import escape
+from typing import Any, Dict, List, Optional
+
+from utils.cache import TTLCache
+from utils.email_service import EmailService
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+DEFAULT_DIGEST_KINDS = (
+    'availability_notification,tutor_scheduling_notification,approval_status,job_assignment'
+)
+
+# Recipient -> window minutes; preferences change rarely and a stale minute is harmless
+_window_cache = TTLCache(max_size=2048, ttl_seconds=int(os.environ.get('EMAIL_DIGEST_PREF_TTL', '60')))
+
+_BODY_RE = re.compile(r'<body[^>]*>(.*?)</body>', re.IGNORECASE | re.DOTALL)
+
+
+def digest_kinds() -> set:
+    return {k.strip() for k in os.environ.get('EMAIL_DIGEST_KINDS', DEFAULT_DIGEST_KINDS).split(',') if k.strip()}
+
+
+def coalesce_key(email: Optional[str]) -> Optional[str]:
+    """Normalized mailbox: +tutor/+tutee tags on hdsb.ca deliver to the same inbox"""
+    if not email:
+        return None
+    return (EmailService._scrub_hdsb_role_tag(email) or email).strip().lower()
+
+
+def digest_window_minutes(client, email: str) -> int:
+    """Opted-in window for a recipient (0 = send immediately); client must be the service role"""
+    key = coalesce_key(email)
+    if not key:
+        return 0
+    cached = _window_cache.get(key)
+    if cached is not None:
+        return cached
+    minutes = 0
+    try:
+        # Look up the same normalized address the cache is keyed on, so every +tag variant agrees
+        res = client.rpc('email_digest_window', {'p_email': key}).execute()
+        minutes = int(res.data or 0)
+    except Exception as e:
+        logger.warning(f"Digest preference lookup failed for {key}: {str(e)}")
+    if not minutes:
+        try:
+            minutes = int(os.environ.get('EMAIL_DIGEST_DEFAULT_MINUTES', '0'))
+        except Exception:
+            minutes = 0
+    _window_cache.set(key, minutes)
+    return minutes
+
+
+def invalidate_digest_window(email: Optional[str]) -> None:
+    key = coalesce_key(email)
+    if key:
+        _window_cache.set(key, None)
+
+
+def plan_outbox_row(client, row: Dict[str, Any]) -> Dict[str, Any]:
+    """Hold an outbox row for a digest when its kind and recipient allow it"""
+    now = datetime.now(timezone.utc)
+    # Always set both keys: bulk inserts need every row to carry the same columns
+    row['coalesce_key'] = None
+    row['next_attempt_at'] = now.isoformat()
+    if row.get('cc') or row.get('kind') not in digest_kinds():
+        return row
+    minutes = digest_window_minutes(client, row.get('to_email'))
+    if minutes <= 0:
+        return row
+    # The first held message bounds the delay: the worker sweeps in later ones when it falls due
+    row['coalesce_key'] = coalesce_key(row.get('to_email'))
+    row['next_attempt_at'] = (now + timedelta(minutes=minutes)).isoformat()
+    return row
+
+
+def build_digest(rows: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Merge several outbox rows for one recipient into a single message"""
+    rows = sorted(rows, key=lambda r: r.get('created_at') or '')
+    sections_html = []
+    sections_text = []
+    for row in rows:
+        html = row.get('body_html') or ''
+        match = _BODY_RE.search(html)
+        inner = match.group(1) if match else html
+        sections_html.append(
+            f"<div style=\"border-top:1px solid #ddd;padding:12px 0\">"
+            f"<h3>{escape(row.get('subject') or '')}</h3>{inner}</div>"
+        )
+        sections_text.append(f"== {row.get('subject') or ''} ==\n{(row.get('body_text') or '').strip()}")
+    count = len(rows)
+    return {
+        'to_email': rows[0].get('to_email'),
+        'subject': f"You have {count} new tutoring notifications",
+        'body_html': (
+            "<html><body>"
+            f"<h2>{count} updates since your last email</h2>"
+            + "".join(sections_html)
+            + "<p>You are receiving a digest because you opted in to grouped notifications.</p>"
+            "</body></html>"
+        ),
+        'body_text': f"{count} updates since your last email\n\n" + "\n\n".join(sections_text),
+    }
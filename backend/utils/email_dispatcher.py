@@ -0,0 +1,302 @@
+"""
+Multi-provider email dispatcher
+
+Holds every configured provider (SMTP, Brevo, Mailjet), each behind a token
+bucket sized to its sending quota and a health score. Messages go to the
+healthiest provider with capacity; failures and throttling (HTTP 429, SMTP
+421/45x) put the provider on a cooldown and the affected messages fail over to
+the next provider.
+
+Configuration:
+    EMAIL_PROVIDERS            comma list in preference order (default: EMAIL_SERVICE
+                               first, then every other provider with credentials)
+    EMAIL_RATE_<PROVIDER>      sustained messages/second (e.g. EMAIL_RATE_BREVO=10)
+    EMAIL_BURST_<PROVIDER>     bucket capacity (defaults to 2x the rate, min 1)
+    EMAIL_DISPATCH_MAX_WAIT    seconds to wait for capacity before giving up (outbox
+                               workers and other background senders)
+    EMAIL_DISPATCH_REQUEST_WAIT  the same, for sends made while handling a request
+"""
+
+import os
+import logging
+import threading
+import time
+from typing import Any, Dict, List, Optional, Tuple
+
+from flask import has_request_context
+
+from utils.email_service import EmailService, PROVIDER_CLASSES, create_provider
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Default sustained rates (messages/second); override per deployment quota
+DEFAULT_RATES = {'smtp': 5.0, 'brevo': 10.0, 'mailjet': 10.0}
+
+# Statuses that mean "slow down" rather than "this message is bad"
+THROTTLE_STATUSES = {429, 421, 450, 451, 452}
+
+
+class TokenBucket:
+    """Classic token bucket; thread-safe"""
+
+    def __init__(self, rate: float, capacity: float):
+        self.rate = max(0.001, rate)
+        self.capacity = max(1.0, capacity)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def take(self, n: int) -> int:
+        """Take up to n whole tokens; returns how many were granted"""
+        with self._lock:
+            self._refill()
+            granted = min(n, int(self._tokens))
+            self._tokens -= granted
+            return granted
+
+    def give_back(self, n: int) -> None:
+        with self._lock:
+            self._tokens = min(self.capacity, self._tokens + n)
+
+    def drain(self) -> None:
+        with self._lock:
+            self._tokens = 0.0
+            self._updated = time.monotonic()
+
+    def wait_time(self) -> float:
+        """Seconds until at least one token is available"""
+        with self._lock:
+            self._refill()
+            return 0.0 if self._tokens >= 1 else (1 - self._tokens) / self.rate
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            self._refill()
+            return self._tokens
+
+
+class ProviderState:
+    """A provider plus its limiter, health score and counters"""
+
+    def __init__(self, name: str, provider: EmailService, rate: float, burst: float):
+        self.name = name
+        self.provider = provider
+        self.bucket = TokenBucket(rate, burst)
+        self.health = 1.0
+        self.consecutive_failures = 0
+        self.cooldown_until = 0.0
+        self.started_at = time.monotonic()
+        self.sent = 0
+        self.failed = 0
+        self.throttled = 0
+        self.calls = 0
+        self.latency_ms: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self._lock = threading.Lock()
+
+    def available(self, now: float) -> bool:
+        return now >= self.cooldown_until
+
+    def record(self, ok_count: int, fail_count: int, elapsed: float, status: Optional[int]) -> None:
+        with self._lock:
+            self.calls += 1
+            self.sent += ok_count
+            self.failed += fail_count
+            ms = elapsed * 1000.0
+            self.latency_ms = ms if self.latency_ms is None else 0.8 * self.latency_ms + 0.2 * ms
+            total = ok_count + fail_count
+            if total:
+                # EWMA of the success ratio; a single bad call halves confidence at most
+                ratio = ok_count / total
+                self.health = max(0.0, min(1.0, 0.7 * self.health + 0.3 * ratio))
+            if fail_count and not ok_count:
+                self.consecutive_failures += 1
+                throttled = status in THROTTLE_STATUSES
+                if throttled:
+                    self.throttled += 1
+                    self.bucket.drain()
+                base = 30.0 if throttled else 5.0
+                self.cooldown_until = time.monotonic() + min(600.0, base * (2 ** (self.consecutive_failures - 1)))
+                self.last_error = f"status {status}" if status is not None else 'send failed'
+            elif ok_count:
+                self.consecutive_failures = 0
+
+    def metrics(self) -> Dict[str, Any]:
+        uptime = max(1e-6, time.monotonic() - self.started_at)
+        return {
+            'health': round(self.health, 3),
+            'tokens_available': round(self.bucket.available, 2),
+            'rate_per_sec': self.bucket.rate,
+            'burst': self.bucket.capacity,
+            'cooling_down': not self.available(time.monotonic()),
+            'sent': self.sent,
+            'failed': self.failed,
+            'throttled': self.throttled,
+            'api_calls': self.calls,
+            'avg_latency_ms': round(self.latency_ms, 1) if self.latency_ms is not None else None,
+            'throughput_per_min': round(self.sent / uptime * 60.0, 2),
+            'error_rate': round(self.failed / max(1, self.sent + self.failed), 4),
+            'last_error': self.last_error,
+        }
+
+
+def _env_float(name: str, default: float) -> float:
+    try:
+        return float(os.environ.get(name, str(default)))
+    except Exception:
+        return default
+
+
+def _provider_names() -> List[str]:
+    explicit = os.environ.get('EMAIL_PROVIDERS')
+    if explicit:
+        return [n.strip().lower() for n in explicit.split(',') if n.strip().lower() in PROVIDER_CLASSES]
+    primary = os.environ.get('EMAIL_SERVICE', 'smtp').lower()
+    names = [primary if primary in PROVIDER_CLASSES else 'smtp']
+    return names + [n for n in PROVIDER_CLASSES if n not in names]
+
+
+class EmailDispatcher(EmailService):
+    """EmailService that routes across all configured providers"""
+
+    def __new__(cls, *args, **kwargs):
+        # Bypass the provider-selecting singleton in EmailService.__new__
+        return object.__new__(cls)
+
+    def __init__(self, names: Optional[List[str]] = None):
+        self.max_wait = _env_float('EMAIL_DISPATCH_MAX_WAIT', 30.0)
+        # A request thread should fail fast rather than sit waiting for tokens
+        self.request_wait = _env_float('EMAIL_DISPATCH_REQUEST_WAIT', 1.0)
+        self.providers: List[ProviderState] = []
+        explicit = names is not None or bool(os.environ.get('EMAIL_PROVIDERS'))
+        for i, name in enumerate(names if names is not None else _provider_names()):
+            try:
+                provider = create_provider(name)
+            except Exception as e:
+                logger.error(f"Failed to initialise email provider {name}: {str(e)}")
+                continue
+            # The primary is always kept (it logs its own misconfiguration); extras only when usable
+            if i > 0 and not explicit and not provider.is_configured():
+                continue
+            rate = _env_float(f'EMAIL_RATE_{name.upper()}', DEFAULT_RATES.get(name, 5.0))
+            burst = _env_float(f'EMAIL_BURST_{name.upper()}', max(1.0, rate * 2))
+            self.providers.append(ProviderState(name, provider, rate, burst))
+
+    def is_configured(self) -> bool:
+        return any(p.provider.is_configured() for p in self.providers)
+
+    @property
+    def primary(self) -> Optional[EmailService]:
+        return self.providers[0].provider if self.providers else None
+
+    def _candidates(self, exclude: set) -> Tuple[List[ProviderState], List[ProviderState]]:
+        """(ready, cooling): ready by health then configured order, cooling by earliest recovery"""
+        now = time.monotonic()
+        usable = [p for p in self.providers if p.name not in exclude and p.provider.is_configured()]
+        ready = [p for p in usable if p.available(now)]
+        order = {p.name: i for i, p in enumerate(self.providers)}
+        ready.sort(key=lambda p: (-round(p.health, 1), order[p.name]))
+        cooling = sorted((p for p in usable if not p.available(now)), key=lambda p: p.cooldown_until)
+        return ready, cooling
+
+    def _pass_providers(self, pending: List[int], tried: Dict[int, set]) -> List[ProviderState]:
+        """Providers to use this pass. A cooling provider (recent 429/5xx) is used only
+        when no ready provider can ever take the pending messages; a ready provider that
+        is merely out of tokens is waited for instead."""
+        ready, cooling = self._candidates(set())
+        if any(p.name not in tried[i] for p in ready for i in pending):
+            return ready
+        return cooling
+
+    def _send_on(self, state: ProviderState, batch: List[Dict[str, Any]]) -> List[bool]:
+        provider = state.provider
+        provider._set_last_error(None)
+        start = time.monotonic()
+        try:
+            if len(batch) == 1:
+                m = batch[0]
+                results = [provider.send_email(m.get('to_email'), m.get('subject', ''), m.get('body_html', ''),
+                                               m.get('body_text'), m.get('cc'))]
+            else:
+                results = provider.send_many(batch)
+        except Exception as e:
+            logger.error(f"Email provider {state.name} raised: {str(e)}")
+            results = [False] * len(batch)
+        ok = sum(1 for r in results if r)
+        state.record(ok, len(results) - ok, time.monotonic() - start, provider.last_error_status())
+        return results
+
+    def send_many(self, messages: List[Dict[str, Any]]) -> List[bool]:
+        """Send messages, spreading them across providers by capacity and failing over on errors"""
+        results = [False] * len(messages)
+        pending = list(range(len(messages)))
+        tried: Dict[int, set] = {i: set() for i in pending}
+        deadline = time.monotonic() + (self.request_wait if has_request_context() else self.max_wait)
+
+        while pending:
+            progressed = False
+            for state in self._pass_providers(pending, tried):
+                eligible = [i for i in pending if state.name not in tried[i]]
+                if not eligible:
+                    continue
+                granted = state.bucket.take(len(eligible))
+                if not granted:
+                    continue
+                chunk = eligible[:granted]
+                chunk_results = self._send_on(state, [messages[i] for i in chunk])
+                done = set()
+                for i, ok in zip(chunk, chunk_results):
+                    tried[i].add(state.name)
+                    if ok:
+                        results[i] = True
+                        done.add(i)
+                pending = [i for i in pending if i not in done]
+                progressed = True
+                if not pending:
+                    break
+
+            # Messages that every usable provider has already rejected are final failures
+            usable = {p.name for p in self.providers if p.provider.is_configured()}
+            pending = [i for i in pending if not usable.issubset(tried[i])]
+            if not pending or progressed:
+                continue
+            # Everyone is rate limited: wait for the earliest bucket, within the deadline
+            waits = [p.bucket.wait_time() for p in self._pass_providers(pending, tried)]
+            now = time.monotonic()
+            if not waits or now >= deadline:
+                logger.error(f"No email provider capacity; {len(pending)} message(s) not sent")
+                break
+            time.sleep(max(0.01, min(min(waits), deadline - now)))
+        return results
+
+    def send_email(self, to_email: str, subject: str, body_html: str,
+                   body_text: Optional[str] = None, cc: Optional[List[str]] = None) -> bool:
+        return self.send_many([{
+            'to_email': to_email, 'subject': subject, 'body_html': body_html,
+            'body_text': body_text, 'cc': cc,
+        }])[0]
+
+    def metrics(self) -> Dict[str, Any]:
+        """Per-provider throughput, error and limiter state"""
+        return {p.name: p.metrics() for p in self.providers}
+
+
+_dispatcher: Optional[EmailDispatcher] = None
+_dispatcher_lock = threading.Lock()
+
+
+def get_dispatcher() -> EmailDispatcher:
+    """Process-wide dispatcher (providers keep their pools/clients across calls)"""
+    global _dispatcher
+    if _dispatcher is None:
+        with _dispatcher_lock:
+            if _dispatcher is None:
+                _dispatcher = EmailDispatcher()
+    return _dispatcher
@@ -0,0 +1,489 @@
+"""
+Durable outbound email outbox
+
+Request handlers only enqueue rows into public.email_outbox, through a writer
+thread that holds the service-role client (users cannot insert outbox rows and
+request handlers never get that client). The role only decides who writes
+rows, not what they say: the /api/email/* send routes take recipients and
+bodies from the caller and are admin-only; every other route derives them
+from the rows it acts on.
+
+A small pool of background workers claims due rows with claim_email_outbox()
+(FOR UPDATE SKIP LOCKED, see schema.sql), delivers them through the configured
+EmailService, retries failures with exponential backoff and records the final
+delivery status in communications.
+
+Run workers in-process (EMAIL_OUTBOX_WORKERS > 0, started by create_app) or
+standalone with: python -m utils.email_outbox
+"""
+
+import atexit
+import os
+import logging
+import queue
+import random
+import socket
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+from utils.db import get_supabase_client, get_service_client
+from utils.email_service import EmailService, get_email_service
+from utils.email_digest import build_digest, plan_outbox_row
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+OUTBOX_TABLE = 'email_outbox'
+
+
+def _env_int(name: str, default: int) -> int:
+    try:
+        return int(os.environ.get(name, str(default)))
+    except Exception:
+        return default
+
+
+def outbox_enabled() -> bool:
+    """The outbox is used only when a worker can drain it (service key present)."""
+    if os.environ.get('EMAIL_OUTBOX_ENABLED', 'true').lower() in ('0', 'false', 'no'):
+        return False
+    return bool(os.environ.get('SUPABASE_SERVICE_ROLE_KEY'))
+
+
+def log_communications(client, entries: List[Any]) -> None:
+    """
+    Record email deliveries in communications with one multi-row insert
+
+    Args:
+        entries: (outbox-style row, status) pairs; rows without a job_id are skipped
+    """
+    records = [{
+        'job_id': row['job_id'],
+        'type': 'email',
+        'recipient': row.get('to_email') or '',
+        'subject': row.get('subject'),
+        'content': row.get('kind') or row.get('subject'),
+        'status': status,
+    } for row, status in entries if row.get('job_id')]
+    if not records:
+        return
+    try:
+        client.table('communications').insert(records).execute()
+        return
+    except Exception as e:
+        if len(records) == 1:
+            # Job rows are hard-deleted on completion/cancel; the FK may no longer resolve
+            logger.warning(f"Failed to log communication for job {records[0]['job_id']}: {str(e)}")
+            return
+        logger.warning(f"Bulk communications insert failed, retrying per row: {str(e)}")
+    # One dangling job_id must not drop the whole batch's log
+    for record in records:
+        try:
+            client.table('communications').insert(record).execute()
+        except Exception as e:
+            logger.warning(f"Failed to log communication for job {record['job_id']}: {str(e)}")
+
+
+def _enqueued_by() -> Optional[str]:
+    """auth id of the user whose request queued the message, when inside a request"""
+    try:
+        from flask import has_request_context, request
+        if has_request_context():
+            return getattr(request, 'user_id', None)
+    except Exception:
+        pass
+    return None
+
+
+def _outbox_row(message: Dict[str, Any], job_id: Optional[str], kind: Optional[str],
+                created_by: Optional[str]) -> Dict[str, Any]:
+    return {
+        'created_by': created_by,
+        'to_email': message.get('to_email'),
+        'cc': message.get('cc') or None,
+        'subject': message.get('subject', ''),
+        'body_html': message.get('body_html', ''),
+        'body_text': message.get('body_text'),
+        'job_id': message.get('job_id', job_id),
+        'kind': message.get('kind', kind),
+        'max_attempts': _env_int('EMAIL_OUTBOX_MAX_ATTEMPTS', 5),
+    }
+
+
+def _insert_rows(client, rows: List[Dict[str, Any]]) -> bool:
+    """Insert outbox rows in one statement (digest planning included); True when all landed"""
+    rows = [plan_outbox_row(client, row) for row in rows]
+    res = client.table(OUTBOX_TABLE).insert(rows).execute()
+    return bool(res.data) and len(res.data) == len(rows)
+
+
+def _send_now(rows: List[Dict[str, Any]], log_client=None) -> List[bool]:
+    """Deliver outbox-style rows synchronously when they cannot be queued"""
+    results = get_email_service().send_many([OutboxWorkerPool._message(row) for row in rows])
+    if log_client is not None:
+        try:
+            log_communications(log_client, [(row, 'sent') for row, ok in zip(rows, results) if ok])
+        except Exception as e:
+            logger.error(f"Failed to log communications: {str(e)}")
+    return results
+
+
+class OutboxWriter:
+    """Background thread that inserts queued messages into email_outbox
+
+    Users may not write the outbox themselves and request handlers never hold
+    the service-role client, so enqueue_email()/enqueue_many() called from a
+    request hand their rows to this thread, which inserts whatever has
+    accumulated in one statement. Rows that cannot be inserted are delivered
+    directly from this thread, so a message is never silently dropped.
+    """
+
+    def __init__(self, batch_size: Optional[int] = None):
+        self.batch_size = batch_size or _env_int('EMAIL_OUTBOX_WRITE_BATCH', 200)
+        self._queue: "queue.Queue[Dict[str, Any]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, rows: List[Dict[str, Any]]) -> None:
+        self.start()
+        for row in rows:
+            self._queue.put(row)
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='email-outbox-writer', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        """Flush what is queued, then stop"""
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while not (self._stop.is_set() and self._queue.empty()):
+            try:
+                rows = [self._queue.get(timeout=0.5)]
+            except queue.Empty:
+                continue
+            while len(rows) < self.batch_size:
+                try:
+                    rows.append(self._queue.get_nowait())
+                except queue.Empty:
+                    break
+            try:
+                self.write(rows)
+            except Exception as e:
+                logger.error(f"Email outbox writer dropped {len(rows)} emails: {str(e)}")
+
+    def write(self, rows: List[Dict[str, Any]]) -> None:
+        client = get_service_client()
+        if client is not None:
+            try:
+                if _insert_rows(client, rows):
+                    return
+            except Exception as e:
+                logger.error(f"Failed to enqueue {len(rows)} emails: {str(e)}")
+        _send_now(rows, client)
+
+
+_writer: Optional[OutboxWriter] = None
+_writer_lock = threading.Lock()
+
+
+def get_outbox_writer() -> OutboxWriter:
+    global _writer
+    if _writer is None:
+        with _writer_lock:
+            if _writer is None:
+                _writer = OutboxWriter()
+                atexit.register(_writer.stop)
+    return _writer
+
+
+def enqueue_email(to_email: str, subject: str, body_html: str,
+                  body_text: Optional[str] = None, cc: Optional[List[str]] = None,
+                  job_id: Optional[str] = None, kind: Optional[str] = None,
+                  client=None) -> bool:
+    """
+    Queue an email for background delivery
+
+    Falls back to sending synchronously when the outbox is disabled or the
+    insert fails, so a message is never silently dropped.
+
+    Args:
+        client: Service-role client, for worker and CLI callers that already
+            hold one; without it the row goes through the outbox writer thread
+
+    Returns:
+        bool: True if the email was queued (or sent by the fallback)
+    """
+    if not to_email:
+        return False
+    return enqueue_many([{
+        'to_email': to_email, 'subject': subject, 'body_html': body_html,
+        'body_text': body_text, 'cc': cc,
+    }], job_id=job_id, kind=kind, client=client)[0]
+
+
+def enqueue_many(messages: List[Dict[str, Any]], job_id: Optional[str] = None,
+                 kind: Optional[str] = None, client=None) -> List[bool]:
+    """
+    Queue several emails with a single insert
+
+    Each message dict uses the send_email argument names and may override
+    job_id / kind per message. Falls back to a synchronous send_many.
+
+    Returns:
+        List[bool]: Per-message success, in input order
+    """
+    if not messages:
+        return []
+    valid = [bool(m.get('to_email')) for m in messages]
+    created_by = _enqueued_by()
+    rows = [_outbox_row(m, job_id, kind, created_by) for m, ok in zip(messages, valid) if ok]
+    if rows and outbox_enabled():
+        if client is None:
+            get_outbox_writer().submit(rows)
+            return valid
+        try:
+            if _insert_rows(client, rows):
+                return valid
+        except Exception as e:
+            logger.error(f"Failed to enqueue {len(rows)} emails: {str(e)}")
+    sent = iter(_send_now(rows, client or get_supabase_client()) if rows else [])
+    return [next(sent) if ok else False for ok in valid]
+
+
+class OutboxEmailService(EmailService):
+    """EmailService whose send_email enqueues instead of delivering.
+
+    Reuses every template helper on EmailService (availability notification,
+    session confirmation, ...) while keeping the request path free of SMTP/API
+    calls.
+    """
+
+    def __new__(cls, *args, **kwargs):
+        # Bypass the provider-selecting singleton in EmailService.__new__
+        return object.__new__(cls)
+
+    def __init__(self, job_id: Optional[str] = None, kind: Optional[str] = None, client=None):
+        self.job_id = job_id
+        self.kind = kind
+        self.client = client
+
+    def send_email(self, to_email: str, subject: str, body_html: str,
+                   body_text: Optional[str] = None, cc: Optional[List[str]] = None) -> bool:
+        return enqueue_email(to_email, subject, body_html, body_text, cc,
+                             job_id=self.job_id, kind=self.kind, client=self.client)
+
+    def send_many(self, messages: List[Dict[str, Any]]) -> List[bool]:
+        return enqueue_many(messages, job_id=self.job_id, kind=self.kind, client=self.client)
+
+
+def get_outbox_email_service(job_id: Optional[str] = None, kind: Optional[str] = None,
+                             client=None) -> OutboxEmailService:
+    """
+    Get an email service that queues messages for background delivery
+
+    Args:
+        job_id: Optional tutoring job the messages relate to (logged to communications)
+        kind: Optional short label for the message type
+        client: Optional service-role client for worker and CLI callers (see enqueue_email)
+
+    Returns:
+        OutboxEmailService: Enqueuing email service
+    """
+    return OutboxEmailService(job_id=job_id, kind=kind, client=client)
+
+
+def _backoff_seconds(attempts: int) -> float:
+    base = _env_int('EMAIL_OUTBOX_BACKOFF_BASE', 30)
+    cap = _env_int('EMAIL_OUTBOX_BACKOFF_MAX', 3600)
+    delay = min(cap, base * (2 ** max(0, attempts - 1)))
+    # Full jitter on the upper half to avoid retry bursts against the provider
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class OutboxWorkerPool:
+    """Background threads that drain email_outbox"""
+
+    def __init__(self, num_workers: Optional[int] = None, batch_size: Optional[int] = None,
+                 poll_interval: Optional[float] = None, lease_seconds: Optional[int] = None):
+        self.num_workers = num_workers if num_workers is not None else _env_int('EMAIL_OUTBOX_WORKERS', 2)
+        self.batch_size = batch_size or _env_int('EMAIL_OUTBOX_BATCH_SIZE', 50)
+        self.poll_interval = poll_interval or float(os.environ.get('EMAIL_OUTBOX_POLL_SECONDS', '2'))
+        self.lease_seconds = lease_seconds or _env_int('EMAIL_OUTBOX_LEASE_SECONDS', 300)
+        self._stop = threading.Event()
+        self._threads: List[threading.Thread] = []
+        self._worker_prefix = f"{socket.gethostname()}:{os.getpid()}"
+
+    def start(self) -> None:
+        for i in range(self.num_workers):
+            t = threading.Thread(target=self._run, args=(f"{self._worker_prefix}:{i}",),
+                                 name=f"email-outbox-{i}", daemon=True)
+            t.start()
+            self._threads.append(t)
+        logger.info(f"Started {self.num_workers} email outbox worker(s)")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        for t in self._threads:
+            t.join(timeout=timeout)
+        self._threads = []
+
+    def _run(self, worker_id: str) -> None:
+        while not self._stop.is_set():
+            try:
+                processed = self.process_batch(worker_id)
+            except Exception as e:
+                logger.error(f"Email outbox worker {worker_id} error: {str(e)}")
+                processed = 0
+            # Drain continuously while there is work; otherwise poll
+            if processed == 0:
+                self._stop.wait(self.poll_interval)
+
+    def process_batch(self, worker_id: str) -> int:
+        """Claim and deliver one batch. Returns the number of rows processed."""
+        client = get_service_client()
+        if client is None:
+            return 0
+        claimed = client.rpc('claim_email_outbox', {
+            'p_worker': worker_id,
+            'p_limit': self.batch_size,
+            'p_lease_seconds': self.lease_seconds,
+        }).execute()
+        rows = claimed.data or []
+        if rows:
+            self._deliver_many(client, rows, worker_id)
+        return len(rows)
+
+    @staticmethod
+    def _message(row: Dict[str, Any]) -> Dict[str, Any]:
+        return {
+            'to_email': row.get('to_email'),
+            'subject': row.get('subject') or '',
+            'body_html': row.get('body_html') or '',
+            'body_text': row.get('body_text'),
+            'cc': row.get('cc') or None,
+        }
+
+    def _claim_digest(self, client, worker_id: str, key: str) -> List[Dict[str, Any]]:
+        """Sweep up the recipient's other held messages (not yet due) into this digest"""
+        try:
+            res = client.rpc('claim_email_digest', {
+                'p_worker': worker_id,
+                'p_coalesce_key': key,
+                'p_lease_seconds': self.lease_seconds,
+            }).execute()
+            return res.data or []
+        except Exception as e:
+            logger.error(f"Failed to claim digest rows for {key}: {str(e)}")
+            return []
+
+    def _deliver_many(self, client, rows: List[Dict[str, Any]], worker_id: str = '') -> None:
+        """Deliver a claimed batch with one send_many call (batched by the provider)"""
+        email_service = get_email_service()
+        # Each unit is one outgoing message and the outbox rows it covers
+        units = []
+        held: Dict[str, List[Dict[str, Any]]] = {}
+        for row in rows:
+            if row.get('coalesce_key'):
+                held.setdefault(row['coalesce_key'], []).append(row)
+            else:
+                units.append((self._message(row), [row]))
+        for key, group in held.items():
+            seen = {r['id'] for r in group}
+            group = group + [r for r in self._claim_digest(client, worker_id, key) if r.get('id') not in seen]
+            units.append((build_digest(group) if len(group) > 1 else self._message(group[0]), group))
+
+        try:
+            results = email_service.send_many([message for message, _ in units])
+            errors = [None if ok else 'provider_rejected' for ok in results]
+        except Exception as e:
+            results = [False] * len(units)
+            errors = [str(e)[:500]] * len(units)
+        provider = type(email_service).__name__
+        finished = []
+        for (_, group), ok, error in zip(units, results, errors):
+            label = provider if len(group) == 1 else f"{provider} (digest of {len(group)})"
+            for row in group:
+                status = self._finish(client, row, ok, error, label)
+                if status in ('sent', 'failed'):
+                    finished.append((row, status))
+        log_communications(client, finished)
+
+    def _finish(self, client, row: Dict[str, Any], ok: bool, error: Optional[str], provider: str) -> str:
+        """Persist the outcome of one delivery attempt and return the row's new status"""
+        now = datetime.now(timezone.utc)
+        attempts = int(row.get('attempts') or 1)
+        max_attempts = int(row.get('max_attempts') or 5)
+        if ok:
+            update = {
+                'status': 'sent',
+                'sent_at': now.isoformat(),
+                'provider': provider,
+                'locked_by': None,
+                'locked_until': None,
+                'last_error': None,
+            }
+        elif attempts >= max_attempts:
+            update = {'status': 'failed', 'locked_by': None, 'locked_until': None, 'last_error': error}
+        else:
+            retry_at = now + timedelta(seconds=_backoff_seconds(attempts))
+            update = {
+                'status': 'pending',
+                'next_attempt_at': retry_at.isoformat(),
+                'locked_by': None,
+                'locked_until': None,
+                'last_error': error,
+            }
+        try:
+            client.table(OUTBOX_TABLE).update(update).eq('id', row['id']).execute()
+        except Exception as e:
+            logger.error(f"Failed to update outbox row {row.get('id')}: {str(e)}")
+
+        if update['status'] == 'failed':
+            logger.error(f"Giving up on email {row.get('id')} to {row.get('to_email')} after {attempts} attempts: {error}")
+        return update['status']
+
+
+_pool: Optional[OutboxWorkerPool] = None
+_pool_lock = threading.Lock()
+
+
+def start_outbox_workers() -> Optional[OutboxWorkerPool]:
+    """Start the in-process worker pool once per process when enabled."""
+    global _pool
+    if not outbox_enabled() or _env_int('EMAIL_OUTBOX_WORKERS', 2) <= 0:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = OutboxWorkerPool()
+            _pool.start()
+    return _pool
+
+
+if __name__ == "__main__":
+    # Standalone worker process
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+    if get_service_client() is None:
+        raise SystemExit("SUPABASE_URL and SUPABASE_SERVICE_ROLE_KEY must be set to run outbox workers")
+    pool = OutboxWorkerPool()
+    pool.start()
+    try:
+        while True:
+            time.sleep(1)
+    except KeyboardInterrupt:
+        pool.stop()
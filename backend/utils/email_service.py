@@ -1,6 +1,7 @@
 import os
 import logging
 import smtplib
+import threading
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
 from typing import List, Dict, Any, Optional
@@ -8,10 +9,14 @@ import re
 import sib_api_v3_sdk
 from sib_api_v3_sdk.rest import ApiException
 from mailjet_rest import Client
+from utils.smtp_pool import SMTPConnectionPool
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+# Status code of the last failed provider call, per thread and provider class
+_error_state = threading.local()
+
 class EmailService:
     """Base email service for sending notifications"""
     
@@ -23,18 +28,20 @@ class EmailService:
             # Determine which email service to use based on configuration
             service_type = os.environ.get("EMAIL_SERVICE", "smtp").lower()
             
-            if service_type == "brevo":
-                cls._instance = object.__new__(BrevoEmailService)
-                cls._instance.__init__()
-            elif service_type == "mailjet":
-                cls._instance = object.__new__(MailjetEmailService)
-                cls._instance.__init__()
-            else:
-                # Default to SMTP
-                cls._instance = object.__new__(SMTPEmailService)
-                cls._instance.__init__()
+            cls._instance = create_provider(service_type)
                 
         return cls._instance
+
+    def is_configured(self) -> bool:
+        """Whether the provider has the credentials it needs to send"""
+        return False
+
+    def _set_last_error(self, status: Optional[int]) -> None:
+        setattr(_error_state, type(self).__name__, status)
+
+    def last_error_status(self) -> Optional[int]:
+        """HTTP/SMTP status of this thread's last failed send on this provider, if known"""
+        return getattr(_error_state, type(self).__name__, None)
     
     def send_email(self, to_email: str, subject: str, body_html: str, 
                   body_text: Optional[str] = None, cc: Optional[List[str]] = None) -> bool:
@@ -53,6 +60,28 @@ class EmailService:
         """
         raise NotImplementedError("Subclasses must implement send_email method")
 
+    def send_many(self, messages: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Send several emails, batching provider calls where the provider allows it
+
+        Args:
+            messages: List of dicts with to_email, subject, body_html and optional
+                body_text / cc (same meaning as send_email arguments)
+
+        Returns:
+            List[bool]: Per-message success, in input order
+        """
+        return [
+            self.send_email(m.get('to_email'), m.get('subject', ''), m.get('body_html', ''),
+                            m.get('body_text'), m.get('cc'))
+            for m in messages
+        ]
+
+    @staticmethod
+    def _chunks(items: List[Any], size: int):
+        for i in range(0, len(items), max(1, size)):
+            yield items[i:i + size]
+
     @staticmethod
     def _scrub_hdsb_role_tag(address: Optional[str]) -> Optional[str]:
         """Remove +tutor/+tutee tagging from @hdsb.ca emails for delivery.
@@ -191,10 +220,12 @@ class EmailService:
         """
         
         # Send emails
-        tutor_success = self.send_email(tutor_email_clean, email_subject, tutor_html, tutor_text)
-        tutee_success = self.send_email(tutee_email_clean, email_subject, tutee_html, tutee_text)
+        results = self.send_many([
+            {'to_email': tutor_email_clean, 'subject': email_subject, 'body_html': tutor_html, 'body_text': tutor_text},
+            {'to_email': tutee_email_clean, 'subject': email_subject, 'body_html': tutee_html, 'body_text': tutee_text},
+        ])
         
-        return tutor_success and tutee_success
+        return all(results)
 
     def send_availability_notification(self, tutee_email: str, tutee_name: str, 
                                      tutor_name: str, subject_name: str, 
@@ -366,6 +397,71 @@ class EmailService:
         # Send email
         return self.send_email(tutor_email, email_subject, html_content, text_content)
 
+    def send_cancellation_notification(self, tutor_email: str, tutee_email: str,
+                                       cancellation_details: Dict[str, Any]) -> bool:
+        """
+        Send cancellation notification emails to tutor and tutee
+
+        Args:
+            tutor_email: Tutor's email address
+            tutee_email: Tutee's email address
+            cancellation_details: Dictionary with subject, tutor_name, tutee_name and reason
+
+        Returns:
+            bool: True if emails were sent successfully, False otherwise
+        """
+        subject_name = cancellation_details.get("subject", "")
+        tutor_name = cancellation_details.get("tutor_name", "")
+        tutee_name = cancellation_details.get("tutee_name", "")
+        reason = cancellation_details.get("reason", "")
+
+        email_subject = f"Tutoring Session Cancelled: {subject_name}"
+
+        # Create email content for tutor
+        tutor_html = f"""
+        <html>
+        <body>
+            <h2>Tutoring Session Cancelled</h2>
+            <p>Hello {tutor_name},</p>
+            <p>Your tutoring session has been cancelled:</p>
+            <ul>
+                <li><strong>Subject:</strong> {subject_name}</li>
+                <li><strong>Student:</strong> {tutee_name}</li>
+                <li><strong>Reason:</strong> {reason}</li>
+            </ul>
+            <p>The opportunity has been returned to the tutoring board for other tutors to apply.</p>
+            <p>Thank you for your understanding.</p>
+        </body>
+        </html>
+        """
+
+        # Create email content for tutee
+        tutee_html = f"""
+        <html>
+        <body>
+            <h2>Tutoring Session Cancelled</h2>
+            <p>Hello {tutee_name},</p>
+            <p>Unfortunately, your tutoring session has been cancelled:</p>
+            <ul>
+                <li><strong>Subject:</strong> {subject_name}</li>
+                <li><strong>Tutor:</strong> {tutor_name}</li>
+                <li><strong>Reason:</strong> {reason}</li>
+            </ul>
+            <p>Don't worry - your request has been returned to our system and another qualified tutor will be able to help you soon.</p>
+            <p>You will receive a new confirmation email once a tutor is assigned.</p>
+            <p>We apologize for any inconvenience.</p>
+        </body>
+        </html>
+        """
+
+        # Send emails
+        results = self.send_many([
+            {'to_email': self._scrub_hdsb_role_tag(tutor_email), 'subject': email_subject, 'body_html': tutor_html},
+            {'to_email': self._scrub_hdsb_role_tag(tutee_email), 'subject': email_subject, 'body_html': tutee_html},
+        ])
+
+        return all(results)
+
 
 class SMTPEmailService(EmailService):
     """Email service using SMTP for sending notifications"""
@@ -381,6 +477,9 @@ class SMTPEmailService(EmailService):
         # Validate configuration
         if not all([self.host, self.username, self.password, self.from_email]):
             logger.warning("SMTP email service not fully configured")
+
+        # Authenticated sessions are reused across sends instead of a TLS handshake + login per message
+        self.pool = SMTPConnectionPool.from_env(self.host, self.port, self.username, self.password) if self.host else None
     
     def send_email(self, to_email: str, subject: str, body_html: str, 
                   body_text: Optional[str] = None, cc: Optional[List[str]] = None) -> bool:
@@ -397,7 +496,7 @@ class SMTPEmailService(EmailService):
         Returns:
             bool: True if email was sent successfully, False otherwise
         """
-        if not all([self.host, self.username, self.password, self.from_email]):
+        if not self.is_configured():
             logger.error("SMTP email service not configured")
             return False
             
@@ -420,22 +519,25 @@ class SMTPEmailService(EmailService):
             # Add HTML part
             msg.attach(MIMEText(body_html, 'html'))
             
-            # Send email
-            with smtplib.SMTP(self.host, self.port) as server:
-                server.starttls()
-                server.login(self.username, self.password)
-                
-                recipients = [to_email_clean]
-                if cc:
-                    recipients.extend(cc_clean)
-                    
-                server.sendmail(self.from_email, recipients, msg.as_string())
+            recipients = [to_email_clean]
+            if cc:
+                recipients.extend(cc_clean)
+
+            # Send email over a pooled session
+            self.pool.sendmail(self.from_email, recipients, msg.as_string())
                 
             logger.info(f"Email sent to {to_email} via SMTP")
             return True
+        except smtplib.SMTPResponseException as e:
+            self._set_last_error(e.smtp_code)
+            logger.error(f"Error sending email via SMTP: {str(e)}")
+            return False
         except Exception as e:
             logger.error(f"Error sending email via SMTP: {str(e)}")
             return False
+
+    def is_configured(self) -> bool:
+        return all([self.host, self.username, self.password, self.from_email])
     
     def send_session_confirmation(self, tutor_email: str, tutee_email: str, 
                                  session_details: Dict[str, Any]) -> bool:
@@ -504,10 +606,12 @@ class SMTPEmailService(EmailService):
         """
         
         # Send emails
-        tutor_success = self.send_email(tutor_email, email_subject, tutor_html)
-        tutee_success = self.send_email(tutee_email, email_subject, tutee_html)
+        results = self.send_many([
+            {'to_email': tutor_email, 'subject': email_subject, 'body_html': tutor_html},
+            {'to_email': tutee_email, 'subject': email_subject, 'body_html': tutee_html},
+        ])
         
-        return tutor_success and tutee_success
+        return all(results)
         
 class BrevoEmailService(EmailService):
     """Email service using Brevo API for sending notifications"""
@@ -522,9 +626,12 @@ class BrevoEmailService(EmailService):
         if not all([self.api_key, self.from_email]):
             logger.warning("Brevo email service not fully configured")
         
-        # Configure API client
+        # Configure API client once; the ApiClient owns a urllib3 pool that is reused across sends
         self.configuration = sib_api_v3_sdk.Configuration()
         self.configuration.api_key['api-key'] = self.api_key
+        self.api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(self.configuration))
+        # Brevo accepts up to 1000 messageVersions per transactional call
+        self.batch_size = int(os.environ.get("BREVO_BATCH_SIZE", "1000"))
         
     def send_email(self, to_email: str, subject: str, body_html: str, 
                   body_text: Optional[str] = None, cc: Optional[List[str]] = None) -> bool:
@@ -546,9 +653,6 @@ class BrevoEmailService(EmailService):
             return False
             
         try:
-            # Create API instance
-            api_instance = sib_api_v3_sdk.TransactionalEmailsApi(sib_api_v3_sdk.ApiClient(self.configuration))
-            
             # Create sender
             sender = {"email": self.from_email, "name": self.from_name}
             
@@ -575,17 +679,68 @@ class BrevoEmailService(EmailService):
                 send_smtp_email.text_content = body_text
                 
             # Send email
-            api_response = api_instance.send_transac_email(send_smtp_email)
+            api_response = self.api_instance.send_transac_email(send_smtp_email)
             logger.info(f"Email sent to {to_email} with message ID: {api_response.message_id}")
             return True
             
         except ApiException as e:
+            self._set_last_error(getattr(e, 'status', None))
             logger.error(f"Brevo API exception: {e}")
             return False
         except Exception as e:
             logger.error(f"Error sending email via Brevo: {str(e)}")
             return False
 
+    def send_many(self, messages: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Send several emails with one Brevo call per batch using messageVersions
+
+        Each version carries its own recipient, subject and content; the
+        top-level content is only a required fallback.
+        """
+        if len(messages) <= 1:
+            return super().send_many(messages)
+        if not self.api_key:
+            logger.error("Brevo API key not configured")
+            return [False] * len(messages)
+
+        results: List[bool] = []
+        sender = {"email": self.from_email, "name": self.from_name}
+        for batch in self._chunks(messages, self.batch_size):
+            versions = []
+            for m in batch:
+                version = {
+                    "to": [{"email": self._scrub_hdsb_role_tag(m.get('to_email')) or m.get('to_email')}],
+                    "subject": m.get('subject', ''),
+                    "htmlContent": m.get('body_html', ''),
+                }
+                if m.get('body_text'):
+                    version["textContent"] = m['body_text']
+                if m.get('cc'):
+                    version["cc"] = [{"email": (self._scrub_hdsb_role_tag(c) or c)} for c in m['cc']]
+                versions.append(version)
+            try:
+                send_smtp_email = sib_api_v3_sdk.SendSmtpEmail(
+                    sender=sender,
+                    subject=batch[0].get('subject', ''),
+                    html_content=batch[0].get('body_html', ''),
+                    message_versions=versions
+                )
+                self.api_instance.send_transac_email(send_smtp_email)
+                logger.info(f"Sent batch of {len(batch)} emails via Brevo")
+                results.extend([True] * len(batch))
+            except ApiException as e:
+                self._set_last_error(getattr(e, 'status', None))
+                logger.error(f"Brevo API exception for batch of {len(batch)}: {e}")
+                results.extend([False] * len(batch))
+            except Exception as e:
+                logger.error(f"Error sending email batch via Brevo: {str(e)}")
+                results.extend([False] * len(batch))
+        return results
+
+    def is_configured(self) -> bool:
+        return all([self.api_key, self.from_email])
+
 
 class MailjetEmailService(EmailService):
     """Email service using Mailjet API for sending notifications"""
@@ -603,6 +758,8 @@ class MailjetEmailService(EmailService):
         
         # Initialize Mailjet client
         self.mailjet = Client(auth=(self.api_key, self.api_secret), version='v3.1')
+        # Send API v3.1 accepts up to 50 entries in Messages per call
+        self.batch_size = int(os.environ.get("MAILJET_BATCH_SIZE", "50"))
         
     def send_email(self, to_email: str, subject: str, body_html: str, 
                   body_text: Optional[str] = None, cc: Optional[List[str]] = None) -> bool:
@@ -663,6 +820,7 @@ class MailjetEmailService(EmailService):
                 logger.info(f"Email sent to {to_email} via Mailjet")
                 return True
             else:
+                self._set_last_error(result.status_code)
                 logger.error(f"Mailjet API error: {result.status_code} - {result.json()}")
                 return False
                 
@@ -670,15 +828,83 @@ class MailjetEmailService(EmailService):
             logger.error(f"Error sending email via Mailjet: {str(e)}")
             return False
 
+    def send_many(self, messages: List[Dict[str, Any]]) -> List[bool]:
+        """
+        Send several emails with one Mailjet call per batch (Messages array)
+
+        Mailjet reports a status per message, so partial failures are kept.
+        """
+        if len(messages) <= 1:
+            return super().send_many(messages)
+        if not all([self.api_key, self.api_secret, self.from_email]):
+            logger.error("Mailjet API credentials not configured")
+            return [False] * len(messages)
+
+        results: List[bool] = []
+        sender = {"Email": self.from_email, "Name": self.from_name}
+        for batch in self._chunks(messages, self.batch_size):
+            payload = []
+            for m in batch:
+                entry = {
+                    "From": sender,
+                    "To": [{"Email": self._scrub_hdsb_role_tag(m.get('to_email')) or m.get('to_email')}],
+                    "Subject": m.get('subject', ''),
+                    "HTMLPart": m.get('body_html', ''),
+                }
+                if m.get('body_text'):
+                    entry["TextPart"] = m['body_text']
+                if m.get('cc'):
+                    entry["Cc"] = [{"Email": (self._scrub_hdsb_role_tag(c) or c)} for c in m['cc']]
+                payload.append(entry)
+            try:
+                result = self.mailjet.send.create(data={'Messages': payload})
+                body = {}
+                try:
+                    body = result.json() or {}
+                except Exception:
+                    body = {}
+                statuses = [(r or {}).get('Status') for r in (body.get('Messages') or [])]
+                if len(statuses) == len(batch):
+                    results.extend([st == 'success' for st in statuses])
+                else:
+                    results.extend([result.status_code == 200] * len(batch))
+                if result.status_code != 200:
+                    self._set_last_error(result.status_code)
+                    logger.error(f"Mailjet API error for batch of {len(batch)}: {result.status_code} - {body}")
+                else:
+                    logger.info(f"Sent batch of {len(batch)} emails via Mailjet")
+            except Exception as e:
+                logger.error(f"Error sending email batch via Mailjet: {str(e)}")
+                results.extend([False] * len(batch))
+        return results
+
+    def is_configured(self) -> bool:
+        return all([self.api_key, self.api_secret, self.from_email])
+
+
+PROVIDER_CLASSES = {
+    'smtp': SMTPEmailService,
+    'brevo': BrevoEmailService,
+    'mailjet': MailjetEmailService,
+}
+
+
+def create_provider(name: str) -> EmailService:
+    """Build a concrete provider by name (unknown names fall back to SMTP)"""
+    provider = object.__new__(PROVIDER_CLASSES.get((name or '').lower(), SMTPEmailService))
+    provider.__init__()
+    return provider
+
 
 def get_email_service() -> EmailService:
     """
     Get the email service instance
     
     Returns:
-        EmailService: Email service instance
+        EmailService: Dispatcher over every configured provider (see utils.email_dispatcher)
     """
-    return EmailService()
+    from utils.email_dispatcher import get_dispatcher
+    return get_dispatcher()
 
 def send_invitation_email(to_email: str, invitation_url: str, role: str) -> bool:
     # Invitations removed from the system: make this a no-op
@@ -0,0 +1,312 @@
+"""
+Change events for dashboards (Server-Sent Events)
+
+Dashboards used to poll every few seconds. Instead each role opens one
+long-lived stream (GET /api/tutor/events, /api/tutee/events,
+/api/admin/events) and refetches only when told something changed.
+
+Events are published on a process-local bus, fed in one of two ways:
+
+- by the mutating routes via publish_change() (single-worker deployments)
+- by Postgres LISTEN/NOTIFY on the 'app_events' channel when
+  EVENTS_DATABASE_URL is set and psycopg2 is installed. Triggers on jobs,
+  opportunities, approvals and help requests (schema.sql section 14) notify
+  every worker, so a change made through any worker reaches every stream.
+  While the listener is connected, route-level publishes for tables with a
+  trigger (NOTIFY_TABLES) are skipped to avoid duplicates.
+
+Events carry only the table, operation, row id and status; clients fetch the
+row itself through the normal (RLS-checked) endpoints. Routing is by topic:
+tutor:<id>, tutee:<id>, 'tutors' (the open opportunity board) and 'admin'.
+
+Each stream is bounded: SSE_MAX_CONNECTIONS per process, SSE_MAX_PER_USER
+per user, a heartbeat comment every SSE_HEARTBEAT_SECONDS, and a maximum
+lifetime after which the client reconnects (and re-authenticates). A client
+reconnecting with Last-Event-ID is replayed the events it missed, or told to
+resync when they are no longer buffered.
+"""
+
+import os
+import json
+import logging
+import queue
+import threading
+import time
+import uuid
+from collections import deque
+from typing import Any, Callable, Dict, Iterable, List, Optional, Set
+
+from flask import Response, jsonify, stream_with_context
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+SSE_MAX_CONNECTIONS = int(os.environ.get('SSE_MAX_CONNECTIONS', '200'))
+SSE_MAX_PER_USER = int(os.environ.get('SSE_MAX_PER_USER', '3'))
+SSE_HEARTBEAT_SECONDS = int(os.environ.get('SSE_HEARTBEAT_SECONDS', '15'))
+SSE_MAX_STREAM_SECONDS = int(os.environ.get('SSE_MAX_STREAM_SECONDS', '900'))
+SSE_RETRY_MS = int(os.environ.get('SSE_RETRY_MS', '3000'))
+SSE_QUEUE_SIZE = int(os.environ.get('SSE_QUEUE_SIZE', '256'))
+SSE_REPLAY_SIZE = int(os.environ.get('SSE_REPLAY_SIZE', '1000'))
+
+NOTIFY_CHANNEL = 'app_events'
+# Tables with a notify_app_event trigger (schema.sql section 14). Changes to any
+# other table are always published locally, listener or not.
+NOTIFY_TABLES = {
+    'tutoring_jobs', 'awaiting_verification_jobs', 'tutoring_opportunities', 'subject_approvals',
+    'help_questions', 'match_proposals', 'tutors', 'certification_requests',
+}
+
+# Table -> event name clients see
+EVENT_NAMES = {
+    'tutoring_jobs': 'jobs',
+    'awaiting_verification_jobs': 'jobs',
+    'tutoring_opportunities': 'opportunities',
+    'subject_approvals': 'approvals',
+    'help_questions': 'help_requests',
+    'match_proposals': 'match_proposals',
+    'certification_requests': 'certification_requests',
+    'tutors': 'tutors',
+}
+
+
+class ConnectionLimitError(Exception):
+    def __init__(self, message: str, status: int):
+        super().__init__(message)
+        self.status = status
+
+
+def topics_for(table: str, row: Dict[str, Any]) -> Set[str]:
+    """Streams that should hear about a change to `row`"""
+    topics = {'admin'}
+    if row.get('tutor_id'):
+        topics.add(f"tutor:{row['tutor_id']}")
+    if row.get('tutee_id'):
+        topics.add(f"tutee:{row['tutee_id']}")
+    if table == 'tutoring_opportunities':
+        topics.add('tutors')
+    elif table == 'tutors' and row.get('id'):
+        topics.add(f"tutor:{row['id']}")
+    return topics
+
+
+class _Subscriber:
+    def __init__(self, user_key: str, topics: Set[str]):
+        self.user_key = user_key
+        self.topics = topics
+        self.queue: 'queue.Queue[Optional[Dict[str, Any]]]' = queue.Queue(maxsize=SSE_QUEUE_SIZE)
+        self.overflowed = False
+
+
+class EventBus:
+    """Process-local fan-out with connection caps and a replay buffer"""
+
+    def __init__(self):
+        self._subscribers: List[_Subscriber] = []
+        self._per_user: Dict[str, int] = {}
+        self._recent: deque = deque(maxlen=SSE_REPLAY_SIZE)
+        # Ids are <boot>-<seq>; a different boot means the client reconnected to another worker
+        self._boot = uuid.uuid4().hex[:8]
+        self._seq = 0
+        self._lock = threading.Lock()
+
+    def subscribe(self, user_key: str, topics: Iterable[str]) -> _Subscriber:
+        with self._lock:
+            if len(self._subscribers) >= SSE_MAX_CONNECTIONS:
+                raise ConnectionLimitError('too_many_streams', 503)
+            if self._per_user.get(user_key, 0) >= SSE_MAX_PER_USER:
+                raise ConnectionLimitError('too_many_streams_for_user', 429)
+            sub = _Subscriber(user_key, set(topics))
+            self._subscribers.append(sub)
+            self._per_user[user_key] = self._per_user.get(user_key, 0) + 1
+            return sub
+
+    def unsubscribe(self, sub: _Subscriber) -> None:
+        with self._lock:
+            if sub in self._subscribers:
+                self._subscribers.remove(sub)
+                left = self._per_user.get(sub.user_key, 1) - 1
+                if left > 0:
+                    self._per_user[sub.user_key] = left
+                else:
+                    self._per_user.pop(sub.user_key, None)
+
+    def publish(self, name: str, data: Dict[str, Any], topics: Set[str]) -> Dict[str, Any]:
+        with self._lock:
+            self._seq += 1
+            event = {'id': f"{self._boot}-{self._seq}", 'seq': self._seq, 'event': name, 'data': data, 'topics': topics}
+            self._recent.append(event)
+            targets = [s for s in self._subscribers if s.topics & topics]
+        for sub in targets:
+            try:
+                sub.queue.put_nowait(event)
+            except queue.Full:
+                # A stalled client gets a resync instead of holding the bus up
+                sub.overflowed = True
+        return event
+
+    def replay(self, last_event_id: Optional[str], topics: Set[str]) -> Optional[List[Dict[str, Any]]]:
+        """Buffered events after last_event_id, or None when the gap cannot be filled"""
+        try:
+            boot, seq_text = (last_event_id or '').split('-', 1)
+            seq = int(seq_text)
+        except Exception:
+            return None
+        with self._lock:
+            if boot != self._boot:
+                return None
+            if self._recent and self._recent[0]['seq'] > seq + 1:
+                return None
+            return [e for e in self._recent if e['seq'] > seq and e['topics'] & topics]
+
+    def stats(self) -> Dict[str, int]:
+        with self._lock:
+            return {'streams': len(self._subscribers), 'users': len(self._per_user), 'last_seq': self._seq}
+
+
+_bus = EventBus()
+_listener_connected = threading.Event()
+_listener_lock = threading.Lock()
+_listener_thread: Optional[threading.Thread] = None
+_change_hooks: List[Callable[[str], None]] = []
+
+
+def get_event_bus() -> EventBus:
+    return _bus
+
+
+def on_change(hook: Callable[[str], None]) -> None:
+    """Register hook(table), called for every change seen by this process (e.g. cache invalidation)"""
+    _change_hooks.append(hook)
+
+
+def _run_hooks(table: str) -> None:
+    for hook in _change_hooks:
+        try:
+            hook(table)
+        except Exception as e:
+            logger.warning(f"Change hook failed for {table}: {str(e)}")
+
+
+def _publish_row(table: str, op: str, row: Dict[str, Any]) -> None:
+    data = {'table': table, 'op': op, 'id': row.get('id'), 'status': row.get('status')}
+    _bus.publish(EVENT_NAMES.get(table, table), data, topics_for(table, row))
+
+
+def publish_change(table: str, op: str, row: Optional[Dict[str, Any]]) -> None:
+    """Called by routes after a write; best-effort and never raises"""
+    if not row:
+        return
+    # Hooks always run locally: not every table is covered by the NOTIFY triggers
+    _run_hooks(table)
+    if _listener_connected.is_set() and table in NOTIFY_TABLES:
+        return
+    try:
+        _publish_row(table, op, row)
+    except Exception as e:
+        logger.warning(f"Failed to publish {table} {op} event: {str(e)}")
+
+
+# ---- Postgres LISTEN/NOTIFY ------------------------------------------------
+
+def _listen_forever(dsn: str) -> None:
+    import select
+    import psycopg2
+    import psycopg2.extensions
+
+    while True:
+        conn = None
+        try:
+            conn = psycopg2.connect(dsn)
+            conn.set_isolation_level(psycopg2.extensions.ISOLATION_LEVEL_AUTOCOMMIT)
+            with conn.cursor() as cur:
+                cur.execute(f"LISTEN {NOTIFY_CHANNEL};")
+            _listener_connected.set()
+            logger.info("Listening for change events on Postgres")
+            while True:
+                if select.select([conn], [], [], SSE_HEARTBEAT_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    note = conn.notifies.pop(0)
+                    try:
+                        payload = json.loads(note.payload)
+                        _run_hooks(payload.get('table') or '')
+                        _publish_row(payload.get('table') or '', payload.get('op') or '', payload)
+                    except Exception as e:
+                        logger.warning(f"Ignoring malformed change event: {str(e)}")
+        except Exception as e:
+            logger.warning(f"Change event listener disconnected: {str(e)}")
+        finally:
+            # Routes publish locally again until the listener is back
+            _listener_connected.clear()
+            try:
+                if conn is not None:
+                    conn.close()
+            except Exception:
+                pass
+        time.sleep(5)
+
+
+def start_event_listener() -> Optional[threading.Thread]:
+    """Start the LISTEN thread once per process when EVENTS_DATABASE_URL and psycopg2 are available"""
+    global _listener_thread
+    dsn = os.environ.get('EVENTS_DATABASE_URL')
+    if not dsn:
+        return None
+    try:
+        import psycopg2  # noqa: F401
+    except Exception:
+        logger.warning("EVENTS_DATABASE_URL is set but psycopg2 is not installed; using route-level events only")
+        return None
+    with _listener_lock:
+        if _listener_thread is None:
+            _listener_thread = threading.Thread(target=_listen_forever, args=(dsn,), name='event-listener', daemon=True)
+            _listener_thread.start()
+    return _listener_thread
+
+
+# ---- SSE -------------------------------------------------------------------
+
+def _format(event: Dict[str, Any]) -> str:
+    return f"id: {event['id']}\nevent: {event['event']}\ndata: {json.dumps(event['data'], separators=(',', ':'))}\n\n"
+
+
+def sse_response(user_key: str, topics: Iterable[str], last_event_id: Optional[str] = None):
+    """Streaming response for one dashboard; (json, status) when over the connection caps"""
+    topics = set(topics)
+    try:
+        sub = _bus.subscribe(user_key, topics)
+    except ConnectionLimitError as e:
+        resp = jsonify({'error': str(e)})
+        resp.headers['Retry-After'] = str(max(1, SSE_RETRY_MS // 1000))
+        return resp, e.status
+
+    def generate():
+        try:
+            yield f"retry: {SSE_RETRY_MS}\n\n"
+            if last_event_id:
+                missed = _bus.replay(last_event_id, topics)
+                if missed is None:
+                    yield "event: resync\ndata: {}\n\n"
+                else:
+                    for event in missed:
+                        yield _format(event)
+            deadline = time.monotonic() + SSE_MAX_STREAM_SECONDS
+            while time.monotonic() < deadline:
+                try:
+                    event = sub.queue.get(timeout=SSE_HEARTBEAT_SECONDS)
+                except queue.Empty:
+                    yield ": ping\n\n"
+                    continue
+                if sub.overflowed:
+                    yield "event: resync\ndata: {}\n\n"
+                    return
+                yield _format(event)
+        finally:
+            _bus.unsubscribe(sub)
+
+    resp = Response(stream_with_context(generate()), mimetype='text/event-stream')
+    resp.headers['Cache-Control'] = 'no-cache'
+    resp.headers['X-Accel-Buffering'] = 'no'
+    return resp
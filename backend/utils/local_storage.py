@@ -0,0 +1,192 @@
+"""
+Local filesystem object store (STORAGE_PROVIDER=local)
+
+Objects are addressed by bucket + key like Supabase Storage, but are stored on
+disk under two levels of hash-sharded directories so no directory grows past a
+few hundred entries:
+
+    <LOCAL_STORAGE_DIR>/<bucket>/ab/cd/<sha256(key)>.<ext>
+
+Writes stream to a temp file in the target directory and are published with
+os.replace, so readers never see a partial object. write_content_addressed
+hashes while copying and names the object after its SHA-256, so the same bytes
+are only ever stored once. Reads are served by the
+routes in routes/api.py with HTTP Range support; access is granted through
+short-lived HMAC-signed URLs.
+"""
+
+import os
+import hmac
+import hashlib
+import logging
+import secrets
+import tempfile
+import time
+from typing import Any, BinaryIO, Dict, Iterator, Optional, Tuple
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+COPY_CHUNK_SIZE = 1024 * 1024
+TEMP_PREFIX = ".upload-"
+# Content-addressed writes land here first, before their hash (and so their path) is known
+INCOMING_DIR = ".incoming"
+
+
+class ObjectTooLarge(Exception):
+    pass
+
+
+class ContentMismatch(ValueError):
+    pass
+
+
+class LocalObjectStore:
+    """Sharded, atomically written object store on local disk"""
+
+    def __init__(self, root: Optional[str] = None, secret: Optional[str] = None):
+        self.root = os.path.abspath(root or os.environ.get("LOCAL_STORAGE_DIR", "./storage"))
+        secret = secret or os.environ.get("LOCAL_STORAGE_SECRET") or os.environ.get("SUPABASE_JWT_SECRET")
+        if not secret:
+            # Signed URLs will not survive a restart, but nothing is left unsigned
+            logger.warning("LOCAL_STORAGE_SECRET not set; using a per-process signing key")
+            secret = secrets.token_hex(32)
+        self._secret = secret.encode()
+        os.makedirs(self.root, exist_ok=True)
+
+    # ---- layout --------------------------------------------------------------
+
+    @staticmethod
+    def _validate_key(key: str) -> str:
+        key = (key or "").strip("/")
+        if not key or ".." in key.split("/") or "\\" in key or "\x00" in key:
+            raise ValueError("Invalid object key")
+        return key
+
+    def path_for(self, bucket: str, key: str) -> str:
+        key = self._validate_key(key)
+        digest = hashlib.sha256(key.encode()).hexdigest()
+        ext = os.path.splitext(key)[1].lower()
+        return os.path.join(self.root, bucket, digest[:2], digest[2:4], f"{digest}{ext}")
+
+    # ---- objects ---------------------------------------------------------------
+
+    def _copy_to_temp(self, directory: str, stream: BinaryIO,
+                      max_bytes: Optional[int]) -> Tuple[str, int, str]:
+        """Copy a stream to a temp file in directory, hashing it on the way; returns (path, size, sha256)"""
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=TEMP_PREFIX)
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with os.fdopen(fd, "wb") as out:
+                while True:
+                    chunk = stream.read(COPY_CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    if max_bytes is not None and size > max_bytes:
+                        raise ObjectTooLarge()
+                    hasher.update(chunk)
+                    out.write(chunk)
+                out.flush()
+                os.fsync(out.fileno())
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+        return tmp_path, size, hasher.hexdigest()
+
+    @staticmethod
+    def _discard(path: str) -> None:
+        try:
+            os.unlink(path)
+        except OSError:
+            pass
+
+    def write_stream(self, bucket: str, key: str, stream: BinaryIO,
+                     max_bytes: Optional[int] = None, expected_sha256: Optional[str] = None) -> int:
+        """Copy a stream to the object in bounded chunks and publish it atomically
+
+        With expected_sha256 the object is only published if the bytes match.
+        """
+        final_path = self.path_for(bucket, key)
+        tmp_path, size, digest = self._copy_to_temp(os.path.dirname(final_path), stream, max_bytes)
+        if expected_sha256 and digest != expected_sha256.lower():
+            self._discard(tmp_path)
+            raise ContentMismatch(f"content hash {digest} does not match {expected_sha256}")
+        try:
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+        return size
+
+    def write_content_addressed(self, bucket: str, stream: BinaryIO, ext: str = "",
+                                folder: Optional[str] = None,
+                                max_bytes: Optional[int] = None) -> Dict[str, Any]:
+        """Store a stream under <folder>/<sha256>.<ext>
+
+        The hash is computed while the bytes are copied. If an object with the
+        same content already exists the copy is dropped and nothing is replaced.
+        """
+        incoming = os.path.join(self.root, bucket, INCOMING_DIR)
+        tmp_path, size, digest = self._copy_to_temp(incoming, stream, max_bytes)
+        key = f"{folder.strip('/')}/{digest}" if folder else digest
+        if ext:
+            key = f"{key}.{ext}"
+        try:
+            final_path = self.path_for(bucket, key)
+            os.makedirs(os.path.dirname(final_path), exist_ok=True)
+            if os.path.exists(final_path):
+                self._discard(tmp_path)
+                return {"key": key, "size": size, "sha256": digest, "created": False}
+            os.replace(tmp_path, final_path)
+        except BaseException:
+            self._discard(tmp_path)
+            raise
+        return {"key": key, "size": size, "sha256": digest, "created": True}
+
+    def stat(self, bucket: str, key: str) -> Optional[Dict[str, int]]:
+        try:
+            st = os.stat(self.path_for(bucket, key))
+        except (OSError, ValueError):
+            return None
+        return {"size": st.st_size, "mtime": int(st.st_mtime)}
+
+    def delete(self, bucket: str, key: str) -> bool:
+        try:
+            os.unlink(self.path_for(bucket, key))
+            return True
+        except FileNotFoundError:
+            return False
+
+    def iter_files(self, bucket: str) -> Iterator[Tuple[str, float, int]]:
+        """Walk every stored file (including abandoned temp files) as (path, mtime, size)"""
+        base = os.path.join(self.root, bucket)
+        for dirpath, _, filenames in os.walk(base):
+            for name in filenames:
+                path = os.path.join(dirpath, name)
+                try:
+                    st = os.stat(path)
+                except OSError:
+                    continue
+                yield path, st.st_mtime, st.st_size
+
+    # ---- signed access ---------------------------------------------------------
+
+    def _signature(self, method: str, bucket: str, key: str, expires: int) -> str:
+        message = f"{method.upper()}\n{bucket}\n{key}\n{expires}".encode()
+        return hmac.new(self._secret, message, hashlib.sha256).hexdigest()
+
+    def sign(self, method: str, bucket: str, key: str, ttl_seconds: int) -> Dict[str, str]:
+        expires = int(time.time()) + int(ttl_seconds)
+        return {"expires": str(expires), "sig": self._signature(method, bucket, key, expires)}
+
+    def verify(self, method: str, bucket: str, key: str, expires: Optional[str], sig: Optional[str]) -> bool:
+        try:
+            exp = int(expires or 0)
+        except ValueError:
+            return False
+        if exp < time.time() or not sig:
+            return False
+        return hmac.compare_digest(self._signature(method, bucket, key, exp), sig)
@@ -1,65 +1,101 @@
 """
 Reminder service for sending session reminders
-This can be called by a scheduled job or cron task
+This can be called by a scheduled job or cron task, or run continuously by the
+built-in ReminderScheduler (REMINDER_SCHEDULER_ENABLED, or: python -m utils.reminder_service --loop)
 """
 
+import os
 import logging
+import threading
+import time
+import uuid
 from datetime import datetime, timedelta, timezone
-from typing import Optional
-from utils.db import DatabaseManager
-from utils.email_service import get_email_service
+from typing import Dict, List, Optional, Tuple
+from utils.db import get_service_client
+from utils.email_outbox import get_outbox_email_service
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
-def send_session_reminders(user_jwt: Optional[str] = None):
+# Ledger kind for the "session is tomorrow" reminder
+DAY_BEFORE_KIND = 'before_24h'
+
+def send_session_reminders(client=None):
     """
     Send reminder emails for sessions scheduled for tomorrow
     This function should be called daily (e.g., via cron job)
+
+    Claims go through the reminder ledger, which only the service role may write.
     """
     try:
-        db = DatabaseManager(user_jwt=user_jwt)
-        email_service = get_email_service()
+        client = client or get_service_client()
+        if client is None:
+            logger.error("Session reminders need SUPABASE_SERVICE_ROLE_KEY")
+            return 0
         
         # Calculate tomorrow's date range
         tomorrow = datetime.now() + timedelta(days=1)
         tomorrow_start = tomorrow.replace(hour=0, minute=0, second=0, microsecond=0)
-        tomorrow_end = tomorrow.replace(hour=23, minute=59, second=59, microsecond=999999)
         
-        # Get all scheduled sessions for tomorrow
-        sessions_result = (
-            db.client
-            .table('tutoring_jobs')
-            .select('*')
-            .eq('status', 'scheduled')
-            .gte('scheduled_time', tomorrow_start.isoformat())
-            .lte('scheduled_time', tomorrow_end.isoformat())
-            .execute()
-        )
+        return run_reminder_window(client, DAY_BEFORE_KIND, tomorrow_start,
+                                   tomorrow_start + timedelta(days=1), when='tomorrow')
         
-        if not sessions_result.data:
-            logger.info("No sessions scheduled for tomorrow")
-            return
+    except Exception as e:
+        logger.error(f"Error in send_session_reminders: {str(e)}")
+        return 0
+
+def request_reminder_run() -> bool:
+    """Run tomorrow's reminders on a background thread; False when no service key is configured"""
+    if not os.environ.get('SUPABASE_SERVICE_ROLE_KEY'):
+        return False
+    threading.Thread(target=send_session_reminders, name='reminder-manual-run', daemon=True).start()
+    return True
+
+def run_reminder_window(client, kind: str, window_start: datetime, window_end: datetime,
+                        when: str = 'tomorrow') -> int:
+    """
+    Queue reminders for sessions starting in [window_start, window_end)
+
+    Args:
+        client: Service-role Supabase client (the ledger is not user-writable)
+        kind: Ledger kind; each session gets at most one reminder per kind
+        when: Human phrase for the email copy ("tomorrow", "in 1 hour")
+
+    Returns:
+        int: Number of sessions whose reminders were queued
+    """
+    try:
+        # Claim sessions in the window that have not been reminded yet (ledger + advisory lock)
+        sessions = claim_due_sessions(client, kind, window_start, window_end)
+        
+        if not sessions:
+            logger.info(f"No unreminded sessions for {kind} in {window_start.isoformat()} - {window_end.isoformat()}")
+            return 0
+        
+        # Prefetch every tutor/tutee involved with one in_() query each instead of one lookup per session
+        tutors_by_id = _fetch_people(client, 'tutors', {s.get('tutor_id') for s in sessions})
+        tutees_by_id = _fetch_people(client, 'tutees', {s.get('tutee_id') for s in sessions})
         
-        reminder_count = 0
+        # Build every reminder first, then hand them to the email service in one batch
+        messages = []
+        message_sessions = []
+        missing_sessions = set()
         
-        for session in sessions_result.data:
+        for session in sessions:
             try:
                 # Extract session details
-                tutor = {}
-                opportunity = {}
-                # Best-effort fetch related entities under RLS
-                try:
-                    trow = db.client.table('tutors').select('first_name,last_name,email').eq('id', session.get('tutor_id')).single().execute()
-                    tutor = trow.data or {}
-                except Exception:
-                    tutor = {}
-                try:
-                    # We snapshot some details on the job; if not present, leave blank
-                    if isinstance(session.get('opportunity_snapshot'), dict):
-                        opportunity = session.get('opportunity_snapshot') or {}
-                except Exception:
-                    opportunity = {}
+                tutor = tutors_by_id.get(session.get('tutor_id')) or {}
+                tutee = tutees_by_id.get(session.get('tutee_id')) or {}
+                # We snapshot some details on the job; fall back to the job columns / tutee row
+                opportunity = session.get('opportunity_snapshot') if isinstance(session.get('opportunity_snapshot'), dict) else {}
+                opportunity = {
+                    **opportunity,
+                    'subject': opportunity.get('subject') or session.get('subject_name') or '',
+                    'session_location': opportunity.get('session_location') or session.get('location') or '',
+                    'tutee_first_name': opportunity.get('tutee_first_name') or tutee.get('first_name', ''),
+                    'tutee_last_name': opportunity.get('tutee_last_name') or tutee.get('last_name', ''),
+                    'tutee_email': opportunity.get('tutee_email') or tutee.get('email', ''),
+                }
                 scheduled_time = datetime.fromisoformat(session['scheduled_time'].replace('Z', '+00:00'))
                 
                 # Convert UTC time to local time for proper date formatting
@@ -76,68 +112,124 @@ def send_session_reminders(user_jwt: Optional[str] = None):
                     'time': formatted_time,
                     'location': opportunity.get('session_location', ''),
                     'tutor_name': f"{tutor.get('first_name', '')} {tutor.get('last_name', '')}".strip(),
-                    'tutee_name': f"{opportunity.get('tutee_first_name', '')} {opportunity.get('tutee_last_name', '')}".strip()
+                    'tutee_name': f"{opportunity.get('tutee_first_name', '')} {opportunity.get('tutee_last_name', '')}".strip(),
+                    'when': when
                 }
                 
-                # Send reminder emails
-                tutor_success = send_tutor_reminder(tutor.get('email', ''), session_details)
-                tutee_success = send_tutee_reminder(opportunity.get('tutee_email', ''), session_details)
-                
-                if tutor_success and tutee_success:
-                    # Log the communication
-                    try:
-                        # Log communication for tutor
-                        db.insert_record("communications", {
-                            "job_id": session['id'],
-                            "type": "email",
-                            "recipient": tutor.get('email', ''),
-                            "subject": f"Session reminder for {session_details['subject']}",
-                            "content": f"Session reminder for {session_details['subject']} on {session_details['date']}",
-                            "status": "sent"
-                        })
-                        # Log communication for tutee
-                        db.insert_record("communications", {
-                            "job_id": session['id'],
-                            "type": "email",
-                            "recipient": opportunity.get('tutee_email', ''),
-                            "subject": f"Session reminder for {session_details['subject']}",
-                            "content": f"Session reminder for {session_details['subject']} on {session_details['date']}",
-                            "status": "sent"
-                        })
-                    except Exception as log_error:
-                        logger.error(f"Failed to log reminder communication: {str(log_error)}")
-                    
-                    reminder_count += 1
-                    logger.info(f"Reminder sent for session {session['id']}")
-                else:
-                    logger.error(f"Failed to send reminder for session {session['id']}")
+                tutor_message = build_tutor_reminder(tutor.get('email', ''), session_details)
+                tutee_message = build_tutee_reminder(opportunity.get('tutee_email', ''), session_details)
+                if not (tutor_message and tutee_message):
+                    # Still remind whoever we can, but the session does not count as reminded
+                    missing_sessions.add(session['id'])
+                for message in (tutor_message, tutee_message):
+                    if not message:
+                        continue
+                    message['job_id'] = session['id']
+                    messages.append(message)
+                    message_sessions.append(session['id'])
                     
             except Exception as session_error:
                 logger.error(f"Error processing session {session.get('id', 'unknown')}: {str(session_error)}")
                 continue
         
-        logger.info(f"Sent {reminder_count} session reminders for tomorrow")
+        # Queue reminder emails; the outbox worker logs delivery to communications
+        email_service = get_outbox_email_service(kind='session_reminder', client=client)
+        results = email_service.send_many(messages)
+        session_ok = {session_id: False for session_id in missing_sessions}
+        for session_id, ok in zip(message_sessions, results):
+            session_ok[session_id] = session_ok.get(session_id, True) and ok
+        reminder_count = sum(1 for ok in session_ok.values() if ok)
+        failed_sessions = [session_id for session_id, ok in session_ok.items() if not ok]
+        for session_id in failed_sessions:
+            logger.error(f"Failed to queue reminder for session {session_id}")
+        # Re-arm sessions whose emails could not be queued at all so the next run retries them
+        queued = {session_id for session_id, ok in zip(message_sessions, results) if ok}
+        release_sessions(client, kind, [sid for sid in failed_sessions if sid not in queued and sid not in missing_sessions])
+        
+        logger.info(f"Queued {reminder_count} {kind} session reminders")
         return reminder_count
         
     except Exception as e:
-        logger.error(f"Error in send_session_reminders: {str(e)}")
+        logger.error(f"Error in run_reminder_window ({kind}): {str(e)}")
         return 0
 
-def send_tutor_reminder(tutor_email: str, session_details: dict) -> bool:
-    """Send reminder email to tutor"""
+def _is_missing_function(error: Exception) -> bool:
+    """PostgREST 'function not found' (PGRST202) or Postgres undefined_function (42883)"""
+    code = getattr(error, 'code', None)
+    if code in ('PGRST202', '42883'):
+        return True
+    text = str(error)
+    return 'PGRST202' in text or '42883' in text
+
+def claim_due_sessions(client, kind: str, window_start: datetime, window_end: datetime) -> List[dict]:
+    """
+    Claim scheduled sessions in [window_start, window_end) that have no ledger row for kind
+
+    Claiming inserts the ledger rows, so repeated or concurrent runs never
+    return the same session twice (see claim_session_reminders in schema.sql).
+    """
+    try:
+        res = client.rpc('claim_session_reminders', {
+            'p_kind': kind,
+            'p_from': window_start.isoformat(),
+            'p_to': window_end.isoformat(),
+            'p_run_id': uuid.uuid4().hex,
+        }).execute()
+        return [row for row in (res.data or []) if isinstance(row, dict)]
+    except Exception as e:
+        if not _is_missing_function(e):
+            # Timeouts and 5xx must not fall back: concurrent schedulers would send duplicates
+            logger.error(f"claim_session_reminders failed, skipping {kind} window: {str(e)}")
+            return []
+        # Schema without the ledger yet: fall back to a plain (non-idempotent) scan
+        logger.warning(f"claim_session_reminders unavailable, scanning without ledger: {str(e)}")
+    res = (
+        client
+        .table('tutoring_jobs')
+        .select('id,tutor_id,tutee_id,scheduled_time,subject_name,location,opportunity_snapshot')
+        .eq('status', 'scheduled')
+        .gte('scheduled_time', window_start.isoformat())
+        .lt('scheduled_time', window_end.isoformat())
+        .execute()
+    )
+    return res.data or []
+
+def release_sessions(client, kind: str, job_ids: List[str]) -> None:
+    """Drop ledger rows for sessions whose reminders could not be queued"""
+    if not job_ids:
+        return
+    try:
+        client.table('reminder_ledger').delete().eq('kind', kind).in_('job_id', job_ids).execute()
+    except Exception as e:
+        logger.error(f"Failed to release reminder ledger rows: {str(e)}")
+
+def _fetch_people(client, table: str, ids) -> Dict[str, dict]:
+    """Load first_name/last_name/email for many ids in one query (best-effort under RLS)"""
+    ids = [i for i in ids if i]
+    people: Dict[str, dict] = {}
+    # Chunk to keep the PostgREST query string well under URL limits
+    for i in range(0, len(ids), 200):
+        try:
+            res = client.table(table).select('id,first_name,last_name,email').in_('id', ids[i:i + 200]).execute()
+            people.update({row['id']: row for row in (res.data or [])})
+        except Exception as e:
+            logger.error(f"Failed to prefetch {table} for reminders: {str(e)}")
+    return people
+
+def build_tutor_reminder(tutor_email: str, session_details: dict) -> Optional[dict]:
+    """Build the reminder message for a tutor (send_many message dict)"""
     if not tutor_email:
-        return False
-        
-    email_service = get_email_service()
+        return None
     
-    subject = f"Reminder: Tutoring Session Tomorrow - {session_details['subject']}"
+    when = session_details.get('when', 'tomorrow')
+    subject = f"Reminder: Tutoring Session {when[:1].upper() + when[1:]} - {session_details['subject']}"
     
     html_body = f"""
     <html>
     <body>
         <h2>Session Reminder</h2>
         <p>Hello {session_details['tutor_name']},</p>
-        <p>This is a friendly reminder about your tutoring session tomorrow:</p>
+        <p>This is a friendly reminder about your tutoring session {when}:</p>
         <ul>
             <li><strong>Subject:</strong> {session_details['subject']}</li>
             <li><strong>Date:</strong> {session_details['date']}</li>
@@ -161,7 +253,7 @@ def send_tutor_reminder(tutor_email: str, session_details: dict) -> bool:
     
     Hello {session_details['tutor_name']},
     
-    This is a friendly reminder about your tutoring session tomorrow:
+    This is a friendly reminder about your tutoring session {when}:
     
     Subject: {session_details['subject']}
     Date: {session_details['date']}
@@ -177,23 +269,30 @@ def send_tutor_reminder(tutor_email: str, session_details: dict) -> bool:
     Thank you for volunteering!
     """
     
-    return email_service.send_email(tutor_email, subject, html_body, text_body)
+    return {'to_email': tutor_email, 'subject': subject, 'body_html': html_body, 'body_text': text_body}
 
-def send_tutee_reminder(tutee_email: str, session_details: dict) -> bool:
-    """Send reminder email to tutee"""
-    if not tutee_email:
+def send_tutor_reminder(tutor_email: str, session_details: dict, email_service=None) -> bool:
+    """Send (queue) reminder email to tutor"""
+    message = build_tutor_reminder(tutor_email, session_details)
+    if not message:
         return False
-        
-    email_service = get_email_service()
+    email_service = email_service or get_outbox_email_service(kind='session_reminder')
+    return email_service.send_email(message['to_email'], message['subject'], message['body_html'], message['body_text'])
+
+def build_tutee_reminder(tutee_email: str, session_details: dict) -> Optional[dict]:
+    """Build the reminder message for a tutee (send_many message dict)"""
+    if not tutee_email:
+        return None
     
-    subject = f"Reminder: Tutoring Session Tomorrow - {session_details['subject']}"
+    when = session_details.get('when', 'tomorrow')
+    subject = f"Reminder: Tutoring Session {when[:1].upper() + when[1:]} - {session_details['subject']}"
     
     html_body = f"""
     <html>
     <body>
         <h2>Session Reminder</h2>
         <p>Hello {session_details['tutee_name']},</p>
-        <p>This is a friendly reminder about your tutoring session tomorrow:</p>
+        <p>This is a friendly reminder about your tutoring session {when}:</p>
         <ul>
             <li><strong>Subject:</strong> {session_details['subject']}</li>
             <li><strong>Date:</strong> {session_details['date']}</li>
@@ -217,7 +316,7 @@ def send_tutee_reminder(tutee_email: str, session_details: dict) -> bool:
     
     Hello {session_details['tutee_name']},
     
-    This is a friendly reminder about your tutoring session tomorrow:
+    This is a friendly reminder about your tutoring session {when}:
     
     Subject: {session_details['subject']}
     Date: {session_details['date']}
@@ -233,9 +332,146 @@ def send_tutee_reminder(tutee_email: str, session_details: dict) -> bool:
     We hope you have a productive session!
     """
     
-    return email_service.send_email(tutee_email, subject, html_body, text_body)
+    return {'to_email': tutee_email, 'subject': subject, 'body_html': html_body, 'body_text': text_body}
+
+def send_tutee_reminder(tutee_email: str, session_details: dict, email_service=None) -> bool:
+    """Send (queue) reminder email to tutee"""
+    message = build_tutee_reminder(tutee_email, session_details)
+    if not message:
+        return False
+    email_service = email_service or get_outbox_email_service(kind='session_reminder')
+    return email_service.send_email(message['to_email'], message['subject'], message['body_html'], message['body_text'])
+
+def parse_reminder_windows(spec: Optional[str] = None) -> List[Tuple[str, timedelta]]:
+    """
+    Parse REMINDER_WINDOWS (e.g. "24h,1h" or "90m") into (ledger kind, lead time) pairs
+    """
+    spec = spec if spec is not None else os.environ.get('REMINDER_WINDOWS', '24h,1h')
+    windows = []
+    for part in (spec or '').split(','):
+        part = part.strip().lower()
+        if not part:
+            continue
+        try:
+            minutes = int(part[:-1]) * 60 if part.endswith('h') else int(part.rstrip('m'))
+        except ValueError:
+            logger.warning(f"Ignoring invalid reminder window: {part}")
+            continue
+        if minutes <= 0:
+            continue
+        kind = f"before_{minutes // 60}h" if minutes % 60 == 0 else f"before_{minutes}m"
+        windows.append((kind, timedelta(minutes=minutes)))
+    return windows
+
+def _describe_lead(lead: timedelta) -> str:
+    minutes = int(lead.total_seconds() // 60)
+    if minutes >= 20 * 60:
+        return 'tomorrow' if minutes <= 36 * 60 else f"in {round(minutes / 1440)} days"
+    if minutes % 60 == 0:
+        hours = minutes // 60
+        return f"in {hours} hour{'s' if hours != 1 else ''}"
+    return f"in {minutes} minutes"
+
+class ReminderScheduler:
+    """
+    Background loop that sends reminders as sessions enter each look-ahead window
+
+    Every tick covers only the slice of start times that entered a window since
+    the previous tick (plus a small overlap), i.e. [now + lead - lookback, now + lead),
+    which is a short range scan on idx_jobs_status_scheduled. The ledger makes the
+    overlap and concurrent schedulers on other instances harmless. Sessions booked
+    after a window opened are not back-filled for that window (e.g. a session booked
+    5 hours out gets the 1h reminder, not the 24h one).
+    """
+
+    def __init__(self, client=None, interval_seconds: Optional[int] = None,
+                 windows: Optional[List[Tuple[str, timedelta]]] = None):
+        self.client = client
+        self.interval = interval_seconds or int(os.environ.get('REMINDER_INTERVAL_SECONDS', '300'))
+        self.windows = windows if windows is not None else parse_reminder_windows()
+        # Overlap consecutive slices so a late or slow tick never leaves a gap
+        self.lookback = timedelta(seconds=int(os.environ.get('REMINDER_LOOKBACK_SECONDS', str(self.interval * 3))))
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def run_once(self, now: Optional[datetime] = None) -> Dict[str, int]:
+        """Process every window once; returns queued session counts per kind"""
+        client = self.client or get_service_client()
+        if client is None:
+            logger.error("Reminder scheduler needs SUPABASE_SERVICE_ROLE_KEY")
+            return {}
+        now = now or datetime.now(timezone.utc)
+        counts = {}
+        for kind, lead in self.windows:
+            window_end = now + lead
+            # Never remind for sessions that already started
+            window_start = max(now, window_end - self.lookback)
+            counts[kind] = run_reminder_window(client, kind, window_start, window_end, when=_describe_lead(lead))
+        return counts
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                logger.error(f"Reminder scheduler tick failed: {str(e)}")
+            self._stop.wait(self.interval)
+
+    def start(self) -> None:
+        if self._thread and self._thread.is_alive():
+            return
+        self._thread = threading.Thread(target=self._run, name='reminder-scheduler', daemon=True)
+        self._thread.start()
+        logger.info(f"Reminder scheduler started: every {self.interval}s for {[k for k, _ in self.windows]}")
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+_scheduler: Optional[ReminderScheduler] = None
+_scheduler_lock = threading.Lock()
+
+def start_reminder_scheduler() -> Optional[ReminderScheduler]:
+    """Start the in-process scheduler once when REMINDER_SCHEDULER_ENABLED and a service key are set"""
+    global _scheduler
+    if os.environ.get('REMINDER_SCHEDULER_ENABLED', 'false').lower() not in ('1', 'true', 'yes'):
+        return None
+    if get_service_client() is None:
+        logger.warning("REMINDER_SCHEDULER_ENABLED but SUPABASE_SERVICE_ROLE_KEY is not set; scheduler not started")
+        return None
+    with _scheduler_lock:
+        if _scheduler is None:
+            _scheduler = ReminderScheduler()
+            _scheduler.start()
+    return _scheduler
 
 if __name__ == "__main__":
-    # Allow running this script directly for testing
-    count = send_session_reminders()
-    print(f"Sent {count} reminder emails")
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Session reminder runner")
+    parser.add_argument('--loop', action='store_true', help="run the windowed scheduler until interrupted")
+    parser.add_argument('--once', action='store_true', help="run every window once and exit")
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+
+    if args.loop or args.once:
+        scheduler = ReminderScheduler()
+        if args.once:
+            print(f"Queued reminders: {scheduler.run_once()}")
+        else:
+            scheduler.start()
+            try:
+                while True:
+                    time.sleep(1)
+            except KeyboardInterrupt:
+                scheduler.stop()
+    else:
+        # Allow running this script directly for testing
+        count = send_session_reminders()
+        print(f"Sent {count} reminder emails")
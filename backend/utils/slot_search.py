@@ -0,0 +1,265 @@
+"""
+Suggested start times for a job's single session
+
+The search space is a minute grid covering SLOT_SEARCH_DAYS days of local
+(wall-clock) time, held as one Python integer used as a bit vector: bit i is
+minute i after the grid's first midnight. Every constraint becomes a mask and
+the whole sweep is a handful of big-integer operations, each touching all
+~23k minutes at once:
+
+    free   = tutee availability & tutor availability & ~busy sessions & ~too soon
+    starts = minutes that begin a run of `duration` free minutes (log2(duration)
+             shift-ANDs), restricted to the step grid (every 15 minutes)
+
+and the first k set bits are the suggestions. Batches build the tutor's
+masks (busy sessions, optional availability) once and reuse them per job.
+
+Times are local to SCHEDULING_TIMEZONE (an IANA name; default: the server's
+local zone), the same wall clock tutees use when entering availability.
+
+Benchmark: python -m utils.slot_search
+"""
+
+import os
+import logging
+from datetime import date, datetime, time as dtime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from utils.availability import Availability, MINUTES_PER_DAY, format_hhmm
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Tutees give 14 days of availability starting two days out
+SLOT_SEARCH_DAYS = int(os.environ.get('SLOT_SEARCH_DAYS', '16'))
+# Suggestions never start sooner than this from now
+SLOT_MIN_LEAD_MINUTES = int(os.environ.get('SLOT_MIN_LEAD_MINUTES', '60'))
+DEFAULT_STEP_MINUTES = 15
+
+_step_masks: Dict[Tuple[int, int], int] = {}
+
+
+def scheduling_tz():
+    """Zone the availability grid is expressed in (None = server local time)"""
+    name = os.environ.get('SCHEDULING_TIMEZONE')
+    if not name:
+        return None
+    try:
+        from zoneinfo import ZoneInfo
+        return ZoneInfo(name)
+    except Exception:
+        logger.warning(f"Unknown SCHEDULING_TIMEZONE {name!r}; using server local time")
+        return None
+
+
+def _to_local(value: datetime, tz) -> datetime:
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.astimezone(tz).replace(tzinfo=None)
+
+
+def _from_local(value: datetime, tz) -> datetime:
+    return value.replace(tzinfo=tz) if tz is not None else value.astimezone()
+
+
+def step_mask(minutes: int, step: int) -> int:
+    """Bits at every `step`-th minute of a grid `minutes` long (cached)"""
+    key = (minutes, step)
+    mask = _step_masks.get(key)
+    if mask is None:
+        # Build by doubling: log2(minutes / step) shift-ORs
+        mask, width = 1, step
+        while width < minutes:
+            mask |= mask << width
+            width *= 2
+        mask &= (1 << minutes) - 1
+        _step_masks[key] = mask
+    return mask
+
+
+def run_starts(mask: int, length: int) -> int:
+    """Bits i such that mask has `length` consecutive ones starting at bit i"""
+    result, covered = mask, 1
+    while covered < length:
+        shift = min(covered, length - covered)
+        result &= result >> shift
+        covered += shift
+    return result
+
+
+def lowest_bits(mask: int, k: int) -> List[int]:
+    """Indices of the k lowest set bits"""
+    out = []
+    while mask and len(out) < k:
+        low = mask & -mask
+        out.append(low.bit_length() - 1)
+        mask ^= low
+    return out
+
+
+def interval_mask(start: int, end: int, minutes: int) -> int:
+    start, end = max(0, start), min(minutes, end)
+    return ((1 << (end - start)) - 1) << start if end > start else 0
+
+
+class SlotGrid:
+    """One search window: first local midnight, length, and the shared masks"""
+
+    def __init__(self, first_day: date, days: int = SLOT_SEARCH_DAYS, now: Optional[datetime] = None,
+                 tz=None, lead_minutes: int = SLOT_MIN_LEAD_MINUTES):
+        self.first_day = first_day
+        self.days = days
+        self.tz = tz
+        self.minutes = days * MINUTES_PER_DAY
+        self.origin = datetime.combine(first_day, dtime())
+        self.full = (1 << self.minutes) - 1
+        now = now or datetime.now(timezone.utc)
+        earliest = self.offset(now) + lead_minutes
+        self.open = self.full & ~interval_mask(0, earliest, self.minutes)
+
+    def offset(self, when: datetime) -> int:
+        """Grid minute of an aware (or UTC-naive) datetime"""
+        local = _to_local(when, self.tz)
+        return int((local - self.origin).total_seconds() // 60)
+
+    def busy_mask(self, sessions: Iterable[Dict[str, Any]]) -> int:
+        """Minutes covered by already-scheduled sessions ({scheduled_time, duration_minutes})"""
+        mask = 0
+        for session in sessions:
+            raw = session.get('scheduled_time')
+            if not raw:
+                continue
+            try:
+                start = self.offset(datetime.fromisoformat(str(raw).replace('Z', '+00:00')))
+            except Exception:
+                continue
+            duration = int(session.get('duration_minutes') or session.get('desired_duration_minutes') or 60)
+            mask |= interval_mask(start, start + duration, self.minutes)
+        return mask
+
+    def slot(self, minute: int, duration: int) -> Dict[str, Any]:
+        local = self.origin + timedelta(minutes=minute)
+        return {
+            'date': local.date().isoformat(),
+            'start_time': format_hhmm(local.hour * 60 + local.minute),
+            'scheduled_time': _from_local(local, self.tz).isoformat(),
+            'duration_minutes': duration,
+        }
+
+    def tutor_mask(self, busy: int = 0, tutor_availability: Optional[Availability] = None) -> int:
+        """Minutes the tutor can take: open, not busy, and within their availability if given"""
+        mask = self.open & ~busy
+        if tutor_availability is not None:
+            mask &= tutor_availability.grid_mask(self.first_day, self.days)
+        return mask
+
+    def suggest(self, availability: Availability, duration: int, k: int = 5,
+                tutor_mask: Optional[int] = None, step: int = DEFAULT_STEP_MINUTES) -> List[Dict[str, Any]]:
+        """Earliest k start times where the whole session fits every constraint"""
+        free = availability.grid_mask(self.first_day, self.days)
+        free &= self.open if tutor_mask is None else tutor_mask
+        starts = run_starts(free, duration) & step_mask(self.minutes, step)
+        return [self.slot(m, duration) for m in lowest_bits(starts, k)]
+
+
+def grid_for(now: Optional[datetime] = None, days: int = SLOT_SEARCH_DAYS) -> SlotGrid:
+    tz = scheduling_tz()
+    now = now or datetime.now(timezone.utc)
+    return SlotGrid(_to_local(now, tz).date(), days=days, now=now, tz=tz)
+
+
+def suggest_for_jobs(jobs: List[Dict[str, Any]], tutor_sessions: List[Dict[str, Any]], k: int = 5,
+                     tutor_availability: Optional[Availability] = None,
+                     step: int = DEFAULT_STEP_MINUTES, grid: Optional[SlotGrid] = None) -> Dict[str, List[Dict[str, Any]]]:
+    """
+    Suggestions for many jobs of one tutor
+
+    jobs carry id, tutee_availability and desired_duration_minutes;
+    tutor_sessions are the tutor's scheduled jobs. The grid and busy mask are
+    built once for the whole batch.
+    """
+    grid = grid or grid_for()
+    tutor_mask = grid.tutor_mask(grid.busy_mask(tutor_sessions), tutor_availability)
+    results = {}
+    for job in jobs:
+        duration = int(job.get('desired_duration_minutes') or 60)
+        availability = Availability.parse(job.get('tutee_availability'), strict=False)
+        results[job['id']] = grid.suggest(availability, duration, k=k, tutor_mask=tutor_mask, step=step)
+    return results
+
+
+# ---- benchmark -------------------------------------------------------------
+
+def _legacy_suggest(raw: Dict[str, List[str]], duration: int, busy: List[Tuple[str, int, int]],
+                    k: int, step: int) -> List[Tuple[str, int]]:
+    """Naive search: every step of every day, string-parsed ranges, linear busy scan"""
+    out = []
+    for key in sorted(raw):
+        for start in range(0, MINUTES_PER_DAY, step):
+            end = start + duration
+            ok = False
+            for r in raw[key]:
+                s, e = r.split('-')
+                sh, sm = map(int, s.split(':'))
+                eh, em = map(int, e.split(':'))
+                if sh * 60 + sm <= start and end <= eh * 60 + em:
+                    ok = True
+                    break
+            if ok and not any(b_key == key and start < b_end and b_start < end for b_key, b_start, b_end in busy):
+                out.append((key, start))
+                if len(out) >= k:
+                    return out
+    return out
+
+
+def _benchmark(jobs: int = 500, k: int = 5) -> None:
+    import random
+    import time
+
+    rng = random.Random(7)
+    now = datetime(2030, 1, 6, 12, 0, tzinfo=timezone.utc)
+    grid = SlotGrid(date(2030, 1, 6), now=now, tz=timezone.utc)
+    batch = []
+    for i in range(jobs):
+        raw = {}
+        for d in range(2, 16):
+            key = (grid.first_day + timedelta(days=d)).isoformat()
+            ranges = []
+            for start in sorted(rng.sample(range(8 * 60, 21 * 60, 30), 4)):
+                ranges.append(f"{format_hhmm(start)}-{format_hhmm(min(start + rng.choice([30, 60, 90]), 22 * 60))}")
+            raw[key] = ranges
+        batch.append({'id': str(i), 'tutee_availability': raw, 'desired_duration_minutes': rng.choice([60, 90, 120])})
+    sessions = [
+        {'scheduled_time': (now + timedelta(days=d, hours=h)).isoformat(), 'duration_minutes': 90}
+        for d in range(1, 15) for h in (2, 6)
+    ]
+    busy_legacy = []
+    for s in sessions:
+        start = grid.offset(datetime.fromisoformat(s['scheduled_time']))
+        busy_legacy.append(((grid.first_day + timedelta(days=start // MINUTES_PER_DAY)).isoformat(),
+                            start % MINUTES_PER_DAY, start % MINUTES_PER_DAY + 90))
+
+    start = time.perf_counter()
+    for job in batch:
+        _legacy_suggest(job['tutee_availability'], job['desired_duration_minutes'], busy_legacy, k, DEFAULT_STEP_MINUTES)
+    legacy = (time.perf_counter() - start) / jobs * 1e3
+
+    parsed = [(job, Availability.parse(job['tutee_availability'])) for job in batch]
+    tutor_mask = grid.tutor_mask(grid.busy_mask(sessions))
+    start = time.perf_counter()
+    for job, availability in parsed:
+        grid.suggest(availability, job['desired_duration_minutes'], k=k, tutor_mask=tutor_mask)
+    sweep = (time.perf_counter() - start) / jobs * 1e3
+
+    start = time.perf_counter()
+    suggest_for_jobs(batch, sessions, k=k, grid=grid)
+    batched = (time.perf_counter() - start) / jobs * 1e3
+
+    print(f"{jobs} jobs, {grid.minutes}-minute grid, top {k}")
+    print(f"{'string loop':>28}: {legacy:.3f} ms/job")
+    print(f"{'bit sweep (parsed)':>28}: {sweep:.3f} ms/job")
+    print(f"{'batch incl. parsing':>28}: {batched:.3f} ms/job")
+
+
+if __name__ == "__main__":
+    _benchmark()
@@ -0,0 +1,272 @@
+"""
+Bounded pool of authenticated SMTP sessions
+
+SMTPEmailService used to open a connection, run STARTTLS and log in for every
+message. The pool keeps up to ``max_size`` logged-in sessions around and hands
+them out to senders:
+
+- sessions idle for longer than ``idle_timeout`` are closed instead of reused
+- sessions idle for longer than ``health_check_interval`` are probed with NOOP
+- a session is retired after ``max_messages`` sends (many relays cap this)
+- a send that fails because the server dropped the connection is retried once
+  on a fresh session, so reconnects are transparent to callers
+
+Benchmark against a local SMTP sink with: python -m utils.smtp_pool
+"""
+
+import os
+import logging
+import smtplib
+import socket
+import threading
+import time
+from contextlib import contextmanager
+from typing import List, Optional
+
+# Configure logging
+logger = logging.getLogger(__name__)
+
+# Errors that mean the session itself is unusable (as opposed to a rejected message)
+_CONNECTION_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, socket.error)
+
+
+class _PooledConnection:
+    __slots__ = ('smtp', 'created_at', 'last_used', 'sent')
+
+    def __init__(self, smtp: smtplib.SMTP):
+        now = time.monotonic()
+        self.smtp = smtp
+        self.created_at = now
+        self.last_used = now
+        self.sent = 0
+
+
+class SMTPConnectionPool:
+    """Thread-safe, bounded pool of SMTP sessions"""
+
+    def __init__(self, host: str, port: int = 587, username: Optional[str] = None,
+                 password: Optional[str] = None, use_tls: bool = True, max_size: int = 4,
+                 idle_timeout: float = 60.0, health_check_interval: float = 15.0,
+                 max_messages: int = 100, connect_timeout: float = 30.0,
+                 acquire_timeout: float = 30.0):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.max_size = max(1, max_size)
+        self.idle_timeout = idle_timeout
+        self.health_check_interval = health_check_interval
+        self.max_messages = max(1, max_messages)
+        self.connect_timeout = connect_timeout
+        self.acquire_timeout = acquire_timeout
+        self._slots = threading.BoundedSemaphore(self.max_size)
+        self._idle: List[_PooledConnection] = []
+        self._lock = threading.Lock()
+        self._closed = False
+        self.stats = {'connects': 0, 'reuses': 0, 'health_checks': 0, 'reconnects': 0, 'sent': 0}
+
+    @classmethod
+    def from_env(cls, host: str, port: int, username: Optional[str], password: Optional[str]) -> 'SMTPConnectionPool':
+        """Build a pool using the EMAIL_SMTP_* tuning variables"""
+        def _num(name: str, default, cast=int):
+            try:
+                return cast(os.environ.get(name, str(default)))
+            except Exception:
+                return default
+
+        return cls(
+            host=host,
+            port=port,
+            username=username,
+            password=password,
+            use_tls=os.environ.get('EMAIL_USE_TLS', 'true').lower() not in ('0', 'false', 'no'),
+            max_size=_num('EMAIL_SMTP_POOL_SIZE', 4),
+            idle_timeout=_num('EMAIL_SMTP_IDLE_TIMEOUT', 60, float),
+            health_check_interval=_num('EMAIL_SMTP_HEALTH_CHECK_SECONDS', 15, float),
+            max_messages=_num('EMAIL_SMTP_MAX_MESSAGES', 100),
+            connect_timeout=_num('EMAIL_SMTP_CONNECT_TIMEOUT', 30, float),
+        )
+
+    # ---- session lifecycle -------------------------------------------------
+
+    def _connect(self) -> _PooledConnection:
+        smtp = smtplib.SMTP(self.host, self.port, timeout=self.connect_timeout)
+        try:
+            if self.use_tls:
+                smtp.starttls()
+            if self.username and self.password:
+                smtp.login(self.username, self.password)
+        except Exception:
+            self._quit(smtp)
+            raise
+        self.stats['connects'] += 1
+        return _PooledConnection(smtp)
+
+    @staticmethod
+    def _quit(smtp: smtplib.SMTP) -> None:
+        try:
+            smtp.quit()
+        except Exception:
+            try:
+                smtp.close()
+            except Exception:
+                pass
+
+    def _is_healthy(self, conn: _PooledConnection) -> bool:
+        now = time.monotonic()
+        idle = now - conn.last_used
+        if idle > self.idle_timeout or conn.sent >= self.max_messages:
+            return False
+        if idle > self.health_check_interval:
+            self.stats['health_checks'] += 1
+            try:
+                code, _ = conn.smtp.noop()
+                return code == 250
+            except Exception:
+                return False
+        return True
+
+    def acquire(self) -> _PooledConnection:
+        """Check out a live session, creating one if none is idle"""
+        if self._closed:
+            raise RuntimeError("SMTP connection pool is closed")
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError("Timed out waiting for an SMTP connection")
+        try:
+            while True:
+                with self._lock:
+                    # LIFO keeps the hottest sessions in use and lets cold ones expire
+                    conn = self._idle.pop() if self._idle else None
+                if conn is None:
+                    return self._connect()
+                if self._is_healthy(conn):
+                    self.stats['reuses'] += 1
+                    return conn
+                self._quit(conn.smtp)
+        except Exception:
+            self._slots.release()
+            raise
+
+    def release(self, conn: _PooledConnection, discard: bool = False) -> None:
+        """Return a session to the pool, or close it if it should not be reused"""
+        try:
+            conn.last_used = time.monotonic()
+            if discard or self._closed or conn.sent >= self.max_messages:
+                self._quit(conn.smtp)
+            else:
+                with self._lock:
+                    self._idle.append(conn)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def connection(self):
+        conn = self.acquire()
+        discard = False
+        try:
+            yield conn.smtp
+            conn.sent += 1
+        except _CONNECTION_ERRORS:
+            discard = True
+            raise
+        finally:
+            self.release(conn, discard=discard)
+
+    # ---- sending -----------------------------------------------------------
+
+    def sendmail(self, from_addr: str, to_addrs: List[str], msg: str) -> None:
+        """Send one message, reconnecting once if the pooled session went stale"""
+        for attempt in range(2):
+            try:
+                with self.connection() as smtp:
+                    smtp.sendmail(from_addr, to_addrs, msg)
+                self.stats['sent'] += 1
+                return
+            except _CONNECTION_ERRORS as e:
+                if attempt:
+                    raise
+                self.stats['reconnects'] += 1
+                logger.warning(f"SMTP session dropped ({str(e)}); retrying on a fresh connection")
+
+    def close(self) -> None:
+        """Close all idle sessions; checked-out sessions close on release"""
+        self._closed = True
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for conn in idle:
+            self._quit(conn.smtp)
+
+
+# ---- benchmark -------------------------------------------------------------
+
+def _start_sink(host: str = '127.0.0.1'):
+    """Minimal SMTP sink that accepts and discards everything (no TLS/auth)"""
+    import socketserver
+
+    class _Handler(socketserver.StreamRequestHandler):
+        def handle(self):
+            self.wfile.write(b"220 sink ESMTP\r\n")
+            in_data = False
+            for raw in self.rfile:
+                line = raw.rstrip(b"\r\n")
+                if in_data:
+                    if line == b".":
+                        in_data = False
+                        self.wfile.write(b"250 OK queued\r\n")
+                    continue
+                verb = line[:4].upper()
+                if verb == b"EHLO":
+                    self.wfile.write(b"250-sink\r\n250 8BITMIME\r\n")
+                elif verb == b"DATA":
+                    in_data = True
+                    self.wfile.write(b"354 End data with <CR><LF>.<CR><LF>\r\n")
+                elif verb == b"QUIT":
+                    self.wfile.write(b"221 Bye\r\n")
+                    return
+                else:
+                    self.wfile.write(b"250 OK\r\n")
+
+    class _Server(socketserver.ThreadingTCPServer):
+        daemon_threads = True
+        allow_reuse_address = True
+
+    server = _Server((host, 0), _Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def _benchmark(messages: int = 400, threads: int = 4) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+    from email.mime.text import MIMEText
+
+    sink = _start_sink()
+    host, port = sink.server_address
+    msg = MIMEText("<p>Session reminder</p>", 'html')
+    msg['Subject'] = 'Benchmark'
+    msg['From'] = 'bench@example.com'
+    msg['To'] = 'to@example.com'
+    payload = msg.as_string()
+
+    def unpooled(_):
+        with smtplib.SMTP(host, port) as server:
+            server.sendmail('bench@example.com', ['to@example.com'], payload)
+
+    pool = SMTPConnectionPool(host, port, use_tls=False, max_size=threads, max_messages=messages)
+
+    def pooled(_):
+        pool.sendmail('bench@example.com', ['to@example.com'], payload)
+
+    for label, fn in (('connection per message', unpooled), ('pooled', pooled)):
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as ex:
+            list(ex.map(fn, range(messages)))
+        elapsed = time.perf_counter() - start
+        print(f"{label:>24}: {messages} messages in {elapsed:.2f}s -> {messages / elapsed:.0f} msg/s")
+    print(f"pool stats: {pool.stats}")
+    pool.close()
+    sink.shutdown()
+
+
+if __name__ == "__main__":
+    _benchmark(int(os.environ.get('BENCH_MESSAGES', '400')), int(os.environ.get('BENCH_THREADS', '4')))
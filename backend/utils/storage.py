@@ -1,13 +1,43 @@
 import os
+import re
+import queue
+import atexit
+import base64
+import hashlib
 import logging
-import uuid
-from typing import Dict, Any, Optional, BinaryIO
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Dict, Any, Optional, BinaryIO, List, Tuple
+from urllib.parse import unquote, urlparse
+import requests
+from flask import has_request_context, request
 from werkzeug.utils import secure_filename
-from .db import get_supabase_client
+from .db import get_supabase_client, get_service_client, _extract_bearer_token_from_request
+from .local_storage import LocalObjectStore, ObjectTooLarge
 
 # Configure logging
 logger = logging.getLogger(__name__)
 
+RECORDINGS_BUCKET = "session-recordings"
+
+# Supabase's resumable (TUS) endpoint requires 6MB chunks (the last one may be smaller)
+TUS_CHUNK_SIZE = 6 * 1024 * 1024
+HASH_CHUNK_SIZE = 1024 * 1024
+
+# Unreferenced objects younger than this are left alone: they may belong to an
+# upload whose completion call has not arrived yet
+GC_GRACE_SECONDS = int(os.environ.get("STORAGE_GC_GRACE_SECONDS", str(24 * 3600)))
+
+# Key part of recording URLs: .../object/public/<bucket>/<key>, .../object/sign/<bucket>/<key>?token=...,
+# /api/storage/local/<bucket>/<key>?expires=...
+_URL_KEY_RE = re.compile(rf"/{re.escape(RECORDINGS_BUCKET)}/([^?#]+)")
+
+
+class UploadTooLarge(Exception):
+    pass
+
 class StorageService:
     """Storage service for file uploads"""
     
@@ -28,6 +58,18 @@ class StorageService:
         
         # Convert MB to bytes for size validation
         self.max_size_bytes = self.max_size_mb * 1024 * 1024
+
+        # Bucket existence is checked once per process, not on every upload
+        self._bucket_ready = False
+        self._bucket_lock = threading.Lock()
+        # Keep-alive HTTP session for chunk PATCHes
+        self._http = requests.Session()
+        self.chunk_retries = int(os.environ.get("UPLOAD_CHUNK_RETRIES", "3"))
+
+        # Self-hosted / test deployments keep objects on local disk
+        self.local = LocalObjectStore() if self.provider == "local" else None
+        self.local_url_ttl = int(os.environ.get("LOCAL_STORAGE_URL_TTL", "3600"))
+        self.playback_url_ttl = int(os.environ.get("RECORDING_URL_TTL", "3600"))
     
     def validate_file(self, filename: str, file_size: int) -> Dict[str, Any]:
         """
@@ -57,86 +99,409 @@ class StorageService:
             
         return {"valid": True, "message": "File is valid"}
     
+    def _ensure_bucket(self, supabase) -> None:
+        """Create the recordings bucket if missing; remembered for the life of the process"""
+        if self._bucket_ready:
+            return
+        with self._bucket_lock:
+            if self._bucket_ready:
+                return
+            try:
+                supabase.storage.get_bucket(RECORDINGS_BUCKET)
+            except Exception:
+                try:
+                    supabase.storage.create_bucket(RECORDINGS_BUCKET)
+                except Exception as e:
+                    # Lost a creation race: fine. Anything else is retried on the next upload
+                    if "exists" not in str(e).lower() and "duplicate" not in str(e).lower():
+                        logger.warning(f"Could not create bucket {RECORDINGS_BUCKET}: {str(e)}")
+                        return
+            self._bucket_ready = True
+
+    @staticmethod
+    def _content_type(ext: str) -> str:
+        return f"audio/{ext}" if ext in ["mp3", "wav"] else f"video/{ext}"
+
+    @staticmethod
+    def _stream_size(file_obj: BinaryIO) -> Optional[int]:
+        """Size of a seekable stream from its current position, without reading it"""
+        try:
+            pos = file_obj.tell()
+            end = file_obj.seek(0, os.SEEK_END)
+            file_obj.seek(pos)
+            return end - pos
+        except Exception:
+            return None
+
+    def _spool(self, file_obj: BinaryIO) -> Tuple[BinaryIO, str]:
+        """Copy an unseekable stream to a spooled temp file, hashing it on the way"""
+        spooled = tempfile.SpooledTemporaryFile(max_size=TUS_CHUNK_SIZE)
+        hasher = hashlib.sha256()
+        total = 0
+        while True:
+            chunk = file_obj.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            total += len(chunk)
+            if total > self.max_size_bytes:
+                spooled.close()
+                raise UploadTooLarge()
+            hasher.update(chunk)
+            spooled.write(chunk)
+        spooled.seek(0)
+        return spooled, hasher.hexdigest()
+
+    @staticmethod
+    def _hash_stream(file_obj: BinaryIO) -> str:
+        """SHA-256 of a seekable stream from its current position; the position is restored"""
+        pos = file_obj.tell()
+        hasher = hashlib.sha256()
+        while True:
+            chunk = file_obj.read(HASH_CHUNK_SIZE)
+            if not chunk:
+                break
+            hasher.update(chunk)
+        file_obj.seek(pos)
+        return hasher.hexdigest()
+
+    @staticmethod
+    def content_object_name(digest: str, ext: str, folder: Optional[str] = None) -> str:
+        """Object key for content with the given SHA-256: [<folder>/]<sha256>.<ext>"""
+        name = f"{digest}.{ext}" if ext else digest
+        return f"{folder.strip('/')}/{name}" if folder else name
+
+    def _tus_headers(self) -> Dict[str, str]:
+        anon_key = os.environ.get("SUPABASE_ANON_KEY", "")
+        token = _extract_bearer_token_from_request() or anon_key
+        return {
+            "Authorization": f"Bearer {token}",
+            "apikey": anon_key,
+            "Tus-Resumable": "1.0.0",
+        }
+
+    @staticmethod
+    def _is_tus_session_url(url: str) -> bool:
+        """True only for upload sessions on our own storage host (never PATCH a caller-chosen host)"""
+        base = urlparse(os.environ.get('SUPABASE_URL', ''))
+        target = urlparse(url or '')
+        return (
+            bool(base.netloc)
+            and target.scheme == base.scheme
+            and target.netloc == base.netloc
+            and target.path.startswith('/storage/v1/upload/resumable/')
+        )
+
+    def _tus_create(self, object_name: str, size: int, content_type: str) -> str:
+        """Open a resumable upload session and return its URL"""
+        def b64(value: str) -> str:
+            return base64.b64encode(value.encode()).decode()
+
+        endpoint = f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/storage/v1/upload/resumable"
+        headers = self._tus_headers()
+        headers.update({
+            "Upload-Length": str(size),
+            "Upload-Metadata": ",".join([
+                f"bucketName {b64(RECORDINGS_BUCKET)}",
+                f"objectName {b64(object_name)}",
+                f"contentType {b64(content_type)}",
+                f"cacheControl {b64('3600')}",
+            ]),
+            "x-upsert": "false",
+        })
+        resp = self._http.post(endpoint, headers=headers, timeout=30)
+        if resp.status_code not in (200, 201) or not resp.headers.get("Location"):
+            raise RuntimeError(f"Could not start resumable upload: {resp.status_code} {resp.text[:200]}")
+        return resp.headers["Location"]
+
+    def _tus_offset(self, upload_url: str) -> int:
+        resp = self._http.head(upload_url, headers=self._tus_headers(), timeout=30)
+        if resp.status_code not in (200, 204):
+            raise RuntimeError(f"Upload session not found: {resp.status_code}")
+        return int(resp.headers.get("Upload-Offset", "0"))
+
+    def _tus_stream(self, file_obj: BinaryIO, upload_url: str, size: int, base_pos: int) -> None:
+        """Send the stream in fixed chunks, re-syncing the offset with the server after failures"""
+        offset = self._tus_offset(upload_url)
+        failures = 0
+        while offset < size:
+            file_obj.seek(base_pos + offset)
+            # Peak memory per upload is one chunk regardless of file size
+            chunk = file_obj.read(min(TUS_CHUNK_SIZE, size - offset))
+            if not chunk:
+                raise RuntimeError("Stream ended before the declared upload length")
+            headers = self._tus_headers()
+            headers.update({
+                "Upload-Offset": str(offset),
+                "Content-Type": "application/offset+octet-stream",
+            })
+            try:
+                resp = self._http.patch(upload_url, data=chunk, headers=headers, timeout=120)
+                if resp.status_code != 204:
+                    raise RuntimeError(f"chunk rejected: {resp.status_code} {resp.text[:200]}")
+                offset = int(resp.headers.get("Upload-Offset", offset + len(chunk)))
+                failures = 0
+            except Exception as e:
+                failures += 1
+                if failures > self.chunk_retries:
+                    raise
+                logger.warning(f"Upload chunk at {offset} failed ({str(e)}); resuming")
+                offset = self._tus_offset(upload_url)
+
     def upload_file(self, file_obj: BinaryIO, filename: str, 
-                   metadata: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+                   metadata: Optional[Dict[str, Any]] = None,
+                   resume_url: Optional[str] = None, file_id: Optional[str] = None,
+                   folder: Optional[str] = None) -> Dict[str, Any]:
         """
         Upload a file to storage
         
+        Objects are content addressed: the stream is hashed (SHA-256) as it is
+        read and stored as [<folder>/]<sha256>.<ext>. If that object already
+        exists nothing is uploaded and the existing object is returned with
+        ``deduplicated`` set, so retrying an upload costs one hashing pass.
+        
+        Files up to one chunk go up in a single request; larger ones use a
+        resumable (TUS) session and are streamed chunk by chunk, so memory use
+        stays bounded. A failed result carries ``resume_url``/``file_id``; pass
+        them back with the same stream to continue where the upload stopped.
+        
         Args:
-            file_obj: File object to upload
+            file_obj: File object to upload (must be seekable for large files)
             filename: Original filename
             metadata: Optional metadata for the file
+            resume_url: Upload session URL from a previous failed attempt
+            file_id: File id from that previous attempt (the content hash)
+            folder: Optional prefix inside the bucket (e.g. the job id)
             
         Returns:
             Dict: Upload result with status, message, and file info
         """
+        upload_url = resume_url
+        if upload_url and not self._is_tus_session_url(upload_url):
+            # The bearer token goes to this URL; only resume sessions we opened ourselves
+            logger.warning("Ignoring resume_url outside the configured storage host")
+            upload_url = None
         try:
-            # Secure filename and generate unique ID
             secure_name = secure_filename(filename)
-            file_id = str(uuid.uuid4())
             ext = secure_name.rsplit('.', 1)[1].lower() if '.' in secure_name else ''
-            storage_path = f"session-recordings/{file_id}.{ext}"
+            content_type = self._content_type(ext)
             
             if self.provider == "supabase":
-                # Upload to Supabase Storage
                 supabase = get_supabase_client()
-                
-                # Create bucket if it doesn't exist
-                try:
-                    supabase.storage.create_bucket("session-recordings")
-                except Exception:
-                    # Bucket might already exist
-                    pass
-                
-                # Upload file
-                result = supabase.storage.from_("session-recordings").upload(
-                    f"{file_id}.{ext}",
-                    file_obj.read(),
-                    {"content-type": f"audio/{ext}" if ext in ["mp3", "wav"] else f"video/{ext}"}
-                )
-                
-                # Get public URL
-                file_url = supabase.storage.from_("session-recordings").get_public_url(f"{file_id}.{ext}")
-                
-                return {
-                    "success": True,
-                    "message": "File uploaded successfully",
-                    "file_id": file_id,
-                    "filename": secure_name,
-                    "storage_path": storage_path,
-                    "url": file_url,
-                    "metadata": metadata or {}
-                }
+                self._ensure_bucket(supabase)
+
+                size = self._stream_size(file_obj)
+                if size is None:
+                    # Unseekable stream: spool to disk in chunks so it can be sized, hashed and resumed
+                    file_obj, digest = self._spool(file_obj)
+                    size = self._stream_size(file_obj)
+                elif size > self.max_size_bytes:
+                    raise UploadTooLarge()
+                else:
+                    digest = self._hash_stream(file_obj)
+                if file_id and file_id != digest:
+                    # A resumed session must carry exactly the bytes it was opened for
+                    upload_url = None
+                file_id = digest
+                object_name = self.content_object_name(digest, ext, folder)
+
+                # Same bytes already stored: a metadata-only upload
+                deduplicated = not upload_url and self.object_info(object_name) is not None
+                if deduplicated:
+                    logger.info(f"Upload of {secure_name} matches existing object {object_name}")
+                elif size <= TUS_CHUNK_SIZE and not upload_url:
+                    # Small body: a single request of at most one chunk
+                    data = file_obj.read(size)
+                    try:
+                        supabase.storage.from_(RECORDINGS_BUCKET).upload(object_name, data, {"content-type": content_type})
+                    except Exception as e:
+                        # Lost a race with an identical upload; the object is the same either way
+                        if "exists" not in str(e).lower() and "duplicate" not in str(e).lower():
+                            raise
+                        deduplicated = True
+                else:
+                    base_pos = file_obj.tell()
+                    upload_url = upload_url or self._tus_create(object_name, size, content_type)
+                    self._tus_stream(file_obj, upload_url, size, base_pos)
+            elif self.provider == "local":
+                # Hashes while streaming to disk and publishes atomically under the hash
+                stored = self.local.write_content_addressed(RECORDINGS_BUCKET, file_obj, ext, folder,
+                                                            self.max_size_bytes)
+                file_id = digest = stored["sha256"]
+                size = stored["size"]
+                object_name = stored["key"]
+                deduplicated = not stored["created"]
             else:
                 return {
                     "success": False,
                     "message": f"Storage provider '{self.provider}' not supported"
                 }
+
+            return {
+                "success": True,
+                "message": "File already stored" if deduplicated else "File uploaded successfully",
+                "file_id": file_id,
+                "filename": secure_name,
+                "storage_path": f"{RECORDINGS_BUCKET}/{object_name}",
+                "url": self.public_url(object_name),
+                "content_type": content_type,
+                "content_hash": digest,
+                "size": size,
+                "deduplicated": deduplicated,
+                "metadata": metadata or {}
+            }
+        except (UploadTooLarge, ObjectTooLarge):
+            return {
+                "success": False,
+                "message": f"File too large. Maximum size: {self.max_size_mb}MB"
+            }
         except Exception as e:
             logger.error(f"Error uploading file: {str(e)}")
-            return {
+            result = {
                 "success": False,
                 "message": f"Error uploading file: {str(e)}"
             }
+            if upload_url:
+                result.update({"resume_url": upload_url, "file_id": file_id})
+            return result
     
-    def delete_file(self, file_path: str) -> Dict[str, Any]:
+    def _storage_url(self, suffix: str) -> str:
+        return f"{os.environ.get('SUPABASE_URL', '').rstrip('/')}/storage/v1{suffix}"
+
+    def create_signed_upload_url(self, object_path: str) -> Dict[str, Any]:
+        """
+        Issue a signed URL the client can PUT the file to directly
+
+        Signing runs with the caller's JWT, so storage policies decide whether
+        this user may write object_path (see recordings policies in schema.sql).
+
+        Returns:
+            Dict: upload_url (absolute, token included), token, path
+        """
+        if self.provider == "local":
+            signed = self.local.sign("PUT", RECORDINGS_BUCKET, object_path, self.local_url_ttl)
+            return {
+                "upload_url": f"{self.public_url(object_path)}?expires={signed['expires']}&sig={signed['sig']}",
+                "token": signed["sig"],
+                "path": object_path,
+            }
+        headers = self._tus_headers()
+        headers.pop("Tus-Resumable", None)
+        resp = self._http.post(self._storage_url(f"/object/upload/sign/{RECORDINGS_BUCKET}/{object_path}"),
+                               headers=headers, timeout=15)
+        if resp.status_code != 200:
+            raise RuntimeError(f"Could not sign upload: {resp.status_code} {resp.text[:200]}")
+        signed = resp.json() or {}
+        url = signed.get("url") or ""
+        token = signed.get("token")
+        if not token and "token=" in url:
+            token = url.split("token=", 1)[1].split("&", 1)[0]
+        return {
+            "upload_url": self._storage_url(url) if url.startswith("/") else url,
+            "token": token,
+            "path": object_path,
+        }
+
+    def verify_content_hash(self, object_path: str, expected_sha256: str, client=None) -> bool:
+        """True when the stored object's bytes hash to expected_sha256
+
+        Local uploads are verified while they are written (write_stream); on
+        Supabase the object is streamed back through a signed URL and hashed,
+        so callers outside a request pass the service client to sign with.
+        """
+        if self.provider == "local":
+            return True
+        resp = self._http.get(self.playback_url(object_path, client=client), stream=True, timeout=120)
+        try:
+            if resp.status_code != 200:
+                raise RuntimeError(f"Could not read back {object_path}: {resp.status_code}")
+            hasher = hashlib.sha256()
+            for chunk in resp.iter_content(HASH_CHUNK_SIZE):
+                hasher.update(chunk)
+            return hasher.hexdigest() == expected_sha256
+        finally:
+            resp.close()
+
+    def object_info(self, object_path: str) -> Optional[Dict[str, Any]]:
+        """Metadata (size, mimetype) for an uploaded object, or None if it does not exist"""
+        if self.provider == "local":
+            info = self.local.stat(RECORDINGS_BUCKET, object_path)
+            if info is None:
+                return None
+            ext = object_path.rsplit('.', 1)[-1].lower() if '.' in object_path else ''
+            return {"size": info["size"], "mimetype": self._content_type(ext)}
+        folder, _, name = object_path.rpartition("/")
+        supabase = get_supabase_client()
+        entries = supabase.storage.from_(RECORDINGS_BUCKET).list(folder, {"limit": 100, "search": name})
+        for entry in entries or []:
+            if entry.get("name") == name:
+                return entry.get("metadata") or {}
+        return None
+
+    @staticmethod
+    def object_key(file_path: str) -> str:
+        """Object key relative to the bucket (paths may be nested per job)"""
+        return file_path[len(RECORDINGS_BUCKET) + 1:] if file_path.startswith(f"{RECORDINGS_BUCKET}/") else file_path
+
+    @staticmethod
+    def _api_base_url() -> str:
+        """Absolute origin of this API for URLs handed to the browser (the frontend is another origin)"""
+        base = os.environ.get("API_PUBLIC_URL", "").rstrip("/")
+        if base:
+            return base
+        if has_request_context():
+            return request.host_url.rstrip("/")
+        return ""
+
+    def public_url(self, object_path: str) -> str:
+        """Stable location of an object; not readable on its own (see playback_url)"""
+        if self.provider == "local":
+            # Stable location; reads still need a signature (see playback_url)
+            return f"{self._api_base_url()}/api/storage/local/{RECORDINGS_BUCKET}/{object_path}"
+        supabase = get_supabase_client()
+        return supabase.storage.from_(RECORDINGS_BUCKET).get_public_url(object_path)
+
+    def playback_url(self, file_path: str, client=None) -> str:
+        """URL a browser can stream (and seek) directly, e.g. from an <audio>/<video> tag
+
+        The bucket is private, so this is always a short-lived signed URL. On
+        Supabase it is signed with the caller's JWT, so the recordings select
+        policy decides who may play an object.
+        """
+        key = self.object_key(file_path)
+        if self.provider == "local":
+            signed = self.local.sign("GET", RECORDINGS_BUCKET, key, self.local_url_ttl)
+            return f"{self.public_url(key)}?expires={signed['expires']}&sig={signed['sig']}"
+        supabase = client or get_supabase_client()
+        signed = supabase.storage.from_(RECORDINGS_BUCKET).create_signed_url(key, self.playback_url_ttl) or {}
+        url = signed.get("signedURL") or signed.get("signedUrl") or ""
+        if not url:
+            raise RuntimeError(f"Could not sign playback URL for {key}")
+        return self._storage_url(url) if url.startswith("/") else url
+
+    def delete_file(self, file_path: str, client=None) -> Dict[str, Any]:
         """
         Delete a file from storage
         
         Args:
             file_path: Path to the file in storage
+            client: Client to delete with (defaults to the caller's)
             
         Returns:
             Dict: Deletion result with status and message
         """
         try:
+            if self.provider == "local":
+                self.local.delete(RECORDINGS_BUCKET, self.object_key(file_path))
+                return {
+                    "success": True,
+                    "message": "File deleted successfully"
+                }
             if self.provider == "supabase":
-                # Extract filename from path
-                filename = file_path.split("/")[-1]
+                filename = self.object_key(file_path)
                 
                 # Delete from Supabase Storage
-                supabase = get_supabase_client()
-                supabase.storage.from_("session-recordings").remove([filename])
+                supabase = client or get_supabase_client()
+                supabase.storage.from_(RECORDINGS_BUCKET).remove([filename])
                 
                 return {
                     "success": True,
@@ -154,6 +519,159 @@ class StorageService:
                 "message": f"Error deleting file: {str(e)}"
             }
 
+    @staticmethod
+    def key_from_url(url: Optional[str]) -> Optional[str]:
+        """Object key inside a public, signed or local recording URL, if it points into the bucket"""
+        match = _URL_KEY_RE.search(url or '')
+        return unquote(match.group(1)) if match else None
+
+    def _referenced_paths(self, client) -> set:
+        """Object keys referenced from session_recordings by storage_path or recording_url
+
+        Mirrors unreferenced_recording_objects() in schema.sql: paths may carry
+        the bucket prefix, and legacy or link rows only have recording_url.
+        """
+        paths = set()
+        page = 1000
+        start = 0
+        while True:
+            res = (
+                client.table('session_recordings')
+                .select('storage_path, recording_url')
+                .range(start, start + page - 1)
+                .execute()
+            )
+            rows = res.data or []
+            for r in rows:
+                if r.get('storage_path'):
+                    paths.add(self.object_key(r['storage_path']))
+                key = self.key_from_url(r.get('recording_url'))
+                if key:
+                    paths.add(key)
+            if len(rows) < page:
+                return paths
+            start += page
+
+    def collect_garbage(self, client=None, grace_seconds: int = GC_GRACE_SECONDS,
+                        dry_run: bool = False) -> Dict[str, Any]:
+        """
+        Delete recording objects that no session_recordings row references
+        
+        An object's reference count is the number of session_recordings rows
+        whose storage_path or recording_url points at it; content-addressed uploads can be
+        shared, and replaced or never-completed uploads drop to zero. Objects
+        at zero that are older than grace_seconds are removed.
+        
+        Returns:
+            Dict: objects deleted (or that would be, with dry_run) and bytes freed
+        """
+        client = client or get_service_client()
+        if client is None:
+            raise RuntimeError("Storage cleanup needs SUPABASE_SERVICE_ROLE_KEY")
+        doomed: List[Tuple[str, int]] = []
+
+        if self.provider == "supabase":
+            res = client.rpc('unreferenced_recording_objects', {'p_grace_seconds': int(grace_seconds)}).execute()
+            doomed = [(r['name'], int(r.get('size_bytes') or 0)) for r in (res.data or [])]
+            if not dry_run:
+                for i in range(0, len(doomed), 100):
+                    client.storage.from_(RECORDINGS_BUCKET).remove([name for name, _ in doomed[i:i + 100]])
+        elif self.provider == "local":
+            # Local files are named by a hash of their key, so compare on paths
+            referenced = {self.local.path_for(RECORDINGS_BUCKET, key) for key in self._referenced_paths(client)}
+            cutoff = time.time() - grace_seconds
+            for path, mtime, size in self.local.iter_files(RECORDINGS_BUCKET):
+                if mtime > cutoff or path in referenced:
+                    continue
+                doomed.append((path, size))
+                if not dry_run:
+                    # Abandoned temp files from interrupted uploads go the same way
+                    try:
+                        os.unlink(path)
+                    except OSError:
+                        pass
+        else:
+            raise RuntimeError(f"Storage provider '{self.provider}' not supported")
+
+        freed = sum(size for _, size in doomed)
+        logger.info(f"Storage cleanup {'found' if dry_run else 'removed'} {len(doomed)} unreferenced objects ({freed} bytes)")
+        return {"deleted": len(doomed), "bytes_freed": freed, "dry_run": dry_run}
+
+class ContentHashVerifier:
+    """Background thread that checks content-addressed uploads against their claimed hash
+
+    Reading an object back can mean streaming up to MAX_UPLOAD_SIZE_MB, which
+    must not tie up a request worker. upload-complete records the recording
+    right away and queues it here; a match stamps content_verified_at (which
+    only the service role may set, see schema.sql), so later completions of the
+    same path skip the check. A mismatch removes the object and its rows.
+    """
+
+    def __init__(self):
+        self._queue: "queue.Queue[Tuple[str, str]]" = queue.Queue()
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+
+    def submit(self, object_path: str, content_hash: str) -> None:
+        self.start()
+        self._queue.put((object_path, content_hash))
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread and self._thread.is_alive():
+                return
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._run, name='recording-hash-verifier', daemon=True)
+            self._thread.start()
+
+    def stop(self, timeout: float = 10.0) -> None:
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout=timeout)
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                object_path, content_hash = self._queue.get(timeout=0.5)
+            except queue.Empty:
+                continue
+            try:
+                self.verify(object_path, content_hash)
+            except Exception as e:
+                # Left unverified: the next completion of this path queues it again
+                logger.error(f"Could not verify content hash of {object_path}: {str(e)}")
+
+    def verify(self, object_path: str, content_hash: str) -> bool:
+        client = get_service_client()
+        if client is None:
+            raise RuntimeError("Content hash verification needs SUPABASE_SERVICE_ROLE_KEY")
+        storage_service = get_storage_service()
+        if storage_service.verify_content_hash(object_path, content_hash, client=client):
+            client.table('session_recordings').update({
+                'content_verified_at': datetime.now(timezone.utc).isoformat(),
+            }).eq('storage_path', object_path).eq('content_hash', content_hash).execute()
+            return True
+        logger.warning(f"Upload {object_path} does not match its claimed hash; removing it")
+        client.table('session_recordings').delete().eq('storage_path', object_path).eq('content_hash', content_hash).execute()
+        storage_service.delete_file(object_path, client=client)
+        return False
+
+
+_verifier: Optional[ContentHashVerifier] = None
+_verifier_lock = threading.Lock()
+
+
+def get_content_hash_verifier() -> ContentHashVerifier:
+    global _verifier
+    if _verifier is None:
+        with _verifier_lock:
+            if _verifier is None:
+                _verifier = ContentHashVerifier()
+                atexit.register(_verifier.stop)
+    return _verifier
+
+
 def get_storage_service() -> StorageService:
     """
     Get the storage service instance
@@ -161,4 +679,25 @@ def get_storage_service() -> StorageService:
     Returns:
         StorageService: Storage service instance
     """
-    return StorageService()
\ No newline at end of file
+    return StorageService()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Recording storage maintenance")
+    parser.add_argument('--gc', action='store_true', help="delete objects no session_recordings row references")
+    parser.add_argument('--dry-run', action='store_true', help="report what --gc would delete")
+    parser.add_argument('--grace-seconds', type=int, default=GC_GRACE_SECONDS)
+    args = parser.parse_args()
+    logging.basicConfig(level=logging.INFO)
+    try:
+        from dotenv import load_dotenv
+        load_dotenv()
+    except Exception:
+        pass
+
+    if args.gc:
+        print(get_storage_service().collect_garbage(grace_seconds=args.grace_seconds, dry_run=args.dry_run))
+    else:
+        parser.print_help()
@@ -190,7 +190,7 @@ export default function SchedulingPage() {
     try {
       setScheduling(true);
 
-      // 1. Call backend cancel endpoint to recreate opportunity and delete job
+      // 1. Call backend cancel endpoint to recreate opportunity, delete job and notify both parties
       try {
         await apiService.cancelJob(jobId);
       } catch (cancelErr) {
@@ -199,51 +199,7 @@ export default function SchedulingPage() {
         return;
       }
 
-      // 3. Send cancellation notification emails
-      try {
-        if (user) {
-          // Get tutor's full name from auth user or construct from available data
-          const tutorName =
-            user?.user_metadata?.full_name ||
-            `${user?.user_metadata?.first_name || ""} ${
-              user?.user_metadata?.last_name || ""
-            }`.trim() ||
-            (user?.email?.replace(/(^[^@\s]+)(\+(?:tutor|tutee))@([Hh][Dd][Ss][Bb]\.ca)$/,'$1@$3') || '').split("@")[0] ||
-            "Tutor";
-
-          const tuteeName =
-            `${(job as any)?.tutee?.first_name ?? ""} ${
-              (job as any)?.tutee?.last_name ?? ""
-            }`.trim() ||
-            `${job.tutoring_opportunity?.tutee_first_name ?? ""} ${
-              job.tutoring_opportunity?.tutee_last_name ?? ""
-            }`.trim();
-
-          await apiService.sendCancellationNotification(
-            (user.email || "").replace(/(^[^@\s]+)(\+(?:tutor|tutee))@([Hh][Dd][Ss][Bb]\.ca)$/,'$1@$3'),
-            (job as any)?.tutee?.email ||
-              job.tutoring_opportunity?.tutee?.email ||
-              "",
-            {
-              subject: `${job?.tutoring_opportunity?.subject_name || ""} • ${
-                job?.tutoring_opportunity?.subject_type || ""
-              } • Grade ${
-                job?.tutoring_opportunity?.subject_grade || ""
-              }`.trim(),
-              tutor_name: tutorName,
-              tutee_name: tuteeName,
-              reason: "Tutor cancelled before scheduling",
-            },
-            jobId
-          );
-          console.log("Cancellation notification emails sent successfully");
-        }
-      } catch (emailError) {
-        console.error("Failed to send cancellation notifications:", emailError);
-        // Don't fail the entire process if email fails
-      }
-
-      // 4. Redirect to dashboard with cancellation message
+      // 2. Redirect to dashboard with cancellation message
       router.push("/tutor/dashboard?cancelled=true");
     } catch (err) {
       console.error("Error in handleCancelJob:", err);
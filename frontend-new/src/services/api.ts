@@ -179,6 +179,30 @@ export async function createTuteeOpportunity(payload: {
 }
 
 // Tutor endpoints
+export interface DashboardDelta {
+  delta: boolean; // false: full payload, replace local state
+  cursor: string;
+  removed?: Record<string, string[]>;
+  [section: string]: any;
+}
+
+const DASHBOARD_PATHS: Record<DashboardRole, string> = {
+  tutor: '/api/tutor/dashboard',
+  tutee: '/api/tutee/dashboard',
+  admin: '/api/admin/overview',
+};
+
+/**
+ * Changes since a cursor from a previous dashboard response. Apply `removed`
+ * ids first, then upsert each returned row by id.
+ */
+export async function getDashboardChanges(role: DashboardRole, since: string) {
+  return apiRequest<DashboardDelta>(
+    `${DASHBOARD_PATHS[role]}?since=${encodeURIComponent(since)}`,
+    { method: 'GET' }
+  );
+}
+
 export async function getTutorDashboard() {
   return apiRequest<{ tutor: any; approved_subject_ids: string[]; opportunities: any[]; jobs: any[] }>(
     '/api/tutor/dashboard',
@@ -200,6 +224,27 @@ export async function listOpenOpportunities() {
   );
 }
 
+export interface OpportunityFeedFilters {
+  subject?: string;
+  grade?: string;
+  type?: string;
+  language?: string;
+  limit?: number;
+  cursor?: string | null;
+}
+
+export async function getOpportunityFeed(filters: OpportunityFeedFilters = {}) {
+  const params = new URLSearchParams();
+  Object.entries(filters).forEach(([key, value]) => {
+    if (value !== undefined && value !== null && value !== '') params.set(key, String(value));
+  });
+  const qs = params.toString();
+  return apiRequest<{ opportunities: any[]; next_cursor: string | null; tutor_status?: string }>(
+    `/api/tutor/opportunities/feed${qs ? `?${qs}` : ''}`,
+    { method: 'GET' }
+  );
+}
+
 export async function cancelTuteeOpportunity(opportunityId: string) {
   return apiRequest<{ message: string; opportunity: any }>(
     `/api/tutee/opportunities/${opportunityId}/cancel`,
@@ -239,6 +284,23 @@ export async function scheduleJob(
   );
 }
 
+export interface SuggestedTime {
+  date: string;
+  start_time: string;
+  scheduled_time: string;
+  duration_minutes: number;
+}
+
+export async function suggestJobTimes(
+  jobId: string,
+  options: { k?: number; step_minutes?: number; tutor_availability?: Record<string, string[]> } = {}
+) {
+  return apiRequest<{ job_id: string; suggestions: SuggestedTime[] }>(
+    `/api/tutor/jobs/${jobId}/suggested-times`,
+    { method: 'POST', body: JSON.stringify(options) }
+  );
+}
+
 export async function cancelJob(jobId: string) {
   return apiRequest<{ message: string; opportunity: any }>(
     `/api/tutor/jobs/${jobId}/cancel`,
@@ -281,15 +343,164 @@ export async function listAwaitingVerificationJobs() {
   );
 }
 
-export async function getAdminOverview() {
+export async function listMatchProposals(status: string = 'pending') {
+  return apiRequest<{ proposals: any[] }>(
+    `/api/admin/match-proposals?status=${encodeURIComponent(status)}`,
+    { method: 'GET' }
+  );
+}
+
+export async function approveMatchProposal(proposalId: string) {
+  return apiRequest<{ message: string; proposal: any; job: any }>(
+    `/api/admin/match-proposals/${proposalId}/approve`,
+    { method: 'POST' }
+  );
+}
+
+export async function rejectMatchProposal(proposalId: string) {
+  return apiRequest<{ message: string; proposal: any }>(
+    `/api/admin/match-proposals/${proposalId}/reject`,
+    { method: 'POST' }
+  );
+}
+
+export type DashboardRole = 'tutor' | 'tutee' | 'admin';
+export interface DashboardEvent {
+  event: string; // jobs | opportunities | approvals | help_requests | tutors | match_proposals | resync
+  data: { table?: string; op?: string; id?: string; status?: string };
+}
+
+/**
+ * Subscribe to server-sent change events for a dashboard. Uses fetch streaming
+ * (EventSource cannot send the bearer token) and reconnects with Last-Event-ID.
+ * Cached GETs for the role are dropped on every event. Returns an unsubscribe function.
+ */
+export function subscribeToDashboardEvents(role: DashboardRole, onEvent: (e: DashboardEvent) => void) {
+  let stopped = false;
+  let lastEventId = '';
+  let retryMs = 3000;
+  let controller: AbortController | null = null;
+
+  const dispatch = (name: string, raw: string) => {
+    invalidateCacheByPrefix(`/api/${role}`);
+    let data = {};
+    try { data = raw ? JSON.parse(raw) : {}; } catch (_) {}
+    onEvent({ event: name || 'message', data });
+  };
+
+  const run = async () => {
+    while (!stopped) {
+      controller = new AbortController();
+      try {
+        const { data: { session } } = await supabase.auth.getSession();
+        const res = await fetch(`${API_URL}/api/${role}/events`, {
+          headers: {
+            Accept: 'text/event-stream',
+            ...(session?.access_token && { Authorization: `Bearer ${session.access_token}` }),
+            ...(lastEventId && { 'Last-Event-ID': lastEventId }),
+          },
+          signal: controller.signal,
+        });
+        if (!res.ok || !res.body) throw new Error(`events ${res.status}`);
+        const reader = res.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        while (!stopped) {
+          const { value, done } = await reader.read();
+          if (done) break;
+          buffer += decoder.decode(value, { stream: true });
+          let sep;
+          while ((sep = buffer.indexOf('\n\n')) >= 0) {
+            const block = buffer.slice(0, sep);
+            buffer = buffer.slice(sep + 2);
+            let name = '';
+            const dataLines: string[] = [];
+            for (const line of block.split('\n')) {
+              if (line.startsWith('id:')) lastEventId = line.slice(3).trim();
+              else if (line.startsWith('event:')) name = line.slice(6).trim();
+              else if (line.startsWith('data:')) dataLines.push(line.slice(5).trim());
+              else if (line.startsWith('retry:')) retryMs = Number(line.slice(6).trim()) || retryMs;
+            }
+            if (name || dataLines.length) dispatch(name, dataLines.join('\n'));
+          }
+        }
+      } catch (_) {
+        if (stopped) return;
+      }
+      if (!stopped) await new Promise((r) => setTimeout(r, retryMs));
+    }
+  };
+
+  run();
+  return () => {
+    stopped = true;
+    controller?.abort();
+  };
+}
+
+export type AdminOverviewSection =
+  | 'admin'
+  | 'tutors'
+  | 'opportunities'
+  | 'awaiting_jobs'
+  | 'help_requests'
+  | 'certification_requests'
+  | 'schools';
+
+/**
+ * Admin dashboard data. Pass `sections` to refresh only part of the page
+ * (e.g. ['awaiting_jobs', 'help_requests']); omitted sections are absent.
+ */
+export async function getAdminOverview(sections?: AdminOverviewSection[]) {
+  const qs = sections && sections.length ? `?sections=${encodeURIComponent(sections.join(','))}` : '';
   return apiRequest<{
-    admin: any;
-    tutors: any[];
-    opportunities: any[];
-    awaiting_jobs: any[];
-    certification_requests: any[];
-    schools: any[];
-  }>(`/api/admin/overview`, { method: 'GET' });
+    admin?: any;
+    tutors?: any[];
+    opportunities?: any[];
+    awaiting_jobs?: any[];
+    help_requests?: any[];
+    certification_requests?: any[];
+    schools?: any[];
+    delta: boolean;
+    cursor: string;
+  }>(`/api/admin/overview${qs}`, { method: 'GET' });
+}
+
+export interface AnalyticsLatency {
+  samples: number;
+  median_hours: number | null;
+  p90_hours: number | null;
+}
+
+export interface AdminAnalytics {
+  from: string;
+  to: string;
+  totals: { jobs_completed: number; hours: number; active_tutors: number };
+  by_week: { week: string; jobs_completed: number; hours: number }[];
+  by_tutor: { tutor_id: string; first_name: string | null; last_name: string | null; jobs_completed: number; hours: number }[];
+  by_school: { school_id: string | null; name: string | null; jobs_completed: number; hours: number; tutors: number }[];
+  by_subject: { subject_name: string; subject_type: string; jobs_completed: number; hours: number }[];
+  time_to_claim: AnalyticsLatency;
+  time_to_schedule: AnalyticsLatency;
+  backlog: {
+    open: number;
+    high_priority: number;
+    older_than_7_days: number;
+    oldest_created_at: string | null;
+    median_age_hours: number | null;
+    by_subject: { subject_name: string; subject_type: string; subject_grade: string; open: number; oldest_created_at: string }[];
+  };
+}
+
+/** Reporting aggregates computed server-side; dates are ISO (default: last 90 days). */
+export async function getAdminAnalytics(params: { from?: string; to?: string; top?: number; schoolId?: string } = {}) {
+  const qs = new URLSearchParams();
+  if (params.from) qs.set('from', params.from);
+  if (params.to) qs.set('to', params.to);
+  if (params.top) qs.set('top', String(params.top));
+  if (params.schoolId) qs.set('school_id', params.schoolId);
+  const query = qs.toString();
+  return apiRequest<AdminAnalytics>(`/api/admin/analytics${query ? `?${query}` : ''}`, { method: 'GET' });
 }
 
 export async function getTutorEditData(tutorId: string) {
@@ -386,22 +597,27 @@ export async function listSchoolsPublic() {
 }
 
 /**
- * Get a pre-signed URL for file upload
+ * Get a signed URL to upload a session recording directly to storage
  */
-export async function getUploadUrl() {
+export async function getUploadUrl(jobId: string, filename: string, fileSize: number, sha256?: string) {
+  // With sha256, a file this job already holds comes back deduplicated (no upload_url)
   return apiRequest<{
-    upload_url: string;
+    upload_url: string | null;
+    method: string | null;
     fields: Record<string, string>;
-    expires_in: number;
+    path: string;
+    deduplicated: boolean;
+    expires_in?: number;
   }>('/api/storage/upload-url', {
     method: 'POST',
+    body: JSON.stringify({ job_id: jobId, filename, file_size: fileSize, sha256 }),
   });
 }
 
 /**
- * Upload a file using the pre-signed URL
+ * Upload a file using the signed URL
  */
-export async function uploadFile(file: File, uploadUrl: string, fields: Record<string, string>) {
+export async function uploadFile(file: File, uploadUrl: string, fields: Record<string, string>, method: string = 'PUT') {
   const formData = new FormData();
   
   // Add the fields to the form data
@@ -413,7 +629,7 @@ export async function uploadFile(file: File, uploadUrl: string, fields: Record<s
   formData.append('file', file);
   
   const response = await fetch(uploadUrl, {
-    method: 'POST',
+    method,
     body: formData,
   });
   
@@ -424,6 +640,16 @@ export async function uploadFile(file: File, uploadUrl: string, fields: Record<s
   return true;
 }
 
+/**
+ * Record a finished direct upload against its job
+ */
+export async function completeUpload(jobId: string, path: string) {
+  return apiRequest<{ message: string; recording: Record<string, unknown> }>('/api/storage/upload-complete', {
+    method: 'POST',
+    body: JSON.stringify({ job_id: jobId, path }),
+  });
+}
+
 /**
  * Send a test email
  */
@@ -606,6 +832,7 @@ const apiService = {
   checkServicesStatus,
   getUploadUrl,
   uploadFile,
+  completeUpload,
   sendTestEmail,
   sendSessionConfirmation,
   sendJobAssignmentNotification,
@@ -615,17 +842,23 @@ const apiService = {
   getTuteeDashboard,
   createTuteeOpportunity,
   getTutorDashboard,
+  getDashboardChanges,
   acceptOpportunity,
   setTuteeAvailability,
   scheduleJob,
+  suggestJobTimes,
   cancelJob,
   cancelJobAsTutee,
   getJobDetails,
   upsertRecordingLink,
   listAwaitingVerificationJobs,
+  listMatchProposals,
+  approveMatchProposal,
+  rejectMatchProposal,
   getRecordingLinkForJob,
   verifyCompletedJob,
   listOpenOpportunities,
+  getOpportunityFeed,
   cancelTuteeOpportunity,
   completeJob,
   listSchoolsPublic,
@@ -642,6 +875,8 @@ const apiService = {
   resolveHelpRequest,
   // Admin aggregate + edit-data (client-side cached)
   getAdminOverview,
+  getAdminAnalytics,
+  subscribeToDashboardEvents,
   getTutorEditData,
   getTutorDetailsAdmin,
   // New: admin delete certification request